@@ -3,19 +3,24 @@
 Application entry point for the Flask API.
 """
 
-from flask import Flask, request, jsonify, make_response, Response
+from flask import Flask, request, jsonify, make_response, Response, g
 from flask_cors import CORS
 from dotenv import load_dotenv 
 import os 
 import logging
+import time
 from typing import Tuple, Union
 from backend.database import init_db
 import uuid
+from backend import memory_debug
+from backend import metrics
+from backend import profiler
 from backend import redis_client
 from backend import security
 from backend.errors import (
     ForbiddenError,
     PayloadTooLargeError,
+    SessionError,
     ValidationError,
     classify_backend_exception,
     json_error_response,
@@ -40,6 +45,10 @@ logger = logging.getLogger(__name__)
 # Initialize database tables at application startup
 init_db()
 
+# SIGUSR2 で時間窓プロファイルを開始できるようにする（PROFILER_SIGNAL_ENABLED 時のみ）
+# Allow SIGUSR2 to start a window profile (only with PROFILER_SIGNAL_ENABLED)
+profiler.install_signal_handler()
+
 # 許可されたオリジンを取得（CORS設定用）
 # Resolve allowed origins for CORS configuration
 ALLOWED_ORIGINS = security.get_allowed_origins()
@@ -90,6 +99,63 @@ def error_response(
     """
     return json_error_response(message, status=status, error_type=error_type)
 
+@app.before_request
+def start_request_timer() -> None:
+    """
+    メトリクス用にリクエスト開始時刻を記録する
+    Record the request start time for latency metrics.
+    """
+    g.request_started = time.perf_counter()
+
+
+@app.before_request
+def start_request_profile() -> None:
+    """
+    署名付き X-Profile ヘッダーのリクエストだけ処理スレッドをサンプリングする
+    Sample the handling thread for requests carrying a signed X-Profile header.
+    """
+    if profiler.header_requested(request.headers):
+        g.profile_sampler = profiler.start_request_profile()
+
+
+@app.teardown_request
+def finish_request_profile(_error: BaseException | None) -> None:
+    """
+    リクエスト終了時（SSE はストリーム終了後）にプロファイルを保存する
+    Write the request profile once the request (or its SSE stream) has finished.
+    """
+    sampler = g.pop("profile_sampler", None)
+    if sampler is not None:
+        profiler.finish_request_profile(sampler)
+
+
+@app.after_request
+def record_request_metrics(response: Response) -> Response:
+    """
+    ルート・モード別のリクエスト数と応答時間を記録する
+    Record request counts and latency per route template and mode.
+
+    ルートは URL テンプレート（未一致は "unmatched"）、モードは Blueprint 名
+    （アプリ直下は "core"）をラベルにし、ラベル数が増えすぎないようにします。
+    Labels use the URL rule template ("unmatched" when none) and the blueprint
+    name ("core" for app-level routes) to keep cardinality bounded.
+    """
+    if request.path == "/metrics":
+        return response
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    mode = request.blueprint or "core"
+    metrics.HTTP_REQUESTS.labels(
+        route=route,
+        mode=mode,
+        method=request.method,
+        status=str(response.status_code),
+    ).inc()
+    started = g.get("request_started")
+    if started is not None:
+        metrics.HTTP_LATENCY.labels(route=route, mode=mode).observe(time.perf_counter() - started)
+    return response
+
+
 @app.after_request
 def apply_security_headers(response: Response) -> Response:
     """
@@ -225,5 +291,120 @@ def set_user_type() -> ResponseOrTuple:
         )
 
 
+@app.route('/api/decision', methods=['GET'])
+def get_decision_status() -> ResponseOrTuple:
+    """
+    決定事項の更新状況を返すポーリング用エンドポイント
+    Polling endpoint for deferred decision updates.
+
+    `turn` クエリ（省略時は現在の会話ターン）まで決定事項が反映済みなら
+    status=ready、バックグラウンド処理中なら status=pending を返します。
+    Returns status=ready once decisions reflect the `turn` query (default: the
+    current chat turn), otherwise status=pending while extraction runs.
+    """
+    try:
+        session_id = request.cookies.get('session_id')
+        if not session_id:
+            raise SessionError("セッションが無効です。ページをリロードしてください。")
+
+        raw_turn = request.args.get('turn')
+        if raw_turn is None:
+            turn = redis_client.get_current_turn(session_id)
+        else:
+            try:
+                turn = int(raw_turn)
+            except ValueError as error:
+                raise ValidationError("turn の指定が正しくありません。", cause=error)
+
+        decision_turn = redis_client.get_decision_turn(session_id)
+        ready = turn <= 0 or decision_turn >= turn
+        return jsonify({
+            "status": "ready" if ready else "pending",
+            "current_plan": redis_client.get_decision(session_id),
+            "turn": turn,
+            "decision_turn": decision_turn,
+        })
+    except Exception as error:
+        backend_error = classify_backend_exception(
+            error,
+            default_message="決定事項の取得に失敗しました。",
+        )
+        logger.error(
+            "Decision status endpoint failed (%s): %s",
+            backend_error.error_type,
+            backend_error,
+            exc_info=True,
+        )
+        return error_response(
+            backend_error.message,
+            status=backend_error.status_code,
+            error_type=backend_error.error_type,
+        )
+
+
+@app.route('/api/debug/memory', methods=['GET', 'POST'])
+def debug_memory() -> ResponseOrTuple:
+    """
+    ワーカーのメモリ診断（tracemalloc のスナップショット差分とキャッシュサイズ）
+    Worker memory diagnostics: tracemalloc snapshot diffs and cache sizes.
+
+    MEMORY_DEBUG_TOKEN 未設定時は 404、設定時は `Authorization: Bearer <token>` が必要です。
+    GET は状態のみ、POST は `action=start|snapshot|stop`（snapshot は `top`,
+    `group_by=lineno|filename`, `rebase=1` を受け付けます）。
+    Returns 404 unless MEMORY_DEBUG_TOKEN is set, which callers must send as a
+    bearer token. GET reports status; POST runs `action=start|snapshot|stop`
+    (snapshot accepts `top`, `group_by=lineno|filename` and `rebase=1`).
+    Each gunicorn worker answers for itself; the response includes its pid.
+    """
+    if not memory_debug.MEMORY_DEBUG_TOKEN:
+        return error_response("Not Found", status=404)
+    supplied = request.headers.get("Authorization", "")
+    if not security.tokens_match(supplied, f"Bearer {memory_debug.MEMORY_DEBUG_TOKEN}"):
+        typed_error = ForbiddenError("認証に失敗しました。")
+        return error_response(typed_error.message, status=typed_error.status_code, error_type=typed_error.error_type)
+
+    if request.method == 'GET':
+        return jsonify(memory_debug.status())
+
+    action = request.args.get('action', 'snapshot')
+    if action == 'start':
+        return jsonify(memory_debug.start())
+    if action == 'stop':
+        return jsonify(memory_debug.stop())
+    if action != 'snapshot':
+        return error_response("action は start / snapshot / stop のいずれかです。", status=400)
+    try:
+        top = min(max(int(request.args.get('top', '20')), 1), 200)
+    except ValueError:
+        top = 20
+    return jsonify(memory_debug.snapshot(
+        top=top,
+        group_by=request.args.get('group_by', 'lineno'),
+        rebase=request.args.get('rebase') in ('1', 'true'),
+    ))
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics() -> Response:
+    """
+    Prometheus 形式のメトリクスを返す
+    Expose metrics in the Prometheus text format.
+
+    既定（METRICS_ENABLED=false）では 404 を返し、METRICS_TOKEN 設定時は
+    `Authorization: Bearer <token>` を要求します。
+    Returns 404 unless METRICS_ENABLED=true (off by default) and requires
+    `Authorization: Bearer <token>` when METRICS_TOKEN is set.
+    """
+    if not metrics.METRICS_ENABLED:
+        return Response("Not Found", status=404, mimetype="text/plain")
+    if metrics.METRICS_TOKEN:
+        supplied = request.headers.get("Authorization", "")
+        expected = f"Bearer {metrics.METRICS_TOKEN}"
+        if not security.tokens_match(supplied, expected):
+            return Response("Unauthorized", status=401, mimetype="text/plain")
+    body, content_type = metrics.render_latest()
+    return Response(body, status=200, headers={"Content-Type": content_type})
+
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -13,7 +13,7 @@ from urllib.error import HTTPError, URLError
 from urllib.parse import urlencode
 from urllib.request import Request, urlopen
 
-from backend import limit_manager
+from backend import cassette, limit_manager, metrics, tracing
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +26,8 @@ def is_configured() -> bool:
     return bool(os.getenv("BRAVE_SEARCH_API", "").strip())
 
 
+@tracing.traced("brave.search")
+@cassette.recorded("search", lambda query, count=None: {"query": query, "count": count})
 def search_web(query: str, count: int | None = None) -> List[Dict[str, str]]:
     """
     Brave Search API でWeb検索を行い、整形済み結果を返す。
@@ -38,6 +40,7 @@ def search_web(query: str, count: int | None = None) -> List[Dict[str, str]]:
 
     allowed, current_count, limit, error_code = limit_manager.check_and_increment_web_search_limit()
     if not allowed:
+        metrics.WEB_SEARCH_REQUESTS.labels(outcome="limit").inc()
         if error_code:
             logger.warning(
                 "Skipping Brave search because monthly-limit check failed: %s",
@@ -81,15 +84,20 @@ def search_web(query: str, count: int | None = None) -> List[Dict[str, str]]:
             e.code,
             error_body[:300],
         )
+        metrics.WEB_SEARCH_REQUESTS.labels(outcome="error").inc()
         return []
     except (URLError, TimeoutError, json.JSONDecodeError) as e:
         logger.warning("Brave search request failed: %s", e)
+        metrics.WEB_SEARCH_REQUESTS.labels(outcome="error").inc()
         return []
     except Exception as e:
         logger.error("Unexpected Brave search error: %s", e)
+        metrics.WEB_SEARCH_REQUESTS.labels(outcome="error").inc()
         return []
 
-    return _normalize_results(payload)
+    results = _normalize_results(payload)
+    metrics.WEB_SEARCH_REQUESTS.labels(outcome="ok" if results else "empty").inc()
+    return results
 
 
 def _resolve_result_count(count: int | None) -> int:
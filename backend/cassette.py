@@ -0,0 +1,336 @@
+"""
+外部API呼び出し（Groq / Brave）の記録・再生（カセット）モード。
+Record/replay ("cassette") mode for external Groq and Brave calls.
+
+CASSETTE_MODE=record で実際の要求・応答（ストリームのチャンク時刻を含む）を
+JSON Lines 形式で CASSETTE_PATH に追記し、CASSETTE_MODE=replay で同じ実行を
+ネットワークなしで決定的に再生します。CASSETTE_REPLAY_TIMING=faithful は記録時の
+待ち時間を再現し、zero は待ち時間なしで再生します（CPU側の回帰を見やすくする）。
+CASSETTE_MODE=record appends real request/response pairs (including stream
+chunk timing) to CASSETTE_PATH as JSON lines; CASSETTE_MODE=replay replays the
+same runs offline and deterministically. CASSETTE_REPLAY_TIMING=faithful
+reproduces the recorded latency, while zero replays instantly so CPU-side
+regressions stand out from network noise.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+import functools
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MODE_OFF = "off"
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+TIMING_FAITHFUL = "faithful"
+TIMING_ZERO = "zero"
+
+# プロンプトに埋め込まれる現在日時は照合キーから除外する
+# Mask the current-datetime line embedded in prompts so keys stay stable across runs
+_VOLATILE_RE = re.compile(r"(現在日時|Current datetime): [^\n\"]*")
+
+
+class CassetteMissError(RuntimeError):
+    """再生時に一致する記録が無い / No recorded entry matches a replayed call."""
+
+
+class CassetteReplayedError(RuntimeError):
+    """
+    記録された例外を再生したもの
+    A recorded exception raised again during replay.
+
+    記録時の例外クラスを特定できれば、そのクラスとこのクラスの両方を継承した例外として
+    再送出するため、例外クラスで分岐する呼び出し側も記録時と同じ経路を通ります。
+    When the recorded exception class can be resolved, the replayed error
+    subclasses both it and this class, so callers branching on the exception
+    class take the same path as during recording.
+    """
+
+
+_mode = MODE_OFF
+_path: Optional[str] = None
+_timing = TIMING_ZERO
+_entries: Dict[Tuple[str, str], Deque[Dict[str, Any]]] = {}
+_last_entries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+_replay_classes: Dict[type, type] = {}
+_lock = threading.Lock()
+
+
+def configure(mode: str = MODE_OFF, path: Optional[str] = None, timing: str = TIMING_ZERO) -> None:
+    """
+    カセットの動作モードを設定する（再生時はファイルを読み込む）
+    Configure the cassette mode, loading the file when replaying.
+    """
+    global _mode, _path, _timing
+    normalized = (mode or MODE_OFF).strip().lower()
+    if normalized not in (MODE_OFF, MODE_RECORD, MODE_REPLAY):
+        logger.warning("Unknown CASSETTE_MODE=%s; cassette disabled", mode)
+        normalized = MODE_OFF
+    if normalized != MODE_OFF and not path:
+        logger.warning("CASSETTE_PATH is not set; cassette disabled")
+        normalized = MODE_OFF
+
+    with _lock:
+        _mode = normalized
+        _path = path
+        _timing = TIMING_FAITHFUL if (timing or "").strip().lower() == TIMING_FAITHFUL else TIMING_ZERO
+        _entries.clear()
+        _last_entries.clear()
+        if _mode == MODE_REPLAY:
+            _load_entries(path or "")
+
+
+def _load_entries(path: str) -> None:
+    """
+    カセットファイルを読み込み、照合キーごとに記録を並べる
+    Load cassette entries grouped by (kind, key) in recorded order.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line)
+                _entries.setdefault((entry["kind"], entry["key"]), deque()).append(entry)
+    except FileNotFoundError:
+        logger.warning("Cassette file not found: %s", path)
+
+
+def current_mode() -> str:
+    """現在のモードを返す / Return the active cassette mode."""
+    return _mode
+
+
+def request_key(kind: str, request: Dict[str, Any]) -> str:
+    """
+    要求内容から照合キー（SHA-256）を作る
+    Build the SHA-256 matching key for a request.
+    """
+    canonical = json.dumps(request, ensure_ascii=False, sort_keys=True, default=str)
+    canonical = _VOLATILE_RE.sub(r"\1: <now>", canonical)
+    return hashlib.sha256(f"{kind}\n{canonical}".encode("utf-8")).hexdigest()
+
+
+def _append_entry(entry: Dict[str, Any]) -> None:
+    """
+    記録を1行のJSONとして追記する
+    Append one entry as a JSON line.
+    """
+    line = json.dumps(entry, ensure_ascii=False, default=str)
+    with _lock:
+        if not _path:
+            return
+        with open(_path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def _next_entry(kind: str, key: str) -> Dict[str, Any]:
+    """
+    一致する記録を順に取り出す（使い切った後は最後の記録を再利用）
+    Pop the next matching entry, reusing the last one once exhausted.
+    """
+    with _lock:
+        queue = _entries.get((kind, key))
+        if queue:
+            entry = queue.popleft()
+            _last_entries[(kind, key)] = entry
+            return entry
+        entry = _last_entries.get((kind, key))
+    if entry is None:
+        raise CassetteMissError(f"No cassette entry for {kind} call (key={key[:12]})")
+    return entry
+
+
+def _sleep_until(start: float, offset: float) -> None:
+    """開始時刻から offset 秒後まで待つ / Sleep until `offset` seconds after `start`."""
+    remaining = offset - (time.perf_counter() - start)
+    if remaining > 0:
+        time.sleep(remaining)
+
+
+def _raise_recorded(entry: Dict[str, Any]) -> None:
+    """記録された例外があれば再送出する / Re-raise a recorded exception, if any."""
+    error = entry.get("error")
+    if error:
+        raise _replayed_error(error)
+
+
+def _recorded_class(error: Dict[str, Any]) -> Optional[type]:
+    """
+    記録された例外クラスを読み込み済みのモジュールから探す（任意のモジュールは読み込まない）
+    Look up the recorded exception class among already imported modules; nothing new is imported.
+    """
+    module = sys.modules.get(str(error.get("module") or ""))
+    candidate = getattr(module, str(error.get("type") or ""), None) if module is not None else None
+    if isinstance(candidate, type) and issubclass(candidate, Exception):
+        return candidate
+    return None
+
+
+def _replayed_str(error: BaseException) -> str:
+    """再生した例外の文字列は記録したメッセージ / A replayed error prints its recorded message."""
+    return str(error.args[0]) if error.args else ""
+
+
+def _replayed_error(error: Dict[str, Any]) -> Exception:
+    """
+    記録された例外を、元のクラスの属性付きで作り直す（特定できなければ CassetteReplayedError）
+    Rebuild a recorded exception as its original class, or CassetteReplayedError when unknown.
+
+    元のクラスのコンストラクタは引数が異なるため呼ばず、メッセージと status_code だけを復元します。
+    The original constructor is bypassed because its signature varies; only the
+    message and status_code are restored.
+    """
+    message = str(error.get("message") or "")
+    fallback = CassetteReplayedError(f"{error.get('type')}: {message}")
+    original = _recorded_class(error)
+    if original is None:
+        return fallback
+    try:
+        replay_class = _replay_classes.get(original)
+        if replay_class is None:
+            replay_class = type(
+                original.__name__,
+                (original, CassetteReplayedError),
+                {"__module__": original.__module__, "__str__": _replayed_str},
+            )
+            _replay_classes[original] = replay_class
+        replayed = replay_class.__new__(replay_class)
+        BaseException.__init__(replayed, message)
+        replayed.message = message
+        if "status_code" in error:
+            replayed.status_code = error["status_code"]
+    except (TypeError, AttributeError):
+        return fallback
+    return replayed
+
+
+def _error_payload(err: Exception) -> Dict[str, Any]:
+    """
+    例外を記録用の辞書にする（再生時にクラスを復元できるようモジュール名も残す）
+    Convert an exception into a recordable dict, keeping the module so replay can restore the class.
+    """
+    payload: Dict[str, Any] = {
+        "type": type(err).__name__,
+        "module": type(err).__module__,
+        "message": str(err),
+    }
+    status_code = getattr(err, "status_code", None)
+    if isinstance(status_code, int):
+        payload["status_code"] = status_code
+    return payload
+
+
+def recorded(kind: str, build_request: Callable[..., Dict[str, Any]]) -> Callable:
+    """
+    単発呼び出しを記録・再生するデコレータ
+    Decorator that records or replays a one-shot call.
+
+    `build_request` は呼び出し引数から照合用の要求内容を返します。
+    `build_request` maps the call arguments to the request used for matching.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            mode = _mode
+            if mode == MODE_OFF:
+                return func(*args, **kwargs)
+
+            request = build_request(*args, **kwargs)
+            key = request_key(kind, request)
+            if mode == MODE_REPLAY:
+                start = time.perf_counter()
+                entry = _next_entry(kind, key)
+                if _timing == TIMING_FAITHFUL:
+                    _sleep_until(start, float(entry.get("elapsed") or 0.0))
+                _raise_recorded(entry)
+                return entry.get("response")
+
+            start = time.perf_counter()
+            entry: Dict[str, Any] = {"kind": kind, "key": key, "request": request}
+            try:
+                response = func(*args, **kwargs)
+            except Exception as e:
+                entry.update(elapsed=time.perf_counter() - start, error=_error_payload(e))
+                _append_entry(entry)
+                raise
+            entry.update(elapsed=time.perf_counter() - start, response=response)
+            _append_entry(entry)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def recorded_stream(kind: str, build_request: Callable[..., Dict[str, Any]]) -> Callable:
+    """
+    ストリーミング呼び出しをチャンク時刻付きで記録・再生するデコレータ
+    Decorator that records or replays a streaming call with chunk timing.
+    """
+
+    def decorator(func: Callable[..., Iterator[Any]]) -> Callable[..., Iterator[Any]]:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Iterator[Any]:
+            mode = _mode
+            if mode == MODE_OFF:
+                yield from func(*args, **kwargs)
+                return
+
+            request = build_request(*args, **kwargs)
+            key = request_key(kind, request)
+            if mode == MODE_REPLAY:
+                start = time.perf_counter()
+                entry = _next_entry(kind, key)
+                faithful = _timing == TIMING_FAITHFUL
+                for offset, chunk in entry.get("chunks") or []:
+                    if faithful:
+                        _sleep_until(start, float(offset))
+                    yield chunk
+                if faithful:
+                    _sleep_until(start, float(entry.get("elapsed") or 0.0))
+                _raise_recorded(entry)
+                return
+
+            start = time.perf_counter()
+            chunks: List[List[Any]] = []
+            entry: Dict[str, Any] = {"kind": kind, "key": key, "request": request, "chunks": chunks}
+            try:
+                for chunk in func(*args, **kwargs):
+                    chunks.append([round(time.perf_counter() - start, 6), chunk])
+                    yield chunk
+            except GeneratorExit:
+                # 利用側が途中で読み終えた場合も、受信済みのチャンクを記録する
+                # Keep the chunks received so far when the consumer stops early
+                entry.update(elapsed=time.perf_counter() - start, truncated=True)
+                _append_entry(entry)
+                raise
+            except Exception as e:
+                entry.update(elapsed=time.perf_counter() - start, error=_error_payload(e))
+                _append_entry(entry)
+                raise
+            entry["elapsed"] = time.perf_counter() - start
+            _append_entry(entry)
+
+        return wrapper
+
+    return decorator
+
+
+configure(
+    os.getenv("CASSETTE_MODE", MODE_OFF),
+    os.getenv("CASSETTE_PATH") or None,
+    os.getenv("CASSETTE_REPLAY_TIMING", TIMING_ZERO),
+)
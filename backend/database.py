@@ -15,6 +15,8 @@ import time
 import logging
 from typing import Generator
 
+from backend import tracing
+
 # ロギング設定
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -28,6 +30,7 @@ if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable must be set")
 
 engine = create_engine(DATABASE_URL)
+tracing.instrument_sqlalchemy(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -0,0 +1,215 @@
+"""
+決定事項抽出をバックグラウンドで実行するワーカープール。
+Background worker pool for deferred decision extraction.
+
+応答の返却後に決定事項抽出（追加のLLM呼び出し）を実行し、
+同一セッション内ではターン順に直列実行します。
+Runs decision extraction (an extra LLM round trip) after the reply has been
+delivered, serializing jobs per session in turn order.
+
+結果は Redis に保存されます。SSE ではセッションロックの解放後に `decision` イベントで送り、
+届かなかった場合はクライアントが /api/decision で取得します。
+Results are saved to Redis. SSE streams push them as a `decision` event after
+the session lock is released; clients that miss it fetch /api/decision.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+from backend import tracing
+from backend.env import env_bool, env_float, env_int
+
+logger = logging.getLogger(__name__)
+
+DECISION_ASYNC_ENABLED = env_bool("DECISION_ASYNC_ENABLED", True)
+DECISION_WORKER_THREADS = max(1, env_int("DECISION_WORKER_THREADS", 4))
+DECISION_STREAM_WAIT_SECONDS = max(0.0, env_float("DECISION_STREAM_WAIT_SECONDS", 30.0))
+
+DecisionJob = Callable[[], str]
+
+
+@dataclass
+class _QueuedJob:
+    """実行待ちの決定事項ジョブ / A decision job waiting to run."""
+
+    turn: int
+    run: DecisionJob
+    futures: List["Future[str]"] = field(default_factory=list)
+    # 投入したリクエストのスパン（ジョブのスパンの親）と、その出力を保留する解放関数
+    # Span of the submitting request (parent of the job's span) and releases for its held trace
+    parent: Optional[tracing.Span] = None
+    trace_releases: List[Callable[[], None]] = field(default_factory=list)
+
+
+@dataclass
+class _SessionQueue:
+    """セッション単位の実行状態 / Per-session execution state."""
+
+    running: bool = False
+    queued: Optional[_QueuedJob] = None
+    latest_turn: int = -1
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_sessions: Dict[str, _SessionQueue] = {}
+_guard = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """
+    ワーカープールを遅延生成する（gunicorn の fork 後に生成されるようにする）
+    Lazily create the pool so it is built after gunicorn forks the worker.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=DECISION_WORKER_THREADS,
+            thread_name_prefix="decision-worker",
+        )
+    return _executor
+
+
+def submit_decision_job(session_id: str, turn: int, run: DecisionJob) -> "Future[str]":
+    """
+    決定事項ジョブを登録し、結果を受け取る Future を返す
+    Enqueue a decision job and return a Future resolving to the decision text.
+
+    同一セッションのジョブは直列に実行されます。実行待ちのジョブは新しいターンの
+    ジョブで置き換えられ（履歴全体を見るため結果は包含される）、古い Future には
+    新しいジョブの結果が渡されます。古いターンのジョブは登録されません。
+    Jobs for one session run serially. A job still waiting in the queue is
+    superseded by a newer turn (which sees the full history) and its Future is
+    resolved with the newer result. Jobs older than an accepted turn are dropped.
+
+    トレース中に登録されたジョブは、登録時のスパンの子スパン内で実行されます
+    （ジョブが終わるまでそのトレースの出力を保留します）。
+    A job submitted inside a trace runs in a child of the submitting span; the
+    trace's export is held until the job has run.
+    """
+    future: "Future[str]" = Future()
+    parent = tracing.current_span()
+    with _guard:
+        state = _sessions.setdefault(session_id, _SessionQueue())
+        if turn < state.latest_turn:
+            future.cancel()
+            return future
+        state.latest_turn = turn
+
+        if state.queued is None:
+            state.queued = _QueuedJob(turn=turn, run=run)
+        job = state.queued
+        job.turn = turn
+        job.run = run
+        job.futures.append(future)
+        job.parent = parent
+        release = tracing.hold(parent)
+        if release is not None:
+            job.trace_releases.append(release)
+
+        should_start = not state.running
+        if should_start:
+            state.running = True
+
+    if should_start:
+        _get_executor().submit(_drain_session, session_id)
+    return future
+
+
+def _drain_session(session_id: str) -> None:
+    """
+    セッションの実行待ちジョブが無くなるまで順に実行する
+    Run queued jobs for a session until its queue is empty.
+    """
+    while True:
+        with _guard:
+            state = _sessions.get(session_id)
+            if state is None or state.queued is None:
+                if state is not None:
+                    state.running = False
+                    _sessions.pop(session_id, None)
+                return
+            job = state.queued
+            state.queued = None
+
+        try:
+            with tracing.resume(job.parent, "decision.job", {"decision.turn": job.turn}):
+                result = job.run()
+        except Exception as e:
+            logger.error("Decision job failed for turn %s: %s", job.turn, e, exc_info=True)
+            for future in job.futures:
+                future.set_exception(e)
+            continue
+        finally:
+            for release in job.trace_releases:
+                release()
+
+        for future in job.futures:
+            future.set_result(result)
+
+
+@dataclass
+class PendingDecision:
+    """ストリームの final フレーム後に送る決定事項 / A decision to push after a stream's final frame."""
+
+    turn: int
+    future: "Future[str]"
+
+
+# ストリーム中のターンが預けた決定事項（watch_stream() の間だけ有効）
+# Decision handed over by the turn being streamed (only while watch_stream() is active)
+_stream_pending: ContextVar[Optional[List[PendingDecision]]] = ContextVar("stream_pending_decision", default=None)
+
+
+def watch_stream() -> Token:
+    """
+    現在のコンテキストで決定事項の預け入れを受け付け、unwatch_stream() 用のトークンを返す
+    Start accepting a deferred decision in the current context; returns a token for unwatch_stream().
+    """
+    return _stream_pending.set([])
+
+
+def unwatch_stream(token: Token) -> None:
+    """
+    預け入れの受け付けを終える（ストリーム生成器が別コンテキストで閉じられた場合も安全）
+    Stop accepting deferred decisions; also safe when a stream generator is closed in another context.
+    """
+    try:
+        _stream_pending.reset(token)
+    except ValueError:
+        _stream_pending.set(None)
+
+
+def defer_to_stream(turn: int, future: "Future[str]") -> None:
+    """
+    決定事項の Future をストリームに預ける（watch_stream() 外では何もしない）
+    Hand a decision Future to the stream; a no-op outside watch_stream().
+    """
+    pending = _stream_pending.get()
+    if pending is not None:
+        pending.append(PendingDecision(turn, future))
+
+
+def stream_pending() -> Optional[PendingDecision]:
+    """ストリームに預けられた最新の決定事項（無ければ None）/ Latest decision handed to the stream, or None."""
+    pending = _stream_pending.get()
+    return pending[-1] if pending else None
+
+
+def wait_for_decision(
+    future: "Future[str]",
+    timeout: Optional[float] = None,
+) -> Optional[str]:
+    """
+    Future の完了を待って決定事項テキストを返す（失敗・タイムアウト時は None）
+    Wait for a decision Future and return its text, or None on failure/timeout.
+    """
+    wait_seconds = DECISION_STREAM_WAIT_SECONDS if timeout is None else timeout
+    try:
+        return future.result(timeout=wait_seconds)
+    except Exception as e:
+        logger.warning("Deferred decision was not delivered: %s", e)
+        return None
@@ -0,0 +1,44 @@
+"""
+環境変数から設定値を読み込む共通ヘルパー。
+Shared helpers for reading settings from environment variables.
+
+不正な値は既定値として扱い、起動を止めません。
+Invalid values fall back to the default instead of failing at import time.
+"""
+
+import os
+
+
+def env_float(name: str, default: float) -> float:
+    """
+    環境変数を float として読み込み、失敗時は既定値を返す
+    Read an environment variable as float, or return the default on parse failure.
+    """
+    raw = os.getenv(name, str(default)).strip()
+    try:
+        return float(raw)
+    except ValueError:
+        return default
+
+
+def env_int(name: str, default: int) -> int:
+    """
+    環境変数を int として読み込み、失敗時は既定値を返す
+    Read an environment variable as int, or return the default on parse failure.
+    """
+    raw = os.getenv(name, str(default)).strip()
+    try:
+        return int(raw)
+    except ValueError:
+        return default
+
+
+def env_bool(name: str, default: bool = False) -> bool:
+    """
+    環境変数を真偽値として解釈する
+    Parse an environment variable as a boolean flag.
+    """
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    return raw.strip().lower() in ("1", "true", "yes", "on")
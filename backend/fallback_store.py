@@ -0,0 +1,221 @@
+"""
+Redis 障害時に使うインメモリのフォールバックストア（上限付き・スレッドセーフ）。
+Bounded, thread-safe in-memory fallback store used while Redis is unavailable.
+
+件数とバイト数の上限を超えると最も長く使われていないキーから追い出し（LRU）、
+期限切れのキーは読み込み時に加えて定期的なスイープでも削除します。スイープ用の
+スレッドは最初の書き込みまで起動しないため、Redis が健全な間は存在しません。
+Entries beyond the entry or byte budget are evicted least-recently-used
+first. Expired keys are removed on read and by a periodic sweep; the sweeper
+thread only starts on the first write, so it does not exist while Redis is healthy.
+
+値は従来どおり (value, expires_at) のタプルとして Mapping 経由でも参照できます。
+Values remain visible through the Mapping interface as (value, expires_at) tuples.
+"""
+
+from __future__ import annotations
+
+from collections import Counter, OrderedDict
+from collections.abc import MutableMapping
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from backend import metrics
+
+logger = logging.getLogger(__name__)
+
+Item = Tuple[str, Optional[float]]
+
+EVICT_ENTRIES = "entries"
+EVICT_BYTES = "bytes"
+EVICT_EXPIRED = "expired"
+
+
+class FallbackStore(MutableMapping):
+    """
+    件数・バイト数の上限と有効期限を持つ LRU ストア
+    LRU store with entry and byte budgets and per-key expiry.
+
+    max_entries / max_bytes が 0 の場合、その上限は無効です。
+    A max_entries or max_bytes of 0 disables that budget.
+    """
+
+    def __init__(self, max_entries: int = 0, max_bytes: int = 0, sweep_interval: float = 60.0) -> None:
+        self.max_entries = max(0, max_entries)
+        self.max_bytes = max(0, max_bytes)
+        self.sweep_interval = sweep_interval
+        self.evictions: Counter = Counter()
+        self._items: "OrderedDict[str, Item]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._sweeper_pid: Optional[int] = None
+
+    # Mapping インターフェース（(value, expires_at) をそのまま扱う）
+    # Mapping interface over raw (value, expires_at) tuples
+
+    def __getitem__(self, key: str) -> Item:
+        with self._lock:
+            return self._items[key]
+
+    def __setitem__(self, key: str, item: Item) -> None:
+        with self._lock:
+            self._put(key, item)
+        self._ensure_sweeper()
+
+    def __delitem__(self, key: str) -> None:
+        with self._lock:
+            if key not in self._items:
+                raise KeyError(key)
+            self._remove(key)
+            self._publish_size()
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._items))
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def pop(self, key: str, *default: Any) -> Any:
+        """キーを取り出して削除する（ロック内で1回の操作）/ Remove and return a key atomically."""
+        with self._lock:
+            if key not in self._items:
+                if default:
+                    return default[0]
+                raise KeyError(key)
+            item = self._items[key]
+            self._remove(key)
+            self._publish_size()
+            return item
+
+    def clear(self) -> None:
+        """全件削除する / Remove every entry."""
+        with self._lock:
+            self._items.clear()
+            self._sizes.clear()
+            self._bytes = 0
+            self._publish_size()
+
+    # 値の読み書き / Value access
+
+    def get_value(self, key: str, now: Optional[float] = None) -> Optional[str]:
+        """
+        値を取得し、期限切れなら削除して None を返す（取得したキーは最近使用扱い）
+        Return the value, or None after removing it when expired; marks the key as recently used.
+        """
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and (now if now is not None else time.time()) > expires_at:
+                self._remove(key)
+                self._count_eviction(EVICT_EXPIRED)
+                self._publish_size()
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set_value(self, key: str, value: str, ttl_seconds: Optional[float] = None) -> None:
+        """
+        TTL 付きで値を保存する（TTL が無ければ期限なし）
+        Store a value with an optional TTL.
+        """
+        expires_at = time.time() + ttl_seconds if ttl_seconds else None
+        self[key] = (value, expires_at)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """
+        期限切れのキーをまとめて削除し、削除件数を返す
+        Remove all expired keys and return how many were removed.
+        """
+        now = now if now is not None else time.time()
+        with self._lock:
+            expired = [key for key, (_value, expires_at) in self._items.items() if expires_at is not None and now > expires_at]
+            for key in expired:
+                self._remove(key)
+                self._count_eviction(EVICT_EXPIRED)
+            if expired:
+                self._publish_size()
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        """件数・バイト数・上限・追い出し件数 / Entry count, bytes, budgets and evictions."""
+        with self._lock:
+            return {
+                "entries": len(self._items),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "evictions": dict(self.evictions),
+            }
+
+    # 内部処理 / Internals
+
+    def _put(self, key: str, item: Item) -> None:
+        if key in self._items:
+            self._remove(key)
+        size = len(key) + len(item[0].encode("utf-8"))
+        self._items[key] = item
+        self._sizes[key] = size
+        self._bytes += size
+        self._evict(keep=key)
+        self._publish_size()
+
+    def _remove(self, key: str) -> None:
+        self._items.pop(key, None)
+        self._bytes -= self._sizes.pop(key, 0)
+
+    def _evict(self, keep: str) -> None:
+        """
+        上限を超えている間、最も古いキーから追い出す（書き込んだばかりのキーは残す）
+        Evict least-recently-used keys while over budget, never the key just written.
+        """
+        while self._items:
+            if self.max_entries and len(self._items) > self.max_entries:
+                reason = EVICT_ENTRIES
+            elif self.max_bytes and self._bytes > self.max_bytes:
+                reason = EVICT_BYTES
+            else:
+                return
+            oldest = next(iter(self._items))
+            if oldest == keep:
+                return
+            self._remove(oldest)
+            self._count_eviction(reason)
+
+    def _count_eviction(self, reason: str) -> None:
+        self.evictions[reason] += 1
+        metrics.REDIS_FALLBACK_EVICTIONS.labels(reason=reason).inc()
+
+    def _publish_size(self) -> None:
+        metrics.REDIS_FALLBACK_ENTRIES.set(len(self._items))
+        metrics.REDIS_FALLBACK_BYTES.set(self._bytes)
+
+    def _ensure_sweeper(self) -> None:
+        """
+        スイープ用スレッドをプロセスごとに1つ起動する（fork 後は子プロセスで起動し直す）
+        Start one sweeper thread per process (restarted in a forked child).
+        """
+        pid = os.getpid()
+        if self.sweep_interval <= 0 or self._sweeper_pid == pid:
+            return
+        with self._lock:
+            if self._sweeper_pid == pid:
+                return
+            self._sweeper_pid = pid
+        threading.Thread(target=self._sweep_loop, name="redis-fallback-sweeper", daemon=True).start()
+
+    def _sweep_loop(self) -> None:
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                removed = self.sweep()
+                if removed:
+                    logger.debug("Swept %d expired fallback keys", removed)
+            except Exception:
+                logger.exception("Fallback store sweep failed")
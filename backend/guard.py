@@ -9,6 +9,7 @@ import logging
 import os
 from typing import Any, Dict, Optional
 
+from backend import cassette, metrics, tracing
 from backend.groq_openai_client import get_groq_client
 
 # .envファイルの読み込み
@@ -97,6 +98,8 @@ def _normalize_guard_result(raw: str) -> str:
     return "unsafe"
 
 
+@tracing.traced("guard.check")
+@cassette.recorded("guard", lambda prompt: {"model": GROQ_GUARD_MODEL_NAME, "prompt": prompt})
 def content_checker(prompt: str) -> str:
     """
     入力または出力テキストの安全性をチェックする
@@ -108,29 +111,35 @@ def content_checker(prompt: str) -> str:
     # 短すぎるテキストはチェックをスキップ（誤検知防止や効率化のため）
     # Skip very short inputs to reduce false positives and overhead
     if len(prompt) <= 5:
+        metrics.GUARD_VERDICTS.labels(verdict="skipped").inc()
         return "safe"
 
     policy = _load_guard_policy()
     try:
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": policy,
-                },
-                {
-                    "role": "user",
-                    "content": prompt,
-                },
-            ],
-            model=GROQ_GUARD_MODEL_NAME,
-            temperature=0,
-        )
+        with metrics.observe_groq_call(GROQ_GUARD_MODEL_NAME, "guard"), tracing.span(
+            "groq.chat_completion", {"gen_ai.request.model": GROQ_GUARD_MODEL_NAME, "call_type": "guard"}
+        ):
+            chat_completion = client.chat.completions.create(
+                messages=[
+                    {
+                        "role": "system",
+                        "content": policy,
+                    },
+                    {
+                        "role": "user",
+                        "content": prompt,
+                    },
+                ],
+                model=GROQ_GUARD_MODEL_NAME,
+                temperature=0,
+            )
     except Exception as e:
         logging.getLogger(__name__).error("Content check failed: %s", e)
+        metrics.GUARD_VERDICTS.labels(verdict="error").inc()
         return "unsafe"
 
     raw = chat_completion.choices[0].message.content or ""
     result = _normalize_guard_result(raw)
+    metrics.GUARD_VERDICTS.labels(verdict=result).inc()
     logging.getLogger(__name__).info("Content check result: %s", result)
     return result
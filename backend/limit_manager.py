@@ -28,6 +28,65 @@ USER_TYPE_LIMITS = {
 }
 
 
+# Luaスクリプト: ユーザーごとと全体のカウントをアトミックにチェック・更新（2キーが同じノードにある場合）
+# Lua script: atomically update user and global counters (when both keys share a node)
+# KEYS[1]: ユーザー利用数のキー / user counter key
+# KEYS[2]: 全体利用数のキー / global counter key
+# ARGV[1]: ユーザー上限 / user limit
+# ARGV[2]: 全体上限 / global limit
+# ARGV[3]: 有効期限（秒） / TTL in seconds
+_DAILY_LIMIT_SCRIPT = """
+local user_key = KEYS[1]
+local total_key = KEYS[2]
+local user_limit = tonumber(ARGV[1])
+local total_limit = tonumber(ARGV[2])
+local expire_time = tonumber(ARGV[3])
+
+local user_val = redis.call("incr", user_key)
+local total_val = redis.call("incr", total_key)
+
+if user_val == 1 then
+    redis.call("expire", user_key, expire_time)
+end
+if total_val == 1 then
+    redis.call("expire", total_key, expire_time)
+end
+
+if user_val > user_limit or total_val > total_limit then
+    redis.call("decr", user_key)
+    redis.call("decr", total_key)
+    if total_val > total_limit then
+        return -2  -- 全体制限超過
+    end
+    return -1  -- ユーザー制限超過
+end
+
+return user_val
+"""
+
+# Luaスクリプト: 1つのカウンタを上限付きで加算（超過時は戻して -1）
+# Lua script: increment one counter up to a limit (rolled back with -1 when exceeded)
+# KEYS[1]: カウンタのキー / counter key
+# ARGV[1]: 上限 / limit
+# ARGV[2]: 有効期限（秒） / TTL in seconds
+_INCREMENT_WITH_LIMIT_SCRIPT = """
+local counter_key = KEYS[1]
+local counter_limit = tonumber(ARGV[1])
+local expire_time = tonumber(ARGV[2])
+
+local counter_val = redis.call("incr", counter_key)
+if counter_val == 1 then
+    redis.call("expire", counter_key, expire_time)
+end
+
+if counter_val > counter_limit then
+    redis.call("decr", counter_key)
+    return -1
+end
+return counter_val
+"""
+
+
 def _seconds_until_next_month(now: Optional[datetime.datetime] = None) -> int:
     """
     現在時刻から翌月初日までの秒数を返す
@@ -79,8 +138,11 @@ def check_and_increment_limit(session_id: str, user_type: Optional[str] = None)
     利用制限を確認し、カウントをインクリメントする
     Check rate limits and increment counters.
     
-    Luaスクリプトを使用してアトミックに実行します。
-    Uses a Lua script for atomic updates.
+    2つのカウンタが同じノードにある場合は1つのLuaスクリプトでアトミックに実行し、
+    cluster / sharded 構成ではユーザー分をセッションのノードで、全体分を別途更新します。
+    Uses one Lua script for an atomic update when both counters share a node;
+    in cluster/sharded mode the user counter stays on the session's node and
+    the global total is updated separately.
     
     戻り値:
     - allowed: 許可されるかどうか (True/False)
@@ -97,8 +159,13 @@ def check_and_increment_limit(session_id: str, user_type: Optional[str] = None)
     - total_exceeded: global limit exceeded
     - error_code: error code (e.g., redis_unavailable)
     """
-    client = redis_client.get_redis_client()
-    if not client:
+    today_str = datetime.date.today().isoformat()
+    # ユーザーのカウンタはセッションのスロット・ノードに、全体カウンタは日付ごとの1キーに置く
+    # The user counter lives on the session's slot/node; the global total is one key per day
+    user_client = redis_client.client_for(session_id)
+    total_key = f"daily_usage_total:{today_str}"
+    total_client = redis_client.client_for(total_key)
+    if not user_client or not total_client:
         logger.error("Redis client is not available. Rejecting limit check.")
         # Fail closed: Redisが利用できない場合は安全のためブロック
         # Fail closed when Redis is unavailable
@@ -108,58 +175,23 @@ def check_and_increment_limit(session_id: str, user_type: Optional[str] = None)
     if not resolved_type:
         return False, 0, 0, "", False, None
 
-    today_str = datetime.date.today().isoformat()
     limit = USER_TYPE_LIMITS[resolved_type]
-    user_key = f"daily_usage:{today_str}:{session_id}:{resolved_type}"
-    total_key = f"daily_usage_total:{today_str}"
-
-    # Luaスクリプト: ユーザーごとと全体のカウントをアトミックにチェック・更新
-    # Lua script: atomically update user and global counters
-    # KEYS[1]: ユーザー利用数のキー / user counter key
-    # KEYS[2]: 全体利用数のキー / global counter key
-    # ARGV[1]: ユーザー上限 / user limit
-    # ARGV[2]: 全体上限 / global limit
-    # ARGV[3]: 有効期限（秒） / TTL in seconds
-    lua_script = """
-    local user_key = KEYS[1]
-    local total_key = KEYS[2]
-    local user_limit = tonumber(ARGV[1])
-    local total_limit = tonumber(ARGV[2])
-    local expire_time = tonumber(ARGV[3])
-
-    local user_val = redis.call("incr", user_key)
-    local total_val = redis.call("incr", total_key)
-
-    if user_val == 1 then
-        redis.call("expire", user_key, expire_time)
-    end
-    if total_val == 1 then
-        redis.call("expire", total_key, expire_time)
-    end
-
-    if user_val > user_limit or total_val > total_limit then
-        redis.call("decr", user_key)
-        redis.call("decr", total_key)
-        if total_val > total_limit then
-            return -2  -- 全体制限超過
-        end
-        return -1  -- ユーザー制限超過
-    end
-
-    return user_val
-    """
+    user_key = f"daily_usage:{today_str}:{redis_client.hash_tag(session_id)}:{resolved_type}"
 
     try:
-        result = client.eval(
-            lua_script,
-            2,
-            user_key,
-            total_key,
-            limit,
-            TOTAL_DAILY_LIMIT,
-            EXPIRATION_SECONDS,
-        )
-        
+        if user_client is total_client and redis_client.REDIS_MODE != redis_client.MODE_CLUSTER:
+            result = user_client.eval(
+                _DAILY_LIMIT_SCRIPT,
+                2,
+                user_key,
+                total_key,
+                limit,
+                TOTAL_DAILY_LIMIT,
+                EXPIRATION_SECONDS,
+            )
+        else:
+            result = _increment_split_counters(user_client, user_key, limit, total_client, total_key)
+
         if result == -1:
             # ユーザー制限超過
             # User limit exceeded
@@ -178,6 +210,42 @@ def check_and_increment_limit(session_id: str, user_type: Optional[str] = None)
         return False, 0, limit, resolved_type, False, "redis_unavailable"
 
 
+def _increment_split_counters(
+    user_client: Any,
+    user_key: str,
+    limit: int,
+    total_client: Any,
+    total_key: str,
+) -> int:
+    """
+    ユーザーと全体のカウンタが別スロット・別ノードにある場合に、順に確認・加算する
+    Check and increment the user and global counters in turn when they live on
+    different slots or nodes.
+
+    ユーザーのカウンタを先に加算し、全体の上限を超えた場合はユーザーの加算を取り消します。
+    2キーを1つのスクリプトで扱えないため原子的ではなく、全体の判定は別の往復になります。
+    全体カウンタは1日1キーのため全リクエストが同じノードに集中しますが、上限
+    （TOTAL_DAILY_LIMIT）が小さいため書き込み量は限られます。
+    The user counter goes first and is rolled back when the global limit is
+    exceeded. One script cannot touch both keys, so this is not atomic and the
+    global check costs a separate round trip. The global total is a single key
+    per day, so every request hits its node; the small TOTAL_DAILY_LIMIT keeps
+    that write load low.
+    """
+    user_val = user_client.eval(_INCREMENT_WITH_LIMIT_SCRIPT, 1, user_key, limit, EXPIRATION_SECONDS)
+    if user_val == -1:
+        return -1
+    try:
+        total_val = total_client.eval(_INCREMENT_WITH_LIMIT_SCRIPT, 1, total_key, TOTAL_DAILY_LIMIT, EXPIRATION_SECONDS)
+    except Exception:
+        user_client.decr(user_key)
+        raise
+    if total_val == -1:
+        user_client.decr(user_key)
+        return -2
+    return user_val
+
+
 def check_and_increment_web_search_limit() -> Tuple[bool, int, int, Optional[str]]:
     """
     Web検索の月次利用上限を確認し、カウントをインクリメントする
@@ -190,35 +258,17 @@ def check_and_increment_web_search_limit() -> Tuple[bool, int, int, Optional[str
     - error_code: optional error code
     """
     limit = max(1, WEB_SEARCH_MONTHLY_LIMIT)
-    client = redis_client.get_redis_client()
+    today = datetime.date.today()
+    monthly_key = f"web_search_usage:{today.year:04d}-{today.month:02d}"
+    client = redis_client.client_for(monthly_key)
     if not client:
         logger.error("Redis client is not available. Rejecting web-search limit check.")
         return False, 0, limit, "redis_unavailable"
-
-    today = datetime.date.today()
-    monthly_key = f"web_search_usage:{today.year:04d}-{today.month:02d}"
     ttl_seconds = _seconds_until_next_month()
 
-    lua_script = """
-    local monthly_key = KEYS[1]
-    local monthly_limit = tonumber(ARGV[1])
-    local expire_time = tonumber(ARGV[2])
-
-    local monthly_val = redis.call("incr", monthly_key)
-    if monthly_val == 1 then
-        redis.call("expire", monthly_key, expire_time)
-    end
-
-    if monthly_val > monthly_limit then
-        redis.call("decr", monthly_key)
-        return -1
-    end
-    return monthly_val
-    """
-
     try:
         result = client.eval(
-            lua_script,
+            _INCREMENT_WITH_LIMIT_SCRIPT,
             1,
             monthly_key,
             limit,
@@ -3,15 +3,24 @@ LLM対話ロジックと決定事項管理のコア実装。
 Core logic for LLM chat flows and decision tracking.
 """
 
+from concurrent.futures import Future
 import json
 import logging
 import re
+import threading
+import time
 import warnings
 from typing import Any, Dict, Generator, List, Optional, Tuple
 
 from backend import brave_search
+from backend import decision_worker
 from backend import guard
+from backend import metrics
 from backend import redis_client
+from backend import serialization
+from backend import slow_turn_log
+from backend import stage_timing
+from backend import tracing
 
 from backend.llama_core_constants import (
     DECISION_ALLOWED_KEYS_BY_MODE,
@@ -23,6 +32,8 @@ from backend.llama_core_constants import (
     DECISION_FLEX_KEY_LIMIT,
     DECISION_GUARD_BLOCKED_MESSAGES,
     DECISION_IGNORED_LINES,
+    DECISION_INCREMENTAL_ENABLED,
+    DECISION_INCREMENTAL_MAX_TURNS,
     DECISION_KEY_EXTRA_ALIASES_BY_MODE,
     DECISION_KEY_LABELS_BY_MODE,
     DECISION_KV_SEPARATOR_RE,
@@ -30,6 +41,7 @@ from backend.llama_core_constants import (
     DECISION_MEMO_KEYS_BY_LANGUAGE,
     DECISION_PATCH_ALLOWED_KEYS,
     DECISION_SAFETY_MESSAGES,
+    DECISION_SKIP_GATE_ENABLED,
     DECISION_SLOT_QUESTION_PATTERNS,
     DECISION_SLOT_VALUE_PATTERNS,
     DECISION_UNKNOWN_ANSWER_RE,
@@ -71,6 +83,7 @@ from backend.llama_core_decision import (
     _parse_decision_key_value,
     _split_decision_lines,
     _strip_code_fences,
+    _turn_may_change_decisions,
 )
 from backend.llama_core_language import (
     _decision_default_message,
@@ -119,6 +132,7 @@ def _parse_web_search_decision(raw_text: str) -> Dict[str, Any]:
     return {}
 
 
+@tracing.traced("web_search.router")
 def _needs_web_search(
     message: str,
     chat_history: List[Tuple[str, str]],
@@ -164,16 +178,19 @@ def _needs_web_search(
     recent_history = chat_history[-6:] if len(chat_history) > 6 else chat_history
     messages = _build_messages(system_prompt, recent_history, user_input)
     try:
-        decision_raw = _invoke_with_tool_retries(messages)
+        decision_raw = _invoke_with_tool_retries(messages, call_type="router")
     except Exception as e:
         logger.warning("Web-search routing failed, fallback to no-search: %s", e)
+        metrics.WEB_SEARCH_ROUTER.labels(decision="error").inc()
         return False, ""
 
     decision = _parse_web_search_decision(decision_raw)
     should_search = bool(decision.get("should_search"))
     query = sanitize_llm_text(str(decision.get("query", "")), max_length=200).strip()
     if not should_search or not query:
+        metrics.WEB_SEARCH_ROUTER.labels(decision="no_search").inc()
         return False, ""
+    metrics.WEB_SEARCH_ROUTER.labels(decision="search").inc()
     return True, query
 
 
@@ -246,11 +263,13 @@ def _run_web_search_if_needed(
     必要時のみWeb検索を実行する
     Execute web search only when LLM decides it is required.
     """
-    should_search, query = _needs_web_search(message, chat_history, mode, language)
+    with stage_timing.stage("router"):
+        should_search, query = _needs_web_search(message, chat_history, mode, language)
     if not should_search:
         return False, []
 
-    results = brave_search.search_web(query)
+    with stage_timing.stage("search"):
+        results = brave_search.search_web(query)
     return True, results
 
 def run_qa_chain(
@@ -314,10 +333,35 @@ def run_qa_chain(
             )
     
     messages = _build_messages(system_prompt, chat_history, message)
-    response = _invoke_with_tool_retries(messages)
+    _annotate_turn_shape(chat_history, decision_text, messages, lang)
+    with stage_timing.stage("llm"):
+        response = _invoke_with_tool_retries(messages)
     return _parse_response_output(response, lang)
 
 
+def _annotate_turn_shape(
+    chat_history: List[Tuple[str, str]],
+    decision_text: Optional[str],
+    messages: List[Dict[str, str]],
+    language: str,
+) -> None:
+    """
+    遅いターンのログ用に会話の形（長さのみ、本文は含めない）を記録する
+    Record the conversation shape (sizes only, no content) for the slow-turn log.
+    """
+    if stage_timing.current() is None:
+        return
+    stage_timing.annotate(
+        language=language,
+        history_turns=len(chat_history) // 2,
+        history_bytes=sum(len(text.encode("utf-8")) for _role, text in chat_history),
+        prompt_tokens_est=slow_turn_log.estimate_tokens(
+            "".join(str(message.get("content") or "") for message in messages)
+        ),
+        decision_chars=len(decision_text or ""),
+    )
+
+
 def _parse_response_output(
     raw_response: str,
     language: Optional[str],
@@ -329,7 +373,9 @@ def _parse_response_output(
     lang = _normalize_language_code(language)
     response = sanitize_llm_text(raw_response)
 
-    if not output_is_safe(response):
+    with stage_timing.stage("output_guard"):
+        is_safe = output_is_safe(response)
+    if not is_safe:
         safe_message = _decision_safety_message(lang)
         return safe_message, None, None, False, safe_message
 
@@ -366,20 +412,263 @@ def _parse_response_output(
 
     return response, yes_no_phrase, choices, is_date_select, remaining_text
 
+# 決定事項ゲートの集計（ワーカープロセス単位）
+# Decision-gate counters (per worker process)
+_DECISION_GATE_STATS: Dict[str, int] = {
+    "turns": 0,
+    "skipped": 0,
+    "llm_runs": 0,
+    "skipped_then_changed": 0,
+}
+_decision_gate_stats_lock = threading.Lock()
+
+
+def _increment_decision_gate_stat(name: str) -> None:
+    """決定事項ゲートのカウンタを加算する / Increment a decision-gate counter."""
+    with _decision_gate_stats_lock:
+        _DECISION_GATE_STATS[name] = _DECISION_GATE_STATS.get(name, 0) + 1
+
+
+def get_decision_gate_stats() -> Dict[str, float]:
+    """
+    決定事項ゲートのスキップ率と見逃し率を返す
+    Return decision-gate counters with skip rate and miss rate.
+
+    miss_rate はスキップしたターンのうち、後のLLM抽出でそのターンの内容による
+    変更が見つかった割合です。
+    miss_rate is the share of skipped turns whose content later turned out to
+    change decisions when the LLM ran.
+    """
+    with _decision_gate_stats_lock:
+        stats: Dict[str, float] = dict(_DECISION_GATE_STATS)
+    turns = stats["turns"]
+    skipped = stats["skipped"]
+    stats["skip_rate"] = skipped / turns if turns else 0.0
+    stats["miss_rate"] = stats["skipped_then_changed"] / skipped if skipped else 0.0
+    return stats
+
+
+def _turn_text(chat_history: List[Tuple[str, str]], turn: int, latest_turn: int) -> str:
+    """
+    指定ターン（1始まり）のユーザー発話と応答を連結して返す（履歴の末尾が latest_turn）
+    Return the user and assistant text of a 1-based turn joined together; the
+    history ends with `latest_turn`.
+
+    履歴は保持上限で先頭が切り詰められるため、末尾から数えて位置を求めます。
+    The history may be trimmed at the front by the retention cap, so the
+    position is counted from the end.
+    """
+    start = len(chat_history) - (latest_turn - turn + 1) * 2
+    if start < 0:
+        return ""
+    return "\n".join(content for _role, content in chat_history[start : start + 2])
+
+
+def _record_skipped_turn_misses(
+    chat_history: List[Tuple[str, str]],
+    turn: Optional[int],
+    last_llm_turn: int,
+    previous_text: str,
+    merged_text: str,
+) -> None:
+    """
+    LLM抽出で変わった値が、スキップしたターンだけに現れていれば見逃しとして数える
+    Count a gate miss when a changed value only appears in turns that were skipped.
+
+    last_llm_turn は決定事項と一緒に読み込んだ値を使い、集計のために Redis を読み書きしません。
+    last_llm_turn is read together with the decisions, so counting adds no Redis round trips.
+    """
+    if turn is None:
+        return
+    skipped_turns = range(max(last_llm_turn, 0) + 1, turn)
+    if not skipped_turns:
+        return
+
+    before = _extract_kv_map(previous_text)
+    changed_values = [
+        value
+        for key, value in _extract_kv_map(merged_text).items()
+        if before.get(key) != value and value
+    ]
+    if not changed_values:
+        return
+
+    latest_text = _turn_text(chat_history, turn, turn)
+    for skipped_turn in skipped_turns:
+        skipped_text = _turn_text(chat_history, skipped_turn, turn)
+        if any(value in skipped_text and value not in latest_text for value in changed_values):
+            _increment_decision_gate_stat("skipped_then_changed")
+            logger.info("Decision gate skipped turn %s that later changed decisions", skipped_turn)
+
+
+def _save_decision(
+    session_id: str,
+    decision_text: str,
+    turn: Optional[int],
+    llm_turn: Optional[int] = None,
+) -> str:
+    """
+    決定事項を保存し、実際に有効な決定事項テキストを返す
+    Persist decision text and return the text that is actually current.
+
+    ターン番号が指定された場合は世代比較付きで保存し、より新しいターンの結果が
+    既に保存されていればそちらを返します。llm_turn は同じ書き込みで記録されます。
+    With a turn number the write is versioned; if a newer turn already saved
+    its result, that newer text is returned instead. llm_turn is recorded by
+    the same write.
+    """
+    if turn is None:
+        redis_client.save_decision(session_id, decision_text)
+        return decision_text
+    if redis_client.save_decision_if_newer(session_id, decision_text, turn, llm_turn=llm_turn):
+        return decision_text
+    logger.info("Skipped stale decision write for turn %s", turn)
+    return redis_client.get_decision(session_id) or decision_text
+
+
+def _incremental_decision_window(
+    chat_history: List[Tuple[str, str]],
+    turn: Optional[int],
+    watermark: int,
+) -> Optional[List[Tuple[str, str]]]:
+    """
+    ウォーターマーク（LLM が最後に抽出したターン）以降の履歴だけを返す
+    Return only the history after the watermark (the last turn the LLM saw), or None for full history.
+
+    ゲートでスキップしたターンは decision_turn を進めますが LLM は見ていないため、
+    decision_llm_turn をウォーターマークにしてスキップしたターンを窓に残します。
+    Turns skipped by the gate advance decision_turn without the LLM seeing
+    them, so decision_llm_turn is the watermark and skipped turns stay in the window.
+
+    直前のアシスタント発話を1件だけ文脈として含め、Yes/No 回答などを解釈できるようにします。
+    遅れがDECISION_INCREMENTAL_MAX_TURNSを超える場合は全履歴に戻します。
+    The assistant message right before the window is kept as context so short
+    answers (e.g. Yes/No) stay interpretable. Falls back to the full history
+    when the watermark lags by more than DECISION_INCREMENTAL_MAX_TURNS.
+
+    履歴の末尾を `turn` として、末尾から窓を切り出します（保持上限で先頭が切り詰められても同じ）。
+    The history ends with `turn`, so the window is cut from the end, which also
+    holds when the retention cap trimmed its front.
+    """
+    if not DECISION_INCREMENTAL_ENABLED or turn is None:
+        return None
+    if watermark < 0 or watermark >= turn:
+        return None
+    if DECISION_INCREMENTAL_MAX_TURNS > 0 and turn - watermark > DECISION_INCREMENTAL_MAX_TURNS:
+        return None
+    start = max(0, len(chat_history) - (turn - watermark) * 2 - 1)
+    return chat_history[start:]
+
+
 def write_decision(
     session_id: str,
     chat_history: List[Tuple[str, str]],
     mode: str = "travel",
     language: Optional[str] = None,
+    turn: Optional[int] = None,
 ) -> str:
     """
     チャット履歴から決定事項を抽出し、Redisに保存する
     Extract decisions from chat history and store them in Redis.
     
     LLMを使用して、会話の内容から「目的地」や「日程」などの確定事項を要約させます。
+    `turn` を渡すと、古いターンの結果が新しいターンの結果を上書きしません。
     Uses the LLM to summarize confirmed items (destination, dates, etc.).
+    When `turn` is given, an older turn never overwrites a newer result.
+
+    直近ターンが決定事項に影響し得ない場合（お礼・雑談など）はLLMを呼ばず、
+    前回の決定事項をそのまま再利用します（DECISION_SKIP_GATE_ENABLED）。
+    Turns that cannot affect decisions (thanks, small talk) reuse the previous
+    decisions without an LLM call (DECISION_SKIP_GATE_ENABLED).
+
+    DECISION_INCREMENTAL_ENABLED 時は、反映済みターン以降の履歴と構造化した
+    以前の決定事項（JSON）だけを送信し、会話が伸びてもプロンプト長を一定に保ちます。
+    With DECISION_INCREMENTAL_ENABLED only turns after the watermark are sent,
+    with previous decisions as structured JSON, so prompt size stays constant.
     """
     lang = _normalize_language_code(language)
+    try:
+        decision, llm_turn = _build_decision_text(session_id, chat_history, mode, lang, turn)
+        return _save_decision(session_id, decision, turn, llm_turn)
+    except Exception as e:
+        logger.error(f"Error in write_decision: {e}")
+        return _decision_error_message(lang)
+
+
+def _rule_based_decision(
+    session_id: str,
+    chat_history: List[Tuple[str, str]],
+    mode: str,
+    lang: str,
+) -> Tuple[str, int, Optional[Dict[str, Any]]]:
+    """
+    保存済みの決定事項に履歴からルールで導ける変更だけを反映する（LLM は呼ばない）
+    Apply only the changes rules can derive from the history to the stored decisions; no LLM call.
+
+    戻り値は (決定事項, LLM で最後に抽出したターン, ルールで導いたパッチ)。
+    Returns (decision text, last turn the LLM extracted, rule-derived patch).
+    """
+    previous_text, last_llm_turn = redis_client.get_decision_progress(session_id)
+    previous_text = _enforce_decision_policy(previous_text, mode, lang)
+    derived_patch = _derive_decision_patch_from_history(chat_history, previous_text)
+    if derived_patch:
+        previous_text = _apply_decision_patch(previous_text, derived_patch)
+        previous_text = _enforce_decision_policy(previous_text, mode, lang)
+    return previous_text, last_llm_turn, derived_patch
+
+
+def _build_decision_text(
+    session_id: str,
+    chat_history: List[Tuple[str, str]],
+    mode: str,
+    language: Optional[str],
+    turn: Optional[int],
+) -> Tuple[str, Optional[int]]:
+    """
+    チャット履歴から保存すべき決定事項テキストを作る（保存はしない、失敗時は例外）
+    Build the decision text to store from the chat history; nothing is saved and errors propagate.
+
+    戻り値は (決定事項, LLM で抽出したターン)。ゲートで LLM を省略した場合、ターンは None です。
+    write_decision が使います。
+    Returns (decision text, turn the LLM extracted), where the turn is None when
+    the gate skipped the LLM. Used by write_decision.
+    """
+    lang = _normalize_language_code(language)
+    previous_text, last_llm_turn, derived_patch = _rule_based_decision(session_id, chat_history, mode, lang)
+    if _decision_gate_skips(chat_history, mode, derived_patch):
+        return previous_text, None
+    return _extract_decision_text(chat_history, mode, lang, turn, previous_text, last_llm_turn), turn
+
+
+def _decision_gate_skips(
+    chat_history: List[Tuple[str, str]],
+    mode: str,
+    derived_patch: Optional[Dict[str, Any]],
+) -> bool:
+    """
+    直近ターンでは LLM の抽出を省略するか（ゲートの統計も数える）
+    Whether the gate skips the LLM extraction for the latest turn; also counts the gate stats.
+    """
+    _increment_decision_gate_stat("turns")
+    if DECISION_SKIP_GATE_ENABLED and not _turn_may_change_decisions(chat_history, mode, derived_patch):
+        _increment_decision_gate_stat("skipped")
+        return True
+    _increment_decision_gate_stat("llm_runs")
+    return False
+
+
+def _extract_decision_text(
+    chat_history: List[Tuple[str, str]],
+    mode: str,
+    lang: str,
+    turn: Optional[int],
+    previous_text: str,
+    last_llm_turn: int,
+) -> str:
+    """
+    読み込み済みの決定事項に LLM の抽出結果を反映したテキストを返す（Redis は読まない）
+    Return the already-read decisions with the LLM extraction applied; Redis is not read.
+    """
     default_message = _decision_default_message(lang)
     if lang == "en":
         message = (
@@ -391,46 +680,154 @@ def write_decision(
             "これまでの決定事項に新しく追加・変更された内容があれば、その項目だけをJSONで出力してください。"
             "未確定や推測は書かず、説明や挨拶は一切不要です。"
         )
-    
-    try:
-        previous_text = redis_client.get_decision(session_id) or ""
-        previous_text = _enforce_decision_policy(previous_text, mode, lang)
-        derived_patch = _derive_decision_patch_from_history(chat_history, previous_text)
-        if derived_patch:
-            previous_text = _apply_decision_patch(previous_text, derived_patch)
-            previous_text = _enforce_decision_policy(previous_text, mode, lang)
-        previous_lines = _split_decision_lines(previous_text)
-        content = "\n".join(previous_lines) if previous_lines else default_message
-        previous_label = "Previous decisions:" if lang == "en" else "以前の決定事項:"
-        system_prompt = (
-            PROMPTS.get(mode, PROMPTS["travel"])["decision_system"]
-            + "\n"
-            + _decision_language_instruction(lang)
-            + "\n"
-            + current_datetime_line(lang)
-            + f"\n{previous_label}\n{content}\n"
-        )
-        messages = _build_messages(system_prompt, chat_history, message)
-        response = _invoke_with_tool_retries(messages)
-        response = sanitize_llm_text(response, max_length=MAX_DECISION_CHARS)
-        if not output_is_safe(response):
-            safe_text = "\n".join(previous_lines) if previous_lines else default_message
-            safe_text = _enforce_decision_policy(safe_text, mode, lang)
-            redis_client.save_decision(session_id, safe_text)
-            return safe_text
-
-        patch = _normalize_decision_patch(_extract_json_object(response))
-        if patch is not None:
-            merged = _apply_decision_patch(previous_text, patch)
+
+    previous_lines = _split_decision_lines(previous_text)
+    content = "\n".join(previous_lines) if previous_lines else default_message
+    previous_label = "Previous decisions:" if lang == "en" else "以前の決定事項:"
+    prompt_history = _incremental_decision_window(chat_history, turn, last_llm_turn)
+    if prompt_history is not None:
+        content = json.dumps(_extract_kv_map(previous_text), ensure_ascii=False)
+        if lang == "en":
+            previous_label = (
+                "Only the latest turns are shown; earlier turns are already reflected.\n"
+                "Previous decisions (JSON):"
+            )
         else:
-            merged = _merge_decision_text(previous_text, response)
+            previous_label = (
+                "会話は直近のターンのみです。それ以前の内容は反映済みです。\n"
+                "以前の決定事項（JSON）:"
+            )
+    else:
+        prompt_history = chat_history
+    system_prompt = (
+        PROMPTS.get(mode, PROMPTS["travel"])["decision_system"]
+        + "\n"
+        + _decision_language_instruction(lang)
+        + "\n"
+        + current_datetime_line(lang)
+        + f"\n{previous_label}\n{content}\n"
+    )
+    messages = _build_messages(system_prompt, prompt_history, message)
+    response = _invoke_with_tool_retries(messages, call_type="decision")
+    response = sanitize_llm_text(response, max_length=MAX_DECISION_CHARS)
+    if not output_is_safe(response):
+        safe_text = "\n".join(previous_lines) if previous_lines else default_message
+        return _enforce_decision_policy(safe_text, mode, lang)
+
+    patch = _normalize_decision_patch(_extract_json_object(response))
+    if patch is not None:
+        merged = _apply_decision_patch(previous_text, patch)
+    else:
+        merged = _merge_decision_text(previous_text, response)
+
+    merged = _enforce_decision_policy(merged, mode, lang)
+    _record_skipped_turn_misses(chat_history, turn, last_llm_turn, previous_text, merged)
+    return merged
 
-        merged = _enforce_decision_policy(merged, mode, lang)
-        redis_client.save_decision(session_id, merged)
-        return merged
+def _schedule_decision_update(
+    session_id: str,
+    chat_history: List[Tuple[str, str]],
+    mode: str,
+    language: str,
+    turn: int,
+) -> Optional["Future[str]"]:
+    """
+    ターン `turn` の決定事項の更新を登録する（非同期モードではバックグラウンドで実行）
+    Schedule the decision update for `turn`, in the background when async mode is on.
+
+    同期モードでは何もせず None を返します。
+    Returns None without scheduling in synchronous mode.
+    """
+    if not decision_worker.DECISION_ASYNC_ENABLED:
+        return None
+    history_snapshot = list(chat_history)
+    future = decision_worker.submit_decision_job(
+        session_id,
+        turn,
+        lambda: write_decision(
+            session_id,
+            history_snapshot,
+            mode=mode,
+            language=language,
+            turn=turn,
+        ),
+    )
+    return future
+
+
+def _committed_turn(commit: redis_client.TurnCommit, chat_history: List[Tuple[str, str]]) -> int:
+    """
+    コミットで割り当てたターン番号（書き込めなかった場合は履歴の長さから数える）
+    Turn number assigned by the commit, or one counted from the history when nothing was written.
+    """
+    return commit.turn if commit.turn is not None else len(chat_history) // 2
+
+
+def _commit_turn(
+    session_id: str,
+    chat_history: List[Tuple[str, str]],
+    turn_entries: List[Tuple[str, str]],
+    mode: str,
+    language: str,
+    decision_text: str,
+) -> Tuple[int, Optional["Future[str]"], str]:
+    """
+    ターンの発話・言語を redis_client.commit_turn の1トランザクションで保存し、決定事項を更新する
+    Save the turn's messages and language in one redis_client.commit_turn
+    transaction, then update the decisions.
+
+    LLM の呼び出し中にワーカーが落ちてもターンが失われないよう、履歴は常に先に保存します。
+    同期モードでは決定事項の状態をスナップショットから1回だけ読み、ルールで導ける決定事項
+    （ゲートで LLM を省略したターンはその結果）を同じトランザクションで保存します。LLM の
+    抽出結果だけはその後に世代比較付きで保存します。非同期モードでは決定事項の更新を登録します。
+    戻り値は (ターン番号, Future, current_plan)。
+    History is always saved first, so a worker crash during the LLM call does
+    not lose the turn. In synchronous mode the decision state is read once,
+    from the snapshot, and the rule-derived decisions (the final result when
+    the gate skips the LLM) go in the same transaction. Only an LLM result is
+    saved afterwards, with a turn check. In async mode the decision update is
+    scheduled. Returns (turn, Future, current_plan).
+    """
+    if decision_worker.DECISION_ASYNC_ENABLED:
+        with stage_timing.stage("redis_write"):
+            commit = redis_client.commit_turn(session_id, turn_entries, language=language)
+        turn = _committed_turn(commit, chat_history)
+        with stage_timing.stage("decision"):
+            decision_future = _schedule_decision_update(session_id, chat_history, mode, language, turn)
+        return turn, decision_future, decision_text
+
+    rule_state: Optional[Tuple[str, int, bool]] = None
+    derived: Optional[str] = None
+    try:
+        base_text, last_llm_turn, derived_patch = _rule_based_decision(session_id, chat_history, mode, language)
+        skipped = _decision_gate_skips(chat_history, mode, derived_patch)
+        rule_state = (base_text, last_llm_turn, skipped)
+        # ゲートで省略したターンも保存し、decision_turn をこのターンまで進める
+        # Gate-skipped turns are saved too, so decision_turn advances to this turn
+        if derived_patch or skipped:
+            derived = base_text
     except Exception as e:
-        logger.error(f"Error in write_decision: {e}")
-        return _decision_error_message(lang)
+        logger.error(f"Error deriving decisions for {session_id}: {e}")
+    with stage_timing.stage("redis_write"):
+        # 決定事項はこのターンの番号で比較付き保存される / The decision is versioned by this turn's number
+        commit = redis_client.commit_turn(session_id, turn_entries, language=language, decision=derived)
+    turn = _committed_turn(commit, chat_history)
+    if rule_state is None:
+        return turn, None, _decision_error_message(language)
+    base_text, last_llm_turn, skipped = rule_state
+    if skipped:
+        if commit.decision_saved:
+            return turn, None, base_text
+        logger.info("Skipped stale decision write for turn %s", turn)
+        return turn, None, redis_client.get_decision(session_id) or base_text
+    with stage_timing.stage("decision"):
+        try:
+            decision = _extract_decision_text(chat_history, mode, language, turn, base_text, last_llm_turn)
+        except Exception as e:
+            logger.error(f"Error building decisions for turn {turn}: {e}")
+            return turn, None, _decision_error_message(language)
+        return turn, None, _save_decision(session_id, decision, turn, turn)
+
 
 def chat_with_llama(
     session_id: str,
@@ -450,15 +847,22 @@ def chat_with_llama(
     2) Load chat history
     3) Generate LLM response (run_qa_chain)
     4) Persist history and decisions
+
+    非同期モードでは決定事項の抽出を応答後に行い、current_plan には
+    前回までの決定事項を返します（最新値は /api/decision で取得）。
+    In async mode decision extraction runs after the reply; current_plan then
+    holds the previous decisions and the update is served by /api/decision.
     """
     lang = _normalize_language_code(language or redis_client.get_user_language(session_id))
-    result = guard.content_checker(prompt)
+    with stage_timing.stage("guard"):
+        result = guard.content_checker(prompt)
     if 'unsafe' in result:
         fallback_decision = redis_client.get_decision(session_id) or _decision_safety_message(lang)
         return None, fallback_decision, None, None, False, _decision_guard_blocked_message(lang), False
     
-    chat_history = redis_client.get_chat_history(session_id)
-    decision_text = redis_client.get_decision(session_id)
+    with stage_timing.stage("redis_read"):
+        chat_history = redis_client.get_chat_history(session_id)
+        decision_text = redis_client.get_decision(session_id)
     decision_text = _enforce_decision_policy(decision_text, mode, lang)
 
     used_web_search, web_results = _run_web_search_if_needed(
@@ -467,6 +871,7 @@ def chat_with_llama(
         mode=mode,
         language=lang,
     )
+    stage_timing.annotate(used_web_search=used_web_search)
     web_context = _build_web_context(web_results, lang) if web_results else None
 
     response, yes_no_phrase, choices, is_date_select, remaining_text = run_qa_chain(
@@ -484,14 +889,27 @@ def chat_with_llama(
         response = _append_sources(response, web_results, lang)
         remaining_text = _append_sources(remaining_text, web_results, lang)
     
-    chat_history.append(("human", prompt))
-    chat_history.append(("assistant", response))
-    redis_client.save_chat_history(session_id, chat_history)
-    current_plan = write_decision(session_id, chat_history, mode=mode, language=lang)
+    turn_entries = [("human", prompt), ("assistant", response)]
+    chat_history.extend(turn_entries)
+    turn, decision_future, current_plan = _commit_turn(
+        session_id, chat_history, turn_entries, mode, lang, decision_text
+    )
     
     return response, current_plan, yes_no_phrase, choices, is_date_select, remaining_text, used_web_search
 
 
+def _attach_stage_timing(payload: Dict[str, Any]) -> None:
+    """
+    ターンの計測を締め、段階計測が有効なら final フレームに `timing` を追加する
+    Close the turn's timings and add the `timing` field to a final frame when
+    stage timing is active.
+    """
+    stage_timing.finish()
+    timings = stage_timing.exposed()
+    if timings is not None:
+        payload["timing"] = timings.as_dict()
+
+
 def stream_chat_with_llama(
     session_id: str,
     prompt: str,
@@ -501,9 +919,20 @@ def stream_chat_with_llama(
     """
     LLM応答をストリーミングしつつ、終了時に決定事項まで更新する
     Stream LLM response chunks and persist chat/decision state at completion.
+
+    非同期モードでは決定事項をバックグラウンドで抽出し、その Future をストリームに預けます
+    （decision_worker.defer_to_stream）。呼び出し側はセッションロックを解放してから結果を待ち、
+    `decision` イベントで送ります。届かなかった場合、クライアントは final の `turn` を指定して
+    /api/decision から取得します。
+    In async mode decisions are extracted in the background and their Future
+    is handed to the stream (decision_worker.defer_to_stream). The caller
+    releases the session lock before waiting for it and sends it as a
+    `decision` event; when it never arrives, clients fetch it from
+    /api/decision with the final frame's `turn`.
     """
     lang = _normalize_language_code(language or redis_client.get_user_language(session_id))
-    result = guard.content_checker(prompt)
+    with stage_timing.stage("guard"):
+        result = guard.content_checker(prompt)
     if "unsafe" in result:
         fallback_decision = redis_client.get_decision(session_id) or _decision_safety_message(lang)
         payload = {
@@ -516,22 +945,27 @@ def stream_chat_with_llama(
             "remaining_text": _decision_guard_blocked_message(lang),
             "used_web_search": False,
         }
-        yield f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+        _attach_stage_timing(payload)
+        yield serialization.sse_event(payload)
         return
 
-    chat_history = redis_client.get_chat_history(session_id)
-    decision_text = redis_client.get_decision(session_id)
+    with stage_timing.stage("redis_read"):
+        chat_history = redis_client.get_chat_history(session_id)
+        decision_text = redis_client.get_decision(session_id)
     decision_text = _enforce_decision_policy(decision_text, mode, lang)
 
-    should_search, query = _needs_web_search(prompt, chat_history, mode=mode, language=lang)
+    with stage_timing.stage("router"):
+        should_search, query = _needs_web_search(prompt, chat_history, mode=mode, language=lang)
     if should_search:
-        yield f"data: {json.dumps({'type': 'search_start'}, ensure_ascii=False)}\n\n"
-        web_results = brave_search.search_web(query)
+        yield serialization.sse_event({'type': 'search_start'})
+        with stage_timing.stage("search"):
+            web_results = brave_search.search_web(query)
         used_web_search = True
     else:
         web_results = []
         used_web_search = False
-    yield f"data: {json.dumps({'type': 'meta', 'used_web_search': used_web_search}, ensure_ascii=False)}\n\n"
+    stage_timing.annotate(used_web_search=used_web_search)
+    yield serialization.sse_event({'type': 'meta', 'used_web_search': used_web_search})
 
     system_prompt = (
         _language_instruction(lang)
@@ -569,14 +1003,28 @@ def stream_chat_with_llama(
             )
 
     messages = _build_messages(system_prompt, chat_history, prompt)
+    _annotate_turn_shape(chat_history, decision_text, messages, lang)
     chunks: List[str] = []
 
+    # TTFB は最初の差分まで、generation はその後の生成時間（送信待ちを除く）
+    # TTFB runs until the first delta; generation excludes time spent yielding to the client
+    llm_started = time.perf_counter()
+    generation_seconds = 0.0
+    first_delta = True
+    resumed = llm_started
     for delta in _invoke_with_tool_retries_stream(messages):
-        if not delta:
-            continue
-        chunks.append(delta)
-        payload = {"type": "delta", "content": delta}
-        yield f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+        received = time.perf_counter()
+        if first_delta:
+            stage_timing.record("llm_ttfb", received - llm_started)
+            first_delta = False
+        else:
+            generation_seconds += received - resumed
+        if delta:
+            chunks.append(delta)
+            payload = {"type": "delta", "content": delta}
+            yield serialization.sse_event(payload)
+        resumed = time.perf_counter()
+    stage_timing.record("llm_generation", generation_seconds)
 
     raw_response = "".join(chunks)
     response, yes_no_phrase, choices, is_date_select, remaining_text = _parse_response_output(raw_response, lang)
@@ -585,10 +1033,13 @@ def stream_chat_with_llama(
         response = _append_sources(response, web_results, lang)
         remaining_text = _append_sources(remaining_text, web_results, lang)
 
-    chat_history.append(("human", prompt))
-    chat_history.append(("assistant", response))
-    redis_client.save_chat_history(session_id, chat_history)
-    current_plan = write_decision(session_id, chat_history, mode=mode, language=lang)
+    turn_entries = [("human", prompt), ("assistant", response)]
+    chat_history.extend(turn_entries)
+    turn, decision_future, current_plan = _commit_turn(
+        session_id, chat_history, turn_entries, mode, lang, decision_text
+    )
+    if decision_future is not None:
+        decision_worker.defer_to_stream(turn, decision_future)
 
     payload = {
         "type": "final",
@@ -599,5 +1050,8 @@ def stream_chat_with_llama(
         "is_date_select": is_date_select,
         "remaining_text": remaining_text,
         "used_web_search": used_web_search,
+        "decision_pending": decision_future is not None,
+        "turn": turn,
     }
-    yield f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+    _attach_stage_timing(payload)
+    yield serialization.sse_event(payload)
@@ -6,6 +6,8 @@ Shared configuration and constants for llama_core modules.
 import os
 import re
 
+from backend.env import env_bool
+
 # APIキーと設定の読み込み
 # Load API keys and configuration
 groq_api_key = os.getenv("GROQ_API_KEY")
@@ -29,7 +31,14 @@ GROQ_API_TIMEOUT = float(os.getenv("GROQ_API_TIMEOUT", "30"))
 GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "3"))
 # 出力ガードレールの有効化設定
 # Toggle output guardrails
-OUTPUT_GUARD_ENABLED = os.getenv("OUTPUT_GUARD_ENABLED", "true").lower() in ("1", "true", "yes")
+OUTPUT_GUARD_ENABLED = env_bool("OUTPUT_GUARD_ENABLED", True)
+# 決定事項に影響しないターンでLLM抽出を省略する設定
+# Skip LLM decision extraction on turns that cannot change decisions
+DECISION_SKIP_GATE_ENABLED = env_bool("DECISION_SKIP_GATE_ENABLED", True)
+# 決定事項を直近ターンのみから差分抽出する設定（ウォーターマーク以降のターンを送信）
+# Incremental decision extraction over turns after the per-session watermark
+DECISION_INCREMENTAL_ENABLED = env_bool("DECISION_INCREMENTAL_ENABLED", False)
+DECISION_INCREMENTAL_MAX_TURNS = int(os.getenv("DECISION_INCREMENTAL_MAX_TURNS", "6"))
 
 if not groq_api_key:
     raise RuntimeError("GROQ_API_KEY が設定されていないか、無効です。")
@@ -277,3 +286,7 @@ DECISION_SLOT_VALUE_PATTERNS = {
         re.IGNORECASE,
     ),
 }
+# 決定事項ゲート: 直前の質問形式（Yes/No・Select・DateSelect）と数値入力の検出
+# Decision gate: detect pending directives (Yes/No, Select, DateSelect) and numeric input
+DECISION_DIRECTIVE_RE = re.compile(r"(Yes/No\s*[:：]|Select\s*[:：]|DateSelect\s*[:：])", re.IGNORECASE)
+DECISION_NUMERIC_RE = re.compile(r"[0-9０-９]")
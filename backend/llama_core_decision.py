@@ -12,6 +12,7 @@ from backend.llama_core_constants import (
     DECISION_BULLET_PREFIX_RE,
     DECISION_DATE_LIKE_RE,
     DECISION_DEFAULT_MESSAGE,
+    DECISION_DIRECTIVE_RE,
     DECISION_FLEX_KEY_LIMIT,
     DECISION_IGNORED_LINES,
     DECISION_KEY_EXTRA_ALIASES_BY_MODE,
@@ -19,6 +20,7 @@ from backend.llama_core_constants import (
     DECISION_KV_SEPARATOR_RE,
     DECISION_MAX_ITEMS,
     DECISION_MEMO_KEYS_BY_LANGUAGE,
+    DECISION_NUMERIC_RE,
     DECISION_PATCH_ALLOWED_KEYS,
     DECISION_SLOT_QUESTION_PATTERNS,
     DECISION_SLOT_VALUE_PATTERNS,
@@ -211,6 +213,90 @@ def _derive_decision_patch_from_history(
     return {"add": add, "update": update, "remove": []}
 
 
+_DECISION_KEYWORD_RE_CACHE: Dict[str, Optional["re.Pattern[str]"]] = {}
+
+
+def _get_decision_keyword_re(mode: str) -> Optional["re.Pattern[str]"]:
+    """
+    モードの項目ラベル・別名に一致する正規表現を構築・キャッシュする
+    Build and cache one regex matching a mode's key labels and aliases.
+
+    英字の別名（"ng" など）は単語境界付きで照合し、語の一部への誤一致を防ぎます。
+    ASCII aliases (e.g. "ng") are matched on word boundaries to avoid partial-word hits.
+    """
+    if mode in _DECISION_KEYWORD_RE_CACHE:
+        return _DECISION_KEYWORD_RE_CACHE[mode]
+
+    keywords = set()
+    for labels in DECISION_KEY_LABELS_BY_MODE.get(mode, {}).values():
+        keywords.update(labels.values())
+    for aliases in DECISION_KEY_EXTRA_ALIASES_BY_MODE.get(mode, {}).values():
+        keywords.update(aliases)
+    keywords.update(DECISION_MEMO_KEYS_BY_LANGUAGE.values())
+
+    parts: List[str] = []
+    for keyword in sorted((k.strip() for k in keywords if k and k.strip()), key=len, reverse=True):
+        escaped = re.escape(keyword)
+        parts.append(rf"\b{escaped}\b" if keyword.isascii() else escaped)
+    compiled = re.compile("|".join(parts), re.IGNORECASE) if parts else None
+    _DECISION_KEYWORD_RE_CACHE[mode] = compiled
+    return compiled
+
+
+def _turn_may_change_decisions(
+    chat_history: List[Tuple[str, str]],
+    mode: str,
+    derived_patch: Optional[Dict[str, Any]],
+) -> bool:
+    """
+    直近ターンが決定事項を変更し得るかを、LLMを使わずに保守的に判定する
+    Conservatively decide, without the LLM, whether the latest turn may change decisions.
+
+    `derived_patch` は呼び出し側で `_derive_decision_patch_from_history` により求めた差分です。
+    `derived_patch` is the patch the caller derived via `_derive_decision_patch_from_history`.
+    """
+    if derived_patch:
+        return True
+    if not chat_history:
+        return False
+
+    user_text = ""
+    assistant_text = ""
+    previous_assistant = ""
+    for role, content in reversed(chat_history):
+        if role == "assistant":
+            if not assistant_text and not user_text:
+                assistant_text = content or ""
+            elif user_text:
+                previous_assistant = content or ""
+                break
+        elif not user_text:
+            user_text = _normalize_user_value(content)
+    if not user_text:
+        return False
+
+    # 直前のアシスタントが Yes/No・選択肢・日付選択や項目を尋ねていれば回答とみなす
+    # An answer to a pending Yes/No, Select, DateSelect, or slot question may confirm a decision
+    if previous_assistant:
+        if DECISION_DIRECTIVE_RE.search(previous_assistant):
+            return True
+        if not DECISION_UNKNOWN_ANSWER_RE.search(user_text):
+            for pattern in DECISION_SLOT_QUESTION_PATTERNS.values():
+                if pattern.search(previous_assistant):
+                    return True
+
+    for pattern in DECISION_SLOT_VALUE_PATTERNS.values():
+        if pattern.search(user_text):
+            return True
+    if DECISION_NUMERIC_RE.search(user_text) or _is_date_like(user_text):
+        return True
+
+    keyword_re = _get_decision_keyword_re(mode)
+    if keyword_re is None:
+        return False
+    return bool(keyword_re.search(user_text) or keyword_re.search(assistant_text))
+
+
 # JSON抽出とパッチ正規化
 # JSON extraction and patch normalization
 def _strip_code_fences(text: str) -> str:
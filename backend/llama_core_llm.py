@@ -10,7 +10,7 @@ from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import openai
 
-from backend import guard
+from backend import cassette, guard, metrics, stage_timing, tracing
 
 from backend.groq_openai_client import get_groq_client
 from backend.llama_core_constants import (
@@ -68,11 +68,32 @@ def _is_transient_error(err: Exception) -> bool:
     return False
 
 
+def _chat_cassette_request(
+    messages: List[Dict[str, str]],
+    model_name: Optional[str] = None,
+    tool_choice: Optional[str] = None,
+    tools: Optional[List[Dict[str, Any]]] = None,
+    call_type: str = "chat",
+) -> Dict[str, Any]:
+    """
+    カセット照合用にチャット補完の要求内容をまとめる
+    Build the cassette matching request for a chat-completions call.
+    """
+    return {
+        "model": model_name or GROQ_MODEL_NAME,
+        "messages": messages,
+        "tool_choice": tool_choice,
+        "tools": tools,
+    }
+
+
+@cassette.recorded("chat", _chat_cassette_request)
 def _invoke_chat_completion(
     messages: List[Dict[str, str]],
     model_name: Optional[str] = None,
     tool_choice: Optional[str] = None,
     tools: Optional[List[Dict[str, Any]]] = None,
+    call_type: str = "chat",
 ) -> str:
     """
     指定メッセージでチャット補完APIを呼び出して本文を返す。
@@ -92,12 +113,19 @@ def _invoke_chat_completion(
         payload["tools"] = tools
     for attempt in range(GROQ_MAX_RETRIES):
         try:
-            completion = client.chat.completions.create(**payload)
+            with metrics.observe_groq_call(payload["model"], call_type), tracing.span(
+                "groq.chat_completion",
+                {"gen_ai.request.model": payload["model"], "call_type": call_type, "attempt": attempt + 1},
+            ):
+                completion = client.chat.completions.create(**payload)
             return _extract_message_content(completion.choices[0].message)
         except Exception as e:
             if not _is_transient_error(e) or attempt == GROQ_MAX_RETRIES - 1:
                 raise
             wait = 2 ** attempt
+            stage_timing.event(
+                "groq_retry", call_type=call_type, attempt=attempt + 1, error=type(e).__name__, wait_s=wait
+            )
             logger.warning(
                 "Groq API transient error (attempt %d/%d): %s; retrying in %ds",
                 attempt + 1, GROQ_MAX_RETRIES, e, wait,
@@ -106,11 +134,13 @@ def _invoke_chat_completion(
     raise RuntimeError("Unreachable")
 
 
+@cassette.recorded_stream("chat_stream", _chat_cassette_request)
 def _invoke_chat_completion_stream(
     messages: List[Dict[str, str]],
     model_name: Optional[str] = None,
     tool_choice: Optional[str] = None,
     tools: Optional[List[Dict[str, Any]]] = None,
+    call_type: str = "chat_stream",
 ) -> Iterator[str]:
     """
     指定メッセージでチャット補完APIをストリーミング呼び出しする。
@@ -131,20 +161,30 @@ def _invoke_chat_completion_stream(
         payload["tools"] = tools
     for attempt in range(GROQ_MAX_RETRIES):
         try:
-            stream = client.chat.completions.create(**payload)
-            for chunk in stream:
-                choices = getattr(chunk, "choices", None) or []
-                if not choices:
-                    continue
-                delta = getattr(choices[0], "delta", None)
-                content = getattr(delta, "content", None) if delta is not None else None
-                if content:
-                    yield str(content)
+            with metrics.observe_groq_call(payload["model"], call_type) as timer, tracing.span(
+                "groq.chat_completion",
+                {"gen_ai.request.model": payload["model"], "call_type": call_type, "attempt": attempt + 1, "stream": True},
+            ) as span:
+                stream = client.chat.completions.create(**payload)
+                for chunk in stream:
+                    choices = getattr(chunk, "choices", None) or []
+                    if not choices:
+                        continue
+                    delta = getattr(choices[0], "delta", None)
+                    content = getattr(delta, "content", None) if delta is not None else None
+                    if content:
+                        # 呼び出し元への受け渡し（クライアントへの送信）は上流の時間に含めない
+                        # Handing the chunk to the caller (delivery to the client) is not upstream time
+                        with timer.exclude(), tracing.excluding(span):
+                            yield str(content)
             return
         except Exception as e:
             if not _is_transient_error(e) or attempt == GROQ_MAX_RETRIES - 1:
                 raise
             wait = 2 ** attempt
+            stage_timing.event(
+                "groq_retry", call_type=call_type, attempt=attempt + 1, error=type(e).__name__, wait_s=wait
+            )
             logger.warning(
                 "Groq API transient error on stream (attempt %d/%d): %s; retrying in %ds",
                 attempt + 1, GROQ_MAX_RETRIES, e, wait,
@@ -208,60 +248,73 @@ def _extract_message_content(message: Any) -> str:
 def _invoke_with_tool_retries(
     messages: List[Dict[str, str]],
     model_name: Optional[str] = None,
+    call_type: str = "chat",
 ) -> str:
     """
     tool_use_failed 発生時にフォールバック条件で再試行する
     Retry with fallback options when the model fails due to tool-use errors.
+
+    call_type はメトリクス用の呼び出し種別（chat / router / decision など）です。
+    call_type labels the call in metrics (chat, router, decision, ...).
     """
     try:
-        return _invoke_chat_completion(messages, model_name=model_name)
+        return _invoke_chat_completion(messages, model_name=model_name, call_type=call_type)
     except Exception as e:
         if not _is_tool_use_failed(e):
             raise
 
     if GROQ_FALLBACK_MODEL_NAME:
+        stage_timing.event("tool_use_fallback", call_type=call_type, step="fallback_model")
         logger.warning(
             "Groq tool_use_failed; retrying with fallback model: %s",
             GROQ_FALLBACK_MODEL_NAME,
         )
         try:
-                return _invoke_chat_completion(messages, model_name=GROQ_FALLBACK_MODEL_NAME)
+                return _invoke_chat_completion(
+                    messages, model_name=GROQ_FALLBACK_MODEL_NAME, call_type=call_type
+                )
         except Exception as retry_err:
             if _is_tool_use_failed(retry_err):
+                stage_timing.event("tool_use_fallback", call_type=call_type, step="fallback_tool_choice_auto")
                 logger.warning("Groq tool_use_failed on fallback; retrying with tool_choice=auto")
                 return _invoke_chat_completion(
                     messages,
                     model_name=GROQ_FALLBACK_MODEL_NAME,
                     tool_choice="auto",
                     tools=PASS_THROUGH_TOOLS,
+                    call_type=call_type,
                 )
             raise
 
+    stage_timing.event("tool_use_fallback", call_type=call_type, step="tool_choice_auto")
     logger.warning("Groq tool_use_failed; retrying with tool_choice=auto")
     return _invoke_chat_completion(
         messages,
         model_name=model_name,
         tool_choice="auto",
         tools=PASS_THROUGH_TOOLS,
+        call_type=call_type,
     )
 
 
 def _invoke_with_tool_retries_stream(
     messages: List[Dict[str, str]],
     model_name: Optional[str] = None,
+    call_type: str = "chat_stream",
 ) -> Iterator[str]:
     """
     tool_use_failed 発生時にフォールバック条件で再試行しつつストリーミングする
     Stream responses with fallback retries when tool-use errors occur.
     """
     try:
-        yield from _invoke_chat_completion_stream(messages, model_name=model_name)
+        yield from _invoke_chat_completion_stream(messages, model_name=model_name, call_type=call_type)
         return
     except Exception as e:
         if not _is_tool_use_failed(e):
             raise
 
     if GROQ_FALLBACK_MODEL_NAME:
+        stage_timing.event("tool_use_fallback", call_type=call_type, step="fallback_model")
         logger.warning(
             "Groq tool_use_failed; retrying stream with fallback model: %s",
             GROQ_FALLBACK_MODEL_NAME,
@@ -270,26 +323,31 @@ def _invoke_with_tool_retries_stream(
             yield from _invoke_chat_completion_stream(
                 messages,
                 model_name=GROQ_FALLBACK_MODEL_NAME,
+                call_type=call_type,
             )
             return
         except Exception as retry_err:
             if _is_tool_use_failed(retry_err):
+                stage_timing.event("tool_use_fallback", call_type=call_type, step="fallback_tool_choice_auto")
                 logger.warning("Groq tool_use_failed on fallback stream; retrying with tool_choice=auto")
                 yield from _invoke_chat_completion_stream(
                     messages,
                     model_name=GROQ_FALLBACK_MODEL_NAME,
                     tool_choice="auto",
                     tools=PASS_THROUGH_TOOLS,
+                    call_type=call_type,
                 )
                 return
             raise
 
+    stage_timing.event("tool_use_fallback", call_type=call_type, step="tool_choice_auto")
     logger.warning("Groq tool_use_failed; retrying stream with tool_choice=auto")
     yield from _invoke_chat_completion_stream(
         messages,
         model_name=model_name,
         tool_choice="auto",
         tools=PASS_THROUGH_TOOLS,
+        call_type=call_type,
     )
 
 def _is_tool_use_failed(err: Exception) -> bool:
@@ -0,0 +1,204 @@
+"""
+ワーカーのメモリ増加を調べる tracemalloc ベースの診断ユーティリティ。
+tracemalloc-based diagnostics for investigating worker memory growth.
+
+`/api/debug/memory` から利用します（MEMORY_DEBUG_TOKEN 未設定時は無効）。
+Used by `/api/debug/memory` (disabled unless MEMORY_DEBUG_TOKEN is set).
+
+- GET             : トレース状態・RSS・キャッシュサイズ / tracing state, RSS and cache sizes
+- action=start    : トレース開始と基準スナップショット / start tracing and take a baseline
+- action=snapshot : 基準との差分の上位とキャッシュサイズ / top diff vs. baseline plus cache sizes
+- action=stop     : トレース停止 / stop tracing
+
+トレース中は割り当てごとに負荷がかかるため、調査が終わったら stop してください。
+Tracing adds overhead to every allocation, so stop it once the investigation is done.
+"""
+
+from __future__ import annotations
+
+import gc
+import os
+import sys
+import threading
+import tracemalloc
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.env import env_int
+
+
+MEMORY_DEBUG_TOKEN = os.getenv("MEMORY_DEBUG_TOKEN", "").strip()
+MEMORY_DEBUG_FRAMES = max(1, env_int("MEMORY_DEBUG_FRAMES", 10))
+
+_lock = threading.Lock()
+_baseline: Optional[tracemalloc.Snapshot] = None
+
+# 監視するモジュール変数（モジュール, 属性）/ Module-level caches to report (module, attribute)
+_CACHES: Tuple[Tuple[str, str], ...] = (
+    ("backend.redis_client", "_memory_store"),
+    ("backend.redis_client", "_journal"),
+    ("backend.redis_client", "_recent_writes"),
+    ("backend.redis_client", "_near_cache"),
+    ("backend.session_request_lock", "_locks"),
+    ("backend.decision_worker", "_sessions"),
+    ("backend.cassette", "_entries"),
+    ("backend.cassette", "_last_entries"),
+)
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    """
+    自分自身（tracemalloc）の割り当てを除いたスナップショットを取る
+    Take a snapshot excluding tracemalloc's own allocations.
+    """
+    return tracemalloc.take_snapshot().filter_traces(
+        (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        )
+    )
+
+
+def _rss_bytes() -> Optional[int]:
+    """
+    現在の RSS（Linux の /proc から取得、取得できなければ None）
+    Current RSS from /proc on Linux, or None when unavailable.
+    """
+    try:
+        with open("/proc/self/statm", "r", encoding="ascii") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def cache_sizes() -> Dict[str, Any]:
+    """
+    モジュール変数のキャッシュ件数と、Groq クライアントの接続プール状況を返す
+    Return entry counts of module-level caches and the Groq client pool state.
+    """
+    sizes: Dict[str, Any] = {}
+    for module_name, attr in _CACHES:
+        module = sys.modules.get(module_name)
+        value = getattr(module, attr, None) if module is not None else None
+        sizes[f"{module_name.split('.', 1)[-1]}.{attr}"] = len(value) if value is not None else None
+
+    store = getattr(sys.modules.get("backend.redis_client"), "_memory_store", None)
+    if store is not None and hasattr(store, "stats"):
+        stats = store.stats()
+        sizes["redis_client._memory_store_bytes"] = stats["bytes"]
+        sizes["redis_client._memory_store_evictions"] = stats["evictions"]
+
+    client_module = sys.modules.get("backend.groq_openai_client")
+    client = getattr(client_module, "_client", None) if client_module is not None else None
+    sizes["groq_openai_client.initialized"] = client is not None
+    pool = _http_pool_of(client)
+    if pool is not None:
+        sizes["groq_openai_client.pool_connections"] = len(getattr(pool, "connections", []) or [])
+    return sizes
+
+
+def _http_pool_of(client: Any) -> Any:
+    """
+    OpenAI クライアント内部の httpx 接続プールを辿る（構造が違えば None）
+    Walk to the httpx connection pool inside an OpenAI client, or None if the layout differs.
+    """
+    obj: Any = client
+    for attr in ("_client", "_transport", "_pool"):
+        obj = getattr(obj, attr, None)
+        if obj is None:
+            return None
+    return obj
+
+
+def _format_stats(stats: List[Any], limit: int, is_diff: bool) -> List[Dict[str, Any]]:
+    """
+    統計行を JSON 向けに整形する
+    Format tracemalloc statistics for JSON output.
+    """
+    rows: List[Dict[str, Any]] = []
+    for stat in stats[:limit]:
+        frame = stat.traceback[0]
+        row: Dict[str, Any] = {
+            "site": f"{frame.filename}:{frame.lineno}",
+            "size_kib": round(stat.size / 1024, 1),
+            "count": stat.count,
+        }
+        if is_diff:
+            row["size_diff_kib"] = round(stat.size_diff / 1024, 1)
+            row["count_diff"] = stat.count_diff
+        rows.append(row)
+    return rows
+
+
+def start() -> Dict[str, Any]:
+    """
+    トレースを開始し、基準スナップショットを取る
+    Start tracing and record a baseline snapshot.
+    """
+    global _baseline
+    with _lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(MEMORY_DEBUG_FRAMES)
+        _baseline = _snapshot()
+    return status()
+
+
+def stop() -> Dict[str, Any]:
+    """
+    トレースを停止して基準を破棄する
+    Stop tracing and drop the baseline.
+    """
+    global _baseline
+    with _lock:
+        _baseline = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+    return status()
+
+
+def status() -> Dict[str, Any]:
+    """
+    トレース状態・RSS・キャッシュサイズを返す
+    Return tracing state, RSS and cache sizes.
+    """
+    traced_current, traced_peak = tracemalloc.get_traced_memory()
+    return {
+        "pid": os.getpid(),
+        "tracing": tracemalloc.is_tracing(),
+        "has_baseline": _baseline is not None,
+        "rss_bytes": _rss_bytes(),
+        "traced_current_bytes": traced_current,
+        "traced_peak_bytes": traced_peak,
+        "gc_objects": len(gc.get_objects()),
+        "caches": cache_sizes(),
+    }
+
+
+def snapshot(top: int = 20, group_by: str = "lineno", rebase: bool = False) -> Dict[str, Any]:
+    """
+    現在のスナップショットを取り、基準があれば差分の上位を返す
+    Take a snapshot and return top allocation sites, diffed against the baseline if any.
+
+    rebase=True の場合、このスナップショットを次回の基準にします。
+    With rebase=True, this snapshot becomes the next baseline.
+    """
+    global _baseline
+    if group_by not in ("lineno", "filename"):
+        group_by = "lineno"
+    with _lock:
+        if not tracemalloc.is_tracing():
+            result = status()
+            result["error"] = "tracing is not started (use action=start)"
+            return result
+        current = _snapshot()
+        if _baseline is not None:
+            top_stats = _format_stats(current.compare_to(_baseline, group_by), top, is_diff=True)
+        else:
+            top_stats = _format_stats(current.statistics(group_by), top, is_diff=False)
+        if rebase or _baseline is None:
+            _baseline = current
+    result = status()
+    result["top"] = top_stats
+    return result
+
@@ -0,0 +1,204 @@
+"""
+Prometheus 形式の運用メトリクス定義。
+Prometheus-format operational metrics.
+
+gunicorn の複数ワーカーで正しく集計するため、PROMETHEUS_MULTIPROC_DIR が
+設定されている場合は prometheus_client のマルチプロセスモードで値を共有します
+（gunicorn.conf.py がディレクトリを準備します）。未設定の単一プロセスでは
+通常のレジストリを使います。
+To aggregate across gunicorn workers, prometheus_client multiprocess mode is
+used when PROMETHEUS_MULTIPROC_DIR is set (gunicorn.conf.py prepares the
+directory). A single process without it uses the default registry.
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+import os
+import time
+from typing import Iterator, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+from backend.env import env_bool
+
+# /metrics は既定で無効（公開ポートで晒さない）/ /metrics is off by default so it is not exposed on the public port
+METRICS_ENABLED = env_bool("METRICS_ENABLED", False)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "").strip()
+
+_HTTP_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+_LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0)
+_POOL_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+HTTP_REQUESTS = Counter(
+    "yorozu_http_requests_total",
+    "HTTP requests by route, mode, method and status.",
+    ["route", "mode", "method", "status"],
+)
+HTTP_LATENCY = Histogram(
+    "yorozu_http_request_duration_seconds",
+    "Time until response headers, by route and mode (SSE bodies are excluded).",
+    ["route", "mode"],
+    buckets=_HTTP_BUCKETS,
+)
+GROQ_LATENCY = Histogram(
+    "yorozu_groq_request_duration_seconds",
+    "Groq API call latency by model and call type (one observation per attempt).",
+    ["model", "call_type"],
+    buckets=_LLM_BUCKETS,
+)
+GROQ_ERRORS = Counter(
+    "yorozu_groq_errors_total",
+    "Groq API call failures by model, call type and exception class.",
+    ["model", "call_type", "error"],
+)
+GUARD_VERDICTS = Counter(
+    "yorozu_guard_verdicts_total",
+    "Guard model verdicts.",
+    ["verdict"],
+)
+WEB_SEARCH_ROUTER = Counter(
+    "yorozu_web_search_router_decisions_total",
+    "Search router decisions.",
+    ["decision"],
+)
+WEB_SEARCH_REQUESTS = Counter(
+    "yorozu_web_search_requests_total",
+    "Brave search attempts by outcome (ok, empty, limit, error).",
+    ["outcome"],
+)
+SESSION_LOCK_CONFLICTS = Counter(
+    "yorozu_session_lock_conflicts_total",
+    "Chat requests rejected with 409 because the session was busy.",
+    ["mode"],
+)
+REDIS_FALLBACK_ACTIVATIONS = Counter(
+    "yorozu_redis_fallback_activations_total",
+    "Times a worker dropped its Redis client and switched to the in-memory fallback.",
+)
+REDIS_FALLBACK_ENTRIES = Gauge(
+    "yorozu_redis_fallback_entries",
+    "Keys held by the in-memory Redis fallback store.",
+    multiprocess_mode="livesum",
+)
+REDIS_FALLBACK_BYTES = Gauge(
+    "yorozu_redis_fallback_bytes",
+    "Approximate bytes held by the in-memory Redis fallback store.",
+    multiprocess_mode="livesum",
+)
+REDIS_POOL_CONNECTIONS = Gauge(
+    "yorozu_redis_pool_connections",
+    "Redis pool connections by state (in_use, idle).",
+    ["state"],
+    multiprocess_mode="livesum",
+)
+REDIS_POOL_ACQUIRE_SECONDS = Histogram(
+    "yorozu_redis_pool_acquire_seconds",
+    "Time to obtain a Redis connection from the pool, including waits and new connects.",
+    buckets=_POOL_BUCKETS,
+)
+REDIS_POOL_EXHAUSTED = Counter(
+    "yorozu_redis_pool_exhausted_total",
+    "Redis commands that failed because no pool connection freed up within the timeout.",
+)
+REDIS_FALLBACK_EVICTIONS = Counter(
+    "yorozu_redis_fallback_evictions_total",
+    "Keys removed from the in-memory Redis fallback store, by reason (entries, bytes, expired).",
+    ["reason"],
+)
+REDIS_JOURNAL_PENDING = Gauge(
+    "yorozu_redis_journal_pending_ops",
+    "Fallback writes waiting to be replayed to Redis.",
+    multiprocess_mode="livesum",
+)
+REDIS_JOURNAL_OPS = Counter(
+    "yorozu_redis_journal_ops_total",
+    "Fallback write journal operations by result (recorded, applied, conflict, dropped).",
+    ["result"],
+)
+REDIS_REPLICA_READS = Counter(
+    "yorozu_redis_replica_reads_total",
+    "Session reads offered to Redis replicas by result (hit, miss, recent_write, unavailable, error).",
+    ["result"],
+)
+REDIS_NEAR_CACHE_READS = Counter(
+    "yorozu_redis_near_cache_reads_total",
+    "Near-cached session field reads (language, user type) by result (hit, miss, error).",
+    ["result"],
+)
+SSE_STREAMS_IN_FLIGHT = Gauge(
+    "yorozu_sse_streams_in_flight",
+    "SSE chat streams currently open.",
+    multiprocess_mode="livesum",
+)
+RATE_LIMIT_REJECTIONS = Counter(
+    "yorozu_rate_limit_rejections_total",
+    "Chat requests rejected by the daily usage limits.",
+    ["mode", "reason"],
+)
+
+
+class CallTimer:
+    """
+    呼び出しの経過時間（exclude() の区間を除く）
+    Elapsed time of a call, minus the spans run under exclude().
+    """
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.excluded = 0.0
+
+    @contextmanager
+    def exclude(self) -> Iterator[None]:
+        """この区間を所要時間から除く / Leave this block out of the elapsed time."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.excluded += time.perf_counter() - start
+
+    def elapsed(self) -> float:
+        """除外分を引いた経過秒数 / Elapsed seconds without the excluded blocks."""
+        return time.perf_counter() - self.start - self.excluded
+
+
+@contextmanager
+def observe_groq_call(model: str, call_type: str) -> Iterator[CallTimer]:
+    """
+    Groq 呼び出し1回の所要時間と失敗を記録する
+    Record the latency and failure of one Groq API call.
+
+    ストリーミングでは、チャンクを呼び出し元へ渡している間を timer.exclude() で除き、
+    上流（Groq）の時間だけを記録します。
+    When streaming, time spent handing chunks to the caller is wrapped in
+    timer.exclude(), so only upstream (Groq) time is recorded.
+    """
+    timer = CallTimer()
+    try:
+        yield timer
+    except Exception as e:
+        GROQ_ERRORS.labels(model=model, call_type=call_type, error=type(e).__name__).inc()
+        raise
+    finally:
+        GROQ_LATENCY.labels(model=model, call_type=call_type).observe(timer.elapsed())
+
+
+def render_latest() -> Tuple[bytes, str]:
+    """
+    公開用のメトリクス本文と Content-Type を返す（マルチプロセス時は全ワーカーを集計）
+    Return the exposition body and content type, aggregating workers in multiprocess mode.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
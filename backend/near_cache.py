@@ -0,0 +1,271 @@
+"""
+めったに変わらないセッション値のワーカー内キャッシュ（ニアキャッシュ）。
+Per-worker near-cache for rarely changing session values.
+
+Redis のクライアント側キャッシュ（CLIENT TRACKING の REDIRECT 方式）で整合性を保ちます。
+キャッシュ用の読み込みは専用プールの接続で行い、各接続は接続時に
+`CLIENT TRACKING ON REDIRECT <id>` を送ります。読んだキーが他のワーカーやプロセスに
+書き換えられると、Redis は `__redis__:invalidate` を購読しているリスナー接続へ
+キー名を送り、リスナーがそのキーを捨てます。
+Coherence comes from Redis client-side caching (CLIENT TRACKING in REDIRECT
+mode). Cached reads use connections from a dedicated pool, each of which sends
+`CLIENT TRACKING ON REDIRECT <id>` when it connects. When another worker or
+process changes a key that was read, Redis sends the key name to the listener
+connection subscribed to `__redis__:invalidate`, and the listener drops it.
+
+リスナーが切断している間は、キャッシュを空にしたうえで使いません。無効化の通知は
+非同期のため、他ワーカーの書き込みが見えるまでにわずかな遅れがあり、エントリの TTL が
+最大の古さの上限になります。
+While the listener is disconnected, the cache is emptied and bypassed.
+Invalidations are asynchronous, so other workers' writes become visible after
+a short delay; the entry TTL bounds how stale a value can get.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+# 無効化通知のチャンネル（RESP2 の REDIRECT 方式）/ Invalidation channel (RESP2 REDIRECT mode)
+INVALIDATE_CHANNEL = "__redis__:invalidate"
+
+
+class LocalCache:
+    """
+    TTL と件数上限付きのスレッドセーフな LRU キャッシュ
+    Thread-safe LRU cache with a TTL and an entry budget.
+
+    読み込み中に無効化されたキーを書き戻さないよう、読み込み前に reserve() で予約し、
+    fill() は予約が残っている場合だけ保存します。ttl が 0 以下ならエントリは期限切れに
+    ならず、max_entries が 0 なら件数上限はありません。
+    To avoid storing a value invalidated while it was being read, callers
+    reserve() the key first, and fill() only stores it while the reservation
+    is intact. A ttl of 0 or less never expires entries; a max_entries of 0
+    disables the budget.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 0) -> None:
+        self.ttl = ttl
+        self.max_entries = max(0, max_entries)
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._reserved: Dict[Hashable, object] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, now: Optional[float] = None) -> Tuple[bool, Any]:
+        """
+        (ヒットしたか, 値) を返す（期限切れのエントリは捨てる）
+        Return (hit, value), dropping an expired entry.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            value, expires_at = entry
+            if expires_at and now >= expires_at:
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def reserve(self, key: Hashable) -> object:
+        """
+        読み込み前にキーを予約し、fill() に渡すトークンを返す
+        Reserve a key before reading it and return the token for fill().
+        """
+        token = object()
+        with self._lock:
+            if self.max_entries and len(self._reserved) >= self.max_entries:
+                # 失敗した読み込みの予約が溜まった場合は捨てる / Drop reservations left by failed reads
+                self._reserved.clear()
+            self._reserved[key] = token
+        return token
+
+    def fill(self, key: Hashable, token: object, value: Any, now: Optional[float] = None) -> bool:
+        """
+        予約が残っていれば値を保存する（保存したら True）
+        Store the value if the reservation is intact; True when stored.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self._reserved.get(key) is not token:
+                return False
+            del self._reserved[key]
+            self._entries.pop(key, None)
+            self._entries[key] = (value, now + self.ttl if self.ttl > 0 else 0.0)
+            while self.max_entries and len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return True
+
+    def invalidate(self, *keys: Hashable) -> None:
+        """キーのエントリと予約を捨てる / Drop the entries and reservations of keys."""
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+                self._reserved.pop(key, None)
+
+    def clear(self) -> None:
+        """全件削除する / Drop every entry and reservation."""
+        with self._lock:
+            self._entries.clear()
+            self._reserved.clear()
+
+
+class InvalidationListener:
+    """
+    無効化通知を受け取るリスナーと、追跡付きの読み込み用クライアントの組
+    Listener for invalidation messages plus the tracked client used for cached reads.
+
+    バックグラウンドスレッドで `__redis__:invalidate` を購読し、切断時はキャッシュを空にして
+    retry_delay 秒後に接続し直します。接続し直すとクライアント ID が変わるため、
+    読み込み用プールも作り直します。
+    A background thread subscribes to `__redis__:invalidate`; on disconnect it
+    empties the cache and reconnects after retry_delay seconds. Reconnecting
+    changes the client ID, so the read pool is rebuilt as well.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        cache: LocalCache,
+        pool_options: Dict[str, Any],
+        retry_delay: float = 2.0,
+        health_check_interval: int = 30,
+    ) -> None:
+        self.url = url
+        self.cache = cache
+        self.pool_options = dict(pool_options)
+        self.retry_delay = max(0.1, retry_delay)
+        self.health_check_interval = health_check_interval
+        self.pid = os.getpid()
+        self._client_id: Optional[int] = None
+        self._client: Optional[Any] = None
+        self._stop = threading.Event()
+
+    @property
+    def client(self) -> Optional[Any]:
+        """
+        キャッシュ用の読み込みクライアント（リスナー切断中は None）
+        Client for cached reads, or None while the listener is disconnected.
+        """
+        return self._client if self._client_id is not None else None
+
+    def start(self) -> None:
+        """リスナースレッドを起動する / Start the listener thread."""
+        threading.Thread(target=self._run, name="redis-near-cache", daemon=True).start()
+
+    def stop(self) -> None:
+        """リスナースレッドを止める（次の受信待ちの後）/ Stop the listener after its current wait."""
+        self._stop.set()
+
+    def handle(self, message: Optional[Dict[str, Any]]) -> None:
+        """
+        無効化通知を1件処理する（キー一覧なら該当キー、空なら全件を捨てる）
+        Handle one invalidation message: drop the listed keys, or everything when the list is empty.
+
+        FLUSHALL などでは Redis がキー一覧の代わりに null を送ります。
+        Redis sends null instead of a key list for FLUSHALL and similar commands.
+        """
+        if not message or message.get("type") != "message":
+            return
+        keys = message.get("data")
+        if isinstance(keys, (list, tuple)):
+            self.cache.invalidate(*keys)
+        else:
+            self.cache.clear()
+
+    # 内部処理 / Internals
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._listen()
+            except Exception as e:
+                # 接続できないままの再試行は debug に留める / Keep repeated failed attempts at debug level
+                log = logger.warning if self._client_id is not None else logger.debug
+                log("Redis near-cache listener disconnected: %s", e)
+            self._reset()
+            self._stop.wait(self.retry_delay)
+
+    def _listen(self) -> None:
+        """
+        購読して無効化通知を処理し続ける（切断時は例外で抜ける）
+        Subscribe and handle invalidations until the connection fails.
+
+        再試行を 0 回にして、redis-py が黙って再接続・再購読（＝ID の変更）しないようにします。
+        Retries are disabled so redis-py never silently reconnects and
+        resubscribes under a new client ID.
+        """
+        from redis.backoff import NoBackoff
+        from redis.retry import Retry
+
+        listener = redis.Redis.from_url(
+            self.url,
+            decode_responses=True,
+            socket_connect_timeout=self.pool_options.get("socket_connect_timeout"),
+            socket_keepalive=True,
+            health_check_interval=self.health_check_interval,
+            retry=Retry(NoBackoff(), 0),
+        )
+        pubsub = listener.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.execute_command("CLIENT", "ID")
+            client_id = int(pubsub.parse_response())
+            # 購読してから ID を公開し、追跡開始前の通知を取りこぼさない
+            # Publish the ID only once subscribed so no invalidation is missed
+            pubsub.subscribe(INVALIDATE_CHANNEL)
+            self._client = self._create_client()
+            self._client_id = client_id
+            logger.info("Redis near-cache listener connected (client id %s)", self._client_id)
+            while not self._stop.is_set():
+                self.handle(pubsub.get_message(timeout=1.0))
+        finally:
+            pubsub.close()
+            listener.close()
+
+    def _create_client(self) -> Any:
+        """接続時に追跡を有効にする読み込み用クライアント / Read client whose connections enable tracking."""
+        pool = redis.BlockingConnectionPool.from_url(
+            self.url,
+            redis_connect_func=self._enable_tracking,
+            **self.pool_options,
+        )
+        return redis.Redis(connection_pool=pool)
+
+    def _enable_tracking(self, connection: Any) -> None:
+        """
+        新しい接続で CLIENT TRACKING を有効にし、通知をリスナーへ向ける
+        Enable CLIENT TRACKING on a new connection, redirecting invalidations to the listener.
+        """
+        connection.on_connect()
+        client_id = self._client_id
+        if client_id is None:
+            raise redis.ConnectionError("near-cache invalidation listener is not connected")
+        connection.send_command("CLIENT", "TRACKING", "ON", "REDIRECT", client_id)
+        response = connection.read_response()
+        if str(response.decode() if isinstance(response, bytes) else response) != "OK":
+            raise redis.ResponseError(f"CLIENT TRACKING failed: {response}")
+
+    def _reset(self) -> None:
+        """
+        切断時にキャッシュを空にし、読み込み用プールを閉じる
+        Empty the cache and close the read pool after a disconnect.
+        """
+        client, self._client, self._client_id = self._client, None, None
+        self.cache.clear()
+        if client is not None:
+            try:
+                client.connection_pool.disconnect()
+            except Exception as e:
+                logger.debug("Failed to close near-cache pool: %s", e)
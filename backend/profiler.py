@@ -0,0 +1,348 @@
+"""
+稼働中ワーカー向けのオンデマンド・サンプリングプロファイラ。
+On-demand sampling profiler for live workers.
+
+既定では無効で、有効化されるまでサンプリング用スレッドは存在しません。
+Off by default; no sampling thread exists until profiling is triggered.
+
+起動方法 / Triggers:
+- 時間窓 / time window: PROFILER_SIGNAL_ENABLED=true のワーカーに SIGUSR2 を送ると
+  PROFILER_WINDOW_SECONDS 秒間、全スレッドをサンプリングします。
+  Sending SIGUSR2 to a worker with PROFILER_SIGNAL_ENABLED=true samples all
+  threads for PROFILER_WINDOW_SECONDS.
+- 署名付きヘッダー / signed header: PROFILER_SECRET を設定し、
+  `X-Profile: <expires_unix>.<hmac_sha256(secret, expires_unix)>` を付けた
+  リクエストの処理スレッドだけをサンプリングします（sign_header() で生成）。
+  With PROFILER_SECRET set, requests carrying the header above are sampled on
+  their own thread only (build the value with sign_header()).
+
+結果は PROFILER_OUTPUT_DIR に collapsed（flamegraph.pl / speedscope で読める）
+または speedscope JSON（PROFILER_FORMAT）で保存されます。
+Results are written to PROFILER_OUTPUT_DIR as collapsed stacks or speedscope
+JSON (PROFILER_FORMAT).
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+import hashlib
+import hmac
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from backend.env import env_bool, env_float
+
+logger = logging.getLogger(__name__)
+
+FORMAT_COLLAPSED = "collapsed"
+FORMAT_SPEEDSCOPE = "speedscope"
+PROFILE_HEADER = "X-Profile"
+
+PROFILER_SECRET = os.getenv("PROFILER_SECRET", "").strip()
+PROFILER_SIGNAL_ENABLED = env_bool("PROFILER_SIGNAL_ENABLED", False)
+PROFILER_OUTPUT_DIR = os.getenv("PROFILER_OUTPUT_DIR", "/tmp/yorozu_profiles")
+PROFILER_FORMAT = os.getenv("PROFILER_FORMAT", FORMAT_COLLAPSED).strip().lower()
+PROFILER_INTERVAL_SECONDS = max(0.001, env_float("PROFILER_INTERVAL_SECONDS", 0.005))
+PROFILER_WINDOW_SECONDS = env_float("PROFILER_WINDOW_SECONDS", 30.0)
+# 1回のプロファイルの上限（署名付きリクエストが長引いた場合も打ち切る）
+# Hard cap for any single profile, including long signed requests
+PROFILER_MAX_SECONDS = env_float("PROFILER_MAX_SECONDS", 120.0)
+# 署名付きヘッダーの期限として受け付ける最大の先行秒数（長寿命トークンを拒否する）
+# Furthest ahead a signed header's expiry may be; longer-lived tokens are rejected
+PROFILER_MAX_TOKEN_TTL_SECONDS = env_float("PROFILER_MAX_TOKEN_TTL_SECONDS", 300.0)
+
+Stack = Tuple[Tuple[str, str, int], ...]
+
+# 集計から除外するプロファイラ自身のスレッド / Profiler-owned threads excluded from samples
+_internal_threads: set = set()
+
+
+class Sampler:
+    """
+    一定間隔でスレッドのスタックを採取して集計するサンプラー
+    Periodically samples thread stacks and aggregates identical stacks.
+    """
+
+    def __init__(
+        self,
+        label: str,
+        thread_id: Optional[int] = None,
+        interval: float = PROFILER_INTERVAL_SECONDS,
+        max_seconds: float = PROFILER_MAX_SECONDS,
+    ) -> None:
+        self.label = label
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.counts: Counter = Counter()
+        self.started = 0.0
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """サンプリングスレッドを開始する / Start the sampling thread."""
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name=f"profiler-{self.label}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """サンプリングを止めてスレッドの終了を待つ / Stop sampling and join the thread."""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        deadline = self.started + self.max_seconds
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if self.thread_id is not None:
+                frame = frames.get(self.thread_id)
+                if frame is None:
+                    break
+                self.counts[_stack_of(frame)] += 1
+            else:
+                for thread_id, frame in frames.items():
+                    if thread_id != own_id and thread_id not in _internal_threads:
+                        self.counts[_stack_of(frame)] += 1
+            if time.perf_counter() >= deadline:
+                break
+        self.elapsed = time.perf_counter() - self.started
+
+
+def _stack_of(frame: Any) -> Stack:
+    """
+    フレームから根→葉の順のスタックを作る
+    Build a root-to-leaf stack from a frame.
+    """
+    stack: List[Tuple[str, str, int]] = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+def _frame_label(name: str, filename: str, line: int) -> str:
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def render_collapsed(counts: Mapping[Stack, int]) -> str:
+    """
+    collapsed 形式（`a;b;c 件数`）に変換する
+    Render stacks in collapsed format (`a;b;c count`).
+    """
+    lines = [
+        ";".join(_frame_label(*frame) for frame in stack) + f" {count}"
+        for stack, count in sorted(counts.items(), key=lambda item: -item[1])
+    ]
+    return "\n".join(lines) + ("\n" if lines else "")
+
+
+def render_speedscope(counts: Mapping[Stack, int], name: str, interval: float) -> Dict[str, Any]:
+    """
+    speedscope のサンプル形式 JSON に変換する
+    Render stacks as a speedscope "sampled" profile.
+    """
+    frame_index: Dict[Tuple[str, str, int], int] = {}
+    frames: List[Dict[str, Any]] = []
+    samples: List[List[int]] = []
+    weights: List[float] = []
+    for stack, count in counts.items():
+        indices = []
+        for frame in stack:
+            if frame not in frame_index:
+                frame_index[frame] = len(frames)
+                frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+            indices.append(frame_index[frame])
+        samples.append(indices)
+        weights.append(round(count * interval, 6))
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": [
+            {
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": round(sum(weights), 6),
+                "samples": samples,
+                "weights": weights,
+            }
+        ],
+        "exporter": "yorozu_madoguchi profiler",
+    }
+
+
+def write_profile(sampler: Sampler, output_dir: str = "", fmt: str = "") -> Optional[str]:
+    """
+    採取結果をファイルに保存してパスを返す（サンプル無しなら None）
+    Write the samples to disk and return the path, or None when empty.
+    """
+    if not sampler.counts:
+        return None
+    output_dir = output_dir or PROFILER_OUTPUT_DIR
+    fmt = fmt or PROFILER_FORMAT
+    stem = f"{sampler.label}-{os.getpid()}-{int(time.time() * 1000)}"
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        if fmt == FORMAT_SPEEDSCOPE:
+            path = os.path.join(output_dir, f"{stem}.speedscope.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(render_speedscope(sampler.counts, stem, sampler.interval), f)
+        else:
+            path = os.path.join(output_dir, f"{stem}.collapsed")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(render_collapsed(sampler.counts))
+    except OSError as e:
+        logger.warning("Failed to write profile: %s", e)
+        return None
+    logger.info("Profile written to %s (%d samples)", path, sum(sampler.counts.values()))
+    return path
+
+
+def sign_header(secret: str, ttl_seconds: int = 300, now: Optional[float] = None) -> str:
+    """
+    X-Profile ヘッダー値を生成する（運用者が curl 等で付与する）
+    Build an X-Profile header value for operators to send.
+    """
+    expires = str(int((now if now is not None else time.time()) + ttl_seconds))
+    signature = hmac.new(secret.encode("utf-8"), expires.encode("utf-8"), hashlib.sha256).hexdigest()
+    return f"{expires}.{signature}"
+
+
+def header_requested(headers: Mapping[str, str], now: Optional[float] = None) -> bool:
+    """
+    署名付きヘッダーが有効（署名一致かつ期限内）かを判定する
+    Return whether the request carries a valid, unexpired signed header.
+
+    期限が PROFILER_MAX_TOKEN_TTL_SECONDS より先のトークンは、漏洩時に長く使われないよう拒否します。
+    Tokens expiring more than PROFILER_MAX_TOKEN_TTL_SECONDS ahead are rejected
+    so a leaked header cannot be replayed for long.
+    """
+    if not PROFILER_SECRET:
+        return False
+    supplied = (headers.get(PROFILE_HEADER) or "").strip()
+    expires, _, signature = supplied.partition(".")
+    if not expires.isdigit() or not signature:
+        return False
+    expected = hmac.new(PROFILER_SECRET.encode("utf-8"), expires.encode("utf-8"), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(signature, expected):
+        return False
+    current = now if now is not None else time.time()
+    return current <= int(expires) <= current + PROFILER_MAX_TOKEN_TTL_SECONDS
+
+
+def start_request_profile() -> Sampler:
+    """
+    現在のスレッド（リクエスト処理）のサンプリングを開始する
+    Start sampling the current request-handling thread.
+    """
+    sampler = Sampler("request", thread_id=threading.get_ident())
+    sampler.start()
+    return sampler
+
+
+def finish_request_profile(sampler: Sampler) -> Optional[str]:
+    """
+    リクエストのサンプリングを終えて保存する
+    Stop a request profile and write it.
+    """
+    sampler.stop()
+    return write_profile(sampler)
+
+
+_window_lock = threading.Lock()
+_window_sampler: Optional[Sampler] = None
+
+
+def start_window(seconds: float = PROFILER_WINDOW_SECONDS) -> bool:
+    """
+    指定秒数だけ全スレッドをサンプリングする（実行中なら何もしない）
+    Sample all threads for a time window; returns False if one is already running.
+    """
+    global _window_sampler
+    with _window_lock:
+        if _window_sampler is not None:
+            return False
+        sampler = Sampler("window", max_seconds=min(seconds, PROFILER_MAX_SECONDS))
+        _window_sampler = sampler
+    sampler.start()
+
+    def _finish() -> None:
+        global _window_sampler
+        # 自身の ident はスレッド内で登録する（start() 直後に終わっても古い ident が残らない）
+        # Register our own ident from inside the thread, so a fast finish cannot leave a stale one
+        own_id = threading.get_ident()
+        _internal_threads.add(own_id)
+        try:
+            sampler._thread.join()  # type: ignore[union-attr]
+            sampler.stop()
+            write_profile(sampler)
+        finally:
+            _internal_threads.discard(own_id)
+            with _window_lock:
+                _window_sampler = None
+
+    threading.Thread(target=_finish, name="profiler-window-writer", daemon=True).start()
+    return True
+
+
+def _watch_signal(read_fd: int) -> None:
+    """
+    SIGUSR2 の通知をパイプから受け取り、時間窓プロファイルを開始する
+    Wait for SIGUSR2 notifications on the pipe and start a window profile for each.
+    """
+    _internal_threads.add(threading.get_ident())
+    while True:
+        try:
+            if not os.read(read_fd, 64):
+                return
+        except OSError:
+            return
+        start_window()
+
+
+def install_signal_handler() -> bool:
+    """
+    PROFILER_SIGNAL_ENABLED の場合に SIGUSR2 で時間窓プロファイルを開始できるようにする
+    Install a SIGUSR2 handler that starts a window profile when enabled.
+
+    シグナルハンドラはロックを取らず、パイプに1バイト書くだけです（メインスレッドが
+    _window_lock を保持中でもデッドロックしない）。開始は待機スレッドが行います。
+    The handler takes no locks and only writes a byte to a pipe, so it cannot
+    deadlock when the main thread holds _window_lock; a waiting thread starts
+    the window. That thread does not sample; it only blocks on the pipe.
+    """
+    if not PROFILER_SIGNAL_ENABLED or not hasattr(signal, "SIGUSR2"):
+        return False
+    read_fd, write_fd = os.pipe()
+    os.set_blocking(write_fd, False)
+
+    def _on_signal(_signum: int, _frame: Any) -> None:
+        try:
+            os.write(write_fd, b"\0")
+        except OSError:
+            # パイプが満杯なら既に開始待ち / A full pipe means a start is already pending
+            pass
+
+    try:
+        signal.signal(signal.SIGUSR2, _on_signal)
+    except ValueError:
+        # メインスレッド以外では登録できない / Only the main thread may install handlers
+        logger.warning("Profiler signal handler not installed (not in main thread)")
+        os.close(read_fd)
+        os.close(write_fd)
+        return False
+    threading.Thread(target=_watch_signal, args=(read_fd,), name="profiler-signal", daemon=True).start()
+    return True
@@ -3,79 +3,142 @@ Redisアクセスと簡易フォールバック（インメモリ）の管理。
 Redis access and a lightweight in-memory fallback.
 """
 
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+import base64
 import os
-import json
 import redis
 import logging
 import time
 import threading
-from typing import Dict, List, Optional, Sequence, Tuple, Any
+import zlib
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Any
+
+from backend.env import env_bool as _env_bool, env_float as _env_float, env_int as _env_int
+from backend import metrics, near_cache, redis_pool, redis_replicas, redis_shards, serialization, tracing, write_journal
+from backend.fallback_store import FallbackStore
 
 logger = logging.getLogger(__name__)
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Redis の構成 / Redis topology
+# - standalone: REDIS_URL の1台 / a single node at REDIS_URL
+# - cluster: REDIS_URL を起点とする Redis Cluster（キーはセッション ID のハッシュタグ付き）
+#   Redis Cluster seeded from REDIS_URL (keys carry the session ID as a hash tag)
+# - sharded: REDIS_SHARD_URLS の複数台へコンシステント・ハッシュで振り分け
+#   several standalone nodes in REDIS_SHARD_URLS, chosen by consistent hashing
+MODE_STANDALONE = "standalone"
+MODE_CLUSTER = "cluster"
+MODE_SHARDED = "sharded"
 
 
-def _env_float(name: str, default: float) -> float:
-    """
-    環境変数を float として読み込み、失敗時は既定値を返す
-    Read an environment variable as float, or return the default on parse failure.
-    """
-    raw = os.getenv(name, str(default)).strip()
-    try:
-        return float(raw)
-    except ValueError:
-        return default
-
+try:
+    REDIS_SESSION_TTL_SECONDS = int(os.getenv("REDIS_SESSION_TTL_SECONDS", "172800"))
+except ValueError:
+    REDIS_SESSION_TTL_SECONDS = 172800
 
-def _env_int(name: str, default: int) -> int:
-    """
-    環境変数を int として読み込み、失敗時は既定値を返す
-    Read an environment variable as int, or return the default on parse failure.
-    """
-    raw = os.getenv(name, str(default)).strip()
-    try:
-        return int(raw)
-    except ValueError:
-        return default
+REDIS_MODE = os.getenv("REDIS_MODE", MODE_STANDALONE).strip().lower()
+if REDIS_MODE not in (MODE_STANDALONE, MODE_CLUSTER, MODE_SHARDED):
+    logger.warning("Unknown REDIS_MODE=%s; using %s", REDIS_MODE, MODE_STANDALONE)
+    REDIS_MODE = MODE_STANDALONE
+REDIS_SHARD_URLS = [url.strip() for url in os.getenv("REDIS_SHARD_URLS", "").split(",") if url.strip()]
+REDIS_SHARD_REPLICAS = _env_int("REDIS_SHARD_REPLICAS", redis_shards.DEFAULT_REPLICAS)
 
 
-def _env_bool(name: str, default: bool = False) -> bool:
+def _parse_sentinels(raw: str) -> List[Tuple[str, int]]:
     """
-    環境変数を真偽値として解釈する
-    Parse an environment variable as a boolean flag.
+    "host:port,host:port" 形式の Sentinel 一覧を解釈する（不正な要素は警告して無視）
+    Parse a "host:port,host:port" Sentinel list, warning about and skipping bad entries.
     """
-    raw = os.getenv(name)
-    if raw is None:
-        return default
-    return raw.strip().lower() in ("1", "true", "yes", "on")
-
-
-try:
-    REDIS_SESSION_TTL_SECONDS = int(os.getenv("REDIS_SESSION_TTL_SECONDS", "172800"))
-except ValueError:
-    REDIS_SESSION_TTL_SECONDS = 172800
+    sentinels = []
+    for item in (part.strip() for part in raw.split(",")):
+        if not item:
+            continue
+        host, _sep, port = item.rpartition(":")
+        try:
+            sentinels.append((host or "localhost", int(port)))
+        except ValueError:
+            logger.warning("Invalid REDIS_SENTINELS entry: %s", item)
+    return sentinels
+
+
+# standalone の読み込みレプリカ（REDIS_REPLICA_URLS か Sentinel のレプリカ）と read-your-writes の設定
+# Standalone read replicas (REDIS_REPLICA_URLS or Sentinel's replicas) and read-your-writes settings
+REDIS_READ_FROM_REPLICAS = _env_bool("REDIS_READ_FROM_REPLICAS", False)
+REDIS_REPLICA_URLS = [url.strip() for url in os.getenv("REDIS_REPLICA_URLS", "").split(",") if url.strip()]
+REDIS_SENTINELS = _parse_sentinels(os.getenv("REDIS_SENTINELS", ""))
+REDIS_SENTINEL_SERVICE = os.getenv("REDIS_SENTINEL_SERVICE", "mymaster")
+REDIS_SENTINEL_PASSWORD = os.getenv("REDIS_SENTINEL_PASSWORD") or None
+REDIS_REPLICA_READ_AFTER_WRITE_SECONDS = _env_float("REDIS_REPLICA_READ_AFTER_WRITE_SECONDS", 5.0)
+REDIS_REPLICA_RETRY_SECONDS = _env_float("REDIS_REPLICA_RETRY_SECONDS", 30.0)
+REDIS_REPLICA_WAIT_MS = max(0, _env_int("REDIS_REPLICA_WAIT_MS", 0))
+REDIS_REPLICA_WAIT_COUNT = max(1, _env_int("REDIS_REPLICA_WAIT_COUNT", 1))
+# 言語・ユーザー種別のワーカー内キャッシュ（standalone の keys レイアウトのみ。TTL が古さの上限、0 で無期限）
+# Per-worker near-cache of language and user type (standalone keys layout only; the TTL bounds staleness, 0 = none)
+REDIS_NEAR_CACHE = _env_bool("REDIS_NEAR_CACHE", False)
+REDIS_NEAR_CACHE_TTL_SECONDS = _env_float("REDIS_NEAR_CACHE_TTL_SECONDS", 60.0)
+REDIS_NEAR_CACHE_MAX_ENTRIES = _env_int("REDIS_NEAR_CACHE_MAX_ENTRIES", 10000)
 
 REDIS_SOCKET_TIMEOUT_SECONDS = _env_float("REDIS_SOCKET_TIMEOUT_SECONDS", 2.0)
 REDIS_CONNECT_TIMEOUT_SECONDS = _env_float("REDIS_CONNECT_TIMEOUT_SECONDS", 2.0)
 REDIS_HEALTH_CHECK_INTERVAL = _env_int("REDIS_HEALTH_CHECK_INTERVAL", 30)
+# 接続プールの上限（0 でワーカーの同時実行数から自動決定）と空き待ちの上限秒数
+# Pool size (0 = derived from the worker's concurrency) and max wait for a free connection
+REDIS_POOL_MAX_CONNECTIONS = _env_int("REDIS_POOL_MAX_CONNECTIONS", 0) or redis_pool.default_max_connections()
+REDIS_POOL_TIMEOUT_SECONDS = _env_float("REDIS_POOL_TIMEOUT_SECONDS", 1.0)
+REDIS_SOCKET_KEEPALIVE = _env_bool("REDIS_SOCKET_KEEPALIVE", True)
 REDIS_RECONNECT_RETRIES = _env_int("REDIS_RECONNECT_RETRIES", 5)
 REDIS_RECONNECT_INITIAL_DELAY_SECONDS = _env_float("REDIS_RECONNECT_INITIAL_DELAY_SECONDS", 0.5)
 REDIS_RECONNECT_MAX_DELAY_SECONDS = _env_float("REDIS_RECONNECT_MAX_DELAY_SECONDS", 5.0)
+# 再接続に失敗した後、スーパーバイザーが次の試行まで待つ秒数
+# Seconds the supervisor waits after a failed reconnect round
 REDIS_RECONNECT_MIN_INTERVAL_SECONDS = _env_float("REDIS_RECONNECT_MIN_INTERVAL_SECONDS", 2.0)
 REDIS_FAIL_FAST = _env_bool("REDIS_FAIL_FAST", False)
 REDIS_ALLOW_FALLBACK = _env_bool("REDIS_ALLOW_FALLBACK", True)
+# フォールバックストアの上限（0 で無効）と期限切れスイープの間隔
+# Fallback store budgets (0 disables) and expiry sweep interval
+REDIS_FALLBACK_MAX_ENTRIES = _env_int("REDIS_FALLBACK_MAX_ENTRIES", 10000)
+REDIS_FALLBACK_MAX_BYTES = _env_int("REDIS_FALLBACK_MAX_BYTES", 64 * 1024 * 1024)
+REDIS_FALLBACK_SWEEP_INTERVAL_SECONDS = _env_float("REDIS_FALLBACK_SWEEP_INTERVAL_SECONDS", 60.0)
+# フォールバック中の書き込みを記録し、復旧後に Redis へ再生する（ライトビハインド）
+# Journal fallback writes and replay them to Redis after recovery (write-behind)
+REDIS_FALLBACK_JOURNAL = _env_bool("REDIS_FALLBACK_JOURNAL", True)
+REDIS_JOURNAL_MAX_OPS = _env_int("REDIS_JOURNAL_MAX_OPS", 20000)
+REDIS_JOURNAL_REPLAY_BATCH = max(1, _env_int("REDIS_JOURNAL_REPLAY_BATCH", 100))
 
 # Redisクライアントの状態管理
 # Redis client state tracking
 redis_client: Optional[Any] = None
 _redis_lock = threading.Lock()
 _last_health_check = 0.0
-_last_reconnect_attempt = 0.0
-
-# Redisが使えない場合の簡易フォールバック（単一プロセス限定）
-# In-memory fallback when Redis is unavailable (single-process only)
-_memory_store: Dict[str, Tuple[str, Optional[float]]] = {}
+# 再接続とヘルスチェックを行うスーパーバイザー（プロセスごとに1スレッド）
+# Supervisor thread that reconnects and health-checks (one per process)
+_supervisor_pid: Optional[int] = None
+_supervisor_wake = threading.Event()
+
+# Redisが使えない場合の簡易フォールバック（単一プロセス限定、上限付き LRU）
+# In-memory fallback when Redis is unavailable (single-process only, bounded LRU)
+_memory_store = FallbackStore(
+    max_entries=REDIS_FALLBACK_MAX_ENTRIES,
+    max_bytes=REDIS_FALLBACK_MAX_BYTES,
+    sweep_interval=REDIS_FALLBACK_SWEEP_INTERVAL_SECONDS,
+)
+# フォールバック書き込みのジャーナル（Redis 復旧後に再生する）
+# Journal of fallback writes, replayed once Redis recovers
+_journal = write_journal.WriteJournal(max_ops=REDIS_JOURNAL_MAX_OPS)
+# 読み込みレプリカ（初回利用時に作る）と、自プロセスが直近に書き込んだセッション
+# Read replicas (built on first use) and the sessions this process wrote recently
+_sentinel: Optional[Any] = None
+_replicas: Optional[redis_replicas.ReplicaSet] = None
+_replicas_built = False
+_recent_writes = redis_replicas.RecentWrites(
+    REDIS_REPLICA_READ_AFTER_WRITE_SECONDS if REDIS_READ_FROM_REPLICAS else 0.0
+)
+# 言語・ユーザー種別のニアキャッシュと、その無効化リスナー（プロセスごとに1つ）
+# Near-cache of language and user type, and its invalidation listener (one per process)
+_near_cache = near_cache.LocalCache(REDIS_NEAR_CACHE_TTL_SECONDS, REDIS_NEAR_CACHE_MAX_ENTRIES)
+_near_cache_listener: Optional[near_cache.InvalidationListener] = None
 
 
 def _should_use_fallback() -> bool:
@@ -124,22 +187,155 @@ def _create_redis_client() -> Optional[Any]:
     Redisクライアントを生成し、初回 ping で接続確認する
     Create a Redis client and verify connectivity with an initial ping.
     """
+    client = None
     try:
-        client = redis.from_url(
-            REDIS_URL,
-            decode_responses=True,
-            socket_timeout=REDIS_SOCKET_TIMEOUT_SECONDS,
-            socket_connect_timeout=REDIS_CONNECT_TIMEOUT_SECONDS,
-            retry_on_timeout=True,
-            health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
-        )
+        if REDIS_MODE == MODE_CLUSTER:
+            client = _create_cluster_client()
+        elif REDIS_MODE == MODE_SHARDED:
+            client = redis_shards.ShardedRedis(
+                {redis_shards.node_name(url): _create_node_client(url) for url in REDIS_SHARD_URLS or [REDIS_URL]},
+                REDIS_SHARD_REPLICAS,
+            )
+        elif REDIS_SENTINELS:
+            client = _get_sentinel().master_for(REDIS_SENTINEL_SERVICE, redis_class=redis.Redis, **_sentinel_options())
+        else:
+            client = _create_node_client(REDIS_URL)
         _ping_if_available(client)
         return client
     except Exception as e:
         logger.error("Failed to connect to Redis: %s", e)
+        if client is not None:
+            _disconnect_pool(client)
         return None
 
 
+def _pool_options() -> Dict[str, Any]:
+    """
+    各ノードの接続プールに渡す共通設定
+    Connection pool settings shared by every node.
+    """
+    return {
+        "max_connections": REDIS_POOL_MAX_CONNECTIONS,
+        "timeout": REDIS_POOL_TIMEOUT_SECONDS,
+        "decode_responses": True,
+        "socket_timeout": REDIS_SOCKET_TIMEOUT_SECONDS,
+        "socket_connect_timeout": REDIS_CONNECT_TIMEOUT_SECONDS,
+        "socket_keepalive": REDIS_SOCKET_KEEPALIVE,
+        "retry_on_timeout": True,
+    }
+
+
+def _create_node_client(url: str) -> Any:
+    """
+    単体ノードのクライアントを上限付きプールで作る（接続は最初のコマンドまで行わない）
+    Build a single-node client on a bounded pool; nothing connects until the first command.
+    """
+    pool = redis_pool.InstrumentedConnectionPool.from_url(
+        url,
+        health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+        **_pool_options(),
+    )
+    return redis.Redis(connection_pool=pool)
+
+
+def _create_cluster_client() -> Any:
+    """
+    Redis Cluster のクライアントを作る（ノードごとのプールも上限付き）
+    Build a Redis Cluster client whose per-node pools are bounded as well.
+    """
+    from redis.cluster import RedisCluster
+
+    return RedisCluster.from_url(
+        REDIS_URL,
+        connection_pool_class=redis_pool.InstrumentedConnectionPool,
+        **_pool_options(),
+    )
+
+
+def _sentinel_options() -> Dict[str, Any]:
+    """
+    Sentinel 経由の接続設定（認証情報と DB は REDIS_URL から取る）
+    Connection settings for Sentinel-managed nodes; credentials and DB come from REDIS_URL.
+
+    Sentinel のプールは待機付きではないため、プール待ちの timeout は渡しません。
+    Sentinel pools do not block for a free connection, so the pool timeout is left out.
+    """
+    options = {name: value for name, value in _pool_options().items() if name != "timeout"}
+    url = redis.connection.parse_url(REDIS_URL)
+    options.update({name: url[name] for name in ("username", "password", "db") if name in url})
+    options["health_check_interval"] = REDIS_HEALTH_CHECK_INTERVAL
+    return options
+
+
+def _get_sentinel() -> Any:
+    """
+    プロセス共通の Sentinel 接続を返す（初回に作る）
+    Return the process-wide Sentinel connection, creating it on first use.
+    """
+    global _sentinel
+    if _sentinel is None:
+        from redis.sentinel import Sentinel
+
+        sentinel_kwargs = {
+            "socket_timeout": REDIS_SOCKET_TIMEOUT_SECONDS,
+            "socket_connect_timeout": REDIS_CONNECT_TIMEOUT_SECONDS,
+        }
+        if REDIS_SENTINEL_PASSWORD:
+            sentinel_kwargs["password"] = REDIS_SENTINEL_PASSWORD
+        _sentinel = Sentinel(REDIS_SENTINELS, sentinel_kwargs=sentinel_kwargs)
+    return _sentinel
+
+
+def _create_replica_set() -> Optional[redis_replicas.ReplicaSet]:
+    """
+    読み込み用レプリカのクライアント群を作る（standalone 以外や未設定なら None）
+    Build the read replica clients; None outside standalone mode or when none are configured.
+
+    Sentinel ではレプリカの選択と切り替えを Sentinel のプールに任せます。
+    With Sentinel, its pool picks replicas and follows failovers.
+    """
+    if not REDIS_READ_FROM_REPLICAS or REDIS_MODE != MODE_STANDALONE:
+        return None
+    if REDIS_REPLICA_WAIT_MS <= 0:
+        # WAIT が無いと他ワーカーが保存直後のターンをレプリカで読み落とすため、プライマリのみで読む
+        # Without WAIT other workers may miss a just-saved turn on a replica, so read from the primary
+        logger.warning(
+            "REDIS_READ_FROM_REPLICAS needs REDIS_REPLICA_WAIT_MS > 0 for read-your-writes across workers; "
+            "reading from the primary"
+        )
+        return None
+    if REDIS_SENTINELS:
+        clients = {
+            f"sentinel:{REDIS_SENTINEL_SERVICE}": _get_sentinel().slave_for(
+                REDIS_SENTINEL_SERVICE, redis_class=redis.Redis, **_sentinel_options()
+            )
+        }
+    else:
+        clients = {redis_shards.node_name(url): _create_node_client(url) for url in REDIS_REPLICA_URLS}
+    if not clients:
+        logger.warning("REDIS_READ_FROM_REPLICAS is set but no replicas are configured; reading from the primary")
+        return None
+    return redis_replicas.ReplicaSet(clients, REDIS_REPLICA_RETRY_SECONDS)
+
+
+def _replica_set() -> Optional[redis_replicas.ReplicaSet]:
+    """
+    読み込み用レプリカを返す（初回に作り、失敗時はプライマリのみで動く）
+    Return the read replicas, building them once; on failure reads stay on the primary.
+    """
+    global _replicas, _replicas_built
+    if not _replicas_built:
+        with _redis_lock:
+            if not _replicas_built:
+                try:
+                    _replicas = _create_replica_set()
+                except Exception as e:
+                    logger.error("Failed to set up Redis read replicas: %s", e)
+                    _replicas = None
+                _replicas_built = True
+    return _replicas
+
+
 def _connect_with_retries() -> Optional[Any]:
     """
     指定回数までバックオフしながらRedis再接続を試みる
@@ -174,6 +370,13 @@ def _mark_unhealthy(reason: str, err: Optional[Exception] = None) -> None:
     """
     Redis状態を不健康としてマークし、クライアントを破棄する
     Mark Redis as unhealthy and clear the active client reference.
+
+    再接続はスーパーバイザーが担当するため、ここでは起こすだけです。
+    接続中のクライアントを破棄した（＝フォールバックへ切り替わった）ときだけ
+    フォールバックの発動回数を数えます。
+    Reconnection is left to the supervisor, which is only woken up here.
+    Fallback activations are counted only when a live client is dropped,
+    i.e. on the healthy-to-fallback transition.
     """
     global redis_client, _last_health_check
     if err is not None:
@@ -181,46 +384,301 @@ def _mark_unhealthy(reason: str, err: Optional[Exception] = None) -> None:
     else:
         logger.error("Redis %s failed", reason)
     with _redis_lock:
+        was_connected = redis_client is not None
         redis_client = None
         _last_health_check = 0.0
+    if was_connected and _should_use_fallback():
+        metrics.REDIS_FALLBACK_ACTIVATIONS.inc()
     _fail_fast(reason, err)
+    _supervisor_wake.set()
 
 
-def get_redis_client() -> Optional[Any]:
+def _supervise_once(now: float) -> None:
+    """
+    スーパーバイザーの1周期: 接続済みならヘルスチェック、未接続なら再接続する
+    One supervisor cycle: health-check a live client, or reconnect when there is none.
+
+    接続がある場合は、未再生のフォールバック書き込みもここで Redis へ再生します。
+    With a live client, pending fallback writes are also replayed to Redis here.
+
+    再接続（バックオフ付きの待機を含む）はロックの外で行い、成功したクライアントだけを
+    ロック内で差し替えます。
+    Reconnection, including its backoff sleeps, runs outside the lock; only the
+    swap to a new client happens under it.
+    """
+    global redis_client, _last_health_check
+    client = redis_client
+    if client is not None and _health_check_due(now):
+        try:
+            _ping_if_available(client)
+            _last_health_check = now
+        except Exception as e:
+            logger.warning("Redis health check failed: %s", e)
+            with _redis_lock:
+                dropped = redis_client is client
+                if dropped:
+                    redis_client = None
+            # _mark_unhealthy と同じく、接続中からフォールバックへ移ったときだけ数える
+            # Counted like _mark_unhealthy: only on the connected-to-fallback transition
+            if dropped and _should_use_fallback():
+                metrics.REDIS_FALLBACK_ACTIVATIONS.inc()
+            _disconnect_pool(client)
+            client = None
+    if client is not None:
+        if len(_journal):
+            replay_fallback_journal(client)
+        return
+
+    new_client = _connect_with_retries()
+    if new_client is None:
+        _fail_fast("reconnect")
+        return
+    with _redis_lock:
+        redis_client = new_client
+        _last_health_check = time.time()
+    logger.info("Redis connection established")
+    if len(_journal):
+        replay_fallback_journal(new_client)
+
+
+def _pools_of(client: Any) -> Dict[str, Any]:
+    """
+    クライアントが持つ接続プール（ノード名ごと）
+    Connection pools held by a client, by node name.
+    """
+    if isinstance(client, redis_shards.ShardedRedis):
+        return {name: node.connection_pool for name, node in client.clients.items()}
+    if callable(getattr(client, "get_nodes", None)):
+        return {
+            node.name: node.redis_connection.connection_pool
+            for node in client.get_nodes()
+            if node.redis_connection is not None
+        }
+    pool = getattr(client, "connection_pool", None)
+    return {"default": pool} if pool is not None else {}
+
+
+def _disconnect_pool(client: Any) -> None:
+    """
+    破棄したクライアントのプール接続を閉じる（失敗は無視）
+    Close the pool connections of a discarded client, ignoring errors.
+    """
+    for pool in _pools_of(client).values():
+        try:
+            pool.disconnect()
+        except Exception as e:
+            logger.debug("Failed to close Redis pool: %s", e)
+
+
+def pool_stats() -> Dict[str, Any]:
+    """
+    現在のクライアントの接続プール統計（未接続なら connected=False のみ）
+    Connection pool statistics of the current client ({"connected": False} when disconnected).
+
+    cluster / sharded ではノードごとの統計を "nodes" に返します。
+    In cluster and sharded modes, per-node statistics are returned under "nodes".
+    Sentinel のプールは統計を持たないため connected のみ返します。
+    Sentinel pools keep no statistics, so only "connected" is returned for them.
+    """
+    pools = {name: pool for name, pool in _pools_of(redis_client).items() if hasattr(pool, "stats")}
+    if not pools:
+        return {"connected": redis_client is not None}
+    if REDIS_MODE == MODE_STANDALONE and len(pools) == 1:
+        return {"connected": True, **next(iter(pools.values())).stats()}
+    return {"connected": True, "nodes": {name: pool.stats() for name, pool in pools.items()}}
+
+
+def _supervisor_loop() -> None:
     """
-    利用可能なRedisクライアントを返し、必要なら再接続する
-    Return a usable Redis client, reconnecting when needed.
+    ヘルスチェックと再接続を繰り返すバックグラウンドループ
+    Background loop that runs health checks and reconnection.
     """
-    global redis_client, _last_health_check, _last_reconnect_attempt
-    now = time.time()
+    while True:
+        try:
+            _supervise_once(time.time())
+        except Exception:
+            logger.exception("Redis supervisor cycle failed")
+        if redis_client is None:
+            wait = max(REDIS_RECONNECT_MIN_INTERVAL_SECONDS, 0.1)
+        elif REDIS_HEALTH_CHECK_INTERVAL > 0:
+            wait = REDIS_HEALTH_CHECK_INTERVAL
+        else:
+            wait = None
+        _supervisor_wake.wait(wait)
+        _supervisor_wake.clear()
 
+
+def _ensure_supervisor() -> None:
+    """
+    スーパーバイザースレッドをプロセスごとに1つ起動する（fork 後は子プロセスで起動し直す）
+    Start one supervisor thread per process (restarted in a forked child).
+    """
+    global _supervisor_pid
+    pid = os.getpid()
+    if _supervisor_pid == pid:
+        return
     with _redis_lock:
-        client = redis_client
-        if client is not None:
-            if _health_check_due(now):
-                _last_health_check = now
-                try:
-                    _ping_if_available(client)
-                except Exception as e:
-                    redis_client = None
-                    client = None
-                    logger.warning("Redis health check failed: %s", e)
+        if _supervisor_pid == pid:
+            return
+        _supervisor_pid = pid
+    threading.Thread(target=_supervisor_loop, name="redis-supervisor", daemon=True).start()
 
-        if client is not None:
-            return client
 
-        if not REDIS_FAIL_FAST and now - _last_reconnect_attempt < REDIS_RECONNECT_MIN_INTERVAL_SECONDS:
-            return None
-        _last_reconnect_attempt = now
+def get_redis_client() -> Optional[Any]:
+    """
+    利用可能なRedisクライアントを返す（未接続なら待たずに None）
+    Return the current Redis client, or None immediately when disconnected.
+
+    リクエスト処理中はロックも再接続も行わず、現在の参照を読むだけです。
+    ヘルスチェックと再接続はバックグラウンドのスーパーバイザーが行い、
+    呼び出し側は None の場合すぐにフォールバックできます。
+    The request path takes no lock and never reconnects; it only reads the
+    current reference. A background supervisor runs health checks and
+    reconnection, so callers can fall back immediately on None.
+    """
+    if _supervisor_pid != os.getpid():
+        _ensure_supervisor()
+    return redis_client
 
-        client = _connect_with_retries()
-        if client is not None:
-            redis_client = client
-            _last_health_check = now
-            return client
 
-    _fail_fast("reconnect")
-    return None
+def client_for(routing_key: str) -> Optional[Any]:
+    """
+    ルーティングキー（セッション ID など）を担当するクライアントを返す
+    Return the client responsible for a routing key such as a session ID.
+
+    sharded ではハッシュリングで選んだノードのクライアント、それ以外は現在のクライアントです
+    （cluster ではキーのハッシュタグでクライアント自身が振り分けます）。
+    In sharded mode this is the node picked by the hash ring; otherwise it is
+    the current client (in cluster mode the client routes by the keys' hash tags).
+    """
+    client = get_redis_client()
+    if isinstance(client, redis_shards.ShardedRedis):
+        return client.for_key(routing_key)
+    return client
+
+
+def hash_tag(value: str) -> str:
+    """
+    cluster では値をハッシュタグ（{value}）にし、同じ値を含むキーを同じスロットに置く
+    In cluster mode, wrap a value as a hash tag ({value}) so keys sharing it land in one slot.
+
+    それ以外の構成ではそのまま返すため、既存のキー名は変わりません。
+    Other modes return it unchanged, so existing key names are kept.
+    """
+    if REDIS_MODE == MODE_CLUSTER:
+        return f"{{{value}}}"
+    return value
+
+
+def _note_write(session_id: str, fields: Optional[Sequence[str]] = None) -> None:
+    """
+    セッションへの書き込みを記録し、しばらくその読み込みをプライマリへ向ける
+    Record a write to a session so its reads go to the primary for a while.
+
+    書き込む fields（None はすべて）のうちニアキャッシュ対象のものは自プロセスのキャッシュからも
+    捨てます（他ワーカーへは Redis の無効化通知が届きます）。履歴や決定事項だけの書き込みでは捨てません。
+    Near-cached entries among the written fields (None = all) are dropped from
+    this process's cache as well; other workers get Redis invalidation
+    messages. Writes of history or decisions alone leave the cache alone.
+    """
+    _recent_writes.note(session_id)
+    if REDIS_NEAR_CACHE:
+        keys = _near_cache_keys(session_id, NEAR_CACHE_FIELDS if fields is None else fields)
+        if keys:
+            _near_cache.invalidate(*keys)
+
+
+def _read_from_replica(session_id: str, read: Callable[[Any], Any], found: Callable[[Any], bool]) -> Optional[Any]:
+    """
+    セッションの読み込みをレプリカで試し、結果を返す（None ならプライマリで読み直す）
+    Try a session read on a replica and return its result; None means read from the primary.
+
+    レプリカ未設定、直近に自プロセスが書き込んだセッション、レプリカに値が無い
+    （複製遅延や未移行のキー）場合、レプリカの失敗時は None です。失敗したレプリカは
+    REDIS_REPLICA_RETRY_SECONDS 秒使わず、プライマリの健全性には影響させません。
+    None is returned without replicas, for sessions this process wrote
+    recently, when the replica has no value (replication lag or unmigrated
+    keys), and when the replica fails. A failed replica is skipped for
+    REDIS_REPLICA_RETRY_SECONDS and does not affect the primary's health.
+    """
+    replicas = _replica_set()
+    if replicas is None:
+        return None
+    if _recent_writes.is_recent(session_id):
+        metrics.REDIS_REPLICA_READS.labels(result="recent_write").inc()
+        return None
+    replica = replicas.pick()
+    if replica is None:
+        metrics.REDIS_REPLICA_READS.labels(result="unavailable").inc()
+        return None
+    try:
+        result = read(replica)
+    except Exception as e:
+        replicas.mark_down(replica)
+        logger.warning("Redis replica read failed; reading from the primary: %s", e)
+        metrics.REDIS_REPLICA_READS.labels(result="error").inc()
+        return None
+    if not found(result):
+        metrics.REDIS_REPLICA_READS.labels(result="miss").inc()
+        return None
+    metrics.REDIS_REPLICA_READS.labels(result="hit").inc()
+    return result
+
+
+def _replica_wait_count() -> int:
+    """
+    WAIT で待つレプリカ数（REDIS_REPLICA_URLS の全台、最低 REDIS_REPLICA_WAIT_COUNT）
+    Replicas to WAIT for: every REDIS_REPLICA_URLS entry, at least REDIS_REPLICA_WAIT_COUNT.
+
+    読み込みはどのレプリカにも振り分けるため、1台だけの確認では他のレプリカが遅れている場合があります。
+    Sentinel ではレプリカ数が分からないため REDIS_REPLICA_WAIT_COUNT を使います。
+    Reads may go to any replica, so acknowledging one is not enough when another
+    lags. With Sentinel the replica count is unknown and REDIS_REPLICA_WAIT_COUNT is used.
+    """
+    return max(REDIS_REPLICA_WAIT_COUNT, len(REDIS_REPLICA_URLS))
+
+
+def _check_replica_wait(acked: Any) -> None:
+    """
+    WAIT の応答が必要数に届かなければ警告する
+    Warn when WAIT returned fewer acknowledgements than needed.
+    """
+    needed = _replica_wait_count()
+    if isinstance(acked, int) and acked < needed:
+        logger.warning(
+            "Redis WAIT timed out with %d of %d replicas; other workers may read a stale turn", acked, needed
+        )
+
+
+def _replica_wait(target: Any) -> bool:
+    """
+    レプリカ読み込みが有効なら、セッションの書き込み後に WAIT でレプリカへの複製を待つ
+    With replica reads on, WAIT after a session write so it reaches the replicas.
+
+    ターン・履歴・フィールド・決定事項の保存、リセット、ジャーナルの再生のすべてで使います。
+    Used by every session write: turns, history, fields, decisions, resets and journal replay.
+
+    target はパイプライン（WAIT を積む）またはクライアント（すぐ送る）です。
+    MULTI/EXEC の中では使えないため、トランザクションの後にクライアントへ送ります。
+    The target is a pipeline (the WAIT is queued) or a client (it is sent at
+    once). WAIT cannot run inside MULTI/EXEC, so transactions send it to the
+    client afterwards.
+
+    他のワーカーが次のターンをレプリカから読んでも、保存済みの履歴が見えるようにします
+    （レプリカ読み込みは REDIS_REPLICA_WAIT_MS > 0 のときだけ有効です）。WAIT が時間切れでも
+    エラーにはせず警告します。パイプラインでは WAIT を積んだかを返し、結果は呼び出し側が
+    _check_replica_wait で確認します。
+    Other workers reading the next turn from a replica then see the saved
+    history (replica reads are only enabled with REDIS_REPLICA_WAIT_MS > 0). A
+    WAIT that times out is logged, not treated as an error. Returns whether a
+    WAIT was issued; for a pipeline the caller checks its result with
+    _check_replica_wait.
+    """
+    if REDIS_REPLICA_WAIT_MS <= 0 or _replica_set() is None:
+        return False
+    acked = target.wait(_replica_wait_count(), REDIS_REPLICA_WAIT_MS)
+    _check_replica_wait(acked)
+    return True
 
 
 def _memory_set(key: str, value: str) -> None:
@@ -228,9 +686,7 @@ def _memory_set(key: str, value: str) -> None:
     フォールバック用メモリストアにTTL付きで値を保存する
     Save a value in the fallback in-memory store with TTL metadata.
     """
-    ttl = REDIS_SESSION_TTL_SECONDS if REDIS_SESSION_TTL_SECONDS > 0 else None
-    expires_at = time.time() + ttl if ttl else None
-    _memory_store[key] = (value, expires_at)
+    _memory_store.set_value(key, value, REDIS_SESSION_TTL_SECONDS if REDIS_SESSION_TTL_SECONDS > 0 else None)
 
 
 def _memory_get(key: str) -> Optional[str]:
@@ -238,14 +694,7 @@ def _memory_get(key: str) -> Optional[str]:
     フォールバック用メモリストアから値を取得し期限切れを処理する
     Read a value from fallback memory and evict it if expired.
     """
-    item = _memory_store.get(key)
-    if not item:
-        return None
-    value, expires_at = item
-    if expires_at and time.time() > expires_at:
-        _memory_store.pop(key, None)
-        return None
-    return value
+    return _memory_store.get_value(key)
 
 
 def _memory_delete(*keys: str) -> None:
@@ -262,204 +711,1701 @@ def get_session_key(session_id: str, key_type: str) -> str:
     セッションIDに基づいたRedisキーを生成する
     Build a Redis key from session ID and key type.
 
-    例: session:abc-123:chat_history
-    Example: session:abc-123:chat_history
+    例: session:abc-123:chat_history（cluster では session:{abc-123}:chat_history）
+    Example: session:abc-123:chat_history (session:{abc-123}:chat_history in cluster mode)
+    """
+    return f"session:{hash_tag(session_id)}:{key_type}"
+
+
+# 値のエンコード形式（先頭のマーカーで判別するため、旧形式の平文もそのまま読める）
+# - 平文: 閾値未満の値と旧形式の値
+# - "\x1fz1:" + base64(zlib): REDIS_COMPRESS_MIN_BYTES 以上で、圧縮により小さくなる値
+# Value encodings, told apart by a leading marker so legacy plain values still read
+# - plain: values below the threshold and all legacy values
+# - "\x1fz1:" + base64(zlib): values of at least REDIS_COMPRESS_MIN_BYTES that shrink
+_CODEC_MARKER = "\x1f"
+_CODEC_ZLIB_V1 = "\x1fz1:"
+# 圧縮する最小バイト数（UTF-8、0 で無効）/ Minimum UTF-8 size to compress (0 disables)
+REDIS_COMPRESS_MIN_BYTES = max(0, _env_int("REDIS_COMPRESS_MIN_BYTES", 1024))
+REDIS_COMPRESS_LEVEL = min(max(_env_int("REDIS_COMPRESS_LEVEL", 6), 1), 9)
+
+
+def _encode_value(text: str) -> str:
+    """
+    保存する値をエンコードする（閾値以上なら zlib 圧縮して版付きで保存）
+    Encode a value for storage, compressing it with a version marker above the threshold.
+
+    クライアントは decode_responses=True のため、圧縮結果は base64 の文字列にします。
+    The client uses decode_responses=True, so compressed bytes are stored as base64 text.
     """
-    return f"session:{session_id}:{key_type}"
+    if REDIS_COMPRESS_MIN_BYTES <= 0 or len(text) * 4 < REDIS_COMPRESS_MIN_BYTES:
+        return text
+    raw = text.encode("utf-8")
+    if len(raw) < REDIS_COMPRESS_MIN_BYTES:
+        return text
+    packed = _CODEC_ZLIB_V1 + base64.b64encode(zlib.compress(raw, REDIS_COMPRESS_LEVEL)).decode("ascii")
+    return packed if len(packed) < len(raw) else text
 
 
-def _set_with_ttl(key: str, value: str) -> None:
+def _decode_value(value: Optional[str]) -> Optional[str]:
     """
-    TTL（有効期限）付きで値を設定するヘルパー関数
-    Helper to set a value with TTL.
+    保存された値を元の文字列に戻す（平文はそのまま返す）
+    Decode a stored value back to text; plain values are returned unchanged.
+
+    未知の版や壊れた値は ValueError を送出します。
+    Raises ValueError for unknown versions or corrupt payloads.
     """
-    client = get_redis_client()
+    if not value or not value.startswith(_CODEC_MARKER):
+        return value
+    if value.startswith(_CODEC_ZLIB_V1):
+        try:
+            return zlib.decompress(base64.b64decode(value[len(_CODEC_ZLIB_V1) :])).decode("utf-8")
+        except (zlib.error, ValueError) as e:
+            raise ValueError(f"Corrupt compressed value: {e}") from e
+    raise ValueError(f"Unknown value encoding: {value[:4]!r}")
+
+
+def _decode_values(session_id: str, values: Sequence[Optional[str]]) -> List[Optional[str]]:
+    """
+    フィールド値をまとめてデコードする（壊れた値は None として扱う）
+    Decode field values, treating undecodable ones as missing.
+    """
+    decoded: List[Optional[str]] = []
+    for value in values:
+        try:
+            decoded.append(_decode_value(value))
+        except ValueError as e:
+            logger.error("Invalid session value for %s: %s", session_id, e)
+            decoded.append(None)
+    return decoded
+
+
+# セッション保存レイアウト
+# - keys: 従来どおり項目ごとの文字列キー（session:<id>:<field>）
+# - hash: セッション全体を1つのハッシュ（session:<id>）に保存し、TTL も1つにまとめる
+# Session storage layout
+# - keys: one string key per field (session:<id>:<field>), the legacy layout
+# - hash: the whole session in one hash (session:<id>) with a single TTL
+LAYOUT_KEYS = "keys"
+LAYOUT_HASH = "hash"
+REDIS_SESSION_LAYOUT = os.getenv("REDIS_SESSION_LAYOUT", LAYOUT_KEYS).strip().lower()
+if REDIS_SESSION_LAYOUT not in (LAYOUT_KEYS, LAYOUT_HASH):
+    logger.warning("Unknown REDIS_SESSION_LAYOUT=%s; using %s", REDIS_SESSION_LAYOUT, LAYOUT_KEYS)
+    REDIS_SESSION_LAYOUT = LAYOUT_KEYS
+
+SESSION_FIELDS = (
+    "chat_history",
+    "decision",
+    "decision_turn",
+    "decision_llm_turn",
+    "user_language",
+    "user_type",
+)
+
+# 旧レイアウトのキーをハッシュへ移す（ハッシュが既にあれば何もしない）
+# KEYS[1]: ハッシュ, KEYS[2..]: 旧キー / ARGV[1]: TTL, ARGV[2..]: 旧キーに対応するフィールド名
+# Move legacy keys into the hash (no-op when the hash already exists)
+# KEYS[1]: hash, KEYS[2..]: legacy keys / ARGV[1]: TTL, ARGV[2..]: field for each legacy key
+_MIGRATE_SESSION_SCRIPT = """
+local hash_key = KEYS[1]
+if redis.call("exists", hash_key) == 1 then
+    return 0
+end
+local moved = 0
+for i = 2, #KEYS do
+    local value = redis.call("get", KEYS[i])
+    if value then
+        redis.call("hset", hash_key, ARGV[i], value)
+        moved = moved + 1
+    end
+end
+if moved > 0 then
+    redis.call("del", unpack(KEYS, 2))
+    local ttl = tonumber(ARGV[1])
+    if ttl > 0 then
+        redis.call("expire", hash_key, ttl)
+    end
+end
+return moved
+"""
+
+
+def get_session_hash_key(session_id: str) -> str:
+    """
+    ハッシュレイアウトでのセッションキーを返す
+    Return the session key used by the hash layout.
+
+    例: session:abc-123（cluster では session:{abc-123}）
+    Example: session:abc-123 (session:{abc-123} in cluster mode)
+    """
+    return f"session:{hash_tag(session_id)}"
+
+
+def _migration_args(session_id: str) -> Tuple[List[str], List[Any]]:
+    """
+    移行スクリプト用の KEYS と ARGV を組み立てる
+    Build KEYS and ARGV for the migration script.
+    """
+    keys = [get_session_hash_key(session_id)] + [get_session_key(session_id, name) for name in SESSION_FIELDS]
+    args: List[Any] = [REDIS_SESSION_TTL_SECONDS] + list(SESSION_FIELDS)
+    return keys, args
+
+
+def migrate_session_to_hash(session_id: str) -> int:
+    """
+    旧レイアウトのキーをハッシュへ移し、移したフィールド数を返す
+    Move legacy per-field keys into the session hash; return the number of fields moved.
+    """
+    client = client_for(session_id)
     if not client:
+        return 0
+    keys, args = _migration_args(session_id)
+    try:
+        moved = int(client.eval(_MIGRATE_SESSION_SCRIPT, len(keys), *keys, *args) or 0)
+    except Exception as e:
+        _mark_unhealthy("eval", e)
+        return 0
+    _mark_migrated(session_id)
+    return moved
+
+
+# 旧キーの移行を確認済みのセッション（プロセスごと）。確認後の書き込みは移行 EVAL を送らない
+# Sessions whose migration this process has confirmed; later writes skip the migration EVAL
+_MIGRATED_MARKERS_MAX = 10000
+_migrated_sessions = near_cache.LocalCache(0, _MIGRATED_MARKERS_MAX)
+
+
+def _mark_migrated(session_id: str) -> None:
+    """
+    セッションのハッシュが存在する（移行済みか旧キーが無い）と記録する
+    Record that the session's hash exists, i.e. it is migrated or never had legacy keys.
+    """
+    key = get_session_hash_key(session_id)
+    _migrated_sessions.fill(key, _migrated_sessions.reserve(key), True)
+
+
+def _is_migrated(session_id: str) -> bool:
+    """このプロセスで移行を確認済みか / Whether this process has confirmed the session's migration."""
+    hit, _ = _migrated_sessions.get(get_session_hash_key(session_id))
+    return hit
+
+
+def _hash_read(client: Any, session_id: str, fields: Sequence[str]) -> List[Optional[str]]:
+    """
+    ハッシュからフィールドを読む（全て空なら旧キーを移行して読み直す）
+    Read fields from the hash, migrating legacy keys first when none are present.
+    """
+    values = _fetch_fields(client, session_id, fields)
+    if any(value is not None for value in values):
+        _mark_migrated(session_id)
+        return values
+    if migrate_session_to_hash(session_id) > 0:
+        values = _fetch_fields(client, session_id, fields)
+    return values
+
+
+def _fetch_fields(client: Any, session_id: str, fields: Sequence[str]) -> List[Optional[str]]:
+    """
+    フィールドの生の値を1コマンドで読む（hash は HMGET、keys は GET/MGET。移行はしない）
+    Read raw field values in one command (HMGET, or GET/MGET for keys) without migrating.
+    """
+    if REDIS_SESSION_LAYOUT == LAYOUT_HASH:
+        return list(client.hmget(get_session_hash_key(session_id), list(fields)))
+    keys = [get_session_key(session_id, name) for name in fields]
+    if len(keys) == 1:
+        return [client.get(keys[0])]
+    return list(client.mget(keys))
+
+
+def _read_fields(session_id: str, fields: Sequence[str]) -> List[Optional[str]]:
+    """
+    セッションのフィールドを1往復で読む（レイアウトとフォールバックを吸収する）
+    Read session fields in one round trip, handling layout and fallback.
+
+    レプリカ読み込みが有効なら先にレプリカを試し、値が無ければプライマリで読みます。
+    With replica reads enabled, a replica is tried first and the primary is read on a miss.
+    """
+    keys = [get_session_key(session_id, name) for name in fields]
+    try:
+        client = client_for(session_id)
+        if client:
+            values = _read_from_replica(
+                session_id,
+                lambda replica: _fetch_fields(replica, session_id, fields),
+                lambda raw: any(value is not None for value in raw),
+            )
+            if values is not None:
+                return _decode_values(session_id, values)
+            if REDIS_SESSION_LAYOUT == LAYOUT_HASH:
+                return _decode_values(session_id, _hash_read(client, session_id, fields))
+            return _decode_values(session_id, _fetch_fields(client, session_id, fields))
+        if _should_use_fallback():
+            logger.warning("Redis client is not available; using in-memory fallback.")
+            return _decode_values(session_id, [_memory_get(key) for key in keys])
+    except Exception as e:
+        _mark_unhealthy("get", e)
         if _should_use_fallback():
-            _memory_set(key, value)
+            return _decode_values(session_id, [_memory_get(key) for key in keys])
+    return [None] * len(keys)
+
+
+# ニアキャッシュの対象（ほぼ変わらないフィールド）/ Near-cached fields (rarely change)
+NEAR_CACHE_FIELDS = ("user_language", "user_type")
+
+
+def _near_cache_keys(session_id: str, fields: Sequence[str] = NEAR_CACHE_FIELDS) -> List[str]:
+    """
+    fields のうちニアキャッシュ対象のフィールドのキー
+    Near-cache keys of the near-cached fields among fields.
+    """
+    return [get_session_key(session_id, name) for name in NEAR_CACHE_FIELDS if name in fields]
+
+
+def _near_cache_enabled() -> bool:
+    """
+    ニアキャッシュを使う構成か（standalone の keys レイアウトのみ）
+    Whether the near-cache is in use (standalone mode with the keys layout only).
+
+    hash レイアウトではターンごとの書き込みと TTL 延長がハッシュ全体を無効化するため使いません。
+    The hash layout is excluded: every turn writes and re-expires the whole
+    hash, which would invalidate the cached fields each time.
+    """
+    return (
+        REDIS_NEAR_CACHE
+        and REDIS_MODE == MODE_STANDALONE
+        and not REDIS_SENTINELS
+        and REDIS_SESSION_LAYOUT == LAYOUT_KEYS
+    )
+
+
+def _near_cache_client() -> Optional[Any]:
+    """
+    ニアキャッシュ用の追跡付きクライアント（無効・対象外の構成・リスナー切断中は None）
+    Tracked client for near-cached reads; None when disabled, in an unsupported
+    configuration, or while the listener is disconnected.
+
+    無効化リスナーはプロセスごとに初回利用時に起動します。
+    The invalidation listener starts on first use in each process.
+    """
+    global _near_cache_listener
+    if not _near_cache_enabled():
+        return None
+    listener = _near_cache_listener
+    if listener is None or listener.pid != os.getpid():
+        with _redis_lock:
+            if _near_cache_listener is None or _near_cache_listener.pid != os.getpid():
+                _near_cache.clear()
+                _near_cache_listener = near_cache.InvalidationListener(
+                    REDIS_URL,
+                    _near_cache,
+                    _pool_options(),
+                    retry_delay=REDIS_RECONNECT_MIN_INTERVAL_SECONDS,
+                    health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+                )
+                _near_cache_listener.start()
+            listener = _near_cache_listener
+    return listener.client
+
+
+def _read_near_cached(session_id: str, name: str) -> Optional[str]:
+    """
+    ほぼ変わらないフィールドをニアキャッシュ経由で読む（使えなければ通常の読み込み）
+    Read a rarely changing field through the near-cache, or normally when it is unavailable.
+    """
+    client = _near_cache_client() if _near_cache_enabled() and get_redis_client() is not None else None
+    if client is None:
+        (value,) = _read_fields(session_id, (name,))
+        return value
+    key = get_session_key(session_id, name)
+    hit, cached = _near_cache.get(key)
+    if hit:
+        metrics.REDIS_NEAR_CACHE_READS.labels(result="hit").inc()
+        return cached
+    token = _near_cache.reserve(key)
+    try:
+        raw = _fetch_fields(client, session_id, (name,))
+    except Exception as e:
+        logger.warning("Redis near-cache read failed; reading directly: %s", e)
+        metrics.REDIS_NEAR_CACHE_READS.labels(result="error").inc()
+        (value,) = _read_fields(session_id, (name,))
+        return value
+    metrics.REDIS_NEAR_CACHE_READS.labels(result="miss").inc()
+    (value,) = _decode_values(session_id, raw)
+    _near_cache.fill(key, token, value)
+    return value
+
+
+def _known_value(session_id: str, name: str) -> Optional[str]:
+    """
+    I/O 無しで分かるフィールドの現在値（有効なスナップショットかニアキャッシュ。不明なら None）
+    A field's current value when known without I/O (active snapshot or
+    near-cache), or None when unknown.
+    """
+    snapshot = _snapshot_for(session_id)
+    if snapshot is not None and getattr(snapshot, name) is not None:
+        return getattr(snapshot, name)
+    if _near_cache_enabled():
+        hit, cached = _near_cache.get(get_session_key(session_id, name))
+        if hit:
+            return cached
+    return None
+
+
+def _queue_field_writes(pipe: Any, session_id: str, values: Dict[str, str], refresh_ttl: bool = False) -> None:
+    """
+    エンコード済みのフィールド書き込みをパイプラインに積む
+    Queue writes of encoded fields on a pipeline.
+
+    hash レイアウトでは、このプロセスで移行を確認していないセッションに限り、
+    書き込みの前に旧キーの移行を積みます（旧キーを残したままハッシュを作らないため）。
+    In the hash layout the legacy-key migration is queued before the write
+    only for sessions this process has not confirmed yet, so a hash is never
+    created while legacy keys remain.
+    """
+    if REDIS_SESSION_LAYOUT != LAYOUT_HASH:
+        for name, value in values.items():
+            key = get_session_key(session_id, name)
+            if REDIS_SESSION_TTL_SECONDS > 0:
+                pipe.setex(key, REDIS_SESSION_TTL_SECONDS, value)
+            else:
+                pipe.set(key, value)
         return
+    hash_key = get_session_hash_key(session_id)
+    if not _is_migrated(session_id):
+        keys, args = _migration_args(session_id)
+        pipe.eval(_MIGRATE_SESSION_SCRIPT, len(keys), *keys, *args)
+    pipe.hset(hash_key, mapping=values)
+    if REDIS_SESSION_TTL_SECONDS > 0:
+        pipe.expire(hash_key, REDIS_SESSION_TTL_SECONDS, nx=not refresh_ttl)
+
+
+def _write_fields(session_id: str, values: Dict[str, str], refresh_ttl: bool = False) -> None:
+    """
+    セッションのフィールドを書き込む
+    Write session fields.
+
+    hash レイアウトでは移行（未確認のセッションのみ）・HSET・EXPIRE を1回のパイプラインで
+    送ります。TTL は refresh_ttl=True（履歴保存＝1ターンに1回）のときだけ延長し、それ以外は
+    TTL 未設定の場合のみ設定します。
+    In the hash layout, migration (for unconfirmed sessions only), HSET and
+    EXPIRE go in one pipeline. The TTL
+    is extended only with refresh_ttl=True (history saves, once per turn);
+    other writes only set it when missing.
+
+    レプリカ読み込みが有効なら書き込み後に WAIT で複製を待ちます（_replica_wait）。
+    With replica reads on, the write WAITs for the replicas (_replica_wait).
+    """
+    values = {name: _encode_value(value) for name, value in values.items()}
+    client = client_for(session_id)
+    if client:
+        _note_write(session_id, tuple(values))
+        try:
+            if REDIS_SESSION_LAYOUT == LAYOUT_HASH:
+                pipe = client.pipeline(transaction=False)
+                _queue_field_writes(pipe, session_id, values, refresh_ttl)
+                waited = _replica_wait(pipe)
+                results = pipe.execute()
+                _mark_migrated(session_id)
+                if waited:
+                    _check_replica_wait(results[-1])
+            else:
+                for name, value in values.items():
+                    key = get_session_key(session_id, name)
+                    if REDIS_SESSION_TTL_SECONDS > 0:
+                        client.setex(key, REDIS_SESSION_TTL_SECONDS, value)
+                    else:
+                        client.set(key, value)
+                _replica_wait(client)
+            return
+        except Exception as e:
+            _mark_unhealthy("hset" if REDIS_SESSION_LAYOUT == LAYOUT_HASH else "set", e)
+    if _should_use_fallback():
+        _fallback_write_fields(session_id, values)
+
+
+def _fallback_write_fields(session_id: str, values: Dict[str, str]) -> None:
+    """
+    エンコード済みのフィールドをフォールバック用メモリストアへ書き、ジャーナルに記録する
+    Write encoded fields to the fallback store and record them in the journal.
+    """
+    for name, value in values.items():
+        _memory_set(get_session_key(session_id, name), value)
+    _journal_record(session_id, write_journal.OP_FIELDS, values)
+
+
+# チャット履歴は追記専用のリスト（session:<id>:chat_log、1要素＝1発話の JSON [role, text]）
+# 1ターンの保存は RPUSH/LTRIM/EXPIRE の1往復で、履歴全体を書き直しません。
+# Chat history is an append-only list (session:<id>:chat_log, one JSON [role, text]
+# per message). Saving a turn is one RPUSH/LTRIM/EXPIRE round trip instead of
+# rewriting the whole history.
+CHAT_LOG_KEY_TYPE = "chat_log"
+# 保持・読み込みする直近の発話数（0 は無制限）。ターン番号は履歴の長さではなく
+# ターンの通し番号（TURN_KEY_TYPE）で数えるため、上限を設けても増え続けます。
+# Most recent messages kept and read (0 = unlimited). Turn numbers come from the
+# per-session turn counter (TURN_KEY_TYPE), not the history length, so they keep
+# growing under a cap.
+CHAT_HISTORY_MAX_ENTRIES = max(0, _env_int("CHAT_HISTORY_MAX_ENTRIES", 0))
+
+
+def _history_window(history: Sequence[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """
+    保持上限に収まる直近の履歴を返す
+    Return the most recent messages within the retention cap.
+    """
+    history = [tuple(item) for item in history]
+    if CHAT_HISTORY_MAX_ENTRIES > 0:
+        return history[-CHAT_HISTORY_MAX_ENTRIES:]
+    return history
+
+
+# 履歴要素の役割コード（旧形式の "human"/"assistant" 文字列もそのまま読める）
+# Role codes in history elements (legacy "human"/"assistant" strings still decode)
+_ROLE_CODES = {"human": 0, "assistant": 1}
+_ROLE_NAMES = {code: role for role, code in _ROLE_CODES.items()}
+
+
+def _encode_entries(entries: Sequence[Tuple[str, str]]) -> List[str]:
+    """
+    発話をリスト要素（JSON [役割コード, text]）に変換する
+    Encode messages as list elements (JSON [role code, text]).
+    """
+    return [
+        _encode_value(serialization.dumps([_ROLE_CODES.get(role, role), text]))
+        for role, text in entries
+    ]
+
+
+def _decode_entries(raw_entries: Sequence[str]) -> List[Tuple[str, str]]:
+    """
+    リスト要素（JSON）を発話のタプルに戻す
+    Decode list elements (JSON) back into message tuples.
+    """
+    entries: List[Tuple[str, str]] = []
+    for item in raw_entries:
+        role, text = serialization.loads(_decode_value(item))
+        entries.append((_ROLE_NAMES.get(role, role), text))
+    return entries
+
+
+def _queue_history_push(pipe: Any, session_id: str, encoded: Sequence[str]) -> None:
+    """
+    追記・上限での切り詰め・TTL 延長をパイプラインに積む
+    Queue the append, the trim to the cap and the TTL refresh on a pipeline.
+
+    hash レイアウトではセッションのハッシュの TTL もここで延長します（1ターンに1回）。
+    In the hash layout the session hash TTL is refreshed here too (once per turn).
+    """
+    log_key = get_session_key(session_id, CHAT_LOG_KEY_TYPE)
+    if encoded:
+        pipe.rpush(log_key, *encoded)
+    if CHAT_HISTORY_MAX_ENTRIES > 0:
+        pipe.ltrim(log_key, -CHAT_HISTORY_MAX_ENTRIES, -1)
+    if REDIS_SESSION_TTL_SECONDS > 0:
+        pipe.expire(log_key, REDIS_SESSION_TTL_SECONDS)
+        if REDIS_SESSION_LAYOUT == LAYOUT_HASH:
+            pipe.expire(get_session_hash_key(session_id), REDIS_SESSION_TTL_SECONDS)
+
+
+def _queue_legacy_history_delete(pipe: Any, session_id: str) -> None:
+    """
+    旧形式（JSON 文字列）の履歴を削除するコマンドを積む
+    Queue deletion of the legacy JSON-string history.
+    """
+    if REDIS_SESSION_LAYOUT == LAYOUT_HASH:
+        pipe.hdel(get_session_hash_key(session_id), "chat_history")
+    else:
+        pipe.delete(get_session_key(session_id, "chat_history"))
+
+
+def _queue_history_replace(pipe: Any, session_id: str, history: Sequence[Tuple[str, str]]) -> None:
+    """
+    履歴リストを丸ごと置き換えるコマンドを積む（旧形式の履歴も削除する）
+    Queue commands that replace the whole history list, dropping any legacy history.
+    """
+    pipe.delete(get_session_key(session_id, CHAT_LOG_KEY_TYPE))
+    _queue_history_push(pipe, session_id, _encode_entries(history))
+    _queue_legacy_history_delete(pipe, session_id)
+
+
+def _memory_history(session_id: str) -> List[Tuple[str, str]]:
+    """
+    フォールバック用メモリストアの履歴（JSON 文字列で保持）を返す
+    Return history from the fallback in-memory store (kept as a JSON string).
+    """
     try:
-        if REDIS_SESSION_TTL_SECONDS > 0:
-            client.setex(key, REDIS_SESSION_TTL_SECONDS, value)
-        else:
-            client.set(key, value)
+        return _history_window(_decode_history(_memory_get(get_session_key(session_id, "chat_history"))))
+    except (TypeError, ValueError) as e:
+        logger.error("Invalid chat history for %s: %s", session_id, e)
+        return []
+
+
+def _memory_save_history(session_id: str, history: Sequence[Tuple[str, str]]) -> None:
+    """
+    フォールバック用メモリストアに履歴を保存する
+    Save history in the fallback in-memory store.
+    """
+    _memory_set(
+        get_session_key(session_id, "chat_history"),
+        serialization.dumps(_history_window(history)),
+    )
+
+
+def _fallback_append_history(session_id: str, entries: Sequence[Tuple[str, str]]) -> None:
+    """
+    フォールバック用メモリストアの履歴に追記し、ジャーナルに記録する
+    Append to the fallback history and record it in the journal.
+    """
+    _memory_save_history(session_id, _memory_history(session_id) + list(entries))
+    _journal_record(session_id, write_journal.OP_APPEND, list(entries))
+
+
+def _fallback_replace_history(session_id: str, history: Sequence[Tuple[str, str]]) -> None:
+    """
+    フォールバック用メモリストアの履歴を置き換え、ジャーナルに記録する
+    Replace the fallback history and record it in the journal.
+    """
+    _memory_save_history(session_id, history)
+    _journal_record(session_id, write_journal.OP_REPLACE, list(history))
+
+
+# 履歴リストが空のときだけ旧形式の履歴で初期化し、旧形式の値を削除する
+# KEYS[1]: 履歴リスト, KEYS[2]: 旧形式の履歴を持つキー（hash レイアウトではセッションのハッシュ）
+# ARGV[1]: TTL, ARGV[2]: 履歴の上限, ARGV[3]: hash レイアウトなら "1", ARGV[4..]: エンコード済みの発話
+# Seed the history list from the legacy history only while the list is empty, then drop the legacy value
+# KEYS[1]: history list, KEYS[2]: key holding the legacy history (the session hash in the hash layout)
+# ARGV[1]: TTL, ARGV[2]: history cap, ARGV[3]: "1" in the hash layout, ARGV[4..]: encoded entries
+_SEED_HISTORY_SCRIPT = """
+local log_key = KEYS[1]
+local legacy_key = KEYS[2]
+local ttl = tonumber(ARGV[1])
+local max_entries = tonumber(ARGV[2])
+local seeded = 0
+if redis.call("llen", log_key) == 0 then
+    redis.call("rpush", log_key, unpack(ARGV, 4))
+    if max_entries > 0 then
+        redis.call("ltrim", log_key, -max_entries, -1)
+    end
+    if ttl > 0 then
+        redis.call("expire", log_key, ttl)
+    end
+    seeded = 1
+end
+if ARGV[3] == "1" then
+    redis.call("hdel", legacy_key, "chat_history")
+    if ttl > 0 then
+        redis.call("expire", legacy_key, ttl)
+    end
+else
+    redis.call("del", legacy_key)
+end
+return seeded
+"""
+
+
+def _seed_history_from_legacy(client: Any, session_id: str, legacy: Optional[str]) -> List[Tuple[str, str]]:
+    """
+    読み込み済みの旧形式の履歴をリストへ移し、その内容を返す（初回アクセス時のみ）
+    Move an already-read legacy JSON-string history into the list on first access and return it.
+
+    移す処理はリストが空のときだけ書き込むスクリプトで行うため、同時に初期化しても重複しません。
+    The move runs as a script that only writes while the list is empty, so concurrent seeding cannot duplicate it.
+    """
+    if legacy is None:
+        return []
+    try:
+        history = _history_window(_decode_history(legacy))
+    except (TypeError, ValueError) as e:
+        logger.error("Invalid chat history for %s: %s", session_id, e)
+        return []
+    if not history:
+        return []
+    hash_layout = REDIS_SESSION_LAYOUT == LAYOUT_HASH
+    legacy_key = get_session_hash_key(session_id) if hash_layout else get_session_key(session_id, "chat_history")
+    try:
+        client.eval(
+            _SEED_HISTORY_SCRIPT,
+            2,
+            get_session_key(session_id, CHAT_LOG_KEY_TYPE),
+            legacy_key,
+            REDIS_SESSION_TTL_SECONDS,
+            CHAT_HISTORY_MAX_ENTRIES,
+            "1" if hash_layout else "0",
+            *_encode_entries(history),
+        )
     except Exception as e:
-        _mark_unhealthy("set", e)
+        _mark_unhealthy("eval", e)
+    return history
+
+
+def _fetch_history(client: Any, session_id: str, fields: Sequence[str], migrate: bool = False) -> List[Any]:
+    """
+    履歴の窓と生のフィールド値（末尾に旧形式の履歴）を1回のパイプラインで読む
+    Read the history window and raw field values, with the legacy history last, in one pipeline.
+
+    migrate なら同じパイプラインの先頭で旧キーをハッシュへ移すため、読み直しは不要です。
+    With migrate, legacy keys are moved into the hash at the head of the same pipeline, so no re-read is needed.
+    """
+    start = -CHAT_HISTORY_MAX_ENTRIES if CHAT_HISTORY_MAX_ENTRIES > 0 else 0
+    names = list(fields) + ["chat_history"]
+    pipe = client.pipeline(transaction=False)
+    if migrate:
+        keys, args = _migration_args(session_id)
+        pipe.eval(_MIGRATE_SESSION_SCRIPT, len(keys), *keys, *args)
+    pipe.lrange(get_session_key(session_id, CHAT_LOG_KEY_TYPE), start, -1)
+    if REDIS_SESSION_LAYOUT == LAYOUT_HASH:
+        pipe.hmget(get_session_hash_key(session_id), names)
+    else:
+        pipe.mget([get_session_key(session_id, name) for name in names])
+    results = pipe.execute()
+    return results[1:] if migrate else results
+
+
+def _read_history(session_id: str, fields: Sequence[str] = ()) -> Tuple[List[Tuple[str, str]], List[Optional[str]]]:
+    """
+    履歴（直近の窓）と指定フィールドを1往復で読む
+    Read the history window and the given fields in one round trip.
+
+    レプリカ読み込みが有効なら先にレプリカを試し、履歴が無ければプライマリで読みます。
+    hash レイアウトで移行を確認していないセッションは、移行と読み込みを同じパイプラインで
+    プライマリに送ります。
+    With replica reads enabled, a replica is tried first and the primary is read when it has no history.
+    In the hash layout, sessions whose migration is unconfirmed are read from the primary,
+    with the migration in the same pipeline.
+    """
+    keys = [get_session_key(session_id, name) for name in fields]
+    client = client_for(session_id)
+    if not client:
         if _should_use_fallback():
-            _memory_set(key, value)
+            logger.warning("Redis client is not available; using in-memory fallback.")
+            return _memory_history(session_id), _decode_values(session_id, [_memory_get(key) for key in keys])
+        return [], [None] * len(keys)
+
+    migrate = REDIS_SESSION_LAYOUT == LAYOUT_HASH and not _is_migrated(session_id)
+    results = None
+    if not migrate:
+        results = _read_from_replica(
+            session_id,
+            lambda replica: _fetch_history(replica, session_id, fields),
+            lambda raw: bool(raw[0]),
+        )
+    if results is None:
+        try:
+            results = _fetch_history(client, session_id, fields, migrate=migrate)
+        except Exception as e:
+            _mark_unhealthy("lrange", e)
+            if _should_use_fallback():
+                return _memory_history(session_id), _decode_values(session_id, [_memory_get(key) for key in keys])
+            return [], [None] * len(keys)
+
+    raw_values = list(results[1])
+    legacy = raw_values.pop()
+    values = _decode_values(session_id, raw_values)
+    if migrate and (legacy is not None or any(value is not None for value in values)):
+        _mark_migrated(session_id)
+    if not results[0]:
+        (legacy,) = _decode_values(session_id, [legacy])
+        return _seed_history_from_legacy(client, session_id, legacy), values
+    try:
+        return _decode_entries(results[0]), values
+    except (TypeError, ValueError) as e:
+        logger.error("Invalid chat history for %s: %s", session_id, e)
+        return [], values
+
+
+@dataclass
+class SessionSnapshot:
+    """
+    チャット1ターンで使うセッション状態（1往復でまとめて読み込む）
+    Session state used by one chat turn, loaded in a single round trip.
+
+    ニアキャッシュ使用時は user_language / user_type を読み込まず None のままにし、
+    get_user_language / get_user_type はニアキャッシュから返します。
+    With the near-cache in use, user_language and user_type are not loaded and
+    stay None; get_user_language and get_user_type serve them from the near-cache.
+    """
+
+    session_id: str
+    chat_history: List[Tuple[str, str]] = field(default_factory=list)
+    decision: str = ""
+    user_language: Optional[str] = ""
+    user_type: Optional[str] = ""
+    decision_llm_turn: int = -1
 
 
+_SNAPSHOT_FIELDS = ("decision", "user_language", "user_type", "decision_llm_turn")
+
+# リクエスト中に有効なスナップショット（同じキーを各層で読み直さないため）
+# Snapshot active for the current request, so no layer re-reads the same key
+_active_snapshot: ContextVar[Optional[SessionSnapshot]] = ContextVar("session_snapshot", default=None)
+
+
+def _decode_history(data: Optional[str]) -> List[Tuple[str, str]]:
+    """
+    保存形式のチャット履歴をタプルのリストに変換する
+    Decode stored chat history into a list of tuples.
+    """
+    if not data:
+        return []
+    # JSONのリスト[role, text]をタプル(role, text)に変換
+    # Convert JSON list [role, text] to tuples
+    return [tuple(item) for item in serialization.loads(data)]
+
+
+def _parse_turn(data: Optional[str]) -> int:
+    """
+    保存されたターン番号を整数にする（未保存・不正値は -1）
+    Parse a stored turn number (-1 when missing or invalid).
+    """
+    try:
+        return int(data) if data is not None else -1
+    except (TypeError, ValueError):
+        return -1
+
+
+@tracing.traced("redis.load_session_snapshot")
+def load_session_snapshot(session_id: str) -> SessionSnapshot:
+    """
+    履歴・決定事項・言語・ユーザー種別を1往復でまとめて読み込む（LRANGE と MGET / HMGET のパイプライン）
+    Load history, decision, language and user type in one round trip
+    (LRANGE pipelined with MGET / HMGET).
+
+    use_session_snapshot() で有効化すると、同じリクエスト内の get_* は
+    Redis を読まずにこのスナップショットを返し、save_* は書き込み後に更新します。
+    Once activated with use_session_snapshot(), get_* calls in the same request
+    are served from it without touching Redis, and save_* calls keep it current.
+
+    ニアキャッシュ使用時は言語とユーザー種別を読まず、ニアキャッシュに任せます。
+    With the near-cache in use, language and user type are left to it and not read here.
+    """
+    fields = _SNAPSHOT_FIELDS
+    if _near_cache_enabled():
+        fields = tuple(name for name in fields if name not in NEAR_CACHE_FIELDS)
+    chat_history, raw = _read_history(session_id, fields)
+    values = dict(zip(fields, raw))
+    return SessionSnapshot(
+        session_id=session_id,
+        chat_history=chat_history,
+        decision=values["decision"] or "",
+        user_language=(values["user_language"] or "") if "user_language" in values else None,
+        user_type=(values["user_type"] or "") if "user_type" in values else None,
+        decision_llm_turn=_parse_turn(values["decision_llm_turn"]),
+    )
+
+
+@contextmanager
+def use_session_snapshot(snapshot: Optional[SessionSnapshot]) -> Iterator[None]:
+    """
+    ブロック内でスナップショットを有効にする（None なら何もしない）
+    Activate a snapshot for the block; a no-op for None.
+    """
+    if snapshot is None:
+        yield
+        return
+    token = _active_snapshot.set(snapshot)
+    try:
+        yield
+    finally:
+        try:
+            _active_snapshot.reset(token)
+        except ValueError:
+            # ストリーム生成器が別コンテキストで閉じられた場合
+            # The stream generator was closed from another context
+            _active_snapshot.set(None)
+
+
+def _snapshot_for(session_id: str) -> Optional[SessionSnapshot]:
+    """
+    指定セッションの有効なスナップショット（無ければ None）
+    Return the active snapshot for a session, or None.
+    """
+    snapshot = _active_snapshot.get()
+    if snapshot is not None and snapshot.session_id == session_id:
+        return snapshot
+    return None
+
+
+def _update_snapshot(session_id: str, **values: Any) -> None:
+    """
+    書き込んだ値を有効なスナップショットにも反映する
+    Reflect written values in the active snapshot.
+    """
+    snapshot = _snapshot_for(session_id)
+    if snapshot is not None:
+        for name, value in values.items():
+            setattr(snapshot, name, value)
+
+
+@tracing.traced("redis.get_chat_history")
 def get_chat_history(session_id: str) -> List[Tuple[str, str]]:
     """
     指定されたセッションIDのチャット履歴を取得する
     Fetch chat history for a session.
 
-    履歴はJSONリスト形式で保存されており、取得時にタプルのリストへ変換します。
+    履歴リストの直近 CHAT_HISTORY_MAX_ENTRIES 件（0 なら全件）を返します。
     戻り値: [(role, text), ...]
-    Stored as a JSON list and returned as [(role, text), ...].
+    Returns the latest CHAT_HISTORY_MAX_ENTRIES messages (all when 0) as
+    [(role, text), ...].
     """
-    key = get_session_key(session_id, "chat_history")
+    snapshot = _snapshot_for(session_id)
+    if snapshot is not None:
+        return list(snapshot.chat_history)
+
+    history, _values = _read_history(session_id)
+    return history
+
+
+@tracing.traced("redis.append_chat_history")
+def append_chat_history(session_id: str, entries: Sequence[Tuple[str, str]]) -> None:
+    """
+    チャット履歴の末尾に発話を追記する（1ターン分の保存）
+    Append messages to the end of the chat history (saving one turn).
+
+    追記した分だけを RPUSH し、履歴全体は書き直しません。セッションの TTL もここで延長します。
+    Only the new messages are pushed; the rest of the history is not rewritten.
+    This is also where the session TTL is refreshed.
+    """
+    entries = [tuple(item) for item in entries]
+    if not entries:
+        return
     try:
-        client = get_redis_client()
+        client = client_for(session_id)
         if client:
-            data = client.get(key)
-        else:
-            if _should_use_fallback():
-                logger.warning("Redis client is not available; using in-memory fallback.")
-                data = _memory_get(key)
-            else:
-                data = None
-        if data:
-            # JSONのリスト[role, text]をタプル(role, text)に変換
-            # Convert JSON list [role, text] to tuples
-            return [tuple(item) for item in json.loads(data)]
+            _note_write(session_id, ())
+            try:
+                pipe = client.pipeline(transaction=False)
+                _queue_history_push(pipe, session_id, _encode_entries(entries))
+                _queue_stamp(pipe, session_id, time.time())
+                waited = _replica_wait(pipe)
+                results = pipe.execute()
+                if waited:
+                    _check_replica_wait(results[-1])
+            except Exception as e:
+                _mark_unhealthy("rpush", e)
+                if _should_use_fallback():
+                    _fallback_append_history(session_id, entries)
+        elif _should_use_fallback():
+            _fallback_append_history(session_id, entries)
+        snapshot = _snapshot_for(session_id)
+        if snapshot is not None:
+            snapshot.chat_history = _history_window(snapshot.chat_history + entries)
     except Exception as e:
-        _mark_unhealthy("get", e)
-        if _should_use_fallback():
-            data = _memory_get(key)
-            if data:
-                return [tuple(item) for item in json.loads(data)]
-
-    return []
+        logger.error(f"Error appending chat history for {session_id}: {e}")
 
 
+@tracing.traced("redis.save_chat_history")
 def save_chat_history(session_id: str, chat_history: Sequence[Tuple[str, str]]) -> None:
     """
-    指定されたセッションIDのチャット履歴を保存する
-    Save chat history for a session.
+    指定されたセッションIDのチャット履歴を丸ごと置き換える
+    Replace the whole chat history for a session.
 
-    リスト形式の履歴をJSON文字列にシリアライズしてRedisに保存します。
-    Serializes the list to JSON and stores it in Redis.
+    1ターン分の保存には append_chat_history() を使ってください。
+    Use append_chat_history() to save a single turn.
     """
-    key = get_session_key(session_id, "chat_history")
+    history = _history_window(chat_history)
     try:
-        _set_with_ttl(key, json.dumps(chat_history, ensure_ascii=False))
+        client = client_for(session_id)
+        if client:
+            _note_write(session_id, ())
+            try:
+                pipe = client.pipeline(transaction=True)
+                _queue_history_replace(pipe, session_id, history)
+                _queue_stamp(pipe, session_id, time.time())
+                pipe.execute()
+                _replica_wait(client)
+            except Exception as e:
+                _mark_unhealthy("rpush", e)
+                if _should_use_fallback():
+                    _fallback_replace_history(session_id, history)
+        elif _should_use_fallback():
+            _fallback_replace_history(session_id, history)
+        _update_snapshot(session_id, chat_history=history)
     except Exception as e:
         logger.error(f"Error saving chat history for {session_id}: {e}")
 
 
-def get_decision(session_id: str) -> str:
+# ターンの通し番号（session:<id>:turn_seq）。commit_turn が発話を書くたびに1増やし、
+# 決定事項の世代比較に使います。履歴の保持上限やリセットの影響を受けず単調に増えます
+# （リセット前に登録された抽出ジョブが、リセット後のターンの結果を上書きしないため）。
+# Per-session turn counter (session:<id>:turn_seq). commit_turn advances it
+# whenever it writes messages, and decision writes are versioned by it. It
+# keeps growing regardless of the history cap and resets, so an extraction
+# job queued before a reset cannot overwrite the results of later turns.
+TURN_KEY_TYPE = "turn_seq"
+
+# カウンターを1進めて新しいターン番号を返す。カウンターが無い（この仕組みより前の）
+# セッションは追記前の履歴のターン数から始め、保存済みの decision_turn より小さくならない
+# ようにします（フォールバックの再生で決定事項が先に進んだ場合も含む）。
+# KEYS[1]: カウンター, KEYS[2]: 履歴リスト, KEYS[3]: decision_turn を持つキー（hash ではハッシュ）
+# ARGV[1]: TTL, ARGV[2]: hash レイアウトなら "1"
+# Advance the counter and return the new turn. Sessions without a counter
+# (older than it) start from the turns in the history before the append, and
+# the counter never falls behind the stored decision_turn (e.g. after a
+# fallback replay moved decisions ahead).
+# KEYS[1]: counter, KEYS[2]: history list, KEYS[3]: key holding decision_turn (the hash in the hash layout)
+# ARGV[1]: TTL, ARGV[2]: "1" in the hash layout
+_NEXT_TURN_SCRIPT = """
+local counter_key = KEYS[1]
+local log_key = KEYS[2]
+local state_key = KEYS[3]
+local ttl = tonumber(ARGV[1])
+
+local turn = tonumber(redis.call("get", counter_key) or "")
+if not turn then
+    turn = math.floor(redis.call("llen", log_key) / 2)
+end
+local decision_turn
+if ARGV[2] == "1" then
+    decision_turn = redis.call("hget", state_key, "decision_turn")
+else
+    decision_turn = redis.call("get", state_key)
+end
+decision_turn = tonumber(decision_turn or "")
+if decision_turn and decision_turn > turn then
+    turn = decision_turn
+end
+turn = turn + 1
+if ttl > 0 then
+    redis.call("setex", counter_key, ttl, tostring(turn))
+else
+    redis.call("set", counter_key, tostring(turn))
+end
+return turn
+"""
+
+
+def _next_turn_args(session_id: str) -> Tuple[Any, ...]:
     """
-    指定されたセッションIDの決定事項（構造化前のテキスト）を取得する
-    Fetch decision text (unstructured) for a session.
+    ターンの通し番号を進めるスクリプトの EVAL 引数
+    EVAL arguments of the script that advances the turn counter.
+    """
+    hash_layout = REDIS_SESSION_LAYOUT == LAYOUT_HASH
+    state_key = get_session_hash_key(session_id) if hash_layout else get_session_key(session_id, "decision_turn")
+    return (
+        _NEXT_TURN_SCRIPT,
+        3,
+        get_session_key(session_id, TURN_KEY_TYPE),
+        get_session_key(session_id, CHAT_LOG_KEY_TYPE),
+        state_key,
+        REDIS_SESSION_TTL_SECONDS,
+        "1" if hash_layout else "0",
+    )
+
+
+def _fallback_next_turn(session_id: str) -> int:
+    """
+    フォールバック用メモリストアでターンの通し番号を進める（_NEXT_TURN_SCRIPT と同じ規則）
+    Advance the turn counter in the fallback store, by the same rules as _NEXT_TURN_SCRIPT.
+    """
+    key = get_session_key(session_id, TURN_KEY_TYPE)
+    with _decision_version_lock:
+        turn = _parse_turn(_memory_get(key))
+        if turn < 0:
+            turn = len(_memory_history(session_id)) // 2
+        turn = max(turn, _parse_turn(_memory_get(get_session_key(session_id, "decision_turn")))) + 1
+        _memory_set(key, str(turn))
+    return turn
+
+
+@tracing.traced("redis.get_current_turn")
+def get_current_turn(session_id: str) -> int:
+    """
+    最後にコミットされたターンの番号を取得する（未コミットは 0）
+    Return the number of the last committed turn (0 when none).
+    """
+    key = get_session_key(session_id, TURN_KEY_TYPE)
+    client = client_for(session_id)
+    if client:
+        try:
+            return max(_parse_turn(client.get(key)), 0)
+        except Exception as e:
+            _mark_unhealthy("get", e)
+    if _should_use_fallback():
+        return max(_parse_turn(_memory_get(key)), 0)
+    return 0
+
+
+@dataclass(frozen=True)
+class TurnCommit:
+    """
+    commit_turn の結果
+    Outcome of commit_turn.
+
+    turn はこのコミットで割り当てたターン番号（発話が無い・書けなかった場合は None）、
+    decision_saved は決定事項を保存したか（より新しいターンの結果があれば False）。
+    `turn` is the turn number assigned by the commit (None when no messages were
+    given or nothing could be written); `decision_saved` is whether the
+    decision was written (False when a newer turn's result already exists).
+    """
+
+    turn: Optional[int]
+    decision_saved: bool
+
+
+@tracing.traced("redis.commit_turn")
+def commit_turn(
+    session_id: str,
+    entries: Sequence[Tuple[str, str]],
+    *,
+    language: Optional[str] = None,
+    decision: Optional[str] = None,
+    decision_turn: Optional[int] = None,
+    decision_llm_turn: Optional[int] = None,
+) -> TurnCommit:
     """
-    key = get_session_key(session_id, "decision")
+    1ターン分の書き込み（ターン番号・履歴の追記・言語・決定事項・TTL 延長）を1回の MULTI/EXEC で行う
+    Commit one turn (turn number, history delta, language, decision and TTL
+    refresh) in one MULTI/EXEC.
+
+    途中で失敗しても履歴と決定事項が食い違わないよう、すべてを1つのトランザクションで
+    送ります。発話があればターンの通し番号を1進めます。決定事項は save_decision_if_newer と
+    同じ Lua で世代比較付きに保存し、decision_turn を省略するとこのターンの番号を使います。
+    Everything goes in one transaction, so a failure never leaves history and
+    decisions out of step. With messages, the turn counter advances by one.
+    The decision is written by the same compare-and-set Lua as
+    save_decision_if_newer (decision_llm_turn is recorded by it as well), at
+    decision_turn or, when omitted, at this commit's turn.
+
+    言語はスナップショットかニアキャッシュで分かる保存済みの値と同じなら書き込みません
+    （ニアキャッシュを毎ターン無効化しないため）。
+    The language is not written when it matches the stored value known from
+    the snapshot or the near-cache, so turns do not invalidate the near-cache.
+    """
+    entries = [tuple(item) for item in entries]
+    values = (
+        {"user_language": _encode_value(language)}
+        if language is not None and language != _known_value(session_id, "user_language")
+        else {}
+    )
+    result = TurnCommit(None, False)
     try:
-        client = get_redis_client()
+        client = client_for(session_id)
         if client:
-            data = client.get(key)
-        else:
-            if _should_use_fallback():
-                logger.warning("Redis client is not available; using in-memory fallback.")
-                data = _memory_get(key)
-            else:
-                data = None
-        return data if data else ""
+            _note_write(session_id, tuple(values))
+            try:
+                pipe = client.pipeline(transaction=True)
+                if entries:
+                    pipe.eval(*_next_turn_args(session_id))
+                _queue_history_push(pipe, session_id, _encode_entries(entries))
+                if values:
+                    _queue_field_writes(pipe, session_id, values)
+                if decision is not None:
+                    pipe.eval(*_decision_if_newer_args(session_id, decision, decision_turn, decision_llm_turn))
+                _queue_stamp(pipe, session_id, time.time())
+                results = pipe.execute()
+                # ターン番号が先頭、最終更新時刻が最後でその直前が比較付き保存の結果
+                # The turn comes first; the stamp is last, with the compare-and-set just before it
+                result = TurnCommit(
+                    int(results[0]) if entries else None,
+                    decision is not None and bool(results[-2]),
+                )
+                _replica_wait(client)
+            except Exception as e:
+                _mark_unhealthy("commit", e)
+                if _should_use_fallback():
+                    result = _fallback_commit_turn(session_id, entries, values, decision, decision_turn, decision_llm_turn)
+        elif _should_use_fallback():
+            result = _fallback_commit_turn(session_id, entries, values, decision, decision_turn, decision_llm_turn)
+        snapshot = _snapshot_for(session_id)
+        if snapshot is not None:
+            snapshot.chat_history = _history_window(snapshot.chat_history + entries)
+            if language is not None:
+                snapshot.user_language = language
+            if result.decision_saved:
+                snapshot.decision = decision
+                if decision_llm_turn is not None:
+                    snapshot.decision_llm_turn = decision_llm_turn
     except Exception as e:
-        _mark_unhealthy("get", e)
-        if _should_use_fallback():
-            return _memory_get(key) or ""
-        return ""
+        logger.error(f"Error committing turn for {session_id}: {e}")
+    return result
+
+
+def _fallback_commit_turn(
+    session_id: str,
+    entries: Sequence[Tuple[str, str]],
+    values: Dict[str, str],
+    decision: Optional[str],
+    decision_turn: Optional[int],
+    decision_llm_turn: Optional[int] = None,
+) -> TurnCommit:
+    """
+    commit_turn のフォールバック（メモリストアへ書き、ジャーナルに記録する）
+    Fallback for commit_turn: write to the in-memory store and record in the journal.
+    """
+    turn = _fallback_next_turn(session_id) if entries else None
+    if entries:
+        _fallback_append_history(session_id, entries)
+    if values:
+        _fallback_write_fields(session_id, values)
+    if decision is None:
+        return TurnCommit(turn, False)
+    if decision_turn is None:
+        decision_turn = turn if turn is not None else max(
+            _parse_turn(_memory_get(get_session_key(session_id, TURN_KEY_TYPE))), 0
+        )
+    return TurnCommit(turn, _fallback_save_decision_if_newer(session_id, decision, decision_turn, decision_llm_turn))
+
+
+@tracing.traced("redis.get_decision")
+def get_decision(session_id: str) -> str:
+    """
+    指定されたセッションIDの決定事項（構造化前のテキスト）を取得する
+    Fetch decision text (unstructured) for a session.
+    """
+    snapshot = _snapshot_for(session_id)
+    if snapshot is not None:
+        return snapshot.decision
+
+    (data,) = _read_fields(session_id, ("decision",))
+    return data if data else ""
 
 
+@tracing.traced("redis.save_decision")
 def save_decision(session_id: str, decision_text: str) -> None:
     """
     指定されたセッションIDの決定事項を保存する
     Save decision text for a session.
     """
-    key = get_session_key(session_id, "decision")
     try:
-        _set_with_ttl(key, decision_text)
+        _write_fields(session_id, {"decision": decision_text})
+        _update_snapshot(session_id, decision=decision_text)
     except Exception as e:
         logger.error(f"Error saving decision for {session_id}: {e}")
 
 
+# 決定事項の世代付き保存（古いターンが新しい結果を上書きしないようにする）
+# Turn-versioned decision writes (an older turn never overwrites a newer result)
+# ARGV[4] が空でなければ、LLM で抽出したターン（decision_llm_turn）も同時に書く
+# ARGV[2]（ターン）が空なら、ターンの通し番号の現在値（commit_turn で進めた直後の値）を使う
+# A non-empty ARGV[4] also records the turn the LLM extracted (decision_llm_turn)
+# An empty ARGV[2] (turn) means the turn counter's current value, i.e. the turn
+# commit_turn has just advanced to
+# カウンタより先のターン（リセット前のジョブの結果）は保存しない
+# Turns beyond the counter (results of jobs from before a reset) are not saved
+_SAVE_DECISION_IF_NEWER_SCRIPT = """
+local decision_key = KEYS[1]
+local turn_key = KEYS[2]
+local llm_turn_key = KEYS[3]
+local counter_key = KEYS[4]
+local decision_text = ARGV[1]
+local counter = tonumber(redis.call("get", counter_key) or "")
+local turn = tonumber(ARGV[2]) or counter or 0
+local ttl = tonumber(ARGV[3])
+local llm_turn = ARGV[4]
+
+if counter and turn > counter then
+    return 0
+end
+local current = tonumber(redis.call("get", turn_key) or "-1")
+if current and current > turn then
+    return 0
+end
+
+if ttl > 0 then
+    redis.call("setex", decision_key, ttl, decision_text)
+    redis.call("setex", turn_key, ttl, tostring(turn))
+    if llm_turn ~= "" then
+        redis.call("setex", llm_turn_key, ttl, llm_turn)
+    end
+else
+    redis.call("set", decision_key, decision_text)
+    redis.call("set", turn_key, tostring(turn))
+    if llm_turn ~= "" then
+        redis.call("set", llm_turn_key, llm_turn)
+    end
+end
+return 1
+"""
+# hash レイアウト用（TTL は未設定の場合のみ設定する）
+# Hash-layout variant (the TTL is only set when missing)
+_SAVE_DECISION_IF_NEWER_HASH_SCRIPT = """
+local hash_key = KEYS[1]
+local counter_key = KEYS[2]
+local decision_text = ARGV[1]
+local counter = tonumber(redis.call("get", counter_key) or "")
+local turn = tonumber(ARGV[2]) or counter or 0
+local ttl = tonumber(ARGV[3])
+local llm_turn = ARGV[4]
+
+if counter and turn > counter then
+    return 0
+end
+local current = tonumber(redis.call("hget", hash_key, "decision_turn") or "-1")
+if current and current > turn then
+    return 0
+end
+
+redis.call("hset", hash_key, "decision", decision_text, "decision_turn", tostring(turn))
+if llm_turn ~= "" then
+    redis.call("hset", hash_key, "decision_llm_turn", llm_turn)
+end
+if ttl > 0 and redis.call("ttl", hash_key) < 0 then
+    redis.call("expire", hash_key, ttl)
+end
+return 1
+"""
+_decision_version_lock = threading.Lock()
+
+
+@tracing.traced("redis.get_decision_turn")
+def get_decision_turn(session_id: str) -> int:
+    """
+    決定事項が何ターン目の会話まで反映済みかを取得する（未保存は -1）
+    Return the chat turn the stored decision reflects (-1 when unknown).
+    """
+    (data,) = _read_fields(session_id, ("decision_turn",))
+    return _parse_turn(data)
+
+
+def _memory_save_decision_if_newer(
+    decision_key: str,
+    turn_key: str,
+    decision_text: str,
+    turn: int,
+    counter_key: Optional[str] = None,
+) -> bool:
+    """
+    フォールバック用メモリストアへ世代比較付きで決定事項を保存する
+    Compare-and-set the decision in the fallback in-memory store.
+
+    counter_key のターンの通し番号より先のターンは保存しません（リセット前の結果）。
+    Turns beyond the turn counter at counter_key (results from before a reset) are not saved.
+    """
+    with _decision_version_lock:
+        counter = _parse_turn(_memory_get(counter_key)) if counter_key else -1
+        if counter >= 0 and turn > counter:
+            return False
+        current_raw = _memory_get(turn_key)
+        try:
+            current = int(current_raw) if current_raw is not None else -1
+        except ValueError:
+            current = -1
+        if current > turn:
+            return False
+        _memory_set(decision_key, decision_text)
+        _memory_set(turn_key, str(turn))
+        return True
+
+
+@tracing.traced("redis.save_decision_if_newer")
+def save_decision_if_newer(
+    session_id: str,
+    decision_text: str,
+    turn: int,
+    llm_turn: Optional[int] = None,
+) -> bool:
+    """
+    保存済みの決定事項より新しいターンの場合のみ保存する
+    Save decision text only when `turn` is not older than the stored one.
+
+    llm_turn を渡すと、LLM で抽出したターンも同じ比較付き保存で記録します。
+    保存した場合は True、より新しいターンの結果が既にある場合は False を返します。
+    With llm_turn, the turn the LLM extracted is recorded by the same
+    compare-and-set. Returns True when written, False when a newer turn has
+    already been saved.
+    """
+    saved = _save_decision_if_newer(session_id, decision_text, turn, llm_turn)
+    if saved:
+        _update_snapshot(session_id, decision=decision_text)
+        if llm_turn is not None:
+            _update_snapshot(session_id, decision_llm_turn=int(llm_turn))
+    return saved
+
+
+def _save_decision_if_newer(
+    session_id: str,
+    decision_text: str,
+    turn: int,
+    llm_turn: Optional[int] = None,
+) -> bool:
+    """
+    save_decision_if_newer の本体（Lua による比較付き保存）
+    Body of save_decision_if_newer (compare-and-set via Lua).
+    """
+    client = client_for(session_id)
+    if not client:
+        if _should_use_fallback():
+            return _fallback_save_decision_if_newer(session_id, decision_text, turn, llm_turn)
+        return False
+    _note_write(session_id, ())
+    try:
+        saved = bool(client.eval(*_decision_if_newer_args(session_id, decision_text, turn, llm_turn)))
+        if saved:
+            _replica_wait(client)
+        return saved
+    except Exception as e:
+        _mark_unhealthy("eval", e)
+        if _should_use_fallback():
+            return _fallback_save_decision_if_newer(session_id, decision_text, turn, llm_turn)
+        return False
+
+
+def _decision_if_newer_args(
+    session_id: str,
+    decision_text: str,
+    turn: Optional[int],
+    llm_turn: Optional[int] = None,
+) -> Tuple[Any, ...]:
+    """
+    世代比較付き保存スクリプトの EVAL 引数（レイアウトに応じたスクリプトとキー）
+    EVAL arguments of the compare-and-set script for the current layout.
+
+    turn が None なら、スクリプト内でターンの通し番号の現在値を使います。
+    With turn None the script uses the turn counter's current value.
+    """
+    turn_arg = str(int(turn)) if turn is not None else ""
+    llm_turn_arg = str(int(llm_turn)) if llm_turn is not None else ""
+    counter_key = get_session_key(session_id, TURN_KEY_TYPE)
+    if REDIS_SESSION_LAYOUT == LAYOUT_HASH:
+        return (
+            _SAVE_DECISION_IF_NEWER_HASH_SCRIPT,
+            2,
+            get_session_hash_key(session_id),
+            counter_key,
+            _encode_value(decision_text),
+            turn_arg,
+            REDIS_SESSION_TTL_SECONDS,
+            llm_turn_arg,
+        )
+    return (
+        _SAVE_DECISION_IF_NEWER_SCRIPT,
+        4,
+        get_session_key(session_id, "decision"),
+        get_session_key(session_id, "decision_turn"),
+        get_session_key(session_id, "decision_llm_turn"),
+        counter_key,
+        _encode_value(decision_text),
+        turn_arg,
+        REDIS_SESSION_TTL_SECONDS,
+        llm_turn_arg,
+    )
+
+
+def _fallback_save_decision_if_newer(
+    session_id: str,
+    decision_text: str,
+    turn: int,
+    llm_turn: Optional[int] = None,
+) -> bool:
+    """
+    フォールバック用メモリストアへ世代比較付きで保存し、保存できた場合はジャーナルに記録する
+    Compare-and-set in the fallback store and journal the write when it was applied.
+    """
+    saved = _memory_save_decision_if_newer(
+        get_session_key(session_id, "decision"),
+        get_session_key(session_id, "decision_turn"),
+        decision_text,
+        turn,
+        get_session_key(session_id, TURN_KEY_TYPE),
+    )
+    if saved:
+        _journal_record(session_id, write_journal.OP_DECISION, (decision_text, int(turn)))
+        if llm_turn is not None:
+            _fallback_write_fields(session_id, {"decision_llm_turn": str(int(llm_turn))})
+    return saved
+
+
+@tracing.traced("redis.get_decision_progress")
+def get_decision_progress(session_id: str) -> Tuple[str, int]:
+    """
+    決定事項と、LLM で最後に抽出したターン（未実行は -1）を1往復で取得する
+    Return the decision text and the last turn the LLM extracted (-1 when never) in one read.
+
+    有効なスナップショットがあれば Redis を読みません。
+    An active snapshot answers without touching Redis.
+    """
+    snapshot = _snapshot_for(session_id)
+    if snapshot is not None:
+        return snapshot.decision, snapshot.decision_llm_turn
+    decision, llm_turn = _read_fields(session_id, ("decision", "decision_llm_turn"))
+    return decision or "", _parse_turn(llm_turn)
+
+
+@tracing.traced("redis.reset_session")
 def reset_session(session_id: str) -> None:
     """
     指定されたセッションIDに関連する全データを削除する
     Delete all data associated with a session ID.
 
-    チャット履歴や決定事項など、セッションに関連するキーをまとめて削除します。
-    Removes chat history, decisions, and other session keys.
+    チャット履歴や決定事項など、セッションに関連するキーをまとめて削除します
+    （レイアウト切り替え後も残らないよう、両方のレイアウトのキーを削除します）。
+    Removes chat history, decisions, and other session keys in both layouts so
+    nothing survives a layout switch.
+
+    ターンの通し番号は決定事項と一緒に 0 へ戻します。削除せずに 0 を書くのは、リセット前に
+    登録された決定事項ジョブの結果（カウンタより先のターン）を保存させないためです。
+    The turn counter goes back to 0 together with the decision. It is set to 0
+    rather than deleted, so results of decision jobs from before the reset
+    (turns beyond the counter) are not saved.
     """
-    keys = [
-        get_session_key(session_id, "chat_history"),
-        get_session_key(session_id, "decision"),
-        get_session_key(session_id, "user_language"),
-        get_session_key(session_id, "user_type"),
-    ]
+    _update_snapshot(session_id, chat_history=[], decision="", user_language="", user_type="")
     try:
-        client = get_redis_client()
+        client = client_for(session_id)
         if client:
-            client.delete(*keys)
+            _note_write(session_id)
+            pipe = client.pipeline(transaction=True)
+            pipe.delete(*_session_redis_keys(session_id))
+            _queue_turn_reset(pipe, session_id)
+            _queue_stamp(pipe, session_id, time.time())
+            pipe.execute()
+            _replica_wait(client)
         elif _should_use_fallback():
-            _memory_delete(*keys)
+            _fallback_reset(session_id)
     except Exception as e:
         _mark_unhealthy("delete", e)
         if _should_use_fallback():
-            _memory_delete(*keys)
+            _fallback_reset(session_id)
+
 
+def _queue_turn_reset(pipe: Any, session_id: str) -> None:
+    """
+    ターンの通し番号を 0 に戻すコマンドを積む
+    Queue the reset of the turn counter to 0.
+    """
+    key = get_session_key(session_id, TURN_KEY_TYPE)
+    if REDIS_SESSION_TTL_SECONDS > 0:
+        pipe.setex(key, REDIS_SESSION_TTL_SECONDS, "0")
+    else:
+        pipe.set(key, "0")
 
+
+def _session_redis_keys(session_id: str) -> List[str]:
+    """
+    セッションの全 Redis キー（両レイアウト分と履歴リスト）
+    Every Redis key of a session: both layouts plus the history list.
+    """
+    return [
+        *(get_session_key(session_id, name) for name in SESSION_FIELDS),
+        get_session_key(session_id, CHAT_LOG_KEY_TYPE),
+        get_session_hash_key(session_id),
+    ]
+
+
+def _fallback_reset(session_id: str) -> None:
+    """
+    フォールバック用メモリストアからセッションを削除し、ジャーナルに記録する
+    Delete the session from the fallback store and record it in the journal.
+    """
+    _memory_delete(*(get_session_key(session_id, name) for name in SESSION_FIELDS))
+    _memory_set(get_session_key(session_id, TURN_KEY_TYPE), "0")
+    _journal_record(session_id, write_journal.OP_RESET)
+
+
+@tracing.traced("redis.get_user_type")
 def get_user_type(session_id: str) -> str:
     """指定されたセッションIDのユーザー種別を取得する / Get user type for a session."""
-    key = get_session_key(session_id, "user_type")
-    try:
-        client = get_redis_client()
-        if client:
-            data = client.get(key)
-        else:
-            if _should_use_fallback():
-                logger.warning("Redis client is not available; using in-memory fallback.")
-                data = _memory_get(key)
-            else:
-                data = None
-        return data if data else ""
-    except Exception as e:
-        _mark_unhealthy("get", e)
-        if _should_use_fallback():
-            return _memory_get(key) or ""
-        return ""
+    snapshot = _snapshot_for(session_id)
+    if snapshot is not None and snapshot.user_type is not None:
+        return snapshot.user_type
+    data = _read_near_cached(session_id, "user_type")
+    return data if data else ""
 
 
+@tracing.traced("redis.save_user_type")
 def save_user_type(session_id: str, user_type: str) -> None:
     """指定されたセッションIDのユーザー種別を保存する / Save user type for a session."""
-    key = get_session_key(session_id, "user_type")
     try:
-        _set_with_ttl(key, user_type)
+        _write_fields(session_id, {"user_type": user_type})
+        _update_snapshot(session_id, user_type=user_type)
     except Exception as e:
         logger.error(f"Error saving user_type for {session_id}: {e}")
 
 
+@tracing.traced("redis.get_user_language")
 def get_user_language(session_id: str) -> str:
     """指定されたセッションIDのユーザー言語を取得する / Get user language for a session."""
-    key = get_session_key(session_id, "user_language")
-    try:
-        client = get_redis_client()
-        if client:
-            data = client.get(key)
-        else:
-            if _should_use_fallback():
-                logger.warning("Redis client is not available; using in-memory fallback.")
-                data = _memory_get(key)
-            else:
-                data = None
-        return data if data else ""
-    except Exception as e:
-        _mark_unhealthy("get", e)
-        if _should_use_fallback():
-            return _memory_get(key) or ""
-        return ""
+    snapshot = _snapshot_for(session_id)
+    if snapshot is not None and snapshot.user_language is not None:
+        return snapshot.user_language
+    data = _read_near_cached(session_id, "user_language")
+    return data if data else ""
 
 
+@tracing.traced("redis.save_user_language")
 def save_user_language(session_id: str, language: str) -> None:
     """指定されたセッションIDのユーザー言語を保存する / Save user language for a session."""
-    key = get_session_key(session_id, "user_language")
     try:
-        _set_with_ttl(key, language)
+        _write_fields(session_id, {"user_language": language})
+        _update_snapshot(session_id, user_language=language)
     except Exception as e:
         logger.error(f"Error saving user_language for {session_id}: {e}")
 
 
+# フォールバック書き込みの再生（ライトビハインド）
+# セッションごとの最終更新時刻（session:<id>:updated_at）は1ターンに1回（履歴の保存時）と
+# リセット時に書かれ、再生時の競合判定に使います。この時刻より古いジャーナルの操作は
+# 別のワーカーが Redis 上で会話を進めた後の古い書き込みとみなして捨てます。
+# Replaying fallback writes (write-behind)
+# Each session's last-update time (session:<id>:updated_at) is written once per
+# turn (history saves) and on reset, and resolves conflicts during replay:
+# journaled operations older than it are treated as stale, because another
+# worker has already advanced the conversation in Redis, and are dropped.
+STAMP_KEY_TYPE = "updated_at"
+
+
+def _queue_stamp(pipe: Any, session_id: str, stamp: float) -> None:
+    """
+    セッションの最終更新時刻を書き込むコマンドを積む
+    Queue the write of a session's last-update time.
+    """
+    key = get_session_key(session_id, STAMP_KEY_TYPE)
+    if REDIS_SESSION_TTL_SECONDS > 0:
+        pipe.setex(key, REDIS_SESSION_TTL_SECONDS, repr(stamp))
+    else:
+        pipe.set(key, repr(stamp))
+
+
+def _parse_stamp(data: Optional[str]) -> float:
+    """
+    保存された最終更新時刻を float にする（未保存・不正値は 0.0）
+    Parse a stored last-update time (0.0 when missing or invalid).
+    """
+    try:
+        return float(data) if data is not None else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _journal_record(session_id: str, kind: str, payload: Any = None) -> None:
+    """
+    フォールバック書き込みをジャーナルに記録する（REDIS_FALLBACK_JOURNAL 無効時は何もしない）
+    Record a fallback write in the journal (a no-op when REDIS_FALLBACK_JOURNAL is off).
+    """
+    if REDIS_FALLBACK_JOURNAL:
+        _journal.record(session_id, kind, payload)
+
+
+def _queue_replay(pipe: Any, session_id: str, op: write_journal.JournalOp) -> None:
+    """
+    ジャーナルの1操作を再生するコマンドをパイプラインに積む
+    Queue the commands that replay one journaled operation.
+    """
+    if op.kind == write_journal.OP_FIELDS:
+        _queue_field_writes(pipe, session_id, op.payload)
+    elif op.kind == write_journal.OP_APPEND:
+        _queue_history_push(pipe, session_id, _encode_entries(op.payload))
+    elif op.kind == write_journal.OP_REPLACE:
+        _queue_history_replace(pipe, session_id, op.payload)
+    elif op.kind == write_journal.OP_DECISION:
+        pipe.eval(*_decision_if_newer_args(session_id, *op.payload))
+    elif op.kind == write_journal.OP_RESET:
+        pipe.delete(*_session_redis_keys(session_id))
+        _queue_turn_reset(pipe, session_id)
+    else:
+        logger.error("Unknown journal operation %r for %s", op.kind, session_id)
+
+
+def _replay_groups(client: Any, batch: write_journal.Batch) -> List[Tuple[Any, write_journal.Batch]]:
+    """
+    バッチを「同じ MULTI/EXEC で送れる単位」に分ける
+    Split a batch into groups that can share one MULTI/EXEC.
+
+    standalone は全体で1つ、sharded はノードごと、cluster はスロットをまたげないため
+    セッションごとです。
+    One group in standalone mode, one per node when sharded, and one per
+    session in cluster mode, where a transaction cannot span slots.
+    """
+    if isinstance(client, redis_shards.ShardedRedis):
+        groups: Dict[int, Tuple[Any, write_journal.Batch]] = {}
+        for item in batch:
+            node = client.for_key(item[0])
+            groups.setdefault(id(node), (node, []))[1].append(item)
+        return list(groups.values())
+    if REDIS_MODE == MODE_CLUSTER:
+        return [(client, [item]) for item in batch]
+    return [(client, batch)]
+
+
+def _replay_group(client: Any, group: write_journal.Batch) -> Tuple[int, int]:
+    """
+    1グループを最終更新時刻の MGET と MULTI/EXEC の2往復で再生し、(再生数, 競合数) を返す
+    Replay one group in two round trips (MGET of the stamps, then MULTI/EXEC);
+    return (applied, conflicts).
+    """
+    applied = conflicts = 0
+    stamps = client.mget([get_session_key(session_id, STAMP_KEY_TYPE) for session_id, _ops in group])
+    pipe = client.pipeline(transaction=True)
+    for (session_id, ops), stamp in zip(group, stamps):
+        newer, older = write_journal.split_by_stamp(ops, _parse_stamp(stamp))
+        for op in newer:
+            _queue_replay(pipe, session_id, op)
+        if newer:
+            _queue_stamp(pipe, session_id, max(op.written_at for op in newer))
+        applied += len(newer)
+        conflicts += len(older)
+    pipe.execute()
+    return applied, conflicts
+
+
+def replay_fallback_journal(client: Optional[Any] = None) -> Dict[str, int]:
+    """
+    フォールバック中の書き込みを Redis へ再生し、結果の件数を返す
+    Replay fallback writes to Redis and return counts of the outcome.
+
+    REDIS_JOURNAL_REPLAY_BATCH セッションずつ取り出し、同じノード（cluster では同じ
+    セッション）ごとに最終更新時刻の MGET と MULTI/EXEC のパイプラインの2往復で
+    再生します。Redis 側の方が新しい操作は競合として捨て、再生したセッションは
+    フォールバック用メモリストアから削除します。失敗したグループ以降はジャーナルに
+    戻し、次の復旧時に再生します。
+    Drains REDIS_JOURNAL_REPLAY_BATCH sessions at a time and replays each node's
+    share (each session's, in cluster mode) in two round trips: an MGET of the
+    last-update times and a MULTI/EXEC pipeline. Operations older than Redis
+    are dropped as conflicts, and replayed sessions are removed from the
+    fallback store. The failed group and the rest of the batch are put back
+    for the next recovery.
+    """
+    client = client if client is not None else get_redis_client()
+    progress = {"sessions": 0, "applied": 0, "conflicts": 0, "pending": len(_journal)}
+    if client is None:
+        return progress
+    started = time.perf_counter()
+    failed = False
+    while not failed:
+        batch = _journal.drain(REDIS_JOURNAL_REPLAY_BATCH)
+        if not batch:
+            break
+        groups = _replay_groups(client, batch)
+        for index, (node, group) in enumerate(groups):
+            for session_id, _ops in group:
+                _note_write(session_id)
+            try:
+                applied, conflicts = _replay_group(node, group)
+                _replica_wait(node)
+            except Exception as e:
+                _journal.restore([item for _node, rest in groups[index:] for item in rest])
+                _mark_unhealthy("replay", e)
+                failed = True
+                break
+            _journal.count(write_journal.RESULT_APPLIED, applied)
+            _journal.count(write_journal.RESULT_CONFLICT, conflicts)
+            _memory_delete(*(get_session_key(session_id, name) for session_id, _ops in group for name in SESSION_FIELDS))
+            progress["sessions"] += len(group)
+            progress["applied"] += applied
+            progress["conflicts"] += conflicts
+        logger.info(
+            "Replayed fallback journal: %d sessions, %d writes applied, %d older than Redis skipped, %d pending",
+            progress["sessions"],
+            progress["applied"],
+            progress["conflicts"],
+            len(_journal),
+        )
+    progress["pending"] = len(_journal)
+    if progress["sessions"]:
+        logger.info(
+            "Fallback journal replay finished in %.3fs: %s",
+            time.perf_counter() - started,
+            progress,
+        )
+    return progress
+
+
+def journal_stats() -> Dict[str, Any]:
+    """
+    ジャーナルの未再生件数と結果別の累計
+    Pending journal counts and totals by outcome.
+    """
+    return _journal.stats()
+
+
 # 初期接続（失敗時はフォールバック／fail-fast）
 # Initial connection (fallback or fail-fast on failure)
 if redis_client is None:
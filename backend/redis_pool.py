@@ -0,0 +1,132 @@
+"""
+Redis 接続プール（上限付き・ブロッキング）とその統計。
+Bounded, blocking Redis connection pool and its statistics.
+
+既定の redis.from_url は上限なしのプールを作るため、gthread などでスレッドが増えると
+接続数も際限なく増えます。ここでは上限付きの BlockingConnectionPool を使い、
+空きが無い場合は REDIS_POOL_TIMEOUT_SECONDS まで待ってから失敗させます。
+既定の上限はワーカー内の同時実行数（gunicorn のスレッド数＋決定事項ワーカーのスレッド数
+＋バックグラウンド処理の余裕）から決めます。
+redis.from_url builds an unbounded pool, so connections grow with threads under
+gthread and similar workers. This uses a bounded BlockingConnectionPool that
+waits up to REDIS_POOL_TIMEOUT_SECONDS for a free connection before failing.
+The default size follows the worker's concurrency: gunicorn threads plus
+decision worker threads plus headroom for background work.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, Tuple
+import weakref
+
+import redis
+
+from backend import metrics
+from backend.env import env_int
+
+# スーパーバイザーなどバックグラウンド処理用の余裕 / Headroom for the supervisor and other background work
+_BACKGROUND_CONNECTIONS = 2
+
+# プロセス内の全プール（クラスター・シャード構成ではノードごとにプールがある）
+# Every pool in the process (cluster and sharded setups have one per node)
+_pools: "weakref.WeakSet[InstrumentedConnectionPool]" = weakref.WeakSet()
+
+
+def default_max_connections() -> int:
+    """
+    ワーカー内の同時実行数から既定のプール上限を求める
+    Derive the default pool size from the worker's concurrency.
+
+    GUNICORN_THREADS は gunicorn.conf.py がワーカー起動時に設定します。
+    GUNICORN_THREADS is set by gunicorn.conf.py when a worker starts.
+    """
+    request_threads = max(1, env_int("GUNICORN_THREADS", 1))
+    decision_threads = max(1, env_int("DECISION_WORKER_THREADS", 4))
+    return request_threads + decision_threads + _BACKGROUND_CONNECTIONS
+
+
+class InstrumentedConnectionPool(redis.BlockingConnectionPool):
+    """
+    取得待ち時間と使用中・待機中の接続数を記録するブロッキングプール
+    Blocking pool that records acquire time and in-use/idle connection counts.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        self._stats_lock = threading.Lock()
+        self._in_use = 0
+        self._acquired = 0
+        self._exhausted = 0
+        self._acquire_seconds = 0.0
+        self._max_acquire_seconds = 0.0
+        super().__init__(*args, **kwargs)
+        _pools.add(self)
+
+    def reset(self) -> None:
+        """プールを作り直す（fork 後も呼ばれる）/ Rebuild the pool (also called after fork)."""
+        super().reset()
+        with self._stats_lock:
+            self._in_use = 0
+        self._publish()
+
+    def get_connection(self, *args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            connection = super().get_connection(*args, **kwargs)
+        except redis.ConnectionError as e:
+            if "No connection available" in str(e):
+                with self._stats_lock:
+                    self._exhausted += 1
+                metrics.REDIS_POOL_EXHAUSTED.inc()
+            raise
+        elapsed = time.perf_counter() - started
+        with self._stats_lock:
+            self._in_use += 1
+            self._acquired += 1
+            self._acquire_seconds += elapsed
+            self._max_acquire_seconds = max(self._max_acquire_seconds, elapsed)
+        metrics.REDIS_POOL_ACQUIRE_SECONDS.observe(elapsed)
+        self._publish()
+        return connection
+
+    def release(self, connection: Any) -> None:
+        owned = connection in self._connections
+        super().release(connection)
+        if owned:
+            with self._stats_lock:
+                self._in_use = max(0, self._in_use - 1)
+            self._publish()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        プールの統計（上限・作成済み・使用中・待機中・取得待ち）を返す
+        Return pool statistics: limit, created, in use, idle and acquire waits.
+        """
+        with self._stats_lock:
+            created = len(self._connections)
+            return {
+                "max_connections": self.max_connections,
+                "timeout_seconds": self.timeout,
+                "created": created,
+                "in_use": self._in_use,
+                "idle": max(0, created - self._in_use),
+                "acquired_total": self._acquired,
+                "exhausted_total": self._exhausted,
+                "acquire_seconds_avg": round(self._acquire_seconds / self._acquired, 6) if self._acquired else 0.0,
+                "acquire_seconds_max": round(self._max_acquire_seconds, 6),
+            }
+
+    def _counts(self) -> Tuple[int, int]:
+        with self._stats_lock:
+            return self._in_use, max(0, len(self._connections) - self._in_use)
+
+    def _publish(self) -> None:
+        """プロセス内の全プールの合計をゲージに反映する / Publish totals across every pool in the process."""
+        in_use = idle = 0
+        for pool in list(_pools):
+            pool_in_use, pool_idle = pool._counts()
+            in_use += pool_in_use
+            idle += pool_idle
+        metrics.REDIS_POOL_CONNECTIONS.labels(state="in_use").set(in_use)
+        metrics.REDIS_POOL_CONNECTIONS.labels(state="idle").set(idle)
@@ -0,0 +1,125 @@
+"""
+セッション読み込みをレプリカへ振り分けるための補助クラス。
+Helpers for routing session reads to Redis replicas.
+
+REDIS_READ_FROM_REPLICAS=true のとき、redis_client はセッションの読み込みを
+レプリカ（REDIS_REPLICA_URLS、または Sentinel が選ぶレプリカ）へ送ります。
+書き込みと Lua スクリプトは常にプライマリです。
+With REDIS_READ_FROM_REPLICAS=true, redis_client sends session reads to
+replicas (REDIS_REPLICA_URLS, or the replicas Sentinel picks). Writes and Lua
+scripts always go to the primary.
+
+レプリカは非同期に複製されるため、書き込み直後のセッションはしばらくプライマリから
+読みます（RecentWrites）。これは自プロセスの書き込みにしか効かないため、他ワーカーへの
+read-your-writes は保存ごとの WAIT（REDIS_REPLICA_WAIT_MS）が担い、WAIT が無効なら
+レプリカ読み込みも有効になりません。失敗したレプリカは一定時間使いません（ReplicaSet）。
+Replication is asynchronous, so a session written a moment ago is read from
+the primary for a while (RecentWrites). That only covers this process's own
+writes; read-your-writes across workers relies on the WAIT after each save
+(REDIS_REPLICA_WAIT_MS), and replica reads stay off without it. A replica that
+fails is skipped for a cool-down period (ReplicaSet).
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+class ReplicaSet:
+    """
+    読み込み用レプリカのクライアント群（失敗したノードは retry_after 秒休ませる）
+    Replica clients used for reads; a failed node rests for retry_after seconds.
+    """
+
+    def __init__(self, clients: Dict[str, Any], retry_after: float = 30.0) -> None:
+        self.clients = dict(clients)
+        self.retry_after = max(0.0, retry_after)
+        self._down_until: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.clients)
+
+    def pick(self, now: Optional[float] = None) -> Optional[Any]:
+        """
+        使用可能なレプリカを無作為に1つ返す（無ければ None）
+        Return a random usable replica, or None when every one is resting.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            usable = [name for name in self.clients if self._down_until.get(name, 0.0) <= now]
+        if not usable:
+            return None
+        return self.clients[random.choice(usable)]
+
+    def mark_down(self, client: Any, now: Optional[float] = None) -> None:
+        """
+        失敗したレプリカを retry_after 秒休ませる
+        Rest a failed replica for retry_after seconds.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            for name, candidate in self.clients.items():
+                if candidate is client:
+                    self._down_until[name] = now + self.retry_after
+
+    def down(self, now: Optional[float] = None) -> List[str]:
+        """休止中のレプリカ名 / Names of the replicas currently resting."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return sorted(name for name, until in self._down_until.items() if until > now)
+
+
+class RecentWrites:
+    """
+    セッションごとの最終書き込み時刻（window 秒を過ぎたものは捨てる）
+    Last write time per session; entries older than window seconds are pruned.
+
+    自プロセスが書き込んだセッションを window 秒間プライマリから読ませます。
+    記録はプロセスごとのため、他ワーカーの書き込みは見えません（WAIT で補います）。
+    Sessions this process wrote are read from the primary for window seconds.
+    The record is per process, so other workers' writes are not seen here
+    (WAIT covers those).
+    """
+
+    def __init__(self, window: float) -> None:
+        self.window = max(0.0, window)
+        self._writes: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._writes)
+
+    def note(self, session_id: str, now: Optional[float] = None) -> None:
+        """
+        書き込みを記録する（古い記録はここで掃除する）
+        Record a write, pruning expired entries on the way.
+        """
+        if self.window <= 0:
+            return
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._writes.pop(session_id, None)
+            self._writes[session_id] = now
+            while self._writes:
+                oldest, written_at = next(iter(self._writes.items()))
+                if now - written_at < self.window:
+                    break
+                del self._writes[oldest]
+
+    def is_recent(self, session_id: str, now: Optional[float] = None) -> bool:
+        """直近 window 秒以内に書き込んだか / Whether the session was written within the window."""
+        written_at = self._writes.get(session_id)
+        if written_at is None:
+            return False
+        now = time.monotonic() if now is None else now
+        return now - written_at < self.window
+
+    def clear(self) -> None:
+        """全件削除する / Forget every recorded write."""
+        with self._lock:
+            self._writes.clear()
@@ -0,0 +1,89 @@
+"""
+複数の単体 Redis にセッションを振り分けるコンシステント・ハッシュ。
+Consistent hashing that spreads sessions across several standalone Redis nodes.
+
+REDIS_MODE=sharded のとき、REDIS_SHARD_URLS の各ノードを仮想ノード付きのハッシュリングに
+並べ、セッション ID（制限カウンタなどはキー名）からノードを決めます。1セッションのキーは
+すべて同じノードに置かれるため、複数キーの Lua スクリプトやパイプラインはそのまま使えます。
+ノードを追加・削除しても移動するのは約 1/N のセッションだけです（移動したセッションは
+新しいノードでは空として扱われます）。
+With REDIS_MODE=sharded, the nodes in REDIS_SHARD_URLS are placed on a hash
+ring with virtual nodes, and the session ID (or the key name, for limit
+counters) picks the node. All keys of a session live on one node, so
+multi-key Lua scripts and pipelines work unchanged. Adding or removing a node
+moves only about 1/N of the sessions; moved sessions start empty on their new node.
+"""
+
+from __future__ import annotations
+
+import bisect
+import hashlib
+from typing import Any, Dict, List, Sequence, Tuple
+from urllib.parse import urlsplit
+
+# 1ノードあたりの仮想ノード数（多いほど偏りが小さい）/ Virtual nodes per node (more = more even)
+DEFAULT_REPLICAS = 160
+
+
+def _hash(value: str) -> int:
+    """リング上の位置（MD5 の先頭 8 バイト）/ Ring position from the first 8 bytes of MD5."""
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+def node_name(url: str) -> str:
+    """
+    URL からノード名（host:port/db、認証情報は含めない）を作る
+    Build a node name (host:port/db, without credentials) from a URL.
+
+    パスワードを変えてもリング上の位置が変わらないよう、認証情報は使いません。
+    Credentials are left out so rotating a password does not move sessions.
+    """
+    parts = urlsplit(url.strip())
+    db = parts.path.lstrip("/") or "0"
+    return f"{parts.hostname or 'localhost'}:{parts.port or 6379}/{db}"
+
+
+class HashRing:
+    """
+    仮想ノード付きのコンシステント・ハッシュリング
+    Consistent hash ring with virtual nodes.
+    """
+
+    def __init__(self, nodes: Sequence[str], replicas: int = DEFAULT_REPLICAS) -> None:
+        if not nodes:
+            raise ValueError("HashRing needs at least one node")
+        points: List[Tuple[int, str]] = sorted(
+            (_hash(f"{node}#{index}"), node) for node in nodes for index in range(max(1, replicas))
+        )
+        self.nodes = list(dict.fromkeys(nodes))
+        self._hashes = [point for point, _node in points]
+        self._owners = [node for _point, node in points]
+
+    def node_for(self, key: str) -> str:
+        """キーを担当するノード名 / Name of the node that owns a key."""
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+
+class ShardedRedis:
+    """
+    ノードごとの Redis クライアントとハッシュリングの組
+    Per-node Redis clients plus the hash ring that routes between them.
+
+    コマンドは直接持たず、for_key() で選んだノードのクライアントに送ります。
+    It exposes no commands itself; callers send them to the client chosen by for_key().
+    """
+
+    def __init__(self, clients: Dict[str, Any], replicas: int = DEFAULT_REPLICAS) -> None:
+        self.clients = dict(clients)
+        self.ring = HashRing(list(self.clients), replicas)
+
+    def for_key(self, routing_key: str) -> Any:
+        """ルーティングキー（セッション ID など）を担当するクライアント / Client for a routing key."""
+        return self.clients[self.ring.node_for(routing_key)]
+
+    def ping(self) -> bool:
+        """全ノードに ping する（1つでも失敗すれば例外）/ Ping every node; raises if any fails."""
+        for client in self.clients.values():
+            client.ping()
+        return True
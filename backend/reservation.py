@@ -8,6 +8,8 @@ import os
 from datetime import date, datetime
 from pydantic import BaseModel, Field
 from typing import Any, Dict, Optional, TypedDict
+from backend import metrics
+from backend import tracing
 from backend import redis_client
 from backend.database import SessionLocal
 from backend.models import ReservationPlan
@@ -288,10 +290,14 @@ def complete_plan(session_id: str) -> str:
     ]
 
     client = get_groq_client()
-    completion = client.chat.completions.create(
-        model=os.getenv("GROQ_RESERVATION_MODEL_NAME", "openai/gpt-oss-20b"),
-        messages=messages,
-    )
+    model_name = os.getenv("GROQ_RESERVATION_MODEL_NAME", "openai/gpt-oss-20b")
+    with metrics.observe_groq_call(model_name, "reservation"), tracing.span(
+        "groq.chat_completion", {"gen_ai.request.model": model_name, "call_type": "reservation"}
+    ):
+        completion = client.chat.completions.create(
+            model=model_name,
+            messages=messages,
+        )
     content = completion.choices[0].message.content or "{}"
     result = _parse_reservation_json(content)
 
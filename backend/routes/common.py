@@ -20,8 +20,14 @@ from flask import (
     stream_with_context,
 )
 
+from backend import decision_worker
+from backend import metrics
 from backend import security
+from backend import serialization
+from backend import slow_turn_log
 from backend import redis_client
+from backend import stage_timing
+from backend import tracing
 from backend.errors import (
     BackendError,
     SessionError,
@@ -47,13 +53,23 @@ class ChatRequestContext:
     data: Dict[str, Any]
     prompt: str
     language: str
+    snapshot: Optional[redis_client.SessionSnapshot] = None
+
+
+@dataclass(frozen=True)
+class ChatRequestBody:
+    """セッション状態を読む前に検証した send_message の入力。/ send_message input validated before any session state is read."""
+
+    session_id: str
+    data: Dict[str, Any]
 
 
 ChatErrorResponder = Callable[[str, int, Optional[str]], ResponseOrTuple]
+ChatRequestPreparer = Callable[[], Union[ChatRequestContext, ResponseOrTuple]]
 LimitChecker = Callable[[str, Optional[str]], LimitCheckResult]
 LanguageResolver = Callable[..., str]
 LanguageGetter = Callable[[str], str]
-LanguageSaver = Callable[[str, str], None]
+SessionSnapshotLoader = Callable[[str], Optional[redis_client.SessionSnapshot]]
 LimitExceededMessageBuilder = Callable[[int], str]
 ChatResult = Tuple[Optional[str], str, Optional[str], Optional[List[str]], bool, str, bool]
 ChatRunner = Callable[..., ChatResult]
@@ -157,19 +173,14 @@ def submit_plan_error_response(
     return json_error_response(message, status=status, error_type=error_type)
 
 
-def prepare_chat_request(
+def parse_chat_request(
     req: Request,
     *,
     error_responder: ChatErrorResponder,
-    check_and_increment_limit: LimitChecker,
-    resolve_user_language: LanguageResolver,
-    get_user_language: LanguageGetter,
-    save_user_language: LanguageSaver,
-    limit_exceeded_message_builder: Optional[LimitExceededMessageBuilder] = None,
-) -> Union[ChatRequestContext, ResponseOrTuple]:
+) -> Union[ChatRequestBody, ResponseOrTuple]:
     """
-    send_message の共通前処理を実行する。
-    Execute shared pre-processing for send_message.
+    CSRF・セッション Cookie・JSON 本文を検証する（セッション状態は読まない）
+    Validate CSRF, the session cookie and the JSON body; no session state is read.
     """
     if not security.is_csrf_valid(req):
         return error_responder("不正なリクエストです。", status=403)
@@ -184,54 +195,92 @@ def prepare_chat_request(
             "リクエストの形式が正しくありません（JSONを送信してください）。",
             status=400,
         )
+    return ChatRequestBody(session_id=session_id, data=data)
 
-    is_allowed, _count, limit, user_type, total_exceeded, error_code = (
-        check_and_increment_limit(session_id, user_type=data.get("user_type"))
-    )
-    if error_code == "redis_unavailable":
-        return error_responder(
-            "利用状況を確認できません。しばらく待ってから再試行してください。",
-            status=503,
-            error_type="redis_unavailable",
-        )
-    if not user_type:
-        return error_responder("ユーザー種別を選択してください。", status=400)
-    if total_exceeded:
-        return error_responder("今日の上限に達しました。明日またご利用ください。", status=429)
-    if not is_allowed:
-        message = (
-            limit_exceeded_message_builder(limit)
-            if limit_exceeded_message_builder
-            else f"申し訳ありませんが、本日の利用制限（{limit}回）に達しました。明日またご利用ください。"
-        )
-        return error_responder(
-            message,
-            status=429,
-        )
 
-    prompt = data.get("message", "")
-    if not isinstance(prompt, str) or not prompt:
-        return error_responder("メッセージを入力してください。", status=400)
-    if len(prompt) > 3000:
-        return error_responder(
-            "入力された文字数が3000文字を超えています。短くして再度お試しください。",
-            status=400,
+def prepare_chat_request(
+    req: Request,
+    *,
+    error_responder: ChatErrorResponder,
+    check_and_increment_limit: LimitChecker,
+    resolve_user_language: LanguageResolver,
+    get_user_language: LanguageGetter,
+    limit_exceeded_message_builder: Optional[LimitExceededMessageBuilder] = None,
+    mode: str = "unknown",
+    load_session_snapshot: Optional[SessionSnapshotLoader] = None,
+    body: Optional[ChatRequestBody] = None,
+) -> Union[ChatRequestContext, ResponseOrTuple]:
+    """
+    send_message の共通前処理を実行する。
+    Execute shared pre-processing for send_message.
+
+    セッション状態を読むため、セッションロックの取得後に呼びます（body は検証済みの入力）。
+    Reads session state, so it is called after the session lock is taken;
+    body is the already validated input.
+    """
+    if body is None:
+        body_or_error = parse_chat_request(req, error_responder=error_responder)
+        if not isinstance(body_or_error, ChatRequestBody):
+            return body_or_error
+        body = body_or_error
+    session_id, data = body.session_id, body.data
+
+    # 履歴・決定事項・言語・種別を1往復で読み込み、以降の層で読み直さない
+    # Load history, decision, language and user type in one round trip so later layers never re-read them
+    with stage_timing.stage("redis_read"):
+        snapshot = load_session_snapshot(session_id) if load_session_snapshot else None
+    with redis_client.use_session_snapshot(snapshot):
+        is_allowed, _count, limit, user_type, total_exceeded, error_code = (
+            check_and_increment_limit(session_id, user_type=data.get("user_type"))
         )
+        if error_code == "redis_unavailable":
+            return error_responder(
+                "利用状況を確認できません。しばらく待ってから再試行してください。",
+                status=503,
+                error_type="redis_unavailable",
+            )
+        if not user_type:
+            return error_responder("ユーザー種別を選択してください。", status=400)
+        if total_exceeded:
+            metrics.RATE_LIMIT_REJECTIONS.labels(mode=mode, reason="total").inc()
+            return error_responder("今日の上限に達しました。明日またご利用ください。", status=429)
+        if not is_allowed:
+            metrics.RATE_LIMIT_REJECTIONS.labels(mode=mode, reason="user").inc()
+            message = (
+                limit_exceeded_message_builder(limit)
+                if limit_exceeded_message_builder
+                else f"申し訳ありませんが、本日の利用制限（{limit}回）に達しました。明日またご利用ください。"
+            )
+            return error_responder(
+                message,
+                status=429,
+            )
 
-    stored_language = get_user_language(session_id)
-    language = resolve_user_language(
-        prompt,
-        fallback=stored_language,
-        accept_language=req.headers.get("Accept-Language"),
-    )
-    save_user_language(session_id, language)
+        prompt = data.get("message", "")
+        if not isinstance(prompt, str) or not prompt:
+            return error_responder("メッセージを入力してください。", status=400)
+        if len(prompt) > 3000:
+            return error_responder(
+                "入力された文字数が3000文字を超えています。短くして再度お試しください。",
+                status=400,
+            )
 
-    return ChatRequestContext(
-        session_id=session_id,
-        data=data,
-        prompt=prompt,
-        language=language,
-    )
+        # 言語はターンの保存（redis_client.commit_turn）で履歴と一緒に書き込む
+        # The language is written with the history when the turn is committed (redis_client.commit_turn)
+        stored_language = get_user_language(session_id)
+        language = resolve_user_language(
+            prompt,
+            fallback=stored_language,
+            accept_language=req.headers.get("Accept-Language"),
+        )
+
+        return ChatRequestContext(
+            session_id=session_id,
+            data=data,
+            prompt=prompt,
+            language=language,
+            snapshot=snapshot,
+        )
 
 
 def wants_stream_response(req: Request, data: Dict[str, Any]) -> bool:
@@ -249,39 +298,118 @@ def wants_stream_response(req: Request, data: Dict[str, Any]) -> bool:
     )
 
 
+def _response_status(result: ResponseOrTuple) -> int:
+    """応答（またはタプル）の HTTP ステータス / HTTP status of a response or (response, status) tuple."""
+    if isinstance(result, tuple):
+        return result[1]
+    return result.status_code
+
+
+def _session_busy(mode: str, error_responder: ChatErrorResponder) -> ResponseOrTuple:
+    """同じセッションの処理中に来たリクエストへの 409 / 409 for a request while the session is busy."""
+    metrics.SESSION_LOCK_CONFLICTS.labels(mode=mode).inc()
+    return error_responder(
+        "前のメッセージを処理中です。応答が返るまでお待ちください。",
+        status=409,
+    )
+
+
 def build_stream_chat_response(
     *,
     session_id: str,
-    prompt: str,
     mode: str,
-    language: str,
+    prepare: ChatRequestPreparer,
     error_responder: ChatErrorResponder,
     stream_chat_with_llama: StreamChatRunner,
+    stage_timing_enabled: bool = False,
 ) -> ResponseOrTuple:
     """
     ストリーミング応答を生成する。
     Build an SSE response with per-session lock handling.
+
+    セッションロックを取得してから prepare() でセッション状態を読み込みます
+    （重なったターンが古い履歴でプロンプトを作らないように）。
+    The session lock is taken before prepare() reads session state, so an
+    overlapping turn never builds its prompt from stale history.
+    stage_timing_enabled の場合、段階別の所要時間を final フレームの `timing` に含めます。
+    遅いターンのログが有効なら、応答に載せずに計測してストリーム終了時に記録します
+    （total は Redis の読み込みから final フレーム送出時点までで、その後の送信待ちは含めません）。
+    With stage_timing_enabled, per-stage timings are added to the final frame's `timing`.
+    When the slow-turn log is enabled, timings are also collected (unexposed)
+    and logged when the stream ends; the total runs from the Redis read to the
+    final frame, so delivery to the client afterwards is not counted.
+    トレース中はストリーム終了までルートスパンの出力を保留し、chat.stream と一緒に出力します。
+    When traced, the root span's export is held until the stream ends so it is
+    written together with the chat.stream spans.
+    ターンが決定事項を預けた場合（非同期モード）、final フレームの後でセッションロックを
+    解放してから結果を待ち、`decision` イベントで送ります。
+    When the turn handed over a deferred decision (async mode), the session
+    lock is released after the final frame, then the result is awaited and
+    sent as a `decision` event.
     """
-    lock_acquired = acquire_session_lock(session_id)
-    if not lock_acquired:
-        return error_responder(
-            "前のメッセージを処理中です。応答が返るまでお待ちください。",
-            status=409,
-        )
+    if not acquire_session_lock(session_id):
+        return _session_busy(mode, error_responder)
+
+    collect = stage_timing_enabled or slow_turn_log.enabled()
+    prepare_token = stage_timing.begin(expose=stage_timing_enabled) if collect else None
+    timings = stage_timing.current() if collect else None
+    try:
+        context_or_error = prepare()
+    except BaseException:
+        release_session_lock(session_id)
+        raise
+    finally:
+        if prepare_token is not None:
+            stage_timing.end(prepare_token)
+    if not isinstance(context_or_error, ChatRequestContext):
+        release_session_lock(session_id)
+        slow_turn_log.maybe_log(timings, mode=mode, transport="json", status=_response_status(context_or_error))
+        return context_or_error
+    context = context_or_error
+
+    trace_parent = tracing.current_span()
+    release_trace = tracing.hold(trace_parent)
 
     def generate() -> Generator[str, None, None]:
+        # 前処理から続けて計測する / Keep timing from where the pre-processing left off
+        timing_token = stage_timing.resume(timings) if timings is not None else None
+        decision_token = decision_worker.watch_stream()
+        lock_held = True
+        metrics.SSE_STREAMS_IN_FLIGHT.inc()
         try:
-            for chunk in stream_chat_with_llama(
-                session_id,
-                prompt,
-                mode=mode,
-                language=language,
-            ):
-                yield chunk
-        finally:
+            with tracing.resume(trace_parent, "chat.stream"), redis_client.use_session_snapshot(context.snapshot):
+                for chunk in stream_chat_with_llama(
+                    session_id,
+                    context.prompt,
+                    mode=mode,
+                    language=context.language,
+                ):
+                    yield chunk
+            pending = decision_worker.stream_pending()
+            # ターンは保存済みのため、決定事項を待つ前に次のリクエストを受け付ける
+            # The turn is committed, so accept the next request before waiting for the decision
             release_session_lock(session_id)
+            lock_held = False
+            if pending is not None:
+                updated_plan = decision_worker.wait_for_decision(pending.future)
+                if updated_plan is not None:
+                    yield serialization.sse_event(
+                        {"type": "decision", "current_plan": updated_plan, "turn": pending.turn}
+                    )
+        finally:
+            decision_worker.unwatch_stream(decision_token)
+            if timing_token is not None:
+                slow_turn_log.maybe_log(stage_timing.current(), mode=mode, transport="sse")
+                stage_timing.end(timing_token)
+            metrics.SSE_STREAMS_IN_FLIGHT.dec()
+            if lock_held:
+                release_session_lock(session_id)
+            if release_trace is not None:
+                release_trace()
 
     response = Response(stream_with_context(generate()), mimetype="text/event-stream")
+    if release_trace is not None:
+        response.call_on_close(release_trace)
     response.headers["Cache-Control"] = "no-cache, no-transform"
     response.headers["X-Accel-Buffering"] = "no"
     return response
@@ -290,22 +418,82 @@ def build_stream_chat_response(
 def build_json_chat_response(
     *,
     session_id: str,
-    prompt: str,
     mode: str,
-    language: str,
+    prepare: ChatRequestPreparer,
     error_responder: ChatErrorResponder,
     chat_with_llama: ChatRunner,
+    stage_timing_enabled: bool = False,
 ) -> ResponseOrTuple:
     """
     非ストリーミング応答を生成する。
     Build a non-streaming JSON response with per-session lock handling.
+
+    stage_timing_enabled の場合、段階別の所要時間を `Server-Timing` ヘッダーで返します。
+    遅いターンのログが有効なら、応答に載せずに計測して記録します。
+    With stage_timing_enabled, per-stage timings are returned in `Server-Timing`.
+    When the slow-turn log is enabled, timings are also collected (unexposed) and logged.
+    """
+    if not stage_timing_enabled and not slow_turn_log.enabled():
+        return _build_json_chat_response(
+            session_id=session_id,
+            mode=mode,
+            prepare=prepare,
+            error_responder=error_responder,
+            chat_with_llama=chat_with_llama,
+        )
+
+    timing_token = stage_timing.begin(expose=stage_timing_enabled)
+    status: Optional[int] = None
+    try:
+        result = _build_json_chat_response(
+            session_id=session_id,
+            mode=mode,
+            prepare=prepare,
+            error_responder=error_responder,
+            chat_with_llama=chat_with_llama,
+        )
+        response = result[0] if isinstance(result, tuple) else result
+        status = _response_status(result)
+        timings = stage_timing.exposed()
+        if timings is not None:
+            response.headers["Server-Timing"] = timings.server_timing_header()
+        return result
+    finally:
+        slow_turn_log.maybe_log(stage_timing.current(), mode=mode, transport="json", status=status)
+        stage_timing.end(timing_token)
+
+
+def _run_with_snapshot(
+    snapshot: Optional[redis_client.SessionSnapshot],
+    runner: ChatRunner,
+    *args: Any,
+    **kwargs: Any,
+) -> ChatResult:
+    """スナップショットを有効にしてチャット処理を実行する / Run a chat runner with the snapshot active."""
+    with redis_client.use_session_snapshot(snapshot):
+        return runner(*args, **kwargs)
+
+
+def _build_json_chat_response(
+    *,
+    session_id: str,
+    mode: str,
+    prepare: ChatRequestPreparer,
+    error_responder: ChatErrorResponder,
+    chat_with_llama: ChatRunner,
+) -> ResponseOrTuple:
+    """
+    セッションロックを取得してから前処理とチャット処理を実行し、JSON応答を作る。
+    Take the session lock, then run pre-processing and the chat turn and build the JSON response.
     """
     with session_request_lock(session_id) as lock_acquired:
         if not lock_acquired:
-            return error_responder(
-                "前のメッセージを処理中です。応答が返るまでお待ちください。",
-                status=409,
-            )
+            return _session_busy(mode, error_responder)
+
+        context_or_error = prepare()
+        if not isinstance(context_or_error, ChatRequestContext):
+            return context_or_error
+        context = context_or_error
 
         (
             response_text,
@@ -315,11 +503,13 @@ def build_json_chat_response(
             is_date_select,
             remaining_text,
             used_web_search,
-        ) = chat_with_llama(
+        ) = _run_with_snapshot(
+            context.snapshot,
+            chat_with_llama,
             session_id,
-            prompt,
+            context.prompt,
             mode=mode,
-            language=language,
+            language=context.language,
         )
         return jsonify({
             "response": response_text,
@@ -340,45 +530,54 @@ def handle_chat_send_message(
     check_and_increment_limit: LimitChecker,
     resolve_user_language: LanguageResolver,
     get_user_language: LanguageGetter,
-    save_user_language: LanguageSaver,
     chat_with_llama: ChatRunner,
     stream_chat_with_llama: StreamChatRunner,
     limit_exceeded_message_builder: Optional[LimitExceededMessageBuilder] = None,
+    load_session_snapshot: Optional[SessionSnapshotLoader] = None,
 ) -> ResponseOrTuple:
     """
     send_message の共通処理フローを実行する。
     Execute the shared end-to-end send_message workflow.
+
+    利用回数の確認とセッション状態の読み込みは、セッションロックの取得後に行います。
+    The usage-limit check and the session-state read run after the session lock is taken.
     """
-    context_or_error = prepare_chat_request(
-        req,
-        error_responder=error_responder,
-        check_and_increment_limit=check_and_increment_limit,
-        resolve_user_language=resolve_user_language,
-        get_user_language=get_user_language,
-        save_user_language=save_user_language,
-        limit_exceeded_message_builder=limit_exceeded_message_builder,
-    )
-    if not isinstance(context_or_error, ChatRequestContext):
-        return context_or_error
+    body_or_error = parse_chat_request(req, error_responder=error_responder)
+    if not isinstance(body_or_error, ChatRequestBody):
+        return body_or_error
+    body = body_or_error
+
+    def prepare() -> Union[ChatRequestContext, ResponseOrTuple]:
+        return prepare_chat_request(
+            req,
+            error_responder=error_responder,
+            check_and_increment_limit=check_and_increment_limit,
+            resolve_user_language=resolve_user_language,
+            get_user_language=get_user_language,
+            limit_exceeded_message_builder=limit_exceeded_message_builder,
+            mode=mode,
+            load_session_snapshot=load_session_snapshot,
+            body=body,
+        )
 
-    context = context_or_error
-    if wants_stream_response(req, context.data):
+    timing_enabled = stage_timing.timing_requested(req.headers)
+    if wants_stream_response(req, body.data):
         return build_stream_chat_response(
-            session_id=context.session_id,
-            prompt=context.prompt,
+            session_id=body.session_id,
             mode=mode,
-            language=context.language,
+            prepare=prepare,
             error_responder=error_responder,
             stream_chat_with_llama=stream_chat_with_llama,
+            stage_timing_enabled=timing_enabled,
         )
 
     return build_json_chat_response(
-        session_id=context.session_id,
-        prompt=context.prompt,
+        session_id=body.session_id,
         mode=mode,
-        language=context.language,
+        prepare=prepare,
         error_responder=error_responder,
         chat_with_llama=chat_with_llama,
+        stage_timing_enabled=timing_enabled,
     )
 
 
@@ -484,20 +683,24 @@ def make_chat_send_message_route(
     check_and_increment_limit: LimitChecker,
     resolve_user_language: LanguageResolver,
     get_user_language: LanguageGetter,
-    save_user_language: LanguageSaver,
     chat_with_llama: ChatRunner,
     stream_chat_with_llama: StreamChatRunner,
     logger: logging.Logger,
     limit_exceeded_message_builder: Optional[LimitExceededMessageBuilder] = None,
     exception_responder: Optional[ExceptionResponder] = None,
+    load_session_snapshot: Optional[SessionSnapshotLoader] = None,
 ) -> Callable[[], ResponseOrTuple]:
     """
     send_message ルートを生成して Blueprint に登録する。
     Create and register a send_message route for a feature mode.
+
+    load_session_snapshot を渡すと、セッション状態を1往復で読み込んでターン全体で共有します。
+    With load_session_snapshot, session state is loaded in one round trip and
+    shared by every layer of the turn.
     """
 
-    @blueprint.route(route_path, methods=["POST"], endpoint=endpoint_name)
-    def send_message() -> ResponseOrTuple:
+    def _send_message() -> ResponseOrTuple:
+        """ルート本体（トレース外側は send_message）/ Route body; send_message wraps it in the root span."""
         def _run() -> ResponseOrTuple:
             return handle_chat_send_message(
                 request,
@@ -506,10 +709,10 @@ def make_chat_send_message_route(
                 check_and_increment_limit=check_and_increment_limit,
                 resolve_user_language=resolve_user_language,
                 get_user_language=get_user_language,
-                save_user_language=save_user_language,
                 chat_with_llama=chat_with_llama,
                 stream_chat_with_llama=stream_chat_with_llama,
                 limit_exceeded_message_builder=limit_exceeded_message_builder,
+                load_session_snapshot=load_session_snapshot,
             )
 
         if not catch_exceptions:
@@ -534,9 +737,34 @@ def make_chat_send_message_route(
                 error_type=backend_error.error_type,
             )
 
+    @blueprint.route(route_path, methods=["POST"], endpoint=endpoint_name)
+    def send_message() -> ResponseOrTuple:
+        return _run_traced("chat.send_message", {"http.route": route_path, "chat.mode": mode}, _send_message)
+
     return send_message
 
 
+def _run_traced(
+    name: str,
+    attributes: Dict[str, Any],
+    run: Callable[[], ResponseOrTuple],
+) -> ResponseOrTuple:
+    """
+    ルートの処理をルートスパンで囲み、応答のステータスを記録する
+    Run a route handler under a root span and record the response status.
+
+    SQL や Groq などの子スパンは現在のスパンがある場合だけ記録されるため、
+    子スパンを出したいルートはこれで囲みます。
+    SQL, Groq and other child spans are only recorded under a current span,
+    so routes whose child spans should be exported are wrapped in this.
+    """
+    with tracing.start_trace(name, attributes) as root_span:
+        result = run()
+        if root_span is not None:
+            root_span.set_attribute("http.status_code", _response_status(result))
+        return result
+
+
 def make_complete_route(
     *,
     blueprint: Blueprint,
@@ -559,6 +787,9 @@ def make_complete_route(
 
     @blueprint.route(route_path, endpoint=endpoint_name)
     def complete() -> ResponseOrTuple:
+        return _run_traced("reservation.complete", {"http.route": route_path, "chat.mode": mode}, _complete)
+
+    def _complete() -> ResponseOrTuple:
         def _run() -> ResponseOrTuple:
             return handle_complete(
                 request,
@@ -615,6 +846,9 @@ def make_submit_plan_route(
 
     @blueprint.route(route_path, methods=["POST"], endpoint=endpoint_name)
     def submit_plan() -> ResponseOrTuple:
+        return _run_traced("reservation.submit_plan", {"http.route": route_path}, _submit_plan)
+
+    def _submit_plan() -> ResponseOrTuple:
         def _run() -> ResponseOrTuple:
             return handle_submit_plan(
                 request,
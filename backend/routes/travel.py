@@ -61,7 +61,7 @@ send_message = make_chat_send_message_route(
     ),
     resolve_user_language=lambda *args, **kwargs: llama_core.resolve_user_language(*args, **kwargs),
     get_user_language=lambda *args, **kwargs: redis_client.get_user_language(*args, **kwargs),
-    save_user_language=lambda *args, **kwargs: redis_client.save_user_language(*args, **kwargs),
+    load_session_snapshot=lambda *args, **kwargs: redis_client.load_session_snapshot(*args, **kwargs),
     chat_with_llama=lambda *args, **kwargs: llama_core.chat_with_llama(*args, **kwargs),
     stream_chat_with_llama=lambda *args, **kwargs: llama_core.stream_chat_with_llama(*args, **kwargs),
     logger=logger,
@@ -3,12 +3,15 @@
 Security helpers for CORS, CSRF, CSP, and cookie settings.
 """
 
+import hmac
 import os
 import logging
 from typing import Any, Dict, List
 from urllib.parse import urlparse
 from flask import Request, Response
 
+from backend.env import env_bool
+
 
 DEFAULT_ALLOWED_ORIGINS = ("https://chat.project-kk.com", "http://localhost:5173", "http://localhost:5174")
 logger = logging.getLogger(__name__)
@@ -68,8 +71,21 @@ def is_csrf_valid(request: Request) -> bool:
         referer_origin = _origin_from_referer(referer)
         return referer_origin in allowed if referer_origin else False
 
-    allow_missing = os.getenv("ALLOW_MISSING_ORIGIN", "false").lower() in ("1", "true", "yes")
-    return allow_missing
+    return env_bool("ALLOW_MISSING_ORIGIN", False)
+
+
+def tokens_match(supplied: str, expected: str) -> bool:
+    """
+    ヘッダーの値と設定済みトークンを定数時間で比較する
+    Compare a header value with a configured token in constant time.
+
+    hmac.compare_digest は非 ASCII の str で TypeError になるため、両辺をバイト列にしてから比較します。
+    hmac.compare_digest raises TypeError for non-ASCII str, so both sides are compared as bytes.
+    """
+    return hmac.compare_digest(
+        supplied.encode("utf-8", "surrogatepass"),
+        expected.encode("utf-8", "surrogatepass"),
+    )
 
 
 def should_set_secure_cookie(request: Request) -> bool:
@@ -176,7 +192,7 @@ def apply_security_headers(response: Response) -> Response:
         csp = build_csp()
     response.headers.setdefault("Content-Security-Policy", csp)
 
-    if os.getenv("ENABLE_HSTS", "true").lower() in ("1", "true", "yes"):
+    if env_bool("ENABLE_HSTS", True):
         response.headers.setdefault(
             "Strict-Transport-Security",
             "max-age=63072000; includeSubDomains; preload",
@@ -0,0 +1,82 @@
+"""
+セッション状態と SSE フレームの JSON シリアライザ。
+JSON serializer for session state and SSE frames.
+
+orjson がインストールされていれば使い、無ければ標準ライブラリの json に戻ります
+（SERIALIZER=auto|orjson|json）。どちらも同じ JSON（区切りの空白なし・非ASCII は
+そのまま）を出力するため、切り替え後も保存済みの値をそのまま読めます。
+Uses orjson when it is installed and falls back to the stdlib json module
+otherwise (SERIALIZER=auto|orjson|json). Both produce the same JSON (compact
+separators, non-ASCII kept as-is), so stored values stay readable after a switch.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # 任意依存 / optional dependency
+    orjson = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+BACKEND_AUTO = "auto"
+BACKEND_ORJSON = "orjson"
+BACKEND_JSON = "json"
+
+
+def _select_backend(requested: str) -> str:
+    """
+    設定値と orjson の有無から実際に使うバックエンドを決める
+    Pick the backend to use from the setting and whether orjson is installed.
+    """
+    normalized = (requested or BACKEND_AUTO).strip().lower()
+    if normalized == BACKEND_JSON:
+        return BACKEND_JSON
+    if normalized not in (BACKEND_AUTO, BACKEND_ORJSON):
+        logger.warning("Unknown SERIALIZER=%s; using %s", requested, BACKEND_AUTO)
+    if orjson is not None:
+        return BACKEND_ORJSON
+    if normalized == BACKEND_ORJSON:
+        logger.warning("SERIALIZER=orjson but orjson is not installed; using json")
+    return BACKEND_JSON
+
+
+BACKEND = _select_backend(os.getenv("SERIALIZER", BACKEND_AUTO))
+
+
+def dumps(obj: Any) -> str:
+    """
+    オブジェクトを JSON 文字列にする
+    Serialize an object to a JSON string.
+    """
+    if BACKEND == BACKEND_ORJSON:
+        try:
+            return orjson.dumps(obj).decode("utf-8")
+        except TypeError:
+            # orjson が扱えない型（int のサブクラスや巨大整数など）は標準ライブラリに任せる
+            # Types orjson rejects (int subclasses, huge ints, ...) go to the stdlib
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """
+    JSON 文字列を読み込む（不正な JSON は ValueError）
+    Parse a JSON string; invalid JSON raises ValueError.
+    """
+    if BACKEND == BACKEND_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def sse_event(payload: Any) -> str:
+    """
+    SSE の data フレームを組み立てる
+    Build an SSE data frame.
+    """
+    return f"data: {dumps(payload)}\n\n"
@@ -0,0 +1,97 @@
+"""
+遅いチャットターンの構造化ログ（JSON Lines）。
+Structured JSON-lines log of slow chat turns.
+
+SLOW_TURN_LOG_THRESHOLD_MS 以上かかったターンについて、モード・言語・履歴の
+ターン数とバイト数・プロンプトの推定トークン数・決定事項の長さ・Web検索の有無・
+段階別の所要時間・再試行/フォールバックのイベントを SLOW_TURN_LOG_PATH に追記します。
+ユーザー入力や応答の本文は記録しません。閾値 0 で無効です。
+For turns slower than SLOW_TURN_LOG_THRESHOLD_MS, appends mode, language,
+history length in turns and bytes, estimated prompt tokens, decision size,
+web-search usage, per-stage timings and retry/fallback events to
+SLOW_TURN_LOG_PATH. No user or model text is recorded. A threshold of 0
+disables the log.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from backend.env import env_float
+from backend.stage_timing import StageTimings
+
+logger = logging.getLogger(__name__)
+
+
+SLOW_TURN_LOG_THRESHOLD_MS = env_float("SLOW_TURN_LOG_THRESHOLD_MS", 0.0)
+SLOW_TURN_LOG_PATH = os.getenv("SLOW_TURN_LOG_PATH", "slow_turns.jsonl")
+
+_write_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    """ログが有効か（閾値が正）/ Whether the log is enabled (positive threshold)."""
+    return SLOW_TURN_LOG_THRESHOLD_MS > 0
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    トークン数の概算（ASCII は約4文字、非ASCII は1文字を1トークンとみなす）
+    Rough token estimate: ~4 ASCII chars per token, one token per non-ASCII char.
+    """
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+def build_entry(timings: StageTimings, *, mode: str, transport: str, status: Optional[int] = None) -> Dict[str, Any]:
+    """
+    1ターン分のログ行を組み立てる
+    Build the log entry for one turn.
+    """
+    stages = timings.as_dict()
+    total_ms = stages.pop("total")
+    entry: Dict[str, Any] = {
+        "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "pid": os.getpid(),
+        "mode": mode,
+        "transport": transport,
+        "total_ms": total_ms,
+    }
+    if status is not None:
+        entry["status"] = status
+    entry.update(timings.attributes)
+    entry["stages_ms"] = stages
+    entry["events"] = timings.events
+    return entry
+
+
+def maybe_log(
+    timings: Optional[StageTimings],
+    *,
+    mode: str,
+    transport: str,
+    status: Optional[int] = None,
+) -> bool:
+    """
+    閾値を超えたターンを記録し、記録したかを返す
+    Log the turn when it exceeded the threshold; return whether it was logged.
+    """
+    if timings is None or not enabled():
+        return False
+    entry = build_entry(timings, mode=mode, transport=transport, status=status)
+    if entry["total_ms"] < SLOW_TURN_LOG_THRESHOLD_MS:
+        return False
+    line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+    try:
+        with _write_lock:
+            with open(SLOW_TURN_LOG_PATH, "a", encoding="utf-8") as f:
+                f.write(line)
+    except OSError as e:
+        logger.warning("Failed to write slow-turn log: %s", e)
+        return False
+    return True
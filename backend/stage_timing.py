@@ -0,0 +1,218 @@
+"""
+チャット1ターンの処理段階ごとの所要時間を計測する軽量スパンAPI。
+Lightweight span API that times each stage of a chat turn.
+
+計測はリクエスト単位で有効化され（既定は無効）、結果は JSON 応答の
+`Server-Timing` ヘッダーと SSE の final フレームの `timing` に載ります。
+Timing is enabled per request (off by default); results are returned in the
+`Server-Timing` header of JSON responses and the `timing` field of the final
+SSE frame.
+
+有効化の方法 / How to enable:
+- STAGE_TIMING_ENABLED=true : 全リクエストで計測 / time every request
+- STAGE_TIMING_TOKEN=<secret> : `X-Stage-Timing: <secret>` を送った信頼済みの
+  呼び出し元だけ計測 / time only trusted callers sending the header
+
+遅いターンのログ（slow_turn_log）用には、応答に載せない（expose=False）計測も行います。
+Timings are also collected without exposing them (expose=False) for the
+slow-turn log.
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+import os
+import time
+from typing import Any, Dict, Iterator, List, Mapping, Optional
+
+from backend import security
+from backend.env import env_bool
+
+STAGE_TIMING_ENABLED = env_bool("STAGE_TIMING_ENABLED", False)
+STAGE_TIMING_TOKEN = os.getenv("STAGE_TIMING_TOKEN", "").strip()
+STAGE_TIMING_HEADER = "X-Stage-Timing"
+# 1ターンで保持するイベント数の上限 / Cap on events kept per turn
+MAX_EVENTS = 50
+
+
+class StageTimings:
+    """
+    1リクエスト分の段階別所要時間（同名の段階は合算）
+    Per-request stage durations; repeated stages are summed.
+
+    events は再試行・フォールバックなどの出来事、attributes は会話の形
+    （履歴長など）で、いずれもユーザー入力の本文は含めません。
+    `events` holds retries/fallbacks and `attributes` the conversation shape
+    (history length, ...); neither contains user content.
+    """
+
+    def __init__(self, expose: bool = True) -> None:
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.expose = expose
+        self.events: List[Dict[str, Any]] = []
+        self.attributes: Dict[str, Any] = {}
+        self._order: List[str] = []
+        self._durations: Dict[str, float] = {}
+        self._counts: Dict[str, int] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        """段階の所要時間を加算する / Add a duration to a stage."""
+        if name not in self._durations:
+            self._order.append(name)
+            self._durations[name] = 0.0
+            self._counts[name] = 0
+        self._durations[name] += max(0.0, seconds)
+        self._counts[name] += 1
+
+    def finish(self) -> None:
+        """
+        total の終点を現在時刻に固定する（最初の呼び出しのみ有効）
+        Fix the end of `total` at the current time; only the first call counts.
+        """
+        if self.finished is None:
+            self.finished = time.perf_counter()
+
+    def as_dict(self) -> Dict[str, float]:
+        """
+        段階名からミリ秒への辞書を返す（total は開始から finish() まで、未固定なら現在まで）
+        Return stage name → milliseconds, plus `total` from the start to finish()
+        (or to now when not finished).
+        """
+        result = {name: round(self._durations[name] * 1000, 1) for name in self._order}
+        end = self.finished if self.finished is not None else time.perf_counter()
+        result["total"] = round((end - self.started) * 1000, 1)
+        return result
+
+    def server_timing_header(self) -> str:
+        """
+        Server-Timing ヘッダー値を作る（複数回の段階は desc に回数を入れる）
+        Build a Server-Timing header value; repeated stages note their count.
+        """
+        parts: List[str] = []
+        for name, millis in self.as_dict().items():
+            count = self._counts.get(name, 1)
+            desc = f';desc="x{count}"' if count > 1 else ""
+            parts.append(f"{name};dur={millis}{desc}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[StageTimings]] = ContextVar("stage_timings", default=None)
+
+
+def timing_requested(headers: Mapping[str, str]) -> bool:
+    """
+    このリクエストで段階計測を行うかを判定する
+    Return whether stage timing is enabled for a request.
+    """
+    if STAGE_TIMING_ENABLED:
+        return True
+    if not STAGE_TIMING_TOKEN:
+        return False
+    supplied = (headers.get(STAGE_TIMING_HEADER) or "").strip()
+    return bool(supplied) and security.tokens_match(supplied, STAGE_TIMING_TOKEN)
+
+
+def begin(expose: bool = True) -> Token:
+    """
+    現在のコンテキストで計測を開始し、end() 用のトークンを返す
+    Start collecting in the current context and return a token for end().
+
+    expose=False の計測は応答（Server-Timing / SSE）には載せません。
+    Timings begun with expose=False are never returned to the client.
+    """
+    return _current.set(StageTimings(expose=expose))
+
+
+def resume(timings: StageTimings) -> Token:
+    """
+    既存の計測を現在のコンテキストで続け、end() 用のトークンを返す
+    Continue existing timings in the current context and return a token for end().
+
+    ビューで始めた計測を SSE 生成器（別の実行コンテキスト）で続けるために使います。
+    Used to carry timings begun in the view into the SSE generator, which runs in another context.
+    """
+    return _current.set(timings)
+
+
+def end(token: Token) -> None:
+    """
+    計測を終了する（ストリーム生成器が別コンテキストで閉じられた場合も安全に解除する）
+    Stop collecting; also safe when a stream generator is closed in another context.
+    """
+    try:
+        _current.reset(token)
+    except ValueError:
+        _current.set(None)
+
+
+def current() -> Optional[StageTimings]:
+    """計測中の StageTimings（無効なら None）/ Active timings, or None when disabled."""
+    return _current.get()
+
+
+def exposed() -> Optional[StageTimings]:
+    """応答に載せてよい計測（無ければ None）/ Active timings the client may see, or None."""
+    timings = _current.get()
+    return timings if timings is not None and timings.expose else None
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    段階の所要時間を計測する（計測無効時は何もしない）
+    Time a stage; a no-op when timing is not active.
+    """
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+
+def record(name: str, seconds: float) -> None:
+    """
+    計測済みの所要時間を記録する（TTFB など区切りが with に収まらない場合）
+    Record an already measured duration (e.g. TTFB that spans a loop).
+    """
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+def finish() -> None:
+    """
+    ターンの total をここで締める（final フレーム送出時に呼び、送信待ちを含めない）
+    Close the turn's total here; called at the final frame so client delivery
+    afterwards is not counted. A no-op when timing is not active.
+    """
+    timings = _current.get()
+    if timings is not None:
+        timings.finish()
+
+
+def event(name: str, **fields: Any) -> None:
+    """
+    再試行やフォールバックなどの出来事を記録する（計測無効時は何もしない）
+    Record an event such as a retry or fallback; a no-op when timing is not active.
+    """
+    timings = _current.get()
+    if timings is None or len(timings.events) >= MAX_EVENTS:
+        return
+    at_ms = round((time.perf_counter() - timings.started) * 1000, 1)
+    timings.events.append(dict(fields, name=name, at_ms=at_ms))
+
+
+def annotate(**fields: Any) -> None:
+    """
+    ターンの属性（会話の形）を記録する（計測無効時は何もしない）
+    Record turn attributes describing the conversation shape; a no-op when inactive.
+    """
+    timings = _current.get()
+    if timings is not None:
+        timings.attributes.update(fields)
@@ -0,0 +1,368 @@
+"""
+チャット1ターンの分散トレース（OpenTelemetry 形式のスパン）をローカルに出力する。
+Local tracing of a chat turn using OpenTelemetry-shaped spans.
+
+コレクター不要で、トレース完了時に全スパンを JSON Lines としてファイル
+（TRACING_EXPORTER=file, TRACING_FILE）または標準エラー（console）へ書き出します。
+ルートスパンは send_message・完了画面・submit_plan の各ルートで開始され、
+ガード・ルーター・Brave・Groq・Redis・SQL の各処理が子スパンになります。
+決定事項ワーカーのジョブは投入時のスパンの下で続きます。
+No collector is needed: when a trace completes, all of its spans are written as
+JSON lines to a file (TRACING_EXPORTER=file, TRACING_FILE) or to stderr
+(console). Root spans start in the send_message, completion and submit_plan
+routes; guard, router, Brave, Groq, Redis and SQL work become child spans.
+Decision-worker jobs continue under the span that submitted them.
+
+TRACING_SAMPLE_RATE (0.0〜1.0) でルートごとにサンプリングします。
+未サンプリングのリクエストではスパン API は何もしません。
+TRACING_SAMPLE_RATE (0.0-1.0) samples per root; span calls are no-ops for
+unsampled requests.
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+import functools
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+from backend.env import env_float
+
+logger = logging.getLogger(__name__)
+
+EXPORTER_OFF = "off"
+EXPORTER_CONSOLE = "console"
+EXPORTER_FILE = "file"
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class Span:
+    """
+    1つの処理区間（OpenTelemetry のスパンに相当）
+    A single timed operation, shaped like an OpenTelemetry span.
+    """
+
+    def __init__(self, trace: "_Trace", name: str, parent: Optional["Span"], attributes: Optional[Dict[str, Any]]) -> None:
+        self.trace = trace
+        self.name = name
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_span_id = parent.span_id if parent is not None else None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.status = "OK"
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.excluded_ns = 0
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """属性を設定する / Set an attribute."""
+        self.attributes[key] = value
+
+    @contextmanager
+    def exclude(self) -> Iterator[None]:
+        """
+        この区間をスパンの長さから除く（終了時刻を除外分だけ早める）
+        Leave this block out of the span's duration; the end time is moved earlier by the excluded time.
+        """
+        start = time.time_ns()
+        try:
+            yield
+        finally:
+            self.excluded_ns += time.time_ns() - start
+
+    def record_exception(self, error: BaseException) -> None:
+        """例外をエラー状態として記録する / Mark the span as failed with an exception."""
+        self.status = "ERROR"
+        self.attributes["exception.type"] = type(error).__name__
+
+    def to_dict(self) -> Dict[str, Any]:
+        """エクスポート用の辞書 / Exported representation."""
+        end_ns = self.end_ns or time.time_ns() - self.excluded_ns
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": end_ns,
+            "duration_ms": round((end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "status": self.status,
+        }
+
+
+class _Trace:
+    """
+    1トレース分のスパン（開いているスパンが無くなった時点で出力）
+    Spans of one trace; exported once no span remains open.
+    """
+
+    def __init__(self) -> None:
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.spans: List[Span] = []
+        self.open_spans = 0
+        self.lock = threading.Lock()
+
+    def opened(self, span: Span) -> None:
+        with self.lock:
+            self.spans.append(span)
+            self.open_spans += 1
+
+    def closed(self) -> Optional[List[Span]]:
+        with self.lock:
+            self.open_spans -= 1
+            if self.open_spans > 0:
+                return None
+            finished, self.spans = self.spans, []
+            return finished
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("tracing_span", default=None)
+_exporter = EXPORTER_OFF
+_file_path = "traces.jsonl"
+_sample_rate = 1.0
+_export_lock = threading.Lock()
+
+
+def configure(exporter: str = EXPORTER_OFF, path: Optional[str] = None, sample_rate: float = 1.0) -> None:
+    """
+    出力先とサンプリング率を設定する
+    Configure the exporter and sampling rate.
+    """
+    global _exporter, _file_path, _sample_rate
+    normalized = (exporter or EXPORTER_OFF).strip().lower()
+    if normalized not in (EXPORTER_OFF, EXPORTER_CONSOLE, EXPORTER_FILE):
+        logger.warning("Unknown TRACING_EXPORTER=%s; tracing disabled", exporter)
+        normalized = EXPORTER_OFF
+    _exporter = normalized
+    _file_path = path or "traces.jsonl"
+    _sample_rate = min(max(sample_rate, 0.0), 1.0)
+
+
+def is_enabled() -> bool:
+    """トレース出力が有効か / Whether any exporter is active."""
+    return _exporter != EXPORTER_OFF
+
+
+def current_span() -> Optional[Span]:
+    """現在のスパン（未サンプリングなら None）/ Active span, or None when not sampled."""
+    return _current.get()
+
+
+def _export(spans: List[Span]) -> None:
+    """
+    完了したトレースのスパンを開始順に書き出す
+    Write the spans of a finished trace in start order.
+    """
+    lines = "".join(
+        json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n"
+        for span in sorted(spans, key=lambda item: item.start_ns)
+    )
+    try:
+        with _export_lock:
+            if _exporter == EXPORTER_FILE:
+                with open(_file_path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+            elif _exporter == EXPORTER_CONSOLE:
+                sys.stderr.write(lines)
+                sys.stderr.flush()
+    except OSError as e:
+        logger.warning("Failed to export trace: %s", e)
+
+
+def start_span(name: str, parent: Optional[Span], attributes: Optional[Dict[str, Any]] = None) -> Span:
+    """
+    スパンを開始する（end_span で必ず終了すること）
+    Start a span; it must be finished with end_span().
+    """
+    trace = parent.trace if parent is not None else _Trace()
+    span = Span(trace, name, parent, attributes)
+    trace.opened(span)
+    return span
+
+
+def end_span(span: Span) -> None:
+    """
+    スパンを終了し、トレース内の最後のスパンなら出力する
+    Finish a span and export the trace when it was the last open span.
+    """
+    span.end_ns = time.time_ns() - span.excluded_ns
+    if span.excluded_ns:
+        span.attributes["excluded_ms"] = round(span.excluded_ns / 1e6, 3)
+    finished = span.trace.closed()
+    if finished:
+        _export(finished)
+
+
+def hold(span: Optional[Span]) -> Optional[Callable[[], None]]:
+    """
+    トレースを開いたままにし、返した関数が呼ばれるまで出力を遅らせる（複数回呼んでも1回のみ有効）
+    Keep the span's trace open so it is not exported until the returned
+    release function is called; calling the release more than once is harmless.
+
+    SSE のようにルートのブロックを抜けた後も子スパンが続く場合、ルートと子を
+    同じバッチで出力するために使います。
+    Used when child spans continue after the root's block has returned (SSE),
+    so the root and its stream children are exported as one batch.
+    """
+    if span is None:
+        return None
+    trace = span.trace
+    with trace.lock:
+        trace.open_spans += 1
+    once = threading.Lock()
+
+    def release() -> None:
+        if not once.acquire(blocking=False):
+            return
+        finished = trace.closed()
+        if finished:
+            _export(finished)
+
+    return release
+
+
+@contextmanager
+def _activate(name: str, parent: Optional[Span], attributes: Optional[Dict[str, Any]]) -> Iterator[Span]:
+    """
+    スパンを開始して現在のスパンに設定する
+    Start a span and make it current for the block.
+    """
+    span = start_span(name, parent, attributes)
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as error:
+        if not isinstance(error, GeneratorExit):
+            span.record_exception(error)
+        raise
+    finally:
+        try:
+            _current.reset(token)
+        except ValueError:
+            _current.set(parent)
+        end_span(span)
+
+
+@contextmanager
+def start_trace(name: str, attributes: Optional[Dict[str, Any]] = None) -> Iterator[Optional[Span]]:
+    """
+    サンプリングに当選した場合にルートスパンを開始する
+    Start a root span when the request is sampled.
+    """
+    if _exporter == EXPORTER_OFF or random.random() >= _sample_rate:
+        yield None
+        return
+    with _activate(name, None, attributes) as span:
+        yield span
+
+
+@contextmanager
+def span(name: str, attributes: Optional[Dict[str, Any]] = None) -> Iterator[Optional[Span]]:
+    """
+    現在のスパンの子スパンを開始する（トレース外では何もしない）
+    Start a child of the current span; a no-op outside a sampled trace.
+    """
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    with _activate(name, parent, attributes) as child:
+        yield child
+
+
+@contextmanager
+def resume(parent: Optional[Span], name: str, attributes: Optional[Dict[str, Any]] = None) -> Iterator[Optional[Span]]:
+    """
+    明示した親の下でスパンを開始する（SSE 生成器のように別の実行区間で続く処理用）
+    Start a child of an explicit parent, for work such as SSE generators that
+    continue after the parent's block has returned.
+    """
+    if parent is None:
+        yield None
+        return
+    with _activate(name, parent, attributes) as child:
+        yield child
+
+
+@contextmanager
+def excluding(span: Optional[Span]) -> Iterator[None]:
+    """
+    span.exclude() と同じ（span が None なら何もしない）
+    Same as span.exclude(); a no-op when span is None.
+    """
+    if span is None:
+        yield
+        return
+    with span.exclude():
+        yield
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """
+    関数呼び出しを子スパンで囲むデコレーター
+    Decorator that wraps each call in a child span.
+    """
+
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if _current.get() is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def instrument_sqlalchemy(engine: Any) -> None:
+    """
+    SQLAlchemy エンジンの各クエリを子スパンとして記録する（SQL 文の先頭のみ保存）
+    Record each query on a SQLAlchemy engine as a child span (statement prefix only).
+    """
+    from sqlalchemy import event
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        parent = _current.get()
+        if parent is None:
+            return
+        operation = (statement or "").strip().split(" ", 1)[0].upper()
+        db_span = start_span(
+            f"db.{operation.lower() or 'query'}",
+            parent,
+            {"db.system": conn.dialect.name, "db.operation": operation, "db.statement": statement[:200]},
+        )
+        conn.info.setdefault("tracing_spans", []).append(db_span)
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get("tracing_spans")
+        if stack:
+            end_span(stack.pop())
+
+    def handle_error(exception_context):
+        conn = exception_context.connection
+        stack = conn.info.get("tracing_spans") if conn is not None else None
+        if stack:
+            db_span = stack.pop()
+            db_span.record_exception(exception_context.original_exception)
+            end_span(db_span)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine, "handle_error", handle_error)
+
+
+configure(
+    os.getenv("TRACING_EXPORTER", EXPORTER_OFF),
+    os.getenv("TRACING_FILE") or None,
+    env_float("TRACING_SAMPLE_RATE", 1.0),
+)
@@ -0,0 +1,170 @@
+"""
+Redis 障害中のフォールバック書き込みを記録するライトビハインド・ジャーナル。
+Write-behind journal of fallback writes made while Redis is unavailable.
+
+フォールバックストアに書いた操作を、セッションごとに書き込み時刻付きで順番に記録します。
+Redis が復旧すると redis_client がこのジャーナルを取り出してパイプラインで再生するため、
+障害中に進んだ会話が古い Redis の内容に巻き戻りません。
+Each operation written to the fallback store is recorded per session, in
+order, with its write time. Once Redis recovers, redis_client drains the
+journal and replays it in pipelines, so conversations that advanced during
+the outage do not roll back to stale Redis data.
+
+記録は操作数の上限付きで、超えた場合は最も古いセッションの記録から捨てます
+（そのセッションは従来どおりフォールバックの内容のみになります）。
+The journal is bounded by operation count; beyond it the oldest session's
+operations are dropped, leaving that session fallback-only as before.
+"""
+
+from __future__ import annotations
+
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from backend import metrics
+
+# 操作の種類 / Operation kinds
+OP_FIELDS = "fields"  # payload: {field: エンコード済みの値 / encoded value}
+OP_APPEND = "append"  # payload: [(role, text), ...]
+OP_REPLACE = "replace"  # payload: [(role, text), ...]（履歴全体 / whole history）
+OP_DECISION = "decision"  # payload: (decision_text, turn)
+OP_RESET = "reset"  # payload: None
+
+RESULT_RECORDED = "recorded"
+RESULT_APPLIED = "applied"
+RESULT_CONFLICT = "conflict"
+RESULT_DROPPED = "dropped"
+
+
+@dataclass(frozen=True)
+class JournalOp:
+    """
+    ジャーナルに記録した1操作
+    One operation recorded in the journal.
+    """
+
+    kind: str
+    payload: Any
+    written_at: float
+
+
+Batch = List[Tuple[str, List[JournalOp]]]
+
+
+class WriteJournal:
+    """
+    セッションごとの操作列（記録順）を保持するスレッドセーフなジャーナル
+    Thread-safe journal holding each session's operations in recording order.
+
+    max_ops が 0 の場合、上限は無効です。
+    A max_ops of 0 disables the bound.
+    """
+
+    def __init__(self, max_ops: int = 0) -> None:
+        self.max_ops = max(0, max_ops)
+        self.counts: Counter = Counter()
+        self._sessions: "OrderedDict[str, List[JournalOp]]" = OrderedDict()
+        self._ops = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._ops
+
+    def record(self, session_id: str, kind: str, payload: Any = None, now: Optional[float] = None) -> None:
+        """
+        操作を記録する（時刻の既定値は現在時刻）
+        Record an operation, stamped with the current time by default.
+        """
+        op = JournalOp(kind, payload, now if now is not None else time.time())
+        with self._lock:
+            self._sessions.setdefault(session_id, []).append(op)
+            self._ops += 1
+            self._count(RESULT_RECORDED)
+            self._enforce_limit(keep=session_id)
+            self._publish()
+
+    def drain(self, max_sessions: int) -> Batch:
+        """
+        記録の古いセッションから最大 max_sessions 件を取り出す
+        Remove and return up to max_sessions sessions, oldest first.
+        """
+        with self._lock:
+            batch: Batch = []
+            while self._sessions and len(batch) < max(1, max_sessions):
+                session_id, ops = self._sessions.popitem(last=False)
+                self._ops -= len(ops)
+                batch.append((session_id, ops))
+            self._publish()
+            return batch
+
+    def restore(self, batch: Batch) -> None:
+        """
+        再生に失敗したバッチを戻す（取り出し後に記録された操作より前に並べる）
+        Put back a batch whose replay failed, ahead of operations recorded since it was drained.
+        """
+        with self._lock:
+            for session_id, ops in reversed(batch):
+                newer = self._sessions.pop(session_id, [])
+                self._sessions[session_id] = list(ops) + newer
+                self._sessions.move_to_end(session_id, last=False)
+                self._ops += len(ops)
+            self._enforce_limit(keep=None)
+            self._publish()
+
+    def count(self, result: str, amount: int = 1) -> None:
+        """再生結果の件数を加算する / Count replay outcomes (applied, conflict)."""
+        if amount > 0:
+            with self._lock:
+                self._count(result, amount)
+
+    def stats(self) -> Dict[str, Any]:
+        """未再生の件数と結果別の累計 / Pending counts and totals by outcome."""
+        with self._lock:
+            return {
+                "pending_sessions": len(self._sessions),
+                "pending_ops": self._ops,
+                "max_ops": self.max_ops,
+                "totals": dict(self.counts),
+            }
+
+    def clear(self) -> None:
+        """全件削除する / Drop every recorded operation."""
+        with self._lock:
+            self._sessions.clear()
+            self._ops = 0
+            self._publish()
+
+    # 内部処理 / Internals
+
+    def _enforce_limit(self, keep: Optional[str]) -> None:
+        """
+        上限を超えている間、最も古いセッションの記録を捨てる（記録中のセッションは残す）
+        Drop the oldest sessions' operations while over budget, never the session being recorded.
+        """
+        while self.max_ops and self._ops > self.max_ops and self._sessions:
+            oldest = next(iter(self._sessions))
+            if oldest == keep:
+                return
+            dropped = self._sessions.pop(oldest)
+            self._ops -= len(dropped)
+            self._count(RESULT_DROPPED, len(dropped))
+
+    def _count(self, result: str, amount: int = 1) -> None:
+        self.counts[result] += amount
+        metrics.REDIS_JOURNAL_OPS.labels(result=result).inc(amount)
+
+    def _publish(self) -> None:
+        metrics.REDIS_JOURNAL_PENDING.set(self._ops)
+
+
+def split_by_stamp(ops: Sequence[JournalOp], stamp: float) -> Tuple[List[JournalOp], List[JournalOp]]:
+    """
+    Redis 側の最終更新時刻より新しい操作（再生対象）と古い操作（競合）に分ける
+    Split operations into those newer than the Redis-side stamp (to replay) and older ones (conflicts).
+    """
+    newer = [op for op in ops if op.written_at > stamp]
+    older = [op for op in ops if op.written_at <= stamp]
+    return newer, older
@@ -0,0 +1,349 @@
+"""
+決定事項・ディレクティブ解析のホットパス用マイクロベンチマーク。
+Microbenchmarks for the decision and directive parsing hot paths.
+
+`_enforce_decision_policy`・`_parse_decision_items`・`_apply_decision_patch`・
+`_derive_decision_patch_from_history`・`_parse_response_output` を、長い履歴・
+DECISION_MAX_ITEMS 件の決定事項・日英混在テキストのコーパスで計測し、
+ops/sec と1回あたりのメモリ確保量（tracemalloc のピーク）を保存済みベースラインと
+比較します。回帰があれば終了コード 1 で失敗します。
+Measures ops/sec and per-call allocation peak (tracemalloc) on realistic corpora
+(long histories, DECISION_MAX_ITEMS-sized decisions, mixed ja/en text) and
+compares them with the stored baseline, exiting 1 on regression.
+
+    python -m benchmarks.bench_decision                    # compare with baseline
+    python -m benchmarks.bench_decision --update-baseline  # record a new baseline
+
+ops/sec はマシン依存のため、ベースラインは計測に使うマシンで更新してください。
+ops/sec is machine-dependent; refresh the baseline on the machine that runs it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import functools
+import json
+import os
+import pathlib
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from unittest.mock import patch
+
+ROOT_DIR = pathlib.Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+os.environ.setdefault("GROQ_API_KEY", "bench-key")
+
+from backend import llama_core  # noqa: E402
+from backend.llama_core_constants import DECISION_MAX_ITEMS  # noqa: E402
+from backend.llama_core_decision import (  # noqa: E402
+    _apply_decision_patch,
+    _derive_decision_patch_from_history,
+    _enforce_decision_policy,
+    _parse_decision_items,
+)
+
+BASELINE_PATH = ROOT_DIR / "benchmarks" / "baseline_decision.json"
+DEFAULT_SPEED_TOLERANCE = float(os.getenv("BENCH_SPEED_TOLERANCE", "0.30"))
+DEFAULT_ALLOC_TOLERANCE = float(os.getenv("BENCH_ALLOC_TOLERANCE", "0.20"))
+
+_JA_ITEMS = [
+    ("目的地", ["京都", "大阪", "札幌", "那覇", "金沢"]),
+    ("出発地", ["東京", "名古屋", "福岡"]),
+    ("日程", ["2026-05-03〜2026-05-05", "7月の連休", "来週末"]),
+    ("人数", ["2人", "大人2人と子ども1人", "4名"]),
+    ("予算", ["5万円", "1人3万円以内", "10万円程度"]),
+    ("交通手段", ["新幹線", "飛行機", "レンタカー"]),
+    ("宿泊", ["旅館", "駅近のホテル", "温泉付き"]),
+    ("同行者", ["家族", "友人", "同僚"]),
+]
+_EN_ITEMS = [
+    ("Destination", ["Kyoto", "Osaka", "Sapporo"]),
+    ("Departure", ["Tokyo", "Nagoya"]),
+    ("Dates", ["May 3 to May 5", "next weekend"]),
+    ("Travelers", ["2 adults", "family of four"]),
+    ("Budget", ["50,000 yen", "about $500 per person"]),
+    ("Transport", ["Shinkansen", "flight"]),
+]
+_MEMO_LINES = ["メモ：朝食付きが良い", "メモ：雨の日プランも検討", "Memo: prefers quiet areas"]
+_QUESTIONS = [
+    "どちらに行きたいですか？\nSelect: [京都, 大阪, 札幌]",
+    "日程を選んでください。\nDateSelect: true",
+    "予算はどのくらいを考えていますか？",
+    "何人で行く予定ですか？",
+    "Where would you like to go? Select: [Kyoto, Osaka, Sapporo]",
+    "How many people are traveling?",
+]
+_ANSWERS = [
+    "京都に行きたいです",
+    "5月3日から5月5日まで",
+    "予算は5万円くらい",
+    "大人2人です",
+    "ありがとう、助かります",
+    "I'd like to go to Kyoto with my family",
+    "Budget is about 50,000 yen",
+    "まだ決めていません",
+]
+
+
+def build_decision_texts(rng: random.Random, count: int = 50) -> List[str]:
+    """
+    DECISION_MAX_ITEMS 件前後（上限超えを含む）の日英混在の決定事項テキストを作る
+    Build mixed ja/en decision texts of about DECISION_MAX_ITEMS items (some over the limit).
+    """
+    texts: List[str] = []
+    for index in range(count):
+        lines: List[str] = []
+        pool = _JA_ITEMS + _EN_ITEMS if index % 3 == 0 else _JA_ITEMS
+        size = DECISION_MAX_ITEMS + (index % 3)
+        for item_index in range(size):
+            key, values = pool[item_index % len(pool)]
+            prefix = "- " if item_index % 2 else "・"
+            lines.append(f"{prefix}{key}：{rng.choice(values)}")
+        lines.extend(rng.sample(_MEMO_LINES, 2))
+        texts.append("\n".join(lines))
+    return texts
+
+
+def build_histories(rng: random.Random, count: int = 20, turns: int = 40) -> List[List[Tuple[str, str]]]:
+    """
+    長い会話履歴（assistant の質問と human の回答の繰り返し）を作る
+    Build long chat histories alternating assistant questions and human answers.
+    """
+    histories: List[List[Tuple[str, str]]] = []
+    for _ in range(count):
+        history: List[Tuple[str, str]] = []
+        for _ in range(turns):
+            history.append(("human", rng.choice(_ANSWERS)))
+            history.append(("assistant", rng.choice(_QUESTIONS)))
+        histories.append(history)
+    return histories
+
+
+def build_patches(rng: random.Random, count: int = 50) -> List[Dict[str, Any]]:
+    """
+    add/update/remove を含む差分パッチを作る
+    Build decision patches with add, update, and remove operations.
+    """
+    patches: List[Dict[str, Any]] = []
+    for _ in range(count):
+        added = rng.sample(_JA_ITEMS, 3)
+        updated = rng.sample(_JA_ITEMS, 2)
+        patches.append(
+            {
+                "add": {key: rng.choice(values) for key, values in added},
+                "update": {key: rng.choice(values) for key, values in updated},
+                "remove": [rng.choice(_JA_ITEMS)[0]],
+            }
+        )
+    return patches
+
+
+def build_responses(rng: random.Random, count: int = 50) -> List[Tuple[str, str]]:
+    """
+    ディレクティブを含む日英のLLM応答を作る
+    Build ja/en LLM responses carrying Select, DateSelect, and Yes/No directives.
+    """
+    bodies = {
+        "ja": "ご希望を踏まえて候補を整理しました。移動時間と費用のバランスを考えると、"
+        "次のような選び方がおすすめです。気になる点があれば遠慮なく教えてください。",
+        "en": "Based on your preferences, here is a short summary of options. Considering "
+        "travel time and cost, the following choices work well. Let me know if anything stands out.",
+    }
+    directives = [
+        "Select: [京都, 大阪, 札幌, 那覇]",
+        "DateSelect: true",
+        "Yes/No: この内容でプランを確定してよろしいですか？",
+        "Yes/No: Shall I finalize this plan?",
+        "",
+    ]
+    responses: List[Tuple[str, str]] = []
+    for index in range(count):
+        language = "en" if index % 2 else "ja"
+        body = " ".join([bodies[language]] * rng.randint(2, 5))
+        responses.append((f"{body}\n{directives[index % len(directives)]}", language))
+    return responses
+
+
+def build_benchmarks(seed: int = 1234) -> Dict[str, List[Callable[[], Any]]]:
+    """
+    ベンチマーク名から「コーパス1件ぶんの呼び出し」のリストへの対応を作る
+    Map benchmark names to lists of zero-argument calls, one per corpus entry.
+    """
+    rng = random.Random(seed)
+    decisions = build_decision_texts(rng)
+    histories = build_histories(rng)
+    patches = build_patches(rng)
+    responses = build_responses(rng)
+
+    return {
+        "enforce_decision_policy": [
+            functools.partial(_enforce_decision_policy, text, "travel", "en" if index % 3 == 0 else "ja")
+            for index, text in enumerate(decisions)
+        ],
+        "parse_decision_items": [functools.partial(_parse_decision_items, text) for text in decisions],
+        "apply_decision_patch": [
+            functools.partial(_apply_decision_patch, text, patch_data)
+            for text, patch_data in zip(decisions, patches)
+        ],
+        "derive_decision_patch_from_history": [
+            functools.partial(_derive_decision_patch_from_history, history, text)
+            for history, text in zip(histories, decisions)
+        ],
+        "parse_response_output": [
+            functools.partial(llama_core._parse_response_output, raw, language) for raw, language in responses
+        ],
+    }
+
+
+def measure(calls: Sequence[Callable[[], Any]], rounds: int, min_time: float) -> Dict[str, float]:
+    """
+    ops/sec（最良ラウンド）と1回あたりのメモリ確保ピークの平均を計測する
+    Measure ops/sec (best round) and the mean per-call allocation peak.
+    """
+    for call in calls:  # ウォームアップ（正規表現キャッシュなど） / warm up regex and lookup caches
+        call()
+
+    best = 0.0
+    for _ in range(rounds):
+        count = 0
+        start = time.perf_counter()
+        elapsed = 0.0
+        while elapsed < min_time:
+            for call in calls:
+                call()
+            count += len(calls)
+            elapsed = time.perf_counter() - start
+        best = max(best, count / elapsed)
+
+    total_peak = 0
+    tracemalloc.start()
+    try:
+        for call in calls:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            call()
+            _, peak = tracemalloc.get_traced_memory()
+            total_peak += max(0, peak - before)
+    finally:
+        tracemalloc.stop()
+    return {
+        "ops_per_sec": round(best, 1),
+        "alloc_peak_bytes": round(total_peak / max(1, len(calls)), 1),
+    }
+
+
+def run_benchmarks(
+    names: Optional[Sequence[str]] = None,
+    rounds: int = 7,
+    min_time: float = 0.25,
+) -> Dict[str, Dict[str, float]]:
+    """
+    ベンチマークを実行して結果を返す（出力ガードはネットワークを避けるため無効化）
+    Run the benchmarks; the output guard is stubbed so no network call is made.
+    """
+    benchmarks = build_benchmarks()
+    selected = list(names) if names else list(benchmarks)
+    results: Dict[str, Dict[str, float]] = {}
+    with patch.object(llama_core, "output_is_safe", return_value=True):
+        for name in selected:
+            results[name] = measure(benchmarks[name], rounds, min_time)
+    return results
+
+
+def compare_to_baseline(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    speed_tolerance: float = DEFAULT_SPEED_TOLERANCE,
+    alloc_tolerance: float = DEFAULT_ALLOC_TOLERANCE,
+) -> List[str]:
+    """
+    ベースラインと比較し、回帰の説明文のリストを返す（空なら回帰なし）
+    Compare with the baseline and return regression messages (empty when none).
+    """
+    regressions: List[str] = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        base_ops = float(base.get("ops_per_sec") or 0.0)
+        if base_ops and result["ops_per_sec"] < base_ops * (1 - speed_tolerance):
+            regressions.append(
+                f"{name}: ops/sec {result['ops_per_sec']:.0f} < baseline {base_ops:.0f} "
+                f"(-{(1 - result['ops_per_sec'] / base_ops) * 100:.0f}%)"
+            )
+        base_alloc = float(base.get("alloc_peak_bytes") or 0.0)
+        if base_alloc and result["alloc_peak_bytes"] > base_alloc * (1 + alloc_tolerance):
+            regressions.append(
+                f"{name}: alloc peak {result['alloc_peak_bytes']:.0f}B > baseline {base_alloc:.0f}B "
+                f"(+{(result['alloc_peak_bytes'] / base_alloc - 1) * 100:.0f}%)"
+            )
+    return regressions
+
+
+def _print_table(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]]) -> None:
+    """結果をベースラインとの比率付きで表示する / Print results with ratios to the baseline."""
+    print(f"{'benchmark':<38}{'ops/sec':>12}{'vs base':>10}{'alloc/op':>12}{'vs base':>10}")
+    for name, result in results.items():
+        base = baseline.get(name) or {}
+        speed = result["ops_per_sec"] / base["ops_per_sec"] if base.get("ops_per_sec") else None
+        alloc = result["alloc_peak_bytes"] / base["alloc_peak_bytes"] if base.get("alloc_peak_bytes") else None
+        print(
+            f"{name:<38}{result['ops_per_sec']:>12.0f}"
+            f"{(f'{speed:.2f}x' if speed else '-'):>10}"
+            f"{result['alloc_peak_bytes']:>11.0f}B"
+            f"{(f'{alloc:.2f}x' if alloc else '-'):>10}"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    EN: Run the benchmarks, compare with the baseline, and return the exit code.
+    JP: ベンチマークを実行してベースラインと比較し、終了コードを返す。
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("names", nargs="*", help="benchmarks to run (default: all)")
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.25, help="seconds per round")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH))
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--speed-tolerance", type=float, default=DEFAULT_SPEED_TOLERANCE)
+    parser.add_argument("--alloc-tolerance", type=float, default=DEFAULT_ALLOC_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.names, rounds=args.rounds, min_time=args.min_time)
+    baseline_path = pathlib.Path(args.baseline)
+    stored: Dict[str, Any] = {}
+    if baseline_path.exists():
+        stored = json.loads(baseline_path.read_text(encoding="utf-8"))
+    baseline = stored.get("benchmarks", {})
+
+    _print_table(results, baseline)
+    if args.update_baseline:
+        merged = dict(baseline)
+        merged.update(results)
+        payload = {"python": platform.python_version(), "machine": platform.machine(), "benchmarks": merged}
+        baseline_path.write_text(json.dumps(payload, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        print(f"Baseline updated: {baseline_path}")
+        return 0
+
+    if not baseline:
+        print("No baseline found; run with --update-baseline first.")
+        return 0
+    regressions = compare_to_baseline(results, baseline, args.speed_tolerance, args.alloc_tolerance)
+    if regressions:
+        print("\nREGRESSION DETECTED:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,144 @@
+"""
+1ターンあたりのシリアライズ CPU 時間をバックエンドごとに比較するベンチマーク。
+Per-turn serialization CPU time, compared across serializer backends.
+
+1ターン分の処理として、履歴の窓の読み込み（リスト要素のデコード）・新しい2発話の
+エンコード・ストリーミング応答の SSE フレーム（トークン単位の delta と meta/final）を
+再現し、旧方式（標準 json・役割名の文字列・ensure_ascii=False）と
+serialization モジュールの各バックエンドで計測します。
+Replays the serialization work of one turn (decoding the history window,
+encoding the two new messages, and the SSE frames of a streamed reply: one
+delta per token plus meta/final) and times it for the previous approach
+(stdlib json with role-name strings) and for each serialization backend.
+
+    python -m benchmarks.bench_serialization
+    python -m benchmarks.bench_serialization --history 80 --deltas 600
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import pathlib
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from unittest.mock import patch
+
+ROOT_DIR = pathlib.Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from backend import redis_client, serialization  # noqa: E402
+from benchmarks.bench_session_codec import build_conversations  # noqa: E402
+
+
+def _legacy_turn(raw_window: List[str], new_entries: List[Tuple[str, str]], frames: List[Dict[str, Any]]) -> None:
+    """
+    旧方式: 標準 json・役割名の文字列・ensure_ascii=False の SSE
+    Previous approach: stdlib json, role-name strings, ensure_ascii=False SSE frames.
+    """
+    [tuple(json.loads(item)) for item in raw_window]
+    [json.dumps(list(item), ensure_ascii=False) for item in new_entries]
+    for frame in frames:
+        f"data: {json.dumps(frame, ensure_ascii=False)}\n\n"
+
+
+def _current_turn(raw_window: List[str], new_entries: List[Tuple[str, str]], frames: List[Dict[str, Any]]) -> None:
+    """
+    現行方式: serialization 経由・役割コード
+    Current approach: serialization module with role codes.
+    """
+    redis_client._decode_entries(raw_window)
+    redis_client._encode_entries(new_entries)
+    for frame in frames:
+        serialization.sse_event(frame)
+
+
+def build_turn(history_size: int, deltas: int, seed: int = 1234) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]], List[Dict[str, Any]]]:
+    """
+    履歴の窓・新しい2発話・SSE フレームを作る
+    Build the history window, the two new messages and the SSE frames.
+    """
+    rng = random.Random(seed)
+    history = build_conversations(rng, count=1, turns=max(1, history_size // 2) + 1)[0]
+    window, new_entries = history[:history_size], history[-2:]
+    reply = new_entries[1][1]
+    step = max(1, len(reply) // max(1, deltas))
+    frames: List[Dict[str, Any]] = [{"type": "meta", "used_web_search": False}]
+    frames += [{"type": "delta", "content": reply[index : index + step]} for index in range(0, len(reply), step)][:deltas]
+    frames.append(
+        {
+            "type": "final",
+            "response": reply,
+            "current_plan": "目的地: 京都\n日程: 5月3日〜5日\n人数: 大人2人",
+            "yes_no_phrase": None,
+            "choices": ["京都", "大阪", "札幌"],
+            "is_date_select": False,
+            "remaining_text": reply,
+            "used_web_search": False,
+        }
+    )
+    return window, new_entries, frames
+
+
+def _time_per_call(func: Callable[[], None], min_time: float) -> float:
+    """
+    1回あたりの平均時間（マイクロ秒）を計測する
+    Measure mean microseconds per call.
+    """
+    func()
+    count = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time or count == 0:
+        func()
+        count += 1
+        elapsed = time.perf_counter() - start
+    return elapsed / count * 1e6
+
+
+def run(history_size: int, deltas: int, min_time: float) -> Dict[str, float]:
+    """
+    旧方式と各バックエンドの1ターンあたりの時間を計測する
+    Time one turn for the previous approach and each available backend.
+    """
+    window, new_entries, frames = build_turn(history_size, deltas)
+    legacy_raw = [json.dumps(list(item), ensure_ascii=False) for item in window]
+    results = {
+        "legacy (json, role names)": _time_per_call(lambda: _legacy_turn(legacy_raw, new_entries, frames), min_time)
+    }
+    backends = [serialization.BACKEND_JSON]
+    if serialization.orjson is not None:
+        backends.append(serialization.BACKEND_ORJSON)
+    for backend in backends:
+        with patch.object(serialization, "BACKEND", backend), patch.object(redis_client, "REDIS_COMPRESS_MIN_BYTES", 0):
+            raw_window = redis_client._encode_entries(window)
+            results[f"serialization ({backend})"] = _time_per_call(
+                lambda: _current_turn(raw_window, new_entries, frames), min_time
+            )
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    EN: Run the benchmark and print per-turn time and savings against the previous approach.
+    JP: ベンチマークを実行し、1ターンあたりの時間と旧方式からの削減量を表示する。
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", type=int, default=40, help="messages in the history window")
+    parser.add_argument("--deltas", type=int, default=300, help="SSE delta frames per reply")
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds per measurement")
+    args = parser.parse_args(argv)
+
+    results = run(args.history, args.deltas, args.min_time)
+    legacy = next(iter(results.values()))
+    print(f"{'approach':<30}{'us/turn':>10}{'saved':>10}")
+    for name, micros in results.items():
+        print(f"{name:<30}{micros:>10.1f}{(legacy - micros) / legacy:>10.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
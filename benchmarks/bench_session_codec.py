@@ -0,0 +1,188 @@
+"""
+セッション値の圧縮コーデック（redis_client）の CPU とバイト数のトレードオフ計測。
+CPU vs. bytes trade-off of the session value codec in redis_client.
+
+長い日英混在の会話を、履歴リストの1発話ごとの要素（現在の保存形式）と、
+履歴全体の JSON（旧形式・フォールバック）の2通りで用意し、圧縮レベルと
+閾値ごとに保存バイト数・圧縮率・エンコード/デコード時間を表示します。
+Builds long mixed ja/en conversations both as per-message list elements (the
+current storage format) and as one whole-history JSON value (legacy and
+fallback), then reports stored bytes, ratio and encode/decode time for each
+compression level and threshold.
+
+    python -m benchmarks.bench_session_codec
+    python -m benchmarks.bench_session_codec --levels 1 6 9 --thresholds 0 512 1024 4096
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import pathlib
+import random
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from unittest.mock import patch
+
+ROOT_DIR = pathlib.Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from backend import redis_client  # noqa: E402
+
+_JA_SENTENCES = [
+    "ご希望の条件を整理すると、{city}で{nights}泊、大人{people}人、予算は1人{budget}万円程度ですね。",
+    "移動は新幹線が便利で、東京駅から約{hours}時間です。",
+    "宿泊は駅近のホテルか、少し足を延ばして温泉旅館も候補になります。",
+    "紅葉の時期は混雑するため、{month}月中の早めの予約をおすすめします。",
+    "{city}駅周辺には朝食付きで1泊{price}円前後の宿が多くあります。",
+    "雨の日は美術館や老舗の甘味処を巡るプランも検討できます。",
+    "レンタカーを使う場合、駐車場付きの宿を選ぶと移動が楽になります。",
+    "お子さま連れなら、{city}の水族館や動物園も人気です。",
+    "夕食は地元の食材を使った会席料理が楽しめる店を{count}軒ほど候補に挙げました。",
+    "次に、出発日と帰着日の希望を教えていただけますか？",
+]
+_EN_SENTENCES = [
+    "A {nights}-night trip to {city} for {people} adults fits a budget of about {budget}0,000 yen each.",
+    "The Shinkansen from Tokyo takes roughly {hours} hours.",
+    "Consider a hotel near the station or a ryokan with hot springs.",
+    "Book early for {month}, as autumn foliage season is busy.",
+    "Many inns near {city} Station cost around {price} yen per night with breakfast.",
+    "Which dates would you like to depart and return?",
+]
+_CITIES = ["京都", "金沢", "札幌", "那覇", "箱根", "Kyoto", "Osaka"]
+_QUESTIONS = ["京都に行きたいです", "予算は5万円くらい", "大人2人です", "I'd like a quiet ryokan", "紅葉は見られますか？"]
+
+
+def _reply(rng: random.Random, sentences: Sequence[str], length: int) -> str:
+    """
+    文のプールから毎回異なる応答を組み立てる
+    Assemble a reply from the sentence pool, varied on every call.
+    """
+    return "".join(
+        rng.choice(sentences).format(
+            city=rng.choice(_CITIES),
+            nights=rng.randint(1, 4),
+            people=rng.randint(1, 5),
+            budget=rng.randint(2, 15),
+            hours=rng.randint(1, 5),
+            month=rng.randint(1, 12),
+            price=rng.randint(6, 30) * 1000,
+            count=rng.randint(2, 6),
+        )
+        + ("" if sentences is _JA_SENTENCES else " ")
+        for _ in range(length)
+    )
+
+
+def build_conversations(rng: random.Random, count: int = 10, turns: int = 40) -> List[List[Tuple[str, str]]]:
+    """
+    長い会話（assistant の応答は数段落）を作る
+    Build long conversations with multi-paragraph assistant replies.
+    """
+    conversations: List[List[Tuple[str, str]]] = []
+    for index in range(count):
+        sentences = _EN_SENTENCES if index % 4 == 0 else _JA_SENTENCES
+        history: List[Tuple[str, str]] = []
+        for _ in range(turns):
+            history.append(("human", rng.choice(_QUESTIONS)))
+            history.append(("assistant", _reply(rng, sentences, rng.randint(3, 25))))
+        conversations.append(history)
+    return conversations
+
+
+def _time_per_op(func: Callable[[str], object], values: Sequence[str], min_time: float) -> float:
+    """
+    1回あたりの平均時間（マイクロ秒）を計測する
+    Measure mean microseconds per call.
+    """
+    count = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        for value in values:
+            func(value)
+        count += len(values)
+        elapsed = time.perf_counter() - start
+    return elapsed / max(1, count) * 1e6
+
+
+def measure(values: Sequence[str], level: int, threshold: int, min_time: float) -> Dict[str, float]:
+    """
+    指定の圧縮レベル・閾値でのバイト数と時間を計測する
+    Measure bytes and time for one compression level and threshold.
+    """
+    with patch.object(redis_client, "REDIS_COMPRESS_LEVEL", level), patch.object(
+        redis_client, "REDIS_COMPRESS_MIN_BYTES", threshold
+    ):
+        encoded = [redis_client._encode_value(value) for value in values]
+        encode_us = _time_per_op(redis_client._encode_value, values, min_time)
+    decode_us = _time_per_op(redis_client._decode_value, encoded, min_time)
+    raw_bytes = sum(len(value.encode("utf-8")) for value in values)
+    stored_bytes = sum(len(value.encode("utf-8")) for value in encoded)
+    compressed = sum(1 for value in encoded if value.startswith(redis_client._CODEC_ZLIB_V1))
+    return {
+        "raw_bytes": raw_bytes,
+        "stored_bytes": stored_bytes,
+        "ratio": round(stored_bytes / max(1, raw_bytes), 3),
+        "compressed_share": round(compressed / max(1, len(values)), 3),
+        "encode_us": round(encode_us, 2),
+        "decode_us": round(decode_us, 2),
+    }
+
+
+def run(levels: Sequence[int], thresholds: Sequence[int], min_time: float, seed: int = 1234) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """
+    コーパスごとに全組み合わせを計測する
+    Measure every level/threshold combination for each corpus.
+    """
+    conversations = build_conversations(random.Random(seed))
+    corpora = {
+        "message": [json.dumps(list(item), ensure_ascii=False) for history in conversations for item in history],
+        "whole_history": [json.dumps(history, ensure_ascii=False) for history in conversations],
+    }
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for corpus, values in corpora.items():
+        for level in levels:
+            for threshold in thresholds:
+                results.setdefault(corpus, {})[f"level={level} min={threshold}"] = measure(
+                    values, level, threshold, min_time
+                )
+    return results
+
+
+def _print_table(results: Dict[str, Dict[str, Dict[str, float]]]) -> None:
+    """結果を表で表示する / Print the results as a table."""
+    for corpus, rows in results.items():
+        print(f"\n[{corpus}]")
+        print(f"{'setting':<24}{'raw KiB':>10}{'stored KiB':>12}{'ratio':>8}{'zipped':>8}{'enc us':>10}{'dec us':>10}")
+        for setting, row in rows.items():
+            print(
+                f"{setting:<24}{row['raw_bytes'] / 1024:>10.1f}{row['stored_bytes'] / 1024:>12.1f}"
+                f"{row['ratio']:>8.2f}{row['compressed_share']:>8.0%}{row['encode_us']:>10.1f}{row['decode_us']:>10.1f}"
+            )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    EN: Run the codec benchmark and print (or dump) the results.
+    JP: コーデックのベンチマークを実行し、結果を表示（または JSON 出力）する。
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 6, 9])
+    parser.add_argument("--thresholds", type=int, nargs="+", default=[0, 512, 1024, 4096])
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per measurement")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args(argv)
+
+    results = run(args.levels, args.thresholds, args.min_time)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        _print_table(results)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
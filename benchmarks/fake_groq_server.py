@@ -0,0 +1,426 @@
+"""
+負荷・レイテンシ計測用のローカル Groq 互換（OpenAI互換）サーバー。
+Local OpenAI-compatible stand-in for the Groq API, for load and latency testing.
+
+`GROQ_BASE_URL=http://127.0.0.1:8787/openai/v1` を指定すると、バックエンド全体を
+ネットワークなしで動かせます（`GROQ_API_KEY` は任意の値で構いません）。
+Point `GROQ_BASE_URL=http://127.0.0.1:8787/openai/v1` at it to run the whole
+backend offline (`GROQ_API_KEY` can be any value).
+
+    python -m benchmarks.fake_groq_server --port 8787 --ttfb 0.3 --tokens-per-sec 200
+
+応答はリクエスト内容（ガード・検索ルーター・決定事項・予約抽出・通常チャット）から
+種類を判定し、Select / DateSelect / Yes/No / 決定事項JSON を順に返すスクリプトで
+生成します。`--script` で種類ごとの応答リストを差し替えられます。
+Responses are scripted per request kind (guard, search router, decision,
+reservation, chat) and cycle through Select, DateSelect, Yes/No, and decision
+JSON. `--script` replaces the response list for any kind.
+"""
+
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import uuid
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCRIPTS: Dict[str, List[str]] = {
+    "chat": [
+        "いいですね！どちらに行きたいですか？\nSelect: [京都, 大阪, 札幌]",
+        "日程を選んでください。\nDateSelect: true",
+        "Yes/No: この内容でプランを確定してよろしいですか？",
+        "承知しました。ほかに希望があれば教えてください。",
+    ],
+    "decision": [
+        '{"add": {"目的地": "京都"}, "update": {}, "remove": []}',
+        '{"add": {"日程": "2026-05-03〜2026-05-05"}, "update": {}, "remove": []}',
+        '{"add": {}, "update": {"予算": "5万円"}, "remove": []}',
+        "{}",
+    ],
+    "guard": ['{"verdict": "safe", "categories": [], "reason": "fake"}'],
+    "router": ['{"should_search": false, "query": "", "reason": "fake"}'],
+    "reservation": [
+        '{"destinations": "京都", "departure": "東京", "hotel": null, "airlines": null,'
+        ' "railway": "JR", "taxi": null, "start_date": "2026-05-03", "end_date": "2026-05-05"}'
+    ],
+}
+UNSAFE_TRIGGER = "FAKE_UNSAFE"
+_CJK_RE = re.compile(r"[぀-ヿ㐀-鿿]")
+
+
+def _env_float(name: str, default: float) -> float:
+    """
+    環境変数を float として読み込み、失敗時は既定値を返す
+    Read an environment variable as float, or return the default on parse failure.
+    """
+    try:
+        return float(os.getenv(name, str(default)).strip())
+    except ValueError:
+        return default
+
+
+@dataclass
+class FakeGroqConfig:
+    """
+    フェイクサーバーの遅延・障害注入設定
+    Latency and fault-injection settings for the fake server.
+    """
+
+    latency: float = 0.0
+    ttfb: float = 0.0
+    tokens_per_sec: float = 0.0
+    rate_limit_rate: float = 0.0
+    timeout_rate: float = 0.0
+    timeout_seconds: float = 60.0
+    tool_call_rate: float = 0.0
+    tool_use_failed_rate: float = 0.0
+    seed: Optional[int] = None
+    scripts: Dict[str, List[str]] = field(default_factory=lambda: dict(DEFAULT_SCRIPTS))
+
+    @classmethod
+    def from_env(cls) -> "FakeGroqConfig":
+        """環境変数から設定を読み込む / Build a config from FAKE_GROQ_* variables."""
+        return cls(
+            latency=_env_float("FAKE_GROQ_LATENCY", 0.0),
+            ttfb=_env_float("FAKE_GROQ_TTFB", 0.0),
+            tokens_per_sec=_env_float("FAKE_GROQ_TOKENS_PER_SEC", 0.0),
+            rate_limit_rate=_env_float("FAKE_GROQ_429_RATE", 0.0),
+            timeout_rate=_env_float("FAKE_GROQ_TIMEOUT_RATE", 0.0),
+            timeout_seconds=_env_float("FAKE_GROQ_TIMEOUT_SECONDS", 60.0),
+            tool_call_rate=_env_float("FAKE_GROQ_TOOL_CALL_RATE", 0.0),
+            tool_use_failed_rate=_env_float("FAKE_GROQ_TOOL_USE_FAILED_RATE", 0.0),
+        )
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    トークン数を概算する（日本語は1文字、英数字は4文字で1トークン）
+    Roughly estimate tokens (one per CJK char, one per four other chars).
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + max(0, len(text) - cjk + 3) // 4
+
+
+def classify_request(payload: Dict[str, Any]) -> str:
+    """
+    リクエスト内容から応答の種類を判定する
+    Classify a chat-completions request into a scripted response kind.
+    """
+    messages = payload.get("messages") or []
+    system = str(messages[0].get("content", "")) if messages else ""
+    last_user = str(messages[-1].get("content", "")) if messages else ""
+    model = str(payload.get("model", ""))
+
+    if "safeguard" in model or "safety classifier" in system:
+        return "guard"
+    if "search router" in system or "検索ルーター" in system:
+        return "router"
+    if "予約に関する情報を抽出" in system:
+        return "reservation"
+    if "JSON" in last_user and ("決定事項" in last_user or "decisions" in last_user):
+        return "decision"
+    return "chat"
+
+
+def _split_stream_pieces(text: str) -> List[str]:
+    """
+    ストリーミング用に本文をトークン相当の断片へ分割する
+    Split text into token-sized pieces for streaming.
+    """
+    pieces: List[str] = []
+    for match in re.finditer(r"[぀-ヿ㐀-鿿]|\s*[^\s぀-ヿ㐀-鿿]{1,4}|\s+", text):
+        pieces.append(match.group(0))
+    return pieces or [text]
+
+
+class FakeGroqServer(ThreadingHTTPServer):
+    """
+    設定とスクリプト位置を保持する HTTP サーバー
+    HTTP server holding the fake config and script cursors.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], config: FakeGroqConfig) -> None:
+        super().__init__(address, FakeGroqHandler)
+        self.config = config
+        self.random = random.Random(config.seed)
+        self._cursors = {kind: itertools.cycle(items) for kind, items in config.scripts.items() if items}
+        self._lock = threading.Lock()
+        self.request_count = 0
+
+    def next_scripted(self, kind: str, payload: Dict[str, Any]) -> str:
+        """
+        種類ごとのスクリプトから次の応答を返す
+        Return the next scripted response for a request kind.
+        """
+        if kind == "guard":
+            messages = payload.get("messages") or []
+            content = str(messages[-1].get("content", "")) if messages else ""
+            if UNSAFE_TRIGGER in content:
+                return '{"verdict": "unsafe", "categories": ["fake"], "reason": "trigger"}'
+        with self._lock:
+            self.request_count += 1
+            cursor = self._cursors.get(kind) or self._cursors.get("chat")
+            return next(cursor) if cursor else ""
+
+    def roll(self, rate: float) -> bool:
+        """確率 `rate` で True を返す / Return True with probability `rate`."""
+        if rate <= 0:
+            return False
+        with self._lock:
+            return self.random.random() < rate
+
+
+class FakeGroqHandler(BaseHTTPRequestHandler):
+    """
+    `/chat/completions` と `/models` を実装するリクエストハンドラ
+    Request handler implementing `/chat/completions` and `/models`.
+    """
+
+    server: FakeGroqServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        logger.debug("fake-groq: " + format, *args)
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "fake", "object": "model"}]})
+            return
+        self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+
+    def do_POST(self) -> None:
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "invalid JSON", "type": "invalid_request_error"}})
+            return
+
+        config = self.server.config
+        if self.server.roll(config.rate_limit_rate):
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit reached (fake)", "type": "rate_limit_exceeded"}},
+                headers={"retry-after": "1"},
+            )
+            return
+        if self.server.roll(config.timeout_rate):
+            time.sleep(config.timeout_seconds)
+            self.close_connection = True
+            return
+
+        kind = classify_request(payload)
+        text = self.server.next_scripted(kind, payload)
+        has_tools = bool(payload.get("tools"))
+        if kind == "chat" and not has_tools and self.server.roll(config.tool_use_failed_rate):
+            self._send_json(
+                400,
+                {
+                    "error": {
+                        "message": "Tool choice is none, but model called a tool (fake)",
+                        "type": "invalid_request_error",
+                        "code": "tool_use_failed",
+                    }
+                },
+            )
+            return
+        as_tool_call = has_tools and (kind == "chat") and (
+            config.tool_call_rate <= 0 or self.server.roll(config.tool_call_rate)
+        )
+
+        prompt_tokens = sum(estimate_tokens(str(m.get("content", ""))) for m in payload.get("messages") or [])
+        completion_tokens = estimate_tokens(text)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        model = str(payload.get("model") or "fake")
+        if payload.get("stream"):
+            self._stream(model, text, usage)
+        else:
+            self._complete(model, text, usage, as_tool_call)
+
+    def _complete(self, model: str, text: str, usage: Dict[str, int], as_tool_call: bool) -> None:
+        """非ストリーミング応答を返す / Send a non-streaming completion."""
+        config = self.server.config
+        delay = config.latency
+        if config.tokens_per_sec > 0:
+            delay += usage["completion_tokens"] / config.tokens_per_sec
+        if delay > 0:
+            time.sleep(delay)
+
+        message: Dict[str, Any] = {"role": "assistant", "content": text}
+        finish_reason = "stop"
+        if as_tool_call:
+            message = {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [
+                    {
+                        "id": f"call_{uuid.uuid4().hex[:12]}",
+                        "type": "function",
+                        "function": {
+                            "name": "assistant",
+                            "arguments": json.dumps({"role": "assistant", "content": text}, ensure_ascii=False),
+                        },
+                    }
+                ],
+            }
+            finish_reason = "tool_calls"
+        self._send_json(
+            200,
+            {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": usage,
+            },
+        )
+
+    def _stream(self, model: str, text: str, usage: Dict[str, int]) -> None:
+        """SSE 形式でトークン断片を送信する / Stream token pieces as SSE chunks."""
+        config = self.server.config
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        wait = config.ttfb if config.ttfb > 0 else config.latency
+        if wait > 0:
+            time.sleep(wait)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None, **extra: Any) -> None:
+            body = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            body.update(extra)
+            self.wfile.write(f"data: {json.dumps(body, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        try:
+            chunk({"role": "assistant", "content": ""})
+            for piece in _split_stream_pieces(text):
+                if config.tokens_per_sec > 0:
+                    time.sleep(1.0 / config.tokens_per_sec)
+                chunk({"content": piece})
+            chunk({}, "stop", usage=usage, x_groq={"usage": usage})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            logger.debug("fake-groq: client disconnected during stream")
+
+    def _send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        """JSON レスポンスを送信する / Send a JSON response."""
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def load_scripts(path: Optional[str]) -> Dict[str, List[str]]:
+    """
+    既定スクリプトに JSON ファイルの内容を上書きして返す
+    Return default scripts overridden by a JSON file of `{kind: [responses]}`.
+    """
+    scripts = dict(DEFAULT_SCRIPTS)
+    if not path:
+        return scripts
+    with open(path, "r", encoding="utf-8") as f:
+        loaded = json.load(f)
+    for kind, items in loaded.items():
+        if isinstance(items, list) and items:
+            scripts[kind] = [item if isinstance(item, str) else json.dumps(item, ensure_ascii=False) for item in items]
+    return scripts
+
+
+def create_server(host: str = "127.0.0.1", port: int = 0, config: Optional[FakeGroqConfig] = None) -> FakeGroqServer:
+    """
+    フェイクサーバーを生成する（port=0 で空きポートを使用）
+    Create a fake server; port 0 picks a free port.
+    """
+    return FakeGroqServer((host, port), config or FakeGroqConfig.from_env())
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    EN: Run the fake Groq server from the command line.
+    JP: コマンドラインからフェイク Groq サーバーを起動する。
+    """
+    defaults = FakeGroqConfig.from_env()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", type=float, default=defaults.latency, help="seconds before a non-stream reply")
+    parser.add_argument("--ttfb", type=float, default=defaults.ttfb, help="seconds before the first stream chunk")
+    parser.add_argument("--tokens-per-sec", type=float, default=defaults.tokens_per_sec, help="0 = unthrottled")
+    parser.add_argument("--rate-limit-rate", type=float, default=defaults.rate_limit_rate, help="share of 429s")
+    parser.add_argument("--timeout-rate", type=float, default=defaults.timeout_rate, help="share of hung requests")
+    parser.add_argument("--timeout-seconds", type=float, default=defaults.timeout_seconds)
+    parser.add_argument("--tool-call-rate", type=float, default=defaults.tool_call_rate,
+                        help="share of tool_calls replies when tools are sent (0 = always)")
+    parser.add_argument("--tool-use-failed-rate", type=float, default=defaults.tool_use_failed_rate,
+                        help="share of tool_use_failed 400s on chat requests without tools")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--script", default=os.getenv("FAKE_GROQ_SCRIPT"), help="JSON file of {kind: [responses]}")
+    args = parser.parse_args(argv)
+
+    config = FakeGroqConfig(
+        latency=args.latency,
+        ttfb=args.ttfb,
+        tokens_per_sec=args.tokens_per_sec,
+        rate_limit_rate=args.rate_limit_rate,
+        timeout_rate=args.timeout_rate,
+        timeout_seconds=args.timeout_seconds,
+        tool_call_rate=args.tool_call_rate,
+        tool_use_failed_rate=args.tool_use_failed_rate,
+        seed=args.seed,
+        scripts=load_scripts(args.script),
+    )
+    logging.basicConfig(level=logging.INFO)
+    server = create_server(args.host, args.port, config)
+    host, port = server.server_address[:2]
+    logger.info("Fake Groq server listening on http://%s:%s/openai/v1", host, port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -3,7 +3,7 @@ import { apiUrl } from '../utils/apiBase'
 import { getStoredUserType } from '../utils/userType'
 import { consumeChatSse } from '../utils/sseChatStream'
 import { parseChatDirectiveText } from '../utils/chatDirectiveParser'
-import type { ApiErrorResponse, ChatStreamFinalEvent } from '../types/api'
+import type { ApiErrorResponse, ChatStreamFinalEvent, DecisionStatusResponse } from '../types/api'
 import type { ChatMessage, ChatMessageUpdate } from '../types/chat'
 import type { AppError } from '../types/error'
 import {
@@ -26,6 +26,9 @@ type PersistedChatState = {
 }
 
 const CHAT_STATE_STORAGE_PREFIX = 'yorozu_chat_state'
+// 決定事項のポーリング間隔と回数（約30秒）/ Decision polling interval and attempts (about 30 seconds)
+const DECISION_POLL_INTERVAL_MS = 1500
+const DECISION_POLL_MAX_ATTEMPTS = 20
 
 const buildChatStorageKey = (messageEndpoint: string): string =>
   `${CHAT_STATE_STORAGE_PREFIX}:${messageEndpoint.replace(/[^a-zA-Z0-9_-]/g, '_')}`
@@ -158,6 +161,8 @@ export const useGenericChat = ({
   const [planFromChat, setPlanFromChat] = useState(initialStateRef.current.planFromChat)
   const inFlightRef = useRef(false)
   const queuedMessageRef = useRef<string | null>(null)
+  // 最新ターンのポーリングだけを有効にする / Only the newest turn's decision poll stays active
+  const decisionPollRef = useRef(0)
 
   useEffect(() => {
     // sessionStorageに履歴がない場合、バックエンドのRedisもリセットしてフロントと同期させる。
@@ -199,6 +204,28 @@ export const useGenericChat = ({
     setLoading(false)
   }
 
+  // `decision` イベントが届かなかった場合に、決定事項を /api/decision から取得する
+  // Fetch decisions from /api/decision when the stream ended without a `decision` event
+  const pollDecision = async (turn: number, pollId: number) => {
+    for (let attempt = 0; attempt < DECISION_POLL_MAX_ATTEMPTS; attempt += 1) {
+      await new Promise((resolve) => setTimeout(resolve, DECISION_POLL_INTERVAL_MS))
+      if (decisionPollRef.current !== pollId) return
+      try {
+        const response = await fetch(apiUrl(`/api/decision?turn=${turn}`), { credentials: 'include' })
+        if (!response.ok) return
+        const data = (await response.json()) as DecisionStatusResponse
+        if (decisionPollRef.current !== pollId) return
+        if (data.status === 'ready') {
+          setPlanFromChat(data.current_plan ?? '')
+          return
+        }
+      } catch {
+        // 決定事項の取得失敗は致命的ではないため、次のターンで再取得する
+        return
+      }
+    }
+  }
+
   const sendMessage = async (text: string) => {
     const trimmed = text.trim()
     if (!trimmed) return
@@ -242,6 +269,19 @@ export const useGenericChat = ({
       typeof requestTimeoutMs === 'number' && requestTimeoutMs > 0
         ? setTimeout(() => requestController.abort(), requestTimeoutMs)
         : null
+    const streamState: { finalEvent: ChatStreamFinalEvent | null; usedWebSearch: boolean } = {
+      finalEvent: null,
+      usedWebSearch: false,
+    }
+    // final 後も同じストリームで `decision` イベントを待つ（新しいターンが始まれば無視する）
+    // After final the same stream may still carry a `decision` event (ignored once a newer turn starts)
+    const decisionState = { pollId: 0, received: false }
+    const pollMissedDecision = () => {
+      const finalEvent = streamState.finalEvent
+      if (finalEvent?.decision_pending && !decisionState.received && typeof finalEvent.turn === 'number') {
+        void pollDecision(finalEvent.turn, decisionState.pollId)
+      }
+    }
 
     try {
       const response = await fetch(apiUrl(messageEndpoint), {
@@ -265,10 +305,6 @@ export const useGenericChat = ({
       }
 
       let streamedRawText = ''
-      const streamState: { finalEvent: ChatStreamFinalEvent | null; usedWebSearch: boolean } = {
-        finalEvent: null,
-        usedWebSearch: false,
-      }
 
       updateMessageMeta(loadingMessageId, {
         type: 'loading',
@@ -313,6 +349,40 @@ export const useGenericChat = ({
         return parsed.cleanedText
       }
 
+      const applyFinalEvent = (finalResult: ChatStreamFinalEvent) => {
+        if (finalResult.current_plan !== undefined) {
+          setPlanFromChat(finalResult.current_plan ?? '')
+        }
+
+        const remainingText = finalResult.remaining_text
+        const remainingTextValue =
+          typeof remainingText === 'string' && remainingText !== 'Empty' ? remainingText : null
+        const finalText = remainingTextValue ?? finalResult.response ?? ''
+        const parsedFinalText = parseChatDirectiveText(finalText)
+        const finalChoices =
+          finalResult.choices && Array.isArray(finalResult.choices) && finalResult.choices.length > 0
+            ? finalResult.choices
+            : directiveState.choices.length > 0
+              ? directiveState.choices
+              : parsedFinalText.choices
+        const finalYesNoPhrase =
+          finalResult.yes_no_phrase ?? directiveState.yesNoPhrase ?? parsedFinalText.yesNoPhrase
+        const finalIsDateSelect = Boolean(
+          finalResult.is_date_select || directiveState.isDateSelect || parsedFinalText.isDateSelect,
+        )
+        const finalMessageType =
+          finalChoices.length > 0 ? 'selection' : finalYesNoPhrase ? 'yesno' : finalIsDateSelect ? 'date_selection' : undefined
+        const finalMessageText = finalYesNoPhrase ?? parsedFinalText.cleanedText
+
+        updateMessageMeta(loadingMessageId, {
+          text: finalMessageText,
+          type: finalMessageType,
+          loading_variant: undefined,
+          pending: false,
+          choices: finalChoices.length > 0 ? finalChoices : undefined,
+        })
+      }
+
       await consumeChatSse(response, (event) => {
         if (event.type === 'search_start') {
           streamState.usedWebSearch = true
@@ -337,48 +407,37 @@ export const useGenericChat = ({
         }
         if (event.type === 'final') {
           streamState.finalEvent = event
+          applyFinalEvent(event)
+          // 応答はここで完了し、サーバーもセッションロックを解放済み
+          // The reply is complete here and the server has released the session lock
+          if (timeoutId) {
+            clearTimeout(timeoutId)
+          }
+          decisionPollRef.current += 1
+          decisionState.pollId = decisionPollRef.current
+          finishSending()
+          sendQueuedMessage()
+          return
+        }
+        if (event.type === 'decision') {
+          decisionState.received = true
+          if (decisionPollRef.current === decisionState.pollId && event.current_plan !== undefined) {
+            setPlanFromChat(event.current_plan ?? '')
+          }
         }
       })
 
       if (!streamState.finalEvent) {
         throw new Error('ストリーミングが途中で終了しました。')
       }
-      const finalResult = streamState.finalEvent
-
-      if (finalResult.current_plan !== undefined) {
-        setPlanFromChat(finalResult.current_plan ?? '')
-      }
 
-      const remainingText = finalResult.remaining_text
-      const remainingTextValue =
-        typeof remainingText === 'string' && remainingText !== 'Empty' ? remainingText : null
-      const finalText = remainingTextValue ?? finalResult.response ?? ''
-      const parsedFinalText = parseChatDirectiveText(finalText)
-      const finalChoices =
-        finalResult.choices && Array.isArray(finalResult.choices) && finalResult.choices.length > 0
-          ? finalResult.choices
-          : directiveState.choices.length > 0
-            ? directiveState.choices
-            : parsedFinalText.choices
-      const finalYesNoPhrase =
-        finalResult.yes_no_phrase ?? directiveState.yesNoPhrase ?? parsedFinalText.yesNoPhrase
-      const finalIsDateSelect = Boolean(
-        finalResult.is_date_select || directiveState.isDateSelect || parsedFinalText.isDateSelect,
-      )
-      const finalMessageType =
-        finalChoices.length > 0 ? 'selection' : finalYesNoPhrase ? 'yesno' : finalIsDateSelect ? 'date_selection' : undefined
-      const finalMessageText = finalYesNoPhrase ?? parsedFinalText.cleanedText
-
-      updateMessageMeta(loadingMessageId, {
-        text: finalMessageText,
-        type: finalMessageType,
-        loading_variant: undefined,
-        pending: false,
-        choices: finalChoices.length > 0 ? finalChoices : undefined,
-      })
-
-      finishSending()
+      pollMissedDecision()
     } catch (error) {
+      if (streamState.finalEvent) {
+        // 応答の後で切れた場合は決定事項だけを取り直す / Cut off after the reply: only refetch the decision
+        pollMissedDecision()
+        return
+      }
       const appError = normalizeAppError(error)
       const message = appError.message
 
@@ -393,11 +452,15 @@ export const useGenericChat = ({
       if (timeoutId) {
         clearTimeout(timeoutId)
       }
-      if (!inFlightRef.current && queuedMessageRef.current) {
-        const queuedMessage = queuedMessageRef.current
-        queuedMessageRef.current = null
-        void sendMessage(queuedMessage)
-      }
+      sendQueuedMessage()
+    }
+  }
+
+  const sendQueuedMessage = () => {
+    if (!inFlightRef.current && queuedMessageRef.current) {
+      const queuedMessage = queuedMessageRef.current
+      queuedMessageRef.current = null
+      void sendMessage(queuedMessage)
     }
   }
 
@@ -409,6 +472,7 @@ export const useGenericChat = ({
     const nextMessages = [{ ...initialMessage }]
     inFlightRef.current = false
     queuedMessageRef.current = null
+    decisionPollRef.current += 1
     setLoading(false)
     setMessages(nextMessages)
     setPlanFromChat('')
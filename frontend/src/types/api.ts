@@ -63,9 +63,33 @@ export type ChatStreamDeltaEvent = {
 export type ChatStreamFinalEvent = ChatResponsePayload & {
   type: 'final'
   used_web_search?: boolean
+  decision_pending?: boolean
+  turn?: number
 }
 
-export type ChatStreamEvent = ChatStreamSearchStartEvent | ChatStreamMetaEvent | ChatStreamDeltaEvent | ChatStreamFinalEvent
+export type ChatStreamDecisionEvent = {
+  type: 'decision'
+  current_plan?: string | null
+  turn?: number
+}
+
+export type ChatStreamEvent =
+  | ChatStreamSearchStartEvent
+  | ChatStreamMetaEvent
+  | ChatStreamDeltaEvent
+  | ChatStreamFinalEvent
+  | ChatStreamDecisionEvent
+
+/**
+ * EN: Define the DecisionStatusResponse type alias returned by /api/decision.
+ * JP: /api/decision が返す DecisionStatusResponse 型エイリアスを定義する。
+ */
+export type DecisionStatusResponse = {
+  status?: 'ready' | 'pending'
+  current_plan?: string | null
+  turn?: number
+  decision_turn?: number
+}
 
 /**
  * EN: Define the PlanSummaryResponse type alias.
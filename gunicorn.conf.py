@@ -0,0 +1,36 @@
+"""
+gunicorn 設定（Prometheus マルチプロセス集計の準備）。
+gunicorn settings that prepare Prometheus multiprocess aggregation.
+
+gunicorn は作業ディレクトリの gunicorn.conf.py を自動で読み込みます。
+ワーカー起動前に PROMETHEUS_MULTIPROC_DIR を用意し、終了したワーカーの値を整理します。
+gunicorn loads ./gunicorn.conf.py automatically. The multiprocess directory is
+prepared before workers fork, and exited workers are marked dead.
+"""
+
+import os
+import shutil
+
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/yorozu_prometheus")
+
+
+def on_starting(server):
+    """前回起動時のメトリクスファイルを削除する / Clear metric files from a previous run."""
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """終了したワーカーのライブ値を集計から外す / Drop live gauges of an exited worker."""
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def post_fork(server, worker):
+    """
+    ワーカーのスレッド数を Redis 接続プールの既定サイズ用に公開する
+    Expose the worker's thread count so the Redis pool can size itself.
+    """
+    os.environ["GUNICORN_THREADS"] = str(server.cfg.threads)
@@ -70,7 +70,10 @@ class _StubRedisModule:
         """
         self.reset_sessions = []
         self.saved_user_types = {}
-        self.saved_user_languages = {}
+        self.chat_histories = {}
+        self.decisions = {}
+        self.decision_turns = {}
+        self.current_turns = {}
 
     def reset_session(self, session_id):
         """
@@ -89,8 +92,20 @@ class _StubRedisModule:
     def get_user_language(self, _session_id):
         return ""
 
-    def save_user_language(self, session_id, language):
-        self.saved_user_languages[session_id] = language
+    def get_chat_history(self, session_id):
+        return list(self.chat_histories.get(session_id, []))
+
+    def get_decision(self, session_id):
+        return self.decisions.get(session_id, "")
+
+    def get_decision_turn(self, session_id):
+        return self.decision_turns.get(session_id, -1)
+
+    def get_current_turn(self, session_id):
+        return self.current_turns.get(session_id, 0)
+
+    def load_session_snapshot(self, _session_id):
+        return None
 
 
 class ApiE2ETests(unittest.TestCase):
@@ -110,7 +125,10 @@ class ApiE2ETests(unittest.TestCase):
             for name in ("redis", "backend.llama_core", "backend.reservation")
         }
 
-        redis_stub = types.SimpleNamespace(from_url=lambda *args, **kwargs: _DummyRedisBackend())
+        redis_stub = types.SimpleNamespace(
+            from_url=lambda *args, **kwargs: _DummyRedisBackend(),
+            BlockingConnectionPool=object,
+        )
         llama_stub = types.SimpleNamespace(
             resolve_user_language=lambda _message, fallback=None, accept_language=None: fallback or "ja",
             chat_with_llama=lambda _session_id, _prompt, mode="travel", language=None: (
@@ -131,6 +149,16 @@ class ApiE2ETests(unittest.TestCase):
         sys.modules["backend.llama_core"] = llama_stub
         sys.modules["backend.reservation"] = reservation_stub
 
+        # 他のテストで実モジュールが読み込み済みでも `from backend import ...` がスタブを参照するようにする
+        # Make `from backend import ...` resolve to the stubs even if other tests imported the real modules
+        import backend
+
+        cls._orig_package_attrs = {
+            name: getattr(backend, name, None) for name in ("llama_core", "reservation")
+        }
+        backend.llama_core = llama_stub
+        backend.reservation = reservation_stub
+
         import backend.database as database
 
         cls._orig_init_db = database.init_db
@@ -146,6 +174,12 @@ class ApiE2ETests(unittest.TestCase):
             else:
                 sys.modules[name] = module
 
+        for name, module in cls._orig_package_attrs.items():
+            if module is None:
+                delattr(backend, name)
+            else:
+                setattr(backend, name, module)
+
     def setUp(self):
         """
         EN: Prepare test fixtures.
@@ -380,6 +414,39 @@ class ApiE2ETests(unittest.TestCase):
         payload = response.get_json()
         self.assertEqual(payload["response"], "study-ok")
 
+    def test_api_decision_reports_pending_until_turn_is_reflected(self):
+        """
+        EN: Decision polling reports pending until decisions reflect the current turn.
+        JP: 決定事項が現在のターンに追いつくまで pending を返すことを検証するテスト。
+        """
+        self.client.set_cookie("localhost", "session_id", "session-decision")
+        self.redis_stub.chat_histories["session-decision"] = [
+            ("human", "京都に行きたい"),
+            ("assistant", "いいですね"),
+        ]
+        self.redis_stub.current_turns["session-decision"] = 1
+        self.redis_stub.decisions["session-decision"] = "決定している項目がありません。"
+
+        response = self.client.get("/api/decision")
+        self.assertEqual(response.status_code, 200)
+        payload = response.get_json()
+        self.assertEqual(payload["status"], "pending")
+        self.assertEqual(payload["turn"], 1)
+
+        self.redis_stub.decisions["session-decision"] = "目的地：京都"
+        self.redis_stub.decision_turns["session-decision"] = 1
+        payload = self.client.get("/api/decision?turn=1").get_json()
+        self.assertEqual(payload["status"], "ready")
+        self.assertEqual(payload["current_plan"], "目的地：京都")
+
+    def test_api_decision_requires_session(self):
+        """
+        EN: Decision polling without a session cookie is rejected.
+        JP: セッションCookieなしの決定事項ポーリングが拒否されることを検証するテスト。
+        """
+        response = self.client.get("/api/decision")
+        self.assertEqual(response.status_code, 400)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,50 @@
+"""
+決定事項ホットパス用ベンチマークのコーパスと回帰判定のテスト。
+Tests for the decision hot-path benchmark corpora and regression checks.
+"""
+import os
+import random
+import unittest
+
+os.environ.setdefault("GROQ_API_KEY", "test-key")
+
+from backend.llama_core_constants import DECISION_MAX_ITEMS
+from benchmarks import bench_decision
+
+
+class BenchDecisionTests(unittest.TestCase):
+    """
+    コーパスの規模とベースライン比較の判定を確認する
+    Verify corpus sizing and baseline comparison.
+    """
+
+    def test_decision_corpus_reaches_max_items(self):
+        """
+        EN: Decision texts carry at least DECISION_MAX_ITEMS key/value lines.
+        JP: 決定事項コーパスが DECISION_MAX_ITEMS 件以上の項目を含むこと。
+        """
+        texts = bench_decision.build_decision_texts(random.Random(1), count=3)
+        for text in texts:
+            self.assertGreaterEqual(len(text.splitlines()), DECISION_MAX_ITEMS)
+
+    def test_regressions_are_reported_beyond_tolerance(self):
+        """
+        EN: Slower or more allocation-heavy results beyond tolerance are reported.
+        JP: 許容範囲を超える速度低下やメモリ確保増加が回帰として報告されること。
+        """
+        baseline = {
+            "parse_decision_items": {"ops_per_sec": 1000.0, "alloc_peak_bytes": 100.0},
+            "apply_decision_patch": {"ops_per_sec": 1000.0, "alloc_peak_bytes": 100.0},
+        }
+        results = {
+            "parse_decision_items": {"ops_per_sec": 900.0, "alloc_peak_bytes": 110.0},
+            "apply_decision_patch": {"ops_per_sec": 500.0, "alloc_peak_bytes": 200.0},
+        }
+        regressions = bench_decision.compare_to_baseline(results, baseline, 0.3, 0.2)
+
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(all(line.startswith("apply_decision_patch") for line in regressions))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+"""
+シリアライズのベンチマークのテスト。
+Tests for the serialization benchmark.
+"""
+import unittest
+
+from backend import redis_client
+from benchmarks import bench_serialization
+
+
+class BenchSerializationTests(unittest.TestCase):
+    """
+    1ターン分の入力と計測結果の形を確認する
+    Verify the per-turn inputs and the shape of results.
+    """
+
+    def test_turn_replays_window_entries_and_frames(self):
+        """
+        EN: A turn has the requested window, two new messages, and delta frames between meta and final.
+        JP: 1ターンが指定した窓・新しい2発話・meta と final に挟まれた delta フレームを持つこと。
+        """
+        window, new_entries, frames = bench_serialization.build_turn(history_size=10, deltas=20)
+
+        self.assertEqual(len(window), 10)
+        self.assertEqual([role for role, _text in new_entries], ["human", "assistant"])
+        self.assertEqual(frames[0]["type"], "meta")
+        self.assertEqual(frames[-1]["type"], "final")
+        self.assertLessEqual(len(frames) - 2, 20)
+        self.assertEqual(redis_client._decode_entries(redis_client._encode_entries(window)), window)
+
+    def test_run_reports_legacy_and_available_backends(self):
+        """
+        EN: Results include the legacy approach and the stdlib backend.
+        JP: 結果に旧方式と標準ライブラリのバックエンドが含まれること。
+        """
+        results = bench_serialization.run(history_size=4, deltas=5, min_time=0.0)
+
+        self.assertIn("legacy (json, role names)", results)
+        self.assertIn("serialization (json)", results)
+        self.assertTrue(all(value > 0 for value in results.values()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+"""
+セッション値コーデックのベンチマークのテスト。
+Tests for the session value codec benchmark.
+"""
+import json
+import random
+import unittest
+
+from benchmarks import bench_session_codec
+
+
+class BenchSessionCodecTests(unittest.TestCase):
+    """
+    コーパスと計測結果の形を確認する
+    Verify the corpus and the shape of measurements.
+    """
+
+    def test_threshold_controls_what_is_compressed(self):
+        """
+        EN: Threshold 0 stores values as-is; a low threshold compresses long messages and saves bytes.
+        JP: 閾値 0 ではそのまま保存され、低い閾値では長い発話が圧縮されてバイト数が減ること。
+        """
+        history = bench_session_codec.build_conversations(random.Random(1), count=1, turns=10)[0]
+        values = [json.dumps(list(item), ensure_ascii=False) for item in history]
+
+        plain = bench_session_codec.measure(values, level=6, threshold=0, min_time=0.0)
+        compressed = bench_session_codec.measure(values, level=6, threshold=256, min_time=0.0)
+
+        self.assertEqual(plain["ratio"], 1.0)
+        self.assertEqual(plain["compressed_share"], 0.0)
+        self.assertLess(compressed["ratio"], 1.0)
+        self.assertGreater(compressed["compressed_share"], 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
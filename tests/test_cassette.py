@@ -0,0 +1,106 @@
+"""
+外部API呼び出しの記録・再生（カセット）モードのテスト。
+Tests for the record/replay cassette mode for external calls.
+"""
+import os
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import httpx
+import openai
+
+os.environ.setdefault("GROQ_API_KEY", "test-key")
+
+from backend import cassette
+from backend import guard
+from backend import llama_core_llm
+
+
+class CassetteTests(unittest.TestCase):
+    """
+    記録した応答がネットワークなしで再生されることを確認する
+    Verify that recorded responses replay without network access.
+    """
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".jsonl")
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+        self.addCleanup(cassette.configure, cassette.MODE_OFF)
+
+    def test_guard_call_replays_offline(self):
+        """
+        EN: A recorded guard verdict replays without calling the Groq client.
+        JP: 記録したガード判定は Groq クライアントを呼ばずに再生されること。
+        """
+        completion = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content='{"verdict": "unsafe"}'))]
+        )
+        cassette.configure(cassette.MODE_RECORD, self.path)
+        with patch.object(guard.client.chat.completions, "create", return_value=completion):
+            self.assertEqual(guard.content_checker("危険な内容を含む入力"), "unsafe")
+
+        cassette.configure(cassette.MODE_REPLAY, self.path)
+        with patch.object(guard.client.chat.completions, "create", side_effect=AssertionError("network")):
+            self.assertEqual(guard.content_checker("危険な内容を含む入力"), "unsafe")
+            with self.assertRaises(cassette.CassetteMissError):
+                guard.content_checker("記録されていない入力です")
+
+    def test_stream_replay_supports_faithful_and_zero_timing(self):
+        """
+        EN: Stream chunks replay in order, with recorded gaps only in faithful mode.
+        JP: ストリームのチャンクは順に再生され、記録時の間隔は faithful モードでのみ再現されること。
+        """
+        def slow_stream(*args, **kwargs):
+            for piece in ("こん", "にち", "は"):
+                time.sleep(0.05)
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+
+        messages = [{"role": "system", "content": "現在日時: 2026年1月1日（木） 09:00"}]
+        cassette.configure(cassette.MODE_RECORD, self.path)
+        with patch.object(llama_core_llm, "get_groq_client") as get_client:
+            get_client.return_value.chat.completions.create.side_effect = slow_stream
+            recorded = list(llama_core_llm._invoke_chat_completion_stream(messages))
+
+        # 現在日時が変わっても同じ記録に一致する
+        # The entry still matches after the embedded datetime changes
+        messages = [{"role": "system", "content": "現在日時: 2026年1月2日（金） 10:30"}]
+        cassette.configure(cassette.MODE_REPLAY, self.path, cassette.TIMING_ZERO)
+        start = time.perf_counter()
+        self.assertEqual(list(llama_core_llm._invoke_chat_completion_stream(messages)), recorded)
+        self.assertLess(time.perf_counter() - start, 0.05)
+
+        cassette.configure(cassette.MODE_REPLAY, self.path, cassette.TIMING_FAITHFUL)
+        start = time.perf_counter()
+        self.assertEqual(list(llama_core_llm._invoke_chat_completion_stream(messages)), ["こん", "にち", "は"])
+        self.assertGreaterEqual(time.perf_counter() - start, 0.14)
+
+    def test_recorded_errors_replay_with_their_original_class(self):
+        """
+        EN: A recorded OpenAI status error replays as the same class with its status code.
+        JP: 記録した OpenAI のステータスエラーは、同じクラスとステータスコードで再生されること。
+        """
+        request = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+        error = openai.APIStatusError(
+            "invalid request", response=httpx.Response(400, request=request), body=None
+        )
+        messages = [{"role": "user", "content": "こんにちは"}]
+        cassette.configure(cassette.MODE_RECORD, self.path)
+        with patch.object(llama_core_llm, "get_groq_client") as get_client:
+            get_client.return_value.chat.completions.create.side_effect = error
+            with self.assertRaises(openai.APIStatusError):
+                llama_core_llm._invoke_chat_completion(messages)
+
+        cassette.configure(cassette.MODE_REPLAY, self.path)
+        with self.assertRaises(openai.APIStatusError) as replayed:
+            llama_core_llm._invoke_chat_completion(messages)
+        self.assertIsInstance(replayed.exception, cassette.CassetteReplayedError)
+        self.assertEqual(replayed.exception.status_code, 400)
+        self.assertEqual(str(replayed.exception), "invalid request")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+"""
+`decision_worker` のセッション単位の順序制御を検証するテスト。
+Tests for per-session ordering in `decision_worker`.
+"""
+import threading
+import unittest
+from unittest.mock import patch
+
+from backend import decision_worker
+from backend import redis_client
+
+
+class DecisionWorkerTests(unittest.TestCase):
+    """
+    ジョブの直列実行・置き換え・世代付き保存を確認する
+    Verify serial execution, superseding, and turn-versioned saves.
+    """
+
+    def test_jobs_for_same_session_run_in_turn_order(self):
+        """
+        EN: Jobs for one session run serially and a queued job is superseded by a newer turn.
+        JP: 同一セッションのジョブは直列に実行され、待機中のジョブは新しいターンで置き換えられること。
+        """
+        release_first = threading.Event()
+        first_started = threading.Event()
+        executed = []
+
+        def first_job():
+            first_started.set()
+            release_first.wait(timeout=5)
+            executed.append(1)
+            return "turn-1"
+
+        first = decision_worker.submit_decision_job("worker-session-1", 1, first_job)
+        # 1件目が実行中になってから次を投入する / Submit the rest once the first job is running
+        self.assertTrue(first_started.wait(timeout=5))
+        second = decision_worker.submit_decision_job(
+            "worker-session-1", 2, lambda: executed.append(2) or "turn-2"
+        )
+        third = decision_worker.submit_decision_job(
+            "worker-session-1", 3, lambda: executed.append(3) or "turn-3"
+        )
+        self.assertFalse(second.done())
+        release_first.set()
+
+        self.assertEqual(first.result(timeout=5), "turn-1")
+        self.assertEqual(second.result(timeout=5), "turn-3")
+        self.assertEqual(third.result(timeout=5), "turn-3")
+        self.assertEqual(executed, [1, 3])
+
+    def test_older_turn_is_rejected_while_session_is_active(self):
+        """
+        EN: Submitting an older turn than an accepted one returns a cancelled future.
+        JP: 受付済みより古いターンのジョブはキャンセル済み Future を返すこと。
+        """
+        release = threading.Event()
+        newer = decision_worker.submit_decision_job(
+            "worker-session-2", 5, lambda: release.wait(timeout=5) and "turn-5"
+        )
+        older = decision_worker.submit_decision_job("worker-session-2", 4, lambda: "turn-4")
+        release.set()
+
+        self.assertTrue(older.cancelled())
+        self.assertEqual(newer.result(timeout=5), "turn-5")
+
+    def test_save_decision_if_newer_keeps_latest_turn(self):
+        """
+        EN: A decision for an older turn must not overwrite a newer one.
+        JP: 古いターンの決定事項が新しいターンの決定事項を上書きしないこと。
+        """
+        session_id = "worker-session-3"
+        with patch.object(redis_client, "get_redis_client", return_value=None), patch.object(
+            redis_client, "_should_use_fallback", return_value=True
+        ):
+            self.assertTrue(redis_client.save_decision_if_newer(session_id, "目的地：京都", 2))
+            self.assertFalse(redis_client.save_decision_if_newer(session_id, "目的地：大阪", 1))
+            self.assertEqual(redis_client.get_decision(session_id), "目的地：京都")
+            self.assertEqual(redis_client.get_decision_turn(session_id), 2)
+            redis_client.reset_session(session_id)
+            self.assertEqual(redis_client.get_decision_turn(session_id), -1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+"""
+負荷試験用フェイク Groq サーバーを OpenAI クライアントで検証するテスト。
+Tests for the fake Groq server using the real OpenAI client.
+"""
+import threading
+import unittest
+
+import openai
+
+from benchmarks import fake_groq_server
+from benchmarks.fake_groq_server import FakeGroqConfig
+
+
+class FakeGroqServerTests(unittest.TestCase):
+    """
+    スクリプト応答・ストリーミング・障害注入を確認する
+    Verify scripted replies, streaming, and fault injection.
+    """
+
+    def _start(self, config: FakeGroqConfig) -> openai.OpenAI:
+        server = fake_groq_server.create_server(port=0, config=config)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        host, port = server.server_address[:2]
+        return openai.OpenAI(base_url=f"http://{host}:{port}/openai/v1", api_key="fake", max_retries=0)
+
+    def test_chat_script_cycles_directives_with_usage(self):
+        """
+        EN: Chat replies cycle through Select and DateSelect directives and report usage.
+        JP: 通常チャットは Select・DateSelect を順に返し、usage を含むこと。
+        """
+        client = self._start(FakeGroqConfig())
+        messages = [{"role": "system", "content": "travel"}, {"role": "user", "content": "京都に行きたい"}]
+        first = client.chat.completions.create(model="fake", messages=messages)
+        second = client.chat.completions.create(model="fake", messages=messages)
+
+        self.assertIn("Select: [", first.choices[0].message.content)
+        self.assertIn("DateSelect: true", second.choices[0].message.content)
+        self.assertGreater(first.usage.prompt_tokens, 0)
+        self.assertEqual(
+            first.usage.total_tokens, first.usage.prompt_tokens + first.usage.completion_tokens
+        )
+
+    def test_stream_and_decision_classification(self):
+        """
+        EN: Decision prompts get decision JSON, streamed as chunks ending with usage.
+        JP: 決定事項プロンプトには決定事項JSONを返し、ストリームの最後に usage を含むこと。
+        """
+        client = self._start(FakeGroqConfig())
+        messages = [
+            {"role": "system", "content": "travel"},
+            {"role": "user", "content": "決定事項に変更があれば、その項目だけをJSONで出力してください。"},
+        ]
+        stream = client.chat.completions.create(model="fake", messages=messages, stream=True)
+        chunks = list(stream)
+        text = "".join(chunk.choices[0].delta.content or "" for chunk in chunks if chunk.choices)
+
+        self.assertGreater(len(chunks), 3)
+        self.assertIn('"目的地": "京都"', text)
+        self.assertEqual(chunks[-1].choices[0].finish_reason, "stop")
+        self.assertIsNotNone(chunks[-1].usage)
+
+    def test_tool_calls_and_rate_limits(self):
+        """
+        EN: Requests with tools get tool_calls, and a 429 rate of 1.0 always rate-limits.
+        JP: tools 付きリクエストには tool_calls を返し、429率 1.0 では常にレート制限となること。
+        """
+        client = self._start(FakeGroqConfig())
+        completion = client.chat.completions.create(
+            model="fake",
+            messages=[{"role": "user", "content": "hello"}],
+            tools=[{"type": "function", "function": {"name": "assistant", "parameters": {"type": "object"}}}],
+            tool_choice="auto",
+        )
+        call = completion.choices[0].message.tool_calls[0]
+        self.assertEqual(call.function.name, "assistant")
+        self.assertEqual(completion.choices[0].finish_reason, "tool_calls")
+
+        limited = self._start(FakeGroqConfig(rate_limit_rate=1.0))
+        with self.assertRaises(openai.RateLimitError):
+            limited.chat.completions.create(model="fake", messages=[{"role": "user", "content": "hi"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
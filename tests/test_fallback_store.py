@@ -0,0 +1,105 @@
+"""
+`backend.fallback_store` のテスト。
+Tests for `backend.fallback_store`.
+"""
+import threading
+import unittest
+from unittest.mock import patch
+
+from backend import redis_client
+from backend.fallback_store import FallbackStore
+
+
+class FallbackStoreTests(unittest.TestCase):
+    """
+    上限付き LRU フォールバックストアのテストケース群
+    Test cases for the bounded LRU fallback store.
+    """
+
+    def test_least_recently_used_key_is_evicted_at_entry_budget(self):
+        """
+        EN: Over the entry budget, the least recently read or written key is evicted.
+        JP: 件数上限を超えると、最も長く使われていないキーが追い出されること。
+        """
+        store = FallbackStore(max_entries=2, sweep_interval=0)
+        store.set_value("a", "1")
+        store.set_value("b", "2")
+        self.assertEqual(store.get_value("a"), "1")
+        store.set_value("c", "3")
+
+        self.assertIsNone(store.get_value("b"))
+        self.assertEqual(store.get_value("a"), "1")
+        self.assertEqual(store.stats()["evictions"], {"entries": 1})
+
+    def test_byte_budget_evicts_until_under_limit(self):
+        """
+        EN: Over the byte budget (UTF-8 key plus value), old keys are evicted but the new key is kept.
+        JP: バイト数上限（キーと値の UTF-8）を超えると古いキーから追い出され、新しいキーは残ること。
+        """
+        store = FallbackStore(max_bytes=40, sweep_interval=0)
+        store.set_value("k1", "あ" * 5)
+        store.set_value("k2", "い" * 5)
+        store.set_value("k3", "う" * 10)
+
+        self.assertEqual(list(store), ["k3"])
+        self.assertEqual(store.stats()["bytes"], len("k3") + len(("う" * 10).encode("utf-8")))
+        self.assertEqual(store.stats()["evictions"], {"bytes": 2})
+
+    def test_expired_keys_are_removed_on_read_and_by_sweep(self):
+        """
+        EN: Expired keys disappear on read and are swept without being read.
+        JP: 期限切れのキーは読み込み時に消え、読まれなくてもスイープで削除されること。
+        """
+        store = FallbackStore(sweep_interval=0)
+        store["old"] = ("x", 100.0)
+        store["stale"] = ("y", 100.0)
+        store["fresh"] = ("z", None)
+
+        self.assertIsNone(store.get_value("old", now=200.0))
+        self.assertEqual(store.sweep(now=200.0), 1)
+        self.assertEqual(list(store), ["fresh"])
+        self.assertEqual(store.stats()["evictions"], {"expired": 2})
+
+    def test_concurrent_writers_stay_within_budget(self):
+        """
+        EN: Concurrent writes and deletes from many threads keep the store consistent and bounded.
+        JP: 多数のスレッドから同時に書き込み・削除してもストアが整合し、上限内に収まること。
+        """
+        store = FallbackStore(max_entries=50, sweep_interval=0)
+
+        def worker(prefix):
+            for index in range(500):
+                store.set_value(f"{prefix}:{index}", "v" * (index % 7))
+                store.get_value(f"{prefix}:{index - 3}")
+                store.pop(f"{prefix}:{index - 5}", None)
+
+        threads = [threading.Thread(target=worker, args=(name,)) for name in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = store.stats()
+        self.assertLessEqual(stats["entries"], 50)
+        self.assertEqual(stats["bytes"], sum(len(key) + len(value) for key, (value, _exp) in store.items()))
+
+    def test_redis_client_fallback_uses_bounded_store(self):
+        """
+        EN: redis_client keeps its public behaviour on top of the bounded store.
+        JP: redis_client の公開関数が上限付きストアの上で従来どおり動くこと。
+        """
+        with patch.object(redis_client, "get_redis_client", return_value=None), patch.object(
+            redis_client, "_should_use_fallback", return_value=True
+        ), patch.dict(redis_client._memory_store, {}, clear=True):
+            redis_client.save_user_type("f1", "normal")
+            redis_client.append_chat_history("f1", [("human", "こんにちは")])
+            self.assertEqual(redis_client.get_user_type("f1"), "normal")
+            self.assertEqual(redis_client.get_chat_history("f1"), [("human", "こんにちは")])
+            redis_client.reset_session("f1")
+            # ターンの通し番号だけが 0 として残る / Only the turn counter remains, reset to 0
+            self.assertEqual(len(redis_client._memory_store), 1)
+            self.assertEqual(redis_client.get_current_turn("f1"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
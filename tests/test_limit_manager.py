@@ -2,19 +2,24 @@
 `limit_manager` の日次制限ロジックを検証するテスト。
 Tests for daily rate-limit behavior in `limit_manager`.
 """
+import datetime
 import sys
 import types
 import unittest
+from unittest.mock import patch
 
-sys.modules.setdefault("redis", types.SimpleNamespace(from_url=lambda *args, **kwargs: None))
+sys.modules.setdefault(
+    "redis",
+    types.SimpleNamespace(from_url=lambda *args, **kwargs: None, BlockingConnectionPool=object),
+)
 
 from backend import limit_manager
 
 
 class FakeRedis:
     """
-    Redis `eval/get/set` の最小挙動を再現するテスト用スタブ。
-    Minimal Redis stub that emulates `eval/get/set` behavior for tests.
+    Redis `eval/get/set/decr` の最小挙動を再現するテスト用スタブ。
+    Minimal Redis stub that emulates `eval/get/set/decr` behavior for tests.
     """
     def __init__(self):
         """
@@ -29,15 +34,15 @@ class FakeRedis:
         Simulate atomic counter updates equivalent to the Lua script.
         """
         if _numkeys == 1:
-            monthly_key = args[0]
-            monthly_limit = int(args[1])
-            monthly_val = self.store.get(monthly_key, 0) + 1
-            self.store[monthly_key] = monthly_val
+            counter_key = args[0]
+            counter_limit = int(args[1])
+            counter_val = self.store.get(counter_key, 0) + 1
+            self.store[counter_key] = counter_val
 
-            if monthly_val > monthly_limit:
-                self.store[monthly_key] = self.store.get(monthly_key, 0) - 1
+            if counter_val > counter_limit:
+                self.store[counter_key] = self.store.get(counter_key, 0) - 1
                 return -1
-            return monthly_val
+            return counter_val
 
         user_key = args[0]
         total_key = args[1]
@@ -72,6 +77,14 @@ class FakeRedis:
         """
         self.store[key] = value
 
+    def decr(self, key):
+        """
+        ストアの値を1減らす
+        Decrement a value in the stub store.
+        """
+        self.store[key] = self.store.get(key, 0) - 1
+        return self.store[key]
+
 
 class LimitManagerTests(unittest.TestCase):
     """
@@ -88,10 +101,14 @@ class LimitManagerTests(unittest.TestCase):
         self.original_web_search_monthly_limit = limit_manager.WEB_SEARCH_MONTHLY_LIMIT
         from backend import redis_client as redis_module
         self.redis_module = redis_module
-        self.original_redis_module_client = redis_module.redis_client
 
         fake_redis = FakeRedis()
-        redis_module.redis_client = fake_redis
+        self.fake_redis = fake_redis
+        # モジュール変数はスーパーバイザーが差し替えるため、取得関数を差し替える
+        # Patch the getter: the supervisor thread may replace the module global
+        patcher = patch.object(redis_module, "get_redis_client", return_value=fake_redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
         limit_manager.USER_TYPE_LIMITS = {"normal": 2, "premium": 5}
         limit_manager.TOTAL_DAILY_LIMIT = 3
         limit_manager.WEB_SEARCH_MONTHLY_LIMIT = 2
@@ -104,7 +121,6 @@ class LimitManagerTests(unittest.TestCase):
         limit_manager.USER_TYPE_LIMITS = self.original_user_limits
         limit_manager.TOTAL_DAILY_LIMIT = self.original_total_limit
         limit_manager.WEB_SEARCH_MONTHLY_LIMIT = self.original_web_search_monthly_limit
-        self.redis_module.redis_client = self.original_redis_module_client
 
     def test_user_limit_enforced(self):
         """
@@ -198,6 +214,49 @@ class LimitManagerTests(unittest.TestCase):
         self.assertEqual(limit, 2)
         self.assertIsNone(error_code)
 
+    def test_cluster_mode_keeps_user_counter_on_the_session_slot(self):
+        """
+        EN: In cluster mode the user counter shares the session's hash tag and the total is a separate key.
+        JP: cluster ではユーザーのカウンタがセッションのハッシュタグを持ち、全体は別キーになること。
+        """
+        with patch.object(self.redis_module, "REDIS_MODE", self.redis_module.MODE_CLUSTER):
+            allowed, *_rest = limit_manager.check_and_increment_limit("session-a", user_type="normal")
+
+        self.assertTrue(allowed)
+        today = datetime.date.today().isoformat()
+        self.assertEqual(
+            sorted(self.fake_redis.store),
+            [f"daily_usage:{today}:{{session-a}}:normal", f"daily_usage_total:{today}"],
+        )
+
+    def test_sharded_mode_keeps_user_counter_on_the_session_node(self):
+        """
+        EN: Sharded counters stay on their own nodes, and a global overflow rolls back the user count.
+        JP: sharded ではカウンタがそれぞれのノードに置かれ、全体超過時はユーザー分が戻されること。
+        """
+        session_node = FakeRedis()
+        total_node = FakeRedis()
+
+        def client_for(routing_key):
+            return session_node if routing_key.startswith("session-") else total_node
+
+        today = datetime.date.today().isoformat()
+        with patch.object(self.redis_module, "client_for", side_effect=client_for):
+            for index in range(3):
+                allowed, *_rest = limit_manager.check_and_increment_limit(f"session-{index}", user_type="normal")
+                self.assertTrue(allowed)
+            allowed, count, limit, user_type, total_exceeded, error_code = limit_manager.check_and_increment_limit(
+                "session-extra",
+                user_type="normal",
+            )
+
+        self.assertFalse(allowed)
+        self.assertTrue(total_exceeded)
+        self.assertIsNone(error_code)
+        self.assertEqual(total_node.store, {f"daily_usage_total:{today}": 3})
+        self.assertEqual(session_node.store[f"daily_usage:{today}:session-extra:normal"], 0)
+        self.assertEqual(session_node.store[f"daily_usage:{today}:session-0:normal"], 1)
+
 
 if __name__ == "__main__":
     unittest.main()
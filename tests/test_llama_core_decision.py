@@ -0,0 +1,292 @@
+"""
+`llama_core_decision` の決定事項ゲートを検証するテスト。
+Tests for the decision gate in `llama_core_decision`.
+"""
+from concurrent.futures import Future
+import json
+import os
+import unittest
+from unittest.mock import patch
+
+os.environ.setdefault("GROQ_API_KEY", "test-key")
+
+from backend import llama_core
+from backend import redis_client
+from backend import stage_timing
+from backend.llama_core_decision import _turn_may_change_decisions
+
+
+class DecisionGateTests(unittest.TestCase):
+    """
+    直近ターンが決定事項に影響し得るかの判定を確認する
+    Verify whether the latest turn is considered able to change decisions.
+    """
+
+    def test_small_talk_is_skipped(self):
+        """
+        EN: Thanks and small talk do not trigger decision extraction.
+        JP: お礼や雑談では決定事項の抽出を行わないこと。
+        """
+        history = [
+            ("human", "京都に行きたい"),
+            ("assistant", "いいですね。何か気になることはありますか？"),
+            ("human", "ありがとう"),
+            ("assistant", "どういたしまして！"),
+        ]
+        self.assertFalse(_turn_may_change_decisions(history, "travel", None))
+
+    def test_answer_to_yes_no_confirmation_is_relevant(self):
+        """
+        EN: Answering a pending Yes/No confirmation may change decisions.
+        JP: Yes/No 確認への回答は決定事項を変更し得ること。
+        """
+        history = [
+            ("assistant", "Yes/No: 京都で決定してよろしいですか？"),
+            ("human", "はい"),
+            ("assistant", "承知しました"),
+        ]
+        self.assertTrue(_turn_may_change_decisions(history, "travel", None))
+
+    def test_mode_key_label_is_relevant(self):
+        """
+        EN: Mentioning a mode key label triggers extraction, but ASCII aliases need word boundaries.
+        JP: モードの項目ラベルに言及すると抽出対象となり、英字の別名は単語単位で照合すること。
+        """
+        relevant = [("human", "予算を変えたい"), ("assistant", "承知しました")]
+        self.assertTrue(_turn_may_change_decisions(relevant, "travel", None))
+
+        english = [("human", "thanks for the morning tips"), ("assistant", "You're welcome!")]
+        self.assertFalse(_turn_may_change_decisions(english, "reply", None))
+
+    def test_derived_patch_is_relevant(self):
+        """
+        EN: A locally derived patch always counts as relevant.
+        JP: ローカルで推定した差分がある場合は常に抽出対象とすること。
+        """
+        history = [("human", "ありがとう"), ("assistant", "どういたしまして")]
+        patch_data = {"add": {"目的地": "京都"}, "update": {}, "remove": []}
+        self.assertTrue(_turn_may_change_decisions(history, "travel", patch_data))
+
+
+class WriteDecisionGateTests(unittest.TestCase):
+    """
+    write_decision がゲートでLLM呼び出しを省略することを確認する
+    Verify that write_decision skips the LLM call when gated.
+    """
+
+    def test_skipped_turn_reuses_previous_decision(self):
+        """
+        EN: A gated turn returns the previous decision without calling the LLM.
+        JP: ゲートで省略されたターンはLLMを呼ばず前回の決定事項を返すこと。
+        """
+        session_id = "gate-session-1"
+        history = [("human", "ありがとう"), ("assistant", "どういたしまして！")]
+        with patch.object(redis_client, "get_redis_client", return_value=None), patch.object(
+            redis_client, "_should_use_fallback", return_value=True
+        ), patch.object(llama_core, "_invoke_with_tool_retries") as invoke:
+            redis_client.save_decision(session_id, "目的地：京都")
+            before = llama_core.get_decision_gate_stats()
+            result = llama_core.write_decision(session_id, history, mode="travel", language="ja", turn=1)
+            after = llama_core.get_decision_gate_stats()
+            redis_client.reset_session(session_id)
+
+        invoke.assert_not_called()
+        self.assertEqual(result, "目的地：京都")
+        self.assertEqual(after["skipped"], before["skipped"] + 1)
+        self.assertGreater(after["skip_rate"], 0.0)
+
+    def test_llm_run_records_its_turn_with_the_decision_write(self):
+        """
+        EN: An LLM run reads decisions and the last LLM turn together and records its turn in the decision write.
+        JP: LLM 実行時は決定事項と前回の LLM ターンを一度に読み、ターンを決定事項の保存と一緒に記録すること。
+        """
+        history = [("human", "目的地は京都"), ("assistant", "承知しました")]
+        with patch.object(redis_client, "get_decision_progress", return_value=("", -1)) as progress, patch.object(
+            redis_client, "save_decision_if_newer", return_value=True
+        ) as save, patch.object(
+            llama_core, "_invoke_with_tool_retries", return_value='{"add": {"目的地": "京都"}}'
+        ), patch.object(llama_core, "output_is_safe", return_value=True):
+            llama_core.write_decision("gate-session-3", history, mode="travel", language="ja", turn=1)
+
+        progress.assert_called_once_with("gate-session-3")
+        self.assertEqual(save.call_args.kwargs["llm_turn"], 1)
+
+    def test_incremental_mode_sends_only_turns_after_watermark(self):
+        """
+        EN: Incremental mode sends only turns after the watermark plus structured decisions.
+        JP: 差分モードではウォーターマーク以降のターンと構造化した決定事項だけを送信すること。
+        """
+        session_id = "gate-session-2"
+        history = [
+            ("human", "目的地は京都"),
+            ("assistant", "日程はいつですか？"),
+            ("human", "日程は5月3日から"),
+            ("assistant", "予算はどのくらいですか？"),
+            ("human", "予算は5万円"),
+            ("assistant", "承知しました"),
+        ]
+        with patch.object(redis_client, "get_redis_client", return_value=None), patch.object(
+            redis_client, "_should_use_fallback", return_value=True
+        ), patch.object(llama_core, "DECISION_INCREMENTAL_ENABLED", True), patch.object(
+            llama_core, "_invoke_with_tool_retries", return_value='{"add": {"予算": "5万円"}}'
+        ) as invoke, patch.object(llama_core, "output_is_safe", return_value=True):
+            redis_client.save_decision_if_newer(session_id, "目的地：京都\n日程：5月3日から", 2, llm_turn=2)
+            result = llama_core.write_decision(session_id, history, mode="travel", language="ja", turn=3)
+            redis_client.reset_session(session_id)
+
+        messages = invoke.call_args[0][0]
+        self.assertEqual(
+            [message["content"] for message in messages[1:-1]],
+            ["予算はどのくらいですか？", "予算は5万円", "承知しました"],
+        )
+        self.assertIn('"目的地": "京都"', messages[0]["content"])
+        self.assertIn("予算：5万円", result)
+
+    def test_turns_skipped_by_the_gate_stay_in_the_window(self):
+        """
+        EN: A turn the gate skipped advances decision_turn but stays in the next incremental window.
+        JP: ゲートでスキップしたターンは decision_turn を進めても、次の差分ウィンドウに含まれること。
+        """
+        session_id = "gate-session-4"
+        history = [
+            ("human", "目的地は京都"),
+            ("assistant", "日程はいつですか？"),
+            ("human", "ありがとう、予算は5万円"),
+            ("assistant", "どういたしまして"),
+            ("human", "日程は5月3日から"),
+            ("assistant", "承知しました"),
+        ]
+        with patch.object(redis_client, "get_redis_client", return_value=None), patch.object(
+            redis_client, "_should_use_fallback", return_value=True
+        ), patch.object(llama_core, "DECISION_INCREMENTAL_ENABLED", True), patch.object(
+            llama_core, "_invoke_with_tool_retries", return_value="{}"
+        ) as invoke, patch.object(llama_core, "output_is_safe", return_value=True):
+            redis_client.save_decision_if_newer(session_id, "目的地：京都", 1, llm_turn=1)
+            # ターン2はゲートでスキップされ、LLM のターンは進まない / Turn 2 was skipped, so the LLM turn stays at 1
+            redis_client.save_decision_if_newer(session_id, "目的地：京都", 2)
+            llama_core.write_decision(session_id, history, mode="travel", language="ja", turn=3)
+            redis_client.reset_session(session_id)
+
+        contents = [message["content"] for message in invoke.call_args[0][0][1:-1]]
+        self.assertIn("ありがとう、予算は5万円", contents)
+        self.assertNotIn("目的地は京都", contents)
+
+
+class CommitTurnTests(unittest.TestCase):
+    """
+    ターン末尾の書き込みが1回の commit_turn にまとまることを確認する
+    Verify that the end-of-turn writes are folded into one commit_turn.
+    """
+
+    def test_sync_mode_gate_skip_commits_only_the_turn(self):
+        """
+        EN: In synchronous mode a turn the gate skips makes no LLM call and saves its decision in the turn's commit, reading decision state once.
+        JP: 同期モードでゲートがスキップしたターンは LLM を呼ばず、決定事項の状態を1回だけ読み、ターンのコミットで決定事項も保存すること。
+        """
+        history = [("human", "ありがとう"), ("assistant", "どういたしまして！")]
+        with patch.object(llama_core.decision_worker, "DECISION_ASYNC_ENABLED", False), patch.object(
+            redis_client, "get_decision_progress", return_value=("目的地：京都", -1)
+        ) as progress, patch.object(redis_client, "get_decision") as get_decision, patch.object(
+            redis_client, "commit_turn", return_value=redis_client.TurnCommit(1, True)
+        ) as commit, patch.object(redis_client, "save_decision_if_newer") as save, patch.object(
+            llama_core, "_invoke_with_tool_retries"
+        ) as invoke:
+            turn, future, plan = llama_core._commit_turn("commit-1", history, history, "travel", "ja", "目的地：京都")
+
+        invoke.assert_not_called()
+        save.assert_not_called()
+        get_decision.assert_not_called()
+        progress.assert_called_once_with("commit-1")
+        commit.assert_called_once_with("commit-1", history, language="ja", decision="目的地：京都")
+        self.assertEqual((turn, future, plan), (1, None, "目的地：京都"))
+
+    def test_sync_mode_commits_the_turn_before_the_decision_llm(self):
+        """
+        EN: In synchronous mode the turn is committed before the decision LLM runs, whose result is then saved with a turn check; an LLM failure keeps the turn.
+        JP: 同期モードでは決定事項の LLM より先にターンを保存し、結果は世代比較付きで保存すること。LLM が失敗してもターンは残ること。
+        """
+        history = [("human", "来月、京都に2泊で行きたいです"), ("assistant", "いいですね！")]
+        calls = []
+        with patch.object(llama_core.decision_worker, "DECISION_ASYNC_ENABLED", False), patch.object(
+            redis_client, "get_decision_progress", return_value=("", -1)
+        ) as progress, patch.object(
+            redis_client, "commit_turn", side_effect=lambda *_args, **_kwargs: calls.append("commit") or redis_client.TurnCommit(1, False)
+        ), patch.object(
+            redis_client, "save_decision_if_newer", side_effect=lambda *_args, **_kwargs: calls.append("save") or True
+        ) as save, patch.object(
+            llama_core, "_invoke_with_tool_retries",
+            side_effect=lambda *_args, **_kwargs: calls.append("llm") or '{"目的地": "京都"}',
+        ), patch.object(llama_core, "output_is_safe", return_value=True):
+            turn, _future, plan = llama_core._commit_turn("commit-2", history, history, "travel", "ja", "")
+
+        self.assertEqual(calls, ["commit", "llm", "save"])
+        progress.assert_called_once_with("commit-2")
+        self.assertEqual(save.call_args.args[2], turn)
+        self.assertEqual(save.call_args.kwargs["llm_turn"], turn)
+        self.assertEqual(plan, save.call_args.args[1])
+
+        calls.clear()
+        with patch.object(llama_core.decision_worker, "DECISION_ASYNC_ENABLED", False), patch.object(
+            redis_client, "get_decision_progress", return_value=("", -1)
+        ), patch.object(
+            redis_client, "commit_turn", side_effect=lambda *_args, **_kwargs: calls.append("commit") or redis_client.TurnCommit(1, False)
+        ), patch.object(llama_core, "_invoke_with_tool_retries", side_effect=RuntimeError("worker died")):
+            _turn, _future, plan = llama_core._commit_turn("commit-2", history, history, "travel", "ja", "")
+
+        self.assertEqual(calls, ["commit"])
+        self.assertEqual(plan, llama_core._decision_error_message("ja"))
+
+
+    def test_async_mode_schedules_the_committed_turn_for_a_capped_history(self):
+        """
+        EN: With a capped history, the decision job uses the turn assigned by the commit and its window is cut from the end.
+        JP: 履歴に上限がある場合も、決定事項のジョブはコミットで割り当てたターンを使い、窓は末尾から切り出されること。
+        """
+        history = [("human", "a"), ("assistant", "b"), ("human", "京都にします"), ("assistant", "了解です")]
+        with patch.object(llama_core.decision_worker, "DECISION_ASYNC_ENABLED", True), patch.object(
+            redis_client, "commit_turn", return_value=redis_client.TurnCommit(12, False)
+        ), patch.object(llama_core.decision_worker, "submit_decision_job") as submit:
+            turn, _future, _plan = llama_core._commit_turn("commit-3", history, history[2:], "travel", "ja", "")
+
+        self.assertEqual(turn, 12)
+        self.assertEqual(submit.call_args.args[1], 12)
+        with patch.object(llama_core, "DECISION_INCREMENTAL_ENABLED", True):
+            window = llama_core._incremental_decision_window(history, 12, 11)
+        self.assertEqual(window, history[1:])
+
+
+class StreamDecisionTests(unittest.TestCase):
+    """
+    ストリームが決定事項の抽出を待たずに終わることを確認する
+    Verify that the stream does not wait for decision extraction.
+    """
+
+    def test_stream_ends_at_the_final_frame_while_decision_is_pending(self):
+        """
+        EN: With a pending decision job the stream ends at the final frame, which carries decision_pending and turn and closes the turn's timings.
+        JP: 決定事項のジョブが未完了でも、ストリームは decision_pending と turn を含む final フレームで終わり、計測を締めること。
+        """
+        pending = Future()
+        token = stage_timing.begin(expose=False)
+        self.addCleanup(stage_timing.end, token)
+        with patch.object(llama_core.guard, "content_checker", return_value="safe"), patch.object(
+            redis_client, "get_chat_history", return_value=[]
+        ), patch.object(redis_client, "get_decision", return_value=""), patch.object(
+            llama_core, "_needs_web_search", return_value=(False, "")
+        ), patch.object(
+            llama_core, "_invoke_with_tool_retries_stream", return_value=iter(["こんにちは"])
+        ), patch.object(
+            llama_core, "_commit_turn", return_value=(1, pending, "")
+        ):
+            frames = list(llama_core.stream_chat_with_llama("stream-1", "京都に行きたい", language="ja"))
+
+        final = json.loads(frames[-1][len("data: "):])
+        self.assertEqual(final["type"], "final")
+        self.assertTrue(final["decision_pending"])
+        self.assertEqual(final["turn"], 1)
+        self.assertFalse(pending.done())
+        self.assertIsNotNone(stage_timing.current().finished)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+"""
+`backend.memory_debug` と /api/debug/memory のテスト。
+Tests for `backend.memory_debug` and /api/debug/memory.
+"""
+
+import os
+import tracemalloc
+import unittest
+from unittest.mock import patch
+
+os.environ.setdefault("GROQ_API_KEY", "test-key")
+
+from backend import memory_debug, redis_client
+
+_retained = []
+
+
+def _allocate_blocks() -> None:
+    _retained.extend(bytearray(1024) for _ in range(200))
+
+
+class MemoryDebugTests(unittest.TestCase):
+    """
+    メモリ診断のテストケース群
+    Test cases for memory diagnostics.
+    """
+
+    def tearDown(self):
+        memory_debug.stop()
+        _retained.clear()
+
+    def test_snapshot_diff_reports_new_allocation_site_and_cache_sizes(self):
+        """
+        EN: A diff against the baseline surfaces the allocating line and reports cache sizes.
+        JP: 基準との差分に割り当て箇所が現れ、キャッシュサイズも報告されること。
+        """
+        memory_debug.start()
+        _allocate_blocks()
+        with patch.dict(redis_client._memory_store, {"session:x:history": ("[]", None)}, clear=True):
+            report = memory_debug.snapshot(top=10)
+
+        self.assertTrue(report["tracing"])
+        sites = [row["site"] for row in report["top"]]
+        self.assertTrue(any("test_memory_debug.py" in site for site in sites), sites)
+        self.assertGreater(report["top"][0]["size_diff_kib"], 0)
+        self.assertEqual(report["caches"]["redis_client._memory_store"], 1)
+        self.assertIn("session_request_lock._locks", report["caches"])
+
+        stopped = memory_debug.stop()
+        self.assertFalse(stopped["tracing"])
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_endpoint_requires_token(self):
+        """
+        EN: The endpoint is hidden without a configured token and rejects wrong tokens.
+        JP: トークン未設定時は非公開で、誤ったトークンは拒否すること。
+        """
+        from backend.app import app
+
+        client = app.test_client()
+        with patch.object(memory_debug, "MEMORY_DEBUG_TOKEN", ""):
+            self.assertEqual(client.get("/api/debug/memory").status_code, 404)
+        with patch.object(memory_debug, "MEMORY_DEBUG_TOKEN", "debug"):
+            self.assertEqual(
+                client.get("/api/debug/memory", headers={"Authorization": "Bearer nope"}).status_code,
+                403,
+            )
+            started = client.post(
+                "/api/debug/memory?action=start", headers={"Authorization": "Bearer debug"}
+            )
+            snap = client.post(
+                "/api/debug/memory?action=snapshot&top=5", headers={"Authorization": "Bearer debug"}
+            )
+        self.assertEqual(started.status_code, 200)
+        self.assertTrue(started.get_json()["tracing"])
+        self.assertLessEqual(len(snap.get_json()["top"]), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
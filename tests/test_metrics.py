@@ -0,0 +1,94 @@
+"""
+`backend.metrics` と /metrics エンドポイントのテスト。
+Tests for `backend.metrics` and the /metrics endpoint.
+"""
+
+import os
+import time
+import unittest
+from unittest.mock import patch
+
+os.environ.setdefault("GROQ_API_KEY", "test-key")
+
+from backend import metrics
+
+
+def _sample(name, labels):
+    """レジストリから現在値を取得する / Read a sample value from the default registry."""
+    return metrics.REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class MetricsTests(unittest.TestCase):
+    """
+    メトリクス記録と公開エンドポイントのテストケース群
+    Test cases for metric recording and the exposition endpoint.
+    """
+
+    def test_observe_groq_call_counts_latency_and_errors(self):
+        """
+        EN: observe_groq_call records one latency sample per call and labels failures by exception class.
+        JP: observe_groq_call は呼び出し毎に所要時間を記録し、失敗を例外クラス名で数えること。
+        """
+        labels = {"model": "test-model", "call_type": "unit"}
+        before_count = _sample("yorozu_groq_request_duration_seconds_count", labels)
+        before_errors = _sample(
+            "yorozu_groq_errors_total", dict(labels, error="RuntimeError")
+        )
+
+        with metrics.observe_groq_call("test-model", "unit"):
+            pass
+        with self.assertRaises(RuntimeError):
+            with metrics.observe_groq_call("test-model", "unit"):
+                raise RuntimeError("boom")
+
+        self.assertEqual(
+            _sample("yorozu_groq_request_duration_seconds_count", labels) - before_count, 2
+        )
+        self.assertEqual(
+            _sample("yorozu_groq_errors_total", dict(labels, error="RuntimeError")) - before_errors,
+            1,
+        )
+
+    def test_excluded_time_is_left_out_of_groq_latency(self):
+        """
+        EN: Time under timer.exclude(), such as handing stream chunks to the client, is not counted as Groq latency.
+        JP: timer.exclude() の区間（ストリームのチャンクをクライアントへ渡す時間など）は Groq の所要時間に含めないこと。
+        """
+        labels = {"model": "test-model", "call_type": "unit_stream"}
+        before = _sample("yorozu_groq_request_duration_seconds_sum", labels)
+
+        with metrics.observe_groq_call("test-model", "unit_stream") as timer:
+            with timer.exclude():
+                time.sleep(0.2)
+
+        self.assertLess(_sample("yorozu_groq_request_duration_seconds_sum", labels) - before, 0.1)
+
+    def test_metrics_endpoint_exposes_requests_and_honors_token(self):
+        """
+        EN: /metrics serves the text format with route-template labels and enforces METRICS_TOKEN.
+        JP: /metrics はルートテンプレートのラベル付きで出力し、METRICS_TOKEN を強制すること。
+        """
+        from backend.app import app
+
+        client = app.test_client()
+        client.get("/api/decision")
+
+        with patch.object(metrics, "METRICS_ENABLED", True), patch.object(metrics, "METRICS_TOKEN", ""):
+            response = client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        body = response.get_data(as_text=True)
+        self.assertIn('yorozu_http_requests_total{method="GET",mode="core",route="/api/decision"', body)
+
+        with patch.object(metrics, "METRICS_ENABLED", True), patch.object(metrics, "METRICS_TOKEN", "scrape"):
+            self.assertEqual(client.get("/metrics").status_code, 401)
+            # 非 ASCII のヘッダーも 500 ではなく 401 / A non-ASCII header is a 401, not a 500
+            self.assertEqual(client.get("/metrics", headers={"Authorization": "Bearer scrapé"}).status_code, 401)
+            authorized = client.get("/metrics", headers={"Authorization": "Bearer scrape"})
+        self.assertEqual(authorized.status_code, 200)
+
+        with patch.object(metrics, "METRICS_ENABLED", False):
+            self.assertEqual(client.get("/metrics").status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
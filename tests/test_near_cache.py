@@ -0,0 +1,114 @@
+"""
+`backend.near_cache` のテスト。
+Tests for `backend.near_cache`.
+"""
+import unittest
+
+import redis
+
+from backend.near_cache import InvalidationListener, LocalCache
+
+
+class LocalCacheTests(unittest.TestCase):
+    """
+    ニアキャッシュのローカルストアのテストケース群
+    Test cases for the near-cache's local store.
+    """
+
+    def test_entries_expire_after_the_ttl(self):
+        """
+        EN: A filled entry is served until its TTL passes, then misses.
+        JP: 保存したエントリが TTL までは返され、過ぎるとミスになること。
+        """
+        cache = LocalCache(ttl=10.0)
+        cache.fill("k", cache.reserve("k"), "v", now=100.0)
+
+        self.assertEqual(cache.get("k", now=109.0), (True, "v"))
+        self.assertEqual(cache.get("k", now=110.0), (False, None))
+        self.assertEqual(len(cache), 0)
+
+    def test_invalidation_during_a_read_blocks_the_fill(self):
+        """
+        EN: A key invalidated between reserve and fill is not stored, so a stale read never lands.
+        JP: 予約から保存までの間に無効化されたキーは保存されず、古い値が残らないこと。
+        """
+        cache = LocalCache(ttl=10.0)
+        token = cache.reserve("k")
+        cache.invalidate("k")
+
+        self.assertFalse(cache.fill("k", token, "stale"))
+        self.assertEqual(cache.get("k"), (False, None))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        """
+        EN: Over max_entries, the least recently used entry is evicted.
+        JP: 件数上限を超えると、最も使われていないエントリが削除されること。
+        """
+        cache = LocalCache(ttl=0, max_entries=2)
+        for key in ("a", "b"):
+            cache.fill(key, cache.reserve(key), key)
+        cache.get("a")
+        cache.fill("c", cache.reserve("c"), "c")
+
+        self.assertEqual([cache.get(key)[0] for key in ("a", "b", "c")], [True, False, True])
+
+
+class InvalidationListenerTests(unittest.TestCase):
+    """
+    無効化リスナーのテストケース群
+    Test cases for the invalidation listener.
+    """
+
+    def setUp(self):
+        self.cache = LocalCache(ttl=0)
+        self.listener = InvalidationListener("redis://localhost:6379/0", self.cache, {})
+        for key in ("a", "b"):
+            self.cache.fill(key, self.cache.reserve(key), key)
+
+    def test_invalidation_messages_drop_keys(self):
+        """
+        EN: A message listing keys drops those keys; a null list (FLUSHALL) drops everything.
+        JP: キー一覧の通知でそのキーを、null（FLUSHALL）の通知で全件を捨てること。
+        """
+        self.listener.handle({"type": "subscribe", "data": 1})
+        self.listener.handle({"type": "message", "data": ["a"]})
+        self.assertEqual([self.cache.get(key)[0] for key in ("a", "b")], [False, True])
+
+        self.listener.handle({"type": "message", "data": None})
+        self.assertEqual(len(self.cache), 0)
+
+    def test_client_is_unavailable_until_the_listener_is_subscribed(self):
+        """
+        EN: Without a listener connection there is no cached-read client, and new connections refuse to track.
+        JP: リスナー未接続の間は読み込みクライアントが無く、新しい接続も追跡を有効にしないこと。
+        """
+
+        class _Connection:
+            def __init__(self):
+                self.sent = []
+
+            def on_connect(self):
+                pass
+
+            def send_command(self, *args):
+                self.sent.append(args)
+
+            def read_response(self):
+                return "OK"
+
+        self.assertIsNone(self.listener.client)
+        with self.assertRaises(redis.ConnectionError):
+            self.listener._enable_tracking(_Connection())
+
+        self.listener._client_id = 42
+        connection = _Connection()
+        self.listener._enable_tracking(connection)
+        self.assertEqual(connection.sent, [("CLIENT", "TRACKING", "ON", "REDIRECT", 42)])
+
+        self.listener._reset()
+        self.assertIsNone(self.listener.client)
+        self.assertEqual(len(self.cache), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
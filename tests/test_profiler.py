@@ -0,0 +1,140 @@
+"""
+`backend.profiler` のサンプリングと署名検証のテスト。
+Tests for sampling and header signing in `backend.profiler`.
+"""
+
+import json
+import os
+import signal
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from backend import profiler
+
+
+def _busy_wait(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(200))
+
+
+class ProfilerTests(unittest.TestCase):
+    """
+    プロファイラのテストケース群
+    Test cases for the profiler.
+    """
+
+    def test_signed_header_is_verified_and_expires(self):
+        """
+        EN: Only a correctly signed, unexpired X-Profile header enables request profiling.
+        JP: 正しく署名され期限内の X-Profile ヘッダーだけがプロファイルを有効にすること。
+        """
+        now = 1_700_000_000
+        with patch.object(profiler, "PROFILER_SECRET", "secret"):
+            valid = profiler.sign_header("secret", ttl_seconds=60, now=now)
+            forged = profiler.sign_header("other", ttl_seconds=60, now=now)
+            self.assertTrue(profiler.header_requested({"X-Profile": valid}, now=now))
+            self.assertFalse(profiler.header_requested({"X-Profile": forged}, now=now))
+            self.assertFalse(profiler.header_requested({"X-Profile": valid}, now=now + 61))
+            self.assertFalse(profiler.header_requested({}, now=now))
+            long_lived = profiler.sign_header("secret", ttl_seconds=profiler.PROFILER_MAX_TOKEN_TTL_SECONDS + 60, now=now)
+            self.assertFalse(profiler.header_requested({"X-Profile": long_lived}, now=now))
+            self.assertTrue(profiler.header_requested({"X-Profile": profiler.sign_header("secret", now=now)}, now=now))
+        with patch.object(profiler, "PROFILER_SECRET", ""):
+            self.assertFalse(profiler.header_requested({"X-Profile": valid}, now=now))
+
+    def test_thread_sampler_writes_collapsed_and_speedscope(self):
+        """
+        EN: Sampling a busy thread yields stacks containing its function in both output formats.
+        JP: 処理中スレッドのサンプリング結果が両形式で関数名を含むこと。
+        """
+        stop = threading.Event()
+        worker = threading.Thread(target=_busy_wait, args=(stop,))
+        worker.start()
+        try:
+            sampler = profiler.Sampler("unit", thread_id=worker.ident, interval=0.001)
+            sampler.start()
+            time.sleep(0.1)
+            sampler.stop()
+        finally:
+            stop.set()
+            worker.join()
+
+        self.assertGreater(sum(sampler.counts.values()), 0)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            collapsed_path = profiler.write_profile(sampler, tmpdir, profiler.FORMAT_COLLAPSED)
+            speedscope_path = profiler.write_profile(sampler, tmpdir, profiler.FORMAT_SPEEDSCOPE)
+            with open(collapsed_path, encoding="utf-8") as f:
+                collapsed = f.read()
+            with open(speedscope_path, encoding="utf-8") as f:
+                speedscope = json.load(f)
+
+        self.assertIn("_busy_wait (test_profiler.py:", collapsed)
+        self.assertRegex(collapsed.splitlines()[0], r" \d+$")
+        names = {frame["name"] for frame in speedscope["shared"]["frames"]}
+        self.assertIn("_busy_wait", names)
+        self.assertEqual(speedscope["profiles"][0]["type"], "sampled")
+
+    def test_empty_profile_is_not_written(self):
+        """
+        EN: A sampler without samples writes nothing.
+        JP: サンプルの無いプロファイルは保存しないこと。
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self.assertIsNone(profiler.write_profile(profiler.Sampler("empty"), tmpdir))
+            self.assertEqual(os.listdir(tmpdir), [])
+
+    def _wait_for_window_end(self):
+        deadline = time.time() + 5
+        while profiler._window_sampler is not None and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertIsNone(profiler._window_sampler)
+
+    def test_window_writer_leaves_no_internal_thread_behind(self):
+        """
+        EN: The window writer registers and removes its own ident, so none is left once the window ends.
+        JP: 時間窓の書き出しスレッドは自身の ident を登録・削除し、終了後に残らないこと。
+        """
+        before = set(profiler._internal_threads)
+        with tempfile.TemporaryDirectory() as tmpdir, patch.object(profiler, "PROFILER_OUTPUT_DIR", tmpdir):
+            self.assertTrue(profiler.start_window(0.01))
+            self._wait_for_window_end()
+
+        self.assertEqual(profiler._internal_threads, before)
+
+    @unittest.skipUnless(hasattr(signal, "SIGUSR2"), "SIGUSR2 is not available")
+    def test_signal_does_not_take_the_window_lock_in_the_handler(self):
+        """
+        EN: SIGUSR2 returns at once while the main thread holds the window lock; the window starts after it is released.
+        JP: メインスレッドが時間窓のロックを保持中でも SIGUSR2 のハンドラはすぐ戻り、解放後に時間窓が始まること。
+        """
+        previous = signal.getsignal(signal.SIGUSR2)
+        self.addCleanup(signal.signal, signal.SIGUSR2, previous)
+        with tempfile.TemporaryDirectory() as tmpdir, patch.object(
+            profiler, "PROFILER_SIGNAL_ENABLED", True
+        ), patch.object(profiler, "PROFILER_OUTPUT_DIR", tmpdir), patch.object(
+            profiler, "PROFILER_MAX_SECONDS", 0.05
+        ):
+            self.assertTrue(profiler.install_signal_handler())
+            stop = threading.Event()
+            worker = threading.Thread(target=_busy_wait, args=(stop,), daemon=True)
+            worker.start()
+            with profiler._window_lock:
+                os.kill(os.getpid(), signal.SIGUSR2)
+                # ハンドラがロックを待つとここへ戻らない / A handler waiting on the lock would never return here
+                time.sleep(0.05)
+                self.assertIsNone(profiler._window_sampler)
+
+            deadline = time.time() + 5
+            while not os.listdir(tmpdir) and time.time() < deadline:
+                time.sleep(0.01)
+            self._wait_for_window_end()
+            stop.set()
+            worker.join()
+            self.assertTrue(os.listdir(tmpdir))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,1176 @@
+"""
+`backend.redis_client` のセッション読み書きを検証するテスト。
+Tests for session reads and writes in `backend.redis_client`.
+"""
+
+import json
+import os
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from redis.crc import key_slot
+
+from backend import metrics, redis_client
+from backend.redis_replicas import RecentWrites, ReplicaSet
+from backend.redis_shards import ShardedRedis
+from backend.fallback_store import FallbackStore
+from backend.near_cache import LocalCache
+from backend.write_journal import WriteJournal
+
+
+class _CountingRedis:
+    """
+    往復回数を数える最小のRedis互換クライアント（パイプラインは1往復として記録）
+    Minimal Redis-like client that records round trips (a pipeline counts as one).
+    """
+
+    def __init__(self):
+        self.store = {}
+        self.hashes = {}
+        self.ttls = {}
+        self.calls = []
+        self._batched = False
+
+    def _record(self, *call):
+        if not self._batched:
+            self.calls.append(call)
+
+    def get(self, key):
+        self._record("get", key)
+        return self.store.get(key)
+
+    def mget(self, keys):
+        self._record("mget", tuple(keys))
+        return [self.store.get(key) for key in keys]
+
+    def setex(self, key, _ttl, value):
+        self._record("setex", key)
+        self.store[key] = value
+
+    def set(self, key, value):
+        self._record("set", key)
+        self.store[key] = value
+
+    def delete(self, *keys):
+        self._record("delete", keys)
+        for key in keys:
+            self.store.pop(key, None)
+            self.hashes.pop(key, None)
+
+    def rpush(self, key, *values):
+        self._record("rpush", key)
+        self.store.setdefault(key, []).extend(values)
+        return len(self.store[key])
+
+    def ltrim(self, key, start, end):
+        self._record("ltrim", key)
+        items = self.store.get(key, [])
+        self.store[key] = items[start:] if end == -1 else items[start : end + 1]
+
+    def lrange(self, key, start, end):
+        self._record("lrange", key)
+        items = self.store.get(key, [])
+        return list(items[start:] if end == -1 else items[start : end + 1])
+
+    def expire(self, key, ttl, nx=False):
+        self._record("expire", key, nx)
+        if not nx or key not in self.ttls:
+            self.ttls[key] = ttl
+
+    def hmget(self, key, fields):
+        self._record("hmget", key)
+        values = self.hashes.get(key, {})
+        return [values.get(name) for name in fields]
+
+    def hset(self, key, mapping):
+        self._record("hset", key)
+        self.hashes.setdefault(key, {}).update(mapping)
+
+    def hdel(self, key, *fields):
+        self._record("hdel", key)
+        for name in fields:
+            self.hashes.get(key, {}).pop(name, None)
+
+    def eval(self, script, numkeys, *args):
+        keys, argv = list(args[:numkeys]), list(args[numkeys:])
+        if script == redis_client._MIGRATE_SESSION_SCRIPT:
+            self._record("eval", "migrate")
+            if keys[0] in self.hashes:
+                return 0
+            moved = {argv[i]: self.store.pop(key) for i, key in enumerate(keys[1:], start=1) if key in self.store}
+            if moved:
+                self.hashes[keys[0]] = moved
+            return len(moved)
+        if script == redis_client._SEED_HISTORY_SCRIPT:
+            self._record("eval", "seed")
+            log_key, legacy_key = keys
+            seeded = not self.store.get(log_key)
+            if seeded:
+                entries = list(argv[3:])
+                self.store[log_key] = entries[-int(argv[1]):] if int(argv[1]) > 0 else entries
+            if argv[2] == "1":
+                self.hashes.get(legacy_key, {}).pop("chat_history", None)
+            else:
+                self.store.pop(legacy_key, None)
+            return int(seeded)
+        if script == redis_client._NEXT_TURN_SCRIPT:
+            self._record("eval", "turn")
+            counter, log_key, state_key = keys
+            turn = int(self.store[counter]) if counter in self.store else len(self.store.get(log_key, [])) // 2
+            decision_turn = self.hashes.get(state_key, {}).get("decision_turn") if argv[1] == "1" else self.store.get(state_key)
+            turn = max(turn, int(decision_turn) if decision_turn is not None else turn) + 1
+            self.store[counter] = str(turn)
+            return turn
+        self._record("eval", "decision")
+        if script == redis_client._SAVE_DECISION_IF_NEWER_SCRIPT:
+            # keys レイアウトは項目ごとのキーに書く / The keys layout writes one key per field
+            stored = self.store.get(keys[1])
+            values = {} if stored is None else {"decision_turn": stored}
+        else:
+            values = self.hashes.setdefault(keys[0], {})
+        counter = int(self.store[keys[-1]]) if keys[-1] in self.store else None
+        turn = int(argv[1]) if argv[1] != "" else (counter or 0)
+        if int(values.get("decision_turn", -1)) > turn or (counter is not None and turn > counter):
+            return 0
+        values.update({"decision": argv[0], "decision_turn": str(turn)})
+        if len(argv) > 3 and argv[3] != "":
+            values["decision_llm_turn"] = argv[3]
+        if script == redis_client._SAVE_DECISION_IF_NEWER_SCRIPT:
+            for key, name in zip(keys[:3], ("decision", "decision_turn", "decision_llm_turn")):
+                if name in values:
+                    self.store[key] = values[name]
+        return 1
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+
+class _Pipeline:
+    """
+    コマンドを溜めて execute でまとめて実行するパイプライン
+    Pipeline that queues commands and runs them on execute().
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.queued = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.queued.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    def execute(self):
+        self.client.calls.append(("pipeline", tuple(name for name, _args, _kwargs in self.queued)))
+        self.client._batched = True
+        try:
+            return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.queued]
+        finally:
+            self.client._batched = False
+
+
+class SessionSnapshotTests(unittest.TestCase):
+    """
+    セッションスナップショットのテストケース群
+    Test cases for session snapshots.
+    """
+
+    def setUp(self):
+        self.client = _CountingRedis()
+        patcher = patch.object(redis_client, "get_redis_client", return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_snapshot_loads_in_one_round_trip_and_serves_reads(self):
+        """
+        EN: One pipelined LRANGE+MGET loads the session; later get_* calls inside the scope never hit Redis.
+        JP: LRANGE と MGET の1回のパイプラインで読み込み、スコープ内の get_* は Redis を読まないこと。
+        """
+        self.client.store.update({
+            "session:s1:chat_log": [json.dumps(["human", "こんにちは"]), json.dumps(["assistant", "はい"])],
+            "session:s1:decision": "目的地: 京都",
+            "session:s1:user_language": "ja",
+            "session:s1:user_type": "normal",
+        })
+
+        snapshot = redis_client.load_session_snapshot("s1")
+        self.assertEqual(self.client.calls, [("pipeline", ("lrange", "mget"))])
+
+        with redis_client.use_session_snapshot(snapshot):
+            history = redis_client.get_chat_history("s1")
+            self.assertEqual(history, [("human", "こんにちは"), ("assistant", "はい")])
+            self.assertEqual(redis_client.get_decision("s1"), "目的地: 京都")
+            self.assertEqual(redis_client.get_user_language("s1"), "ja")
+            self.assertEqual(redis_client.get_user_type("s1"), "normal")
+            # 呼び出し側が履歴を変更してもスナップショットは変わらない
+            # Mutating the returned list does not change the snapshot
+            history.append(("human", "追加"))
+            self.assertEqual(len(redis_client.get_chat_history("s1")), 2)
+        self.assertEqual(len(self.client.calls), 1)
+
+        redis_client.get_user_type("s1")
+        self.assertEqual(self.client.calls[-1], ("get", "session:s1:user_type"))
+
+    def test_writes_keep_snapshot_current_and_other_sessions_read_redis(self):
+        """
+        EN: save_* updates the active snapshot, and other sessions are not served from it.
+        JP: save_* はスナップショットも更新し、別セッションはスナップショットを使わないこと。
+        """
+        snapshot = redis_client.load_session_snapshot("s2")
+        with redis_client.use_session_snapshot(snapshot):
+            redis_client.save_chat_history("s2", [("human", "a"), ("assistant", "b")])
+            redis_client.save_user_language("s2", "en")
+            self.assertEqual(redis_client.get_chat_history("s2"), [("human", "a"), ("assistant", "b")])
+            self.assertEqual(redis_client.get_user_language("s2"), "en")
+            redis_client.get_decision("other")
+            self.assertIn(("get", "session:other:decision"), self.client.calls)
+            redis_client.reset_session("s2")
+            self.assertEqual(redis_client.get_chat_history("s2"), [])
+
+    def test_snapshot_falls_back_to_memory_without_redis(self):
+        """
+        EN: Without Redis, the snapshot is read from the in-memory fallback.
+        JP: Redis が無い場合はインメモリのフォールバックから読み込むこと。
+        """
+        with patch.object(redis_client, "get_redis_client", return_value=None), patch.object(
+            redis_client, "_should_use_fallback", return_value=True
+        ), patch.dict(redis_client._memory_store, {}, clear=True):
+            redis_client.save_decision("s3", "予算: 5万円")
+            snapshot = redis_client.load_session_snapshot("s3")
+        self.assertEqual(snapshot.decision, "予算: 5万円")
+        self.assertEqual(snapshot.chat_history, [])
+
+
+class HashLayoutTests(unittest.TestCase):
+    """
+    単一ハッシュのセッションレイアウトのテストケース群
+    Test cases for the single-hash session layout.
+    """
+
+    def setUp(self):
+        self.client = _CountingRedis()
+        for patcher in (
+            patch.object(redis_client, "get_redis_client", return_value=self.client),
+            patch.object(redis_client, "REDIS_SESSION_LAYOUT", redis_client.LAYOUT_HASH),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        redis_client._migrated_sessions.clear()
+
+    def test_session_lives_in_one_hash_key(self):
+        """
+        EN: All fields are stored in one hash, read back with one HMGET, and writes are pipelined.
+        JP: 全項目が1つのハッシュに保存され、1回の HMGET で読め、書き込みはパイプラインで送られること。
+        """
+        redis_client.append_chat_history("h1", [("human", "a")])
+        redis_client.save_user_language("h1", "ja")
+        self.assertTrue(redis_client.save_decision_if_newer("h1", "目的地: 札幌", 2))
+        self.assertFalse(redis_client.save_decision_if_newer("h1", "古い", 1))
+
+        self.assertEqual(list(self.client.hashes), ["session:h1"])
+        # 履歴リストと最終更新時刻以外はハッシュに入る / Only the history list and the update stamp live outside the hash
+        self.assertEqual(list(self.client.store), ["session:h1:chat_log", "session:h1:updated_at"])
+        self.assertIn(("pipeline", ("eval", "hset", "expire")), self.client.calls)
+        # 履歴の追記のみ TTL を延長し、それ以外は未設定時のみ設定する
+        # Only history appends extend the TTL; other writes use NX
+        self.client.calls.clear()
+        redis_client.append_chat_history("h1", [("assistant", "b")])
+        redis_client.save_user_type("h1", "normal")
+        pipelines = [call[1] for call in self.client.calls if call[0] == "pipeline"]
+        # 移行は確認済みのため、以降の書き込みは EVAL を送らない / Migration is confirmed, so later writes send no EVAL
+        self.assertEqual(pipelines, [("rpush", "expire", "expire", "setex"), ("hset", "expire")])
+
+        self.client.calls.clear()
+        snapshot = redis_client.load_session_snapshot("h1")
+        self.assertEqual(self.client.calls, [("pipeline", ("lrange", "hmget"))])
+        self.assertEqual(snapshot.chat_history, [("human", "a"), ("assistant", "b")])
+        self.assertEqual(snapshot.decision, "目的地: 札幌")
+        self.assertEqual(snapshot.user_language, "ja")
+        self.assertEqual(redis_client.get_decision_turn("h1"), 2)
+
+    def test_legacy_keys_are_migrated_on_first_access(self):
+        """
+        EN: Legacy per-field keys are moved into the hash on first read, then removed.
+        JP: 旧レイアウトのキーは初回読み込み時にハッシュへ移され、削除されること。
+        """
+        self.client.store.update({
+            "session:old:chat_history": json.dumps([["human", "こんにちは"]]),
+            "session:old:user_type": "normal",
+        })
+
+        self.assertEqual(redis_client.get_chat_history("old"), [("human", "こんにちは")])
+        # 移行・読み込み・初期化で2往復 / Migration, read and seeding take two round trips
+        self.assertEqual(self.client.calls, [("pipeline", ("eval", "lrange", "hmget")), ("eval", "seed")])
+        self.assertEqual(list(self.client.store), ["session:old:chat_log"])
+        self.assertEqual(self.client.hashes["session:old"], {"user_type": "normal"})
+        self.assertEqual(redis_client.get_user_type("old"), "normal")
+
+        self.client.calls.clear()
+        redis_client.save_user_type("old", "premium")
+        self.assertEqual(self.client.calls, [("pipeline", ("hset", "expire"))])
+
+        redis_client.reset_session("old")
+        self.assertNotIn("session:old", self.client.hashes)
+        self.assertEqual(sorted(self.client.store), ["session:old:turn_seq", "session:old:updated_at"])
+        self.assertEqual(redis_client.get_current_turn("old"), 0)
+
+
+class ChatHistoryLogTests(unittest.TestCase):
+    """
+    追記専用のチャット履歴リストのテストケース群
+    Test cases for the append-only chat history list.
+    """
+
+    def setUp(self):
+        self.client = _CountingRedis()
+        patcher = patch.object(redis_client, "get_redis_client", return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_append_pushes_only_the_new_turn(self):
+        """
+        EN: Each append is one pipeline that pushes only the new messages.
+        JP: 追記は新しい発話だけを送る1回のパイプラインであること。
+        """
+        redis_client.append_chat_history("a1", [("human", "1"), ("assistant", "2")])
+        redis_client.append_chat_history("a1", [("human", "3"), ("assistant", "4")])
+
+        self.assertEqual(self.client.calls, [("pipeline", ("rpush", "expire", "setex"))] * 2)
+        # 役割は整数コードで保存される / Roles are stored as integer codes
+        self.assertEqual(self.client.store["session:a1:chat_log"][-1], '[1,"4"]')
+        self.assertEqual(
+            redis_client.get_chat_history("a1"),
+            [("human", "1"), ("assistant", "2"), ("human", "3"), ("assistant", "4")],
+        )
+
+    def test_history_is_trimmed_and_read_within_the_cap(self):
+        """
+        EN: With CHAT_HISTORY_MAX_ENTRIES the list is trimmed on write and reads return the window.
+        JP: CHAT_HISTORY_MAX_ENTRIES 指定時は書き込みで切り詰められ、読み込みは直近の窓だけを返すこと。
+        """
+        with patch.object(redis_client, "CHAT_HISTORY_MAX_ENTRIES", 2):
+            redis_client.append_chat_history("a2", [("human", "1"), ("assistant", "2"), ("human", "3")])
+            self.assertEqual(self.client.calls, [("pipeline", ("rpush", "ltrim", "expire", "setex"))])
+            self.assertEqual(len(self.client.store["session:a2:chat_log"]), 2)
+            self.assertEqual(redis_client.get_chat_history("a2"), [("assistant", "2"), ("human", "3")])
+
+    def test_legacy_json_history_is_moved_into_the_list(self):
+        """
+        EN: A legacy JSON-string history is moved into the list on first read and then deleted.
+        JP: 旧形式の JSON 文字列の履歴は初回読み込み時にリストへ移され、削除されること。
+        """
+        self.client.store["session:a3:chat_history"] = json.dumps([["human", "旧"], ["assistant", "履歴"]])
+
+        self.assertEqual(redis_client.get_chat_history("a3"), [("human", "旧"), ("assistant", "履歴")])
+        self.assertNotIn("session:a3:chat_history", self.client.store)
+        redis_client.append_chat_history("a3", [("human", "新")])
+        self.assertEqual(len(redis_client.get_chat_history("a3")), 3)
+
+    def test_legacy_history_is_probed_in_the_read_pipeline(self):
+        """
+        EN: The legacy history is probed in the read pipeline; a new session costs one round trip.
+        JP: 旧形式の履歴は読み込みのパイプライン内で確認され、新規セッションは1往復で済むこと。
+        """
+        snapshot = redis_client.load_session_snapshot("a4")
+        self.assertEqual(snapshot.chat_history, [])
+        self.assertEqual(self.client.calls, [("pipeline", ("lrange", "mget"))])
+
+        self.client.calls.clear()
+        self.client.store["session:a5:chat_history"] = json.dumps([["human", "旧"]])
+        self.assertEqual(redis_client.get_chat_history("a5"), [("human", "旧")])
+        self.assertEqual(self.client.calls, [("pipeline", ("lrange", "mget")), ("eval", "seed")])
+
+    def test_concurrent_legacy_seeding_does_not_duplicate_history(self):
+        """
+        EN: Seeding only writes while the list is empty, so a second reader cannot duplicate the history.
+        JP: 初期化はリストが空のときだけ書き込むため、2つ目の読み手が履歴を重複させないこと。
+        """
+        legacy = json.dumps([["human", "旧"], ["assistant", "履歴"]])
+        self.client.store["session:a6:chat_history"] = legacy
+
+        # 両方の読み手が空のリストを見た後で初期化する / Both readers saw an empty list before seeding
+        redis_client._seed_history_from_legacy(self.client, "a6", legacy)
+        redis_client._seed_history_from_legacy(self.client, "a6", legacy)
+
+        self.assertEqual(redis_client.get_chat_history("a6"), [("human", "旧"), ("assistant", "履歴")])
+        self.assertNotIn("session:a6:chat_history", self.client.store)
+
+
+class ValueCodecTests(unittest.TestCase):
+    """
+    圧縮付き・版付きの値エンコードのテストケース群
+    Test cases for the compressed, versioned value encoding.
+    """
+
+    def test_large_values_are_compressed_and_small_or_legacy_values_stay_plain(self):
+        """
+        EN: Values above the threshold round-trip compressed; small and legacy values pass through.
+        JP: 閾値以上の値は圧縮して往復でき、小さい値や旧形式の値はそのまま扱われること。
+        """
+        large = "京都で2泊3日、予算は1人5万円程度です。" * 100
+        with patch.object(redis_client, "REDIS_COMPRESS_MIN_BYTES", 1024):
+            encoded = redis_client._encode_value(large)
+            self.assertTrue(encoded.startswith(redis_client._CODEC_ZLIB_V1))
+            self.assertLess(len(encoded), len(large.encode("utf-8")))
+            self.assertEqual(redis_client._decode_value(encoded), large)
+            self.assertEqual(redis_client._encode_value("目的地: 京都"), "目的地: 京都")
+        self.assertEqual(redis_client._decode_value('[["human", "旧形式"]]'), '[["human", "旧形式"]]')
+        with self.assertRaises(ValueError):
+            redis_client._decode_value("\x1fz9:abc")
+
+    def test_compressed_history_and_fields_read_back_transparently(self):
+        """
+        EN: Compressed history entries and fields are decoded by the normal getters.
+        JP: 圧縮された履歴要素とフィールドが通常の get_* で透過的に読めること。
+        """
+        client = _CountingRedis()
+        reply = "新幹線で東京駅から約2時間15分です。" * 80
+        with patch.object(redis_client, "get_redis_client", return_value=client), patch.object(
+            redis_client, "REDIS_COMPRESS_MIN_BYTES", 512
+        ):
+            redis_client.append_chat_history("c1", [("human", "行き方は？"), ("assistant", reply)])
+            redis_client.save_decision("c1", reply)
+            stored = client.store["session:c1:chat_log"]
+            self.assertFalse(stored[0].startswith(redis_client._CODEC_MARKER))
+            self.assertTrue(stored[1].startswith(redis_client._CODEC_ZLIB_V1))
+            self.assertEqual(redis_client.get_chat_history("c1")[1], ("assistant", reply))
+            self.assertEqual(redis_client.load_session_snapshot("c1").decision, reply)
+
+
+class SupervisorTests(unittest.TestCase):
+    """
+    バックグラウンドの再接続・ヘルスチェックのテストケース群
+    Test cases for background reconnection and health checks.
+    """
+
+    def setUp(self):
+        for patcher in (
+            patch.object(redis_client, "_supervisor_pid", os.getpid()),
+            patch.object(redis_client, "redis_client", None),
+            patch.object(redis_client, "REDIS_FAIL_FAST", False),
+            patch.object(redis_client, "_journal", WriteJournal()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_request_path_does_not_wait_for_reconnect(self):
+        """
+        EN: While the supervisor is reconnecting, get_redis_client returns None without blocking.
+        JP: スーパーバイザーが再接続中でも get_redis_client は待たずに None を返すこと。
+        """
+        release = threading.Event()
+        new_client = _CountingRedis()
+
+        def slow_connect():
+            release.wait(5)
+            return new_client
+
+        with patch.object(redis_client, "_connect_with_retries", side_effect=slow_connect):
+            supervisor = threading.Thread(target=redis_client._supervise_once, args=(time.time(),))
+            supervisor.start()
+            started = time.perf_counter()
+            self.assertIsNone(redis_client.get_redis_client())
+            self.assertLess(time.perf_counter() - started, 0.5)
+            release.set()
+            supervisor.join()
+
+        self.assertIs(redis_client.get_redis_client(), new_client)
+
+    def test_failed_health_check_replaces_client(self):
+        """
+        EN: A failed ping drops the client, counts a fallback activation, and the same cycle installs a reconnected one.
+        JP: ping に失敗するとクライアントを破棄してフォールバック発動を数え、同じ周期で再接続したものに差し替えること。
+        """
+        def activations():
+            return metrics.REGISTRY.get_sample_value("yorozu_redis_fallback_activations_total") or 0.0
+
+        broken = _CountingRedis()
+        broken.ping = lambda: (_ for _ in ()).throw(ConnectionError("down"))
+        replacement = _CountingRedis()
+        before = activations()
+        with patch.object(redis_client, "redis_client", broken), patch.object(
+            redis_client, "_last_health_check", 0.0
+        ), patch.object(redis_client, "_connect_with_retries", return_value=replacement), patch.object(
+            redis_client, "REDIS_ALLOW_FALLBACK", True
+        ):
+            redis_client._supervise_once(time.time())
+            self.assertIs(redis_client.redis_client, replacement)
+        self.assertEqual(activations() - before, 1)
+
+    def test_mark_unhealthy_wakes_supervisor(self):
+        """
+        EN: Marking Redis unhealthy clears the client and wakes the supervisor at once.
+        JP: 不健康としてマークするとクライアントを破棄し、すぐにスーパーバイザーを起こすこと。
+        """
+        redis_client._supervisor_wake.clear()
+        with patch.object(redis_client, "redis_client", _CountingRedis()), patch.object(redis_client.logger, "error"):
+            redis_client._mark_unhealthy("get", ConnectionError("down"))
+            self.assertIsNone(redis_client.redis_client)
+        self.assertTrue(redis_client._supervisor_wake.is_set())
+        redis_client._supervisor_wake.clear()
+
+    def test_fallback_activation_is_counted_once_per_outage(self):
+        """
+        EN: Only the drop of a live client counts as a fallback activation; fallback checks and repeat failures do not.
+        JP: 接続中のクライアントを破棄したときだけフォールバック発動として数え、判定や続く失敗では数えないこと。
+        """
+        def activations():
+            return metrics.REGISTRY.get_sample_value("yorozu_redis_fallback_activations_total") or 0.0
+
+        before = activations()
+        with patch.object(redis_client, "redis_client", _CountingRedis()), patch.object(
+            redis_client, "REDIS_ALLOW_FALLBACK", True
+        ), patch.object(redis_client.logger, "error"):
+            redis_client._mark_unhealthy("get", ConnectionError("down"))
+            redis_client._mark_unhealthy("set", ConnectionError("down"))
+            redis_client._should_use_fallback()
+        redis_client._supervisor_wake.clear()
+
+        self.assertEqual(activations() - before, 1)
+
+
+class FallbackJournalReplayTests(unittest.TestCase):
+    """
+    フォールバック書き込みのジャーナルと復旧後の再生のテストケース群
+    Test cases for journaling fallback writes and replaying them after recovery.
+    """
+
+    def setUp(self):
+        self.client = _CountingRedis()
+        self.journal = WriteJournal()
+        self.store = FallbackStore(sweep_interval=0)
+        for patcher in (
+            patch.object(redis_client, "_journal", self.journal),
+            patch.object(redis_client, "_memory_store", self.store),
+            patch.object(redis_client, "REDIS_SESSION_LAYOUT", redis_client.LAYOUT_HASH),
+            patch.object(redis_client, "REDIS_FAIL_FAST", False),
+            patch.object(redis_client, "REDIS_ALLOW_FALLBACK", True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        redis_client._migrated_sessions.clear()
+
+    def _write_during_outage(self, session_id):
+        with patch.object(redis_client, "get_redis_client", return_value=None), patch.object(
+            redis_client.logger, "warning"
+        ):
+            redis_client.append_chat_history(session_id, [("human", "京都"), ("assistant", "了解です")])
+            redis_client.save_user_type(session_id, "normal")
+            redis_client.save_decision_if_newer(session_id, "目的地: 京都", 1)
+
+    def test_fallback_writes_are_replayed_in_one_batch(self):
+        """
+        EN: Writes made during an outage reach Redis after recovery in one MGET plus one pipeline.
+        JP: 障害中の書き込みが、復旧後に1回の MGET と1回のパイプラインで Redis に反映されること。
+        """
+        self.client.rpush("session:j1:chat_log", '[0,"前の発話"]')
+        self.client.calls.clear()
+        self._write_during_outage("j1")
+        self.assertEqual(len(self.journal), 3)
+
+        progress = redis_client.replay_fallback_journal(self.client)
+
+        self.assertEqual(progress, {"sessions": 1, "applied": 3, "conflicts": 0, "pending": 0})
+        self.assertEqual([call[0] for call in self.client.calls], ["mget", "pipeline"])
+        self.assertEqual(len(self.store), 0)
+        with patch.object(redis_client, "get_redis_client", return_value=self.client):
+            snapshot = redis_client.load_session_snapshot("j1")
+        self.assertEqual(
+            snapshot.chat_history,
+            [("human", "前の発話"), ("human", "京都"), ("assistant", "了解です")],
+        )
+        self.assertEqual((snapshot.user_type, snapshot.decision), ("normal", "目的地: 京都"))
+        self.assertEqual(redis_client.journal_stats()["totals"]["applied"], 3)
+
+    def test_writes_older_than_redis_are_skipped(self):
+        """
+        EN: When Redis was updated after the fallback writes, they are dropped as conflicts.
+        JP: フォールバックの書き込みより後に Redis が更新されていた場合、競合として捨てられること。
+        """
+        self._write_during_outage("j2")
+        self.client.store["session:j2:updated_at"] = repr(time.time() + 60)
+
+        progress = redis_client.replay_fallback_journal(self.client)
+
+        self.assertEqual((progress["applied"], progress["conflicts"]), (0, 3))
+        self.assertNotIn("session:j2:chat_log", self.client.store)
+        self.assertEqual(self.journal.stats()["totals"]["conflict"], 3)
+
+    def test_failed_replay_keeps_the_journal(self):
+        """
+        EN: If the replay pipeline fails, the operations stay in the journal and the fallback data is kept.
+        JP: 再生のパイプラインが失敗した場合、操作はジャーナルに残り、フォールバックのデータも保持されること。
+        """
+        self._write_during_outage("j3")
+        self.client.pipeline = lambda transaction=True: (_ for _ in ()).throw(ConnectionError("down"))
+
+        with patch.object(redis_client, "_mark_unhealthy") as mark_unhealthy:
+            progress = redis_client.replay_fallback_journal(self.client)
+
+        mark_unhealthy.assert_called_once()
+        self.assertEqual((progress["sessions"], progress["pending"]), (0, 3))
+        self.assertEqual(len(self.journal), 3)
+        self.assertGreater(len(self.store), 0)
+
+    def test_supervisor_replays_after_reconnect(self):
+        """
+        EN: After the supervisor installs a reconnected client, pending writes are replayed.
+        JP: スーパーバイザーが再接続したクライアントに差し替えた後、未再生の書き込みが再生されること。
+        """
+        self._write_during_outage("j4")
+        with patch.object(redis_client, "redis_client", None), patch.object(
+            redis_client, "_connect_with_retries", return_value=self.client
+        ):
+            redis_client._supervise_once(time.time())
+        self.assertEqual(len(self.journal), 0)
+        self.assertIn("session:j4:chat_log", self.client.store)
+
+
+class ClusterAndShardingTests(unittest.TestCase):
+    """
+    Redis Cluster のハッシュタグとシャード構成のテストケース群
+    Test cases for Redis Cluster hash tags and the sharded mode.
+    """
+
+    def test_cluster_keys_of_a_session_share_one_slot(self):
+        """
+        EN: In cluster mode every key of a session carries the session hash tag and maps to one slot.
+        JP: cluster では1セッションの全キーがハッシュタグ付きになり、同じスロットに割り当てられること。
+        """
+        with patch.object(redis_client, "REDIS_MODE", redis_client.MODE_CLUSTER):
+            keys = redis_client._session_redis_keys("abc") + [
+                redis_client.get_session_key("abc", redis_client.STAMP_KEY_TYPE)
+            ]
+        self.assertIn("session:{abc}:decision", keys)
+        self.assertIn("session:{abc}", keys)
+        self.assertEqual({key_slot(key.encode()) for key in keys}, {key_slot(b"abc")})
+        self.assertEqual(redis_client.get_session_key("abc", "decision"), "session:abc:decision")
+
+    def test_sharded_sessions_stay_on_their_node(self):
+        """
+        EN: When sharded, each session's reads and writes go to the one node the ring assigns.
+        JP: シャード構成では、各セッションの読み書きがリングで決まった1ノードだけに送られること。
+        """
+        nodes = {"a": _CountingRedis(), "b": _CountingRedis()}
+        sharded = ShardedRedis(nodes)
+        sessions = [f"s{index}" for index in range(20)]
+        with patch.object(redis_client, "get_redis_client", return_value=sharded):
+            for session_id in sessions:
+                redis_client.append_chat_history(session_id, [("human", session_id)])
+                redis_client.save_user_type(session_id, "normal")
+            for session_id in sessions:
+                owner = nodes[sharded.ring.node_for(session_id)]
+                other = next(node for node in nodes.values() if node is not owner)
+                self.assertIn(f"session:{session_id}:chat_log", owner.store)
+                self.assertFalse(any(f":{session_id}:" in key for key in other.store))
+                snapshot = redis_client.load_session_snapshot(session_id)
+                self.assertEqual((snapshot.chat_history, snapshot.user_type), ([("human", session_id)], "normal"))
+
+    def test_sharded_replay_sends_each_node_its_sessions(self):
+        """
+        EN: Journal replay groups sessions by node: one MGET plus one pipeline per node.
+        JP: ジャーナルの再生がノードごとにまとめられ、各ノードに MGET と パイプラインを1回ずつ送ること。
+        """
+        nodes = {"a": _CountingRedis(), "b": _CountingRedis()}
+        sharded = ShardedRedis(nodes)
+        journal = WriteJournal()
+        sessions = [f"r{index}" for index in range(10)]
+        with patch.object(redis_client, "_journal", journal), patch.object(
+            redis_client, "_memory_store", FallbackStore(sweep_interval=0)
+        ), patch.object(redis_client, "REDIS_FAIL_FAST", False), patch.object(
+            redis_client, "REDIS_ALLOW_FALLBACK", True
+        ):
+            with patch.object(redis_client, "get_redis_client", return_value=None), patch.object(
+                redis_client.logger, "warning"
+            ):
+                for session_id in sessions:
+                    redis_client.save_user_type(session_id, "normal")
+            progress = redis_client.replay_fallback_journal(sharded)
+
+        self.assertEqual((progress["sessions"], progress["applied"]), (10, 10))
+        for name, node in nodes.items():
+            self.assertEqual([call[0] for call in node.calls], ["mget", "pipeline"])
+            owned = [session_id for session_id in sessions if sharded.ring.node_for(session_id) == name]
+            self.assertEqual(sorted(key for key in node.store if key.endswith(":user_type")), sorted(
+                f"session:{session_id}:user_type" for session_id in owned
+            ))
+
+
+
+class _WaitingRedis(_CountingRedis):
+    """
+    WAIT に対応したテスト用クライアント
+    Test client that also answers WAIT.
+    """
+
+    def wait(self, num_replicas, timeout_ms):
+        self._record("wait", num_replicas, timeout_ms)
+        return num_replicas
+
+
+class _ReplicatingRedis(_WaitingRedis):
+    """
+    WAIT でストアをレプリカへ複製するプライマリ
+    Primary that copies its store to a replica on WAIT.
+    """
+
+    def __init__(self, replica):
+        super().__init__()
+        self.replica = replica
+
+    def wait(self, num_replicas, timeout_ms):
+        self.replica.store = json.loads(json.dumps(self.store))
+        return super().wait(num_replicas, timeout_ms)
+
+
+class _FailingReplica(_CountingRedis):
+    """
+    読み込みが常に失敗するレプリカ
+    Replica whose reads always fail.
+    """
+
+    def pipeline(self, transaction=True):
+        raise ConnectionError("replica down")
+
+
+class ReplicaReadTests(unittest.TestCase):
+    """
+    読み込みレプリカへの振り分けと read-your-writes のテストケース群
+    Test cases for routing reads to replicas and for read-your-writes.
+    """
+
+    def setUp(self):
+        self.primary = _WaitingRedis()
+        self.replica = _CountingRedis()
+        self.replicas = ReplicaSet({"replica": self.replica})
+        for patcher in (
+            patch.object(redis_client, "get_redis_client", return_value=self.primary),
+            patch.object(redis_client, "_replica_set", return_value=self.replicas),
+            patch.object(redis_client, "_recent_writes", RecentWrites(5.0)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _seed(self, client, session_id):
+        client.store.update({
+            f"session:{session_id}:chat_log": [json.dumps(["human", "こんにちは"])],
+            f"session:{session_id}:user_type": "normal",
+        })
+
+    def test_snapshot_is_read_from_a_replica(self):
+        """
+        EN: A session this process has not written is loaded from the replica without touching the primary.
+        JP: 自プロセスが書き込んでいないセッションは、プライマリに触れずレプリカから読み込まれること。
+        """
+        self._seed(self.replica, "s1")
+
+        snapshot = redis_client.load_session_snapshot("s1")
+
+        self.assertEqual(snapshot.chat_history, [("human", "こんにちは")])
+        self.assertEqual(snapshot.user_type, "normal")
+        self.assertEqual(self.replica.calls, [("pipeline", ("lrange", "mget"))])
+        self.assertEqual(self.primary.calls, [])
+
+    def test_own_writes_are_read_from_the_primary(self):
+        """
+        EN: After a write, reads of that session go to the primary while other sessions still use the replica.
+        JP: 書き込んだセッションの読み込みはプライマリへ、他のセッションは引き続きレプリカへ送られること。
+        """
+        self._seed(self.replica, "other")
+        redis_client.save_user_type("s1", "premium")
+
+        self.assertEqual(redis_client.get_user_type("s1"), "premium")
+        self.assertEqual(redis_client.get_user_type("other"), "normal")
+        self.assertEqual(self.primary.calls[-1], ("get", "session:s1:user_type"))
+        self.assertEqual(self.replica.calls, [("get", "session:other:user_type")])
+
+    def test_replica_miss_reads_the_primary(self):
+        """
+        EN: When the replica has no history yet (replication lag), the session is read again from the primary.
+        JP: レプリカにまだ履歴が無い場合（複製遅延）、プライマリから読み直すこと。
+        """
+        self._seed(self.primary, "s1")
+
+        snapshot = redis_client.load_session_snapshot("s1")
+
+        self.assertEqual(snapshot.chat_history, [("human", "こんにちは")])
+        self.assertEqual(len(self.replica.calls), 1)
+        self.assertEqual(self.primary.calls, [("pipeline", ("lrange", "mget"))])
+
+    def test_failed_replica_rests_without_marking_the_primary_unhealthy(self):
+        """
+        EN: A failing replica falls back to the primary, is skipped afterwards, and leaves the primary healthy.
+        JP: 失敗したレプリカはプライマリに切り替えて以後休止し、プライマリは不健全扱いにならないこと。
+        """
+        self._seed(self.primary, "s1")
+        failing = _FailingReplica()
+        replicas = ReplicaSet({"replica": failing})
+        with patch.object(redis_client, "_replica_set", return_value=replicas), patch.object(
+            redis_client, "_mark_unhealthy"
+        ) as mark_unhealthy, patch.object(redis_client.logger, "warning"):
+            snapshot = redis_client.load_session_snapshot("s1")
+
+        mark_unhealthy.assert_not_called()
+        self.assertEqual(snapshot.user_type, "normal")
+        self.assertEqual(replicas.down(), ["replica"])
+        self.assertIsNone(replicas.pick())
+
+    def test_turn_save_waits_for_replication(self):
+        """
+        EN: With REDIS_REPLICA_WAIT_MS set, the turn save pipeline ends with WAIT so other workers see it on replicas.
+        JP: REDIS_REPLICA_WAIT_MS 指定時、ターン保存のパイプラインが WAIT で終わり、他ワーカーもレプリカで読めること。
+        """
+        with patch.object(redis_client, "REDIS_REPLICA_WAIT_MS", 50):
+            redis_client.append_chat_history("s1", [("human", "a"), ("assistant", "b")])
+
+        names = self.primary.calls[-1][1]
+        self.assertEqual(names[-1], "wait")
+        self.assertEqual(self.replica.calls, [])
+
+    def test_other_worker_reads_the_committed_turn_from_a_replica(self):
+        """
+        EN: A turn committed by one worker is on the replica when another worker, with its own RecentWrites, reads it.
+        JP: あるワーカーが保存したターンを、別の RecentWrites を持つ他ワーカーがレプリカから読めること。
+        """
+        primary = _ReplicatingRedis(self.replica)
+        with patch.object(redis_client, "get_redis_client", return_value=primary), patch.object(
+            redis_client, "REDIS_REPLICA_WAIT_MS", 50
+        ):
+            redis_client.commit_turn("s1", [("human", "a"), ("assistant", "b")], language="ja")
+            writes_before = len(primary.calls)
+            self.assertEqual(primary.calls[-1], ("wait", 1, 50))
+
+            with patch.object(redis_client, "_recent_writes", RecentWrites(5.0)):
+                snapshot = redis_client.load_session_snapshot("s1")
+
+        self.assertEqual(snapshot.chat_history, [("human", "a"), ("assistant", "b")])
+        self.assertEqual(snapshot.user_language, "ja")
+        self.assertEqual(self.replica.calls, [("pipeline", ("lrange", "mget"))])
+        self.assertEqual(len(primary.calls), writes_before)
+
+    def test_decision_write_waits_for_replication(self):
+        """
+        EN: A saved decision WAITs, so another worker reading the next turn from a replica sees it.
+        JP: 決定事項の保存は WAIT で複製を待ち、次のターンをレプリカから読む他ワーカーにも見えること。
+        """
+        primary = _ReplicatingRedis(self.replica)
+        with patch.object(redis_client, "get_redis_client", return_value=primary), patch.object(
+            redis_client, "REDIS_REPLICA_WAIT_MS", 50
+        ):
+            redis_client.commit_turn("s1", [("human", "京都"), ("assistant", "了解")])
+            self.assertTrue(redis_client.save_decision_if_newer("s1", "目的地: 京都", 1))
+            self.assertEqual(primary.calls[-2:], [("eval", "decision"), ("wait", 1, 50)])
+
+            with patch.object(redis_client, "_recent_writes", RecentWrites(5.0)):
+                snapshot = redis_client.load_session_snapshot("s1")
+
+        self.assertEqual(snapshot.decision, "目的地: 京都")
+        self.assertEqual(self.replica.calls, [("pipeline", ("lrange", "mget"))])
+
+    def test_reset_and_field_writes_wait_for_replication(self):
+        """
+        EN: Reset and field writes WAIT too, so replicas drop the old session and see the new user type.
+        JP: リセットとフィールドの書き込みも WAIT で複製を待ち、レプリカから古いセッションが消え新しい種別が見えること。
+        """
+        primary = _ReplicatingRedis(self.replica)
+        self._seed(primary, "s1")
+        with patch.object(redis_client, "get_redis_client", return_value=primary), patch.object(
+            redis_client, "REDIS_REPLICA_WAIT_MS", 50
+        ):
+            redis_client.reset_session("s1")
+            self.assertEqual(primary.calls[-1], ("wait", 1, 50))
+            self.assertNotIn("session:s1:chat_log", self.replica.store)
+            self.assertEqual(self.replica.store["session:s1:turn_seq"], "0")
+
+            redis_client.save_user_type("s1", "premium")
+            self.assertEqual(primary.calls[-1], ("wait", 1, 50))
+            self.assertEqual(self.replica.store["session:s1:user_type"], "premium")
+
+    def test_replica_reads_stay_off_without_wait(self):
+        """
+        EN: Without REDIS_REPLICA_WAIT_MS no replica set is built; with it, WAIT covers every configured replica.
+        JP: REDIS_REPLICA_WAIT_MS が無ければレプリカを使わず、指定時は WAIT が設定した全レプリカを待つこと。
+        """
+        urls = ["redis://replica-a:6379/0", "redis://replica-b:6379/0"]
+        with patch.object(redis_client, "REDIS_READ_FROM_REPLICAS", True), patch.object(
+            redis_client, "REDIS_MODE", redis_client.MODE_STANDALONE
+        ), patch.object(redis_client, "REDIS_SENTINELS", []), patch.object(
+            redis_client, "REDIS_REPLICA_URLS", urls
+        ), patch.object(redis_client, "_create_node_client", side_effect=lambda url: _CountingRedis()):
+            with patch.object(redis_client, "REDIS_REPLICA_WAIT_MS", 0), patch.object(
+                redis_client.logger, "warning"
+            ) as warning:
+                self.assertIsNone(redis_client._create_replica_set())
+            warning.assert_called_once()
+            with patch.object(redis_client, "REDIS_REPLICA_WAIT_MS", 50):
+                self.assertEqual(len(redis_client._create_replica_set()), 2)
+                self.assertEqual(redis_client._replica_wait_count(), 2)
+
+
+
+class NearCacheTests(unittest.TestCase):
+    """
+    言語・ユーザー種別のニアキャッシュのテストケース群
+    Test cases for the language and user type near-cache.
+    """
+
+    def setUp(self):
+        self.primary = _CountingRedis()
+        self.tracked = _CountingRedis()
+        self.tracked.store = self.primary.store
+        self.tracked.hashes = self.primary.hashes
+        self.cache = LocalCache(ttl=60.0)
+        for patcher in (
+            patch.object(redis_client, "get_redis_client", return_value=self.primary),
+            patch.object(redis_client, "_near_cache_client", return_value=self.tracked),
+            patch.object(redis_client, "_near_cache", self.cache),
+            patch.object(redis_client, "REDIS_NEAR_CACHE", True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_repeated_reads_are_served_from_the_cache(self):
+        """
+        EN: Only the first get_user_type/get_user_language reaches Redis; repeats are cache hits.
+        JP: get_user_type / get_user_language は初回だけ Redis を読み、以降はキャッシュから返すこと。
+        """
+        self.primary.store.update({"session:s1:user_type": "premium", "session:s1:user_language": "en"})
+
+        for _ in range(3):
+            self.assertEqual(redis_client.get_user_type("s1"), "premium")
+            self.assertEqual(redis_client.get_user_language("s1"), "en")
+
+        self.assertEqual(self.tracked.calls, [("get", "session:s1:user_type"), ("get", "session:s1:user_language")])
+        self.assertEqual(self.primary.calls, [])
+
+    def test_writes_and_invalidations_drop_cached_values(self):
+        """
+        EN: A local save drops the cached value at once, and a Redis invalidation drops it for other workers' writes.
+        JP: 自プロセスの保存で即座に、他ワーカーの書き込みは Redis の無効化通知でキャッシュが捨てられること。
+        """
+        redis_client.save_user_type("s1", "normal")
+        self.assertEqual(redis_client.get_user_type("s1"), "normal")
+        redis_client.save_user_type("s1", "premium")
+        self.assertEqual(redis_client.get_user_type("s1"), "premium")
+
+        self.primary.store["session:s1:user_type"] = "normal"
+        self.assertEqual(redis_client.get_user_type("s1"), "premium")
+        self.cache.invalidate("session:s1:user_type")
+        self.assertEqual(redis_client.get_user_type("s1"), "normal")
+
+    def test_hash_layout_bypasses_the_cache(self):
+        """
+        EN: The hash layout, where every turn rewrites the session hash, reads the fields directly without caching.
+        JP: 毎ターンハッシュ全体を書き換える hash レイアウトでは、キャッシュせず直接読むこと。
+        """
+        self.primary.hashes["session:s1"] = {"user_type": "normal", "user_language": "ja"}
+        with patch.object(redis_client, "REDIS_SESSION_LAYOUT", redis_client.LAYOUT_HASH):
+            self.assertEqual(redis_client.get_user_type("s1"), "normal")
+            self.assertEqual(redis_client.get_user_language("s1"), "ja")
+
+        self.assertEqual(self.tracked.calls, [])
+        self.assertEqual(len(self.cache), 0)
+
+    def test_second_chat_turn_reads_language_and_user_type_from_the_cache(self):
+        """
+        EN: Through prepare_chat_request, the second turn serves user type and language from the near-cache.
+        JP: prepare_chat_request 経由で、2ターン目はユーザー種別と言語をニアキャッシュから返すこと。
+        """
+        from flask import Flask
+
+        from backend import limit_manager
+        from backend.routes.common import ChatRequestContext, prepare_chat_request
+
+        self.primary.store.update({"session:s1:user_type": "normal", "session:s1:user_language": "ja"})
+        app = Flask(__name__)
+        hits = metrics.REDIS_NEAR_CACHE_READS.labels(result="hit")
+
+        def run_turn(message):
+            with app.test_request_context(
+                "/chat", method="POST", json={"message": message}, headers={"Cookie": "session_id=s1"}
+            ), patch("backend.routes.common.security.is_csrf_valid", return_value=True):
+                from flask import request
+
+                context = prepare_chat_request(
+                    request,
+                    error_responder=lambda message, **_kwargs: message,
+                    check_and_increment_limit=lambda session_id, user_type=None: (
+                        True, 1, 10, limit_manager.resolve_user_type(session_id, user_type), False, None
+                    ),
+                    resolve_user_language=lambda _prompt, fallback="", accept_language=None: fallback or "ja",
+                    get_user_language=redis_client.get_user_language,
+                    load_session_snapshot=redis_client.load_session_snapshot,
+                )
+                self.assertIsInstance(context, ChatRequestContext)
+                with redis_client.use_session_snapshot(context.snapshot):
+                    redis_client.commit_turn("s1", [("human", message), ("assistant", "ok")], language=context.language)
+            return context
+
+        run_turn("first")
+        tracked_after_first = list(self.tracked.calls)
+        hits_before = hits._value.get()
+        context = run_turn("second")
+
+        self.assertEqual(context.language, "ja")
+        self.assertEqual(
+            sorted(tracked_after_first), [("get", "session:s1:user_language"), ("get", "session:s1:user_type")]
+        )
+        self.assertEqual(self.tracked.calls, tracked_after_first)
+        self.assertEqual(hits._value.get() - hits_before, 2)
+        self.assertIsNone(context.snapshot.user_type)
+        # 言語は変わらないため書き直さず、SETEX は最終更新時刻の1回だけ
+        # The unchanged language is not rewritten; the only SETEX is the update stamp
+        self.assertEqual(self.primary.calls[-1][1].count("setex"), 1)
+        self.assertEqual(self.cache.get("session:s1:user_language"), (True, "ja"))
+
+    def test_without_a_listener_reads_go_straight_to_redis(self):
+        """
+        EN: While the invalidation listener is down, reads bypass the cache.
+        JP: 無効化リスナーが切断中は、キャッシュを使わず Redis から読むこと。
+        """
+        self.primary.store["session:s1:user_type"] = "normal"
+        with patch.object(redis_client, "_near_cache_client", return_value=None):
+            redis_client.get_user_type("s1")
+            redis_client.get_user_type("s1")
+
+        self.assertEqual(len(self.primary.calls), 2)
+        self.assertEqual(len(self.cache), 0)
+
+
+class CommitTurnTests(unittest.TestCase):
+    """
+    1ターン分の書き込みをまとめる commit_turn のテストケース群
+    Test cases for commit_turn, which writes one turn in a single transaction.
+    """
+
+    def setUp(self):
+        self.client = _CountingRedis()
+        self.journal = WriteJournal()
+        self.store = FallbackStore(sweep_interval=0)
+        for patcher in (
+            patch.object(redis_client, "get_redis_client", return_value=self.client),
+            patch.object(redis_client, "_journal", self.journal),
+            patch.object(redis_client, "_memory_store", self.store),
+            patch.object(redis_client, "REDIS_SESSION_LAYOUT", redis_client.LAYOUT_HASH),
+            patch.object(redis_client, "REDIS_FAIL_FAST", False),
+            patch.object(redis_client, "REDIS_ALLOW_FALLBACK", True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        redis_client._migrated_sessions.clear()
+
+    def test_turn_is_one_transaction(self):
+        """
+        EN: History, language and decision are written by one pipeline, and the decision is readable afterwards.
+        JP: 履歴・言語・決定事項が1回のパイプラインで書かれ、その後に読み出せること。
+        """
+        commit = redis_client.commit_turn(
+            "c1", [("human", "京都"), ("assistant", "了解です")], language="ja", decision="目的地: 京都"
+        )
+
+        self.assertEqual(commit, redis_client.TurnCommit(1, True))
+        self.assertEqual(len(self.client.calls), 1)
+        self.assertEqual(self.client.calls[0][0], "pipeline")
+        self.assertIn("rpush", self.client.calls[0][1])
+        self.assertIn("eval", self.client.calls[0][1])
+        self.assertEqual(self.client.hashes["session:c1"]["user_language"], "ja")
+        self.assertEqual(redis_client.get_decision("c1"), "目的地: 京都")
+        self.assertEqual(len(redis_client.get_chat_history("c1")), 2)
+        self.assertEqual(redis_client.get_decision_turn("c1"), 1)
+
+    def test_stale_decision_turn_keeps_the_newer_decision(self):
+        """
+        EN: A commit for an older turn still saves the history but returns False and keeps the newer decision.
+        JP: 古いターンのコミットでも履歴は保存されるが、False を返し新しい決定事項は残ること。
+        """
+        # 先に2ターン進んだセッション / A session already two turns in
+        self.client.store["session:c2:turn_seq"] = "2"
+        redis_client.commit_turn("c2", [("human", "1")], decision="目的地: 大阪", decision_turn=3)
+
+        commit = redis_client.commit_turn("c2", [("human", "2")], decision="目的地: 京都", decision_turn=2)
+
+        self.assertFalse(commit.decision_saved)
+        self.assertEqual(redis_client.get_decision("c2"), "目的地: 大阪")
+        self.assertEqual(redis_client.get_chat_history("c2"), [("human", "1"), ("human", "2")])
+
+    def test_llm_turn_is_written_and_read_with_the_decision(self):
+        """
+        EN: The LLM turn is stored by the decision compare-and-set and read back with the decision in one round trip.
+        JP: LLM のターンは決定事項の比較付き保存で書かれ、決定事項と一緒に1往復で読めること。
+        """
+        redis_client.save_decision_if_newer("c4", "目的地: 京都", 2, llm_turn=2)
+        self.client.calls.clear()
+
+        self.assertEqual(redis_client.get_decision_progress("c4"), ("目的地: 京都", 2))
+        self.assertEqual(len(self.client.calls), 1)
+
+    def test_outage_writes_the_turn_to_the_journal(self):
+        """
+        EN: Without Redis the whole turn goes to the fallback store and the journal, and replays afterwards.
+        JP: Redis が無い間はターン全体がフォールバックとジャーナルに書かれ、復旧後に再生されること。
+        """
+        with patch.object(redis_client, "get_redis_client", return_value=None), patch.object(
+            redis_client.logger, "warning"
+        ):
+            commit = redis_client.commit_turn("c3", [("human", "京都")], language="en", decision="目的地: 京都")
+
+        self.assertEqual(commit, redis_client.TurnCommit(1, True))
+        self.assertEqual(len(self.journal), 3)
+        redis_client.replay_fallback_journal(self.client)
+        self.assertEqual(redis_client.get_decision("c3"), "目的地: 京都")
+        self.assertEqual(redis_client.get_user_language("c3"), "en")
+        # 再生で進んだ decision_turn より後の番号から続く / Numbering resumes after the replayed decision_turn
+        self.assertEqual(redis_client.commit_turn("c3", [("human", "次")]).turn, 2)
+
+    def test_turn_numbers_keep_growing_under_the_history_cap(self):
+        """
+        EN: With a history cap, turn numbers keep growing, so an older turn's decision cannot overwrite a newer one.
+        JP: 履歴の保持上限があってもターン番号は増え続け、古いターンの決定事項が新しいものを上書きしないこと。
+        """
+        with patch.object(redis_client, "CHAT_HISTORY_MAX_ENTRIES", 4):
+            turns = [
+                redis_client.commit_turn("c5", [("human", str(index)), ("assistant", "ok")]).turn
+                for index in range(4)
+            ]
+            self.assertEqual(turns, [1, 2, 3, 4])
+            self.assertEqual(len(redis_client.get_chat_history("c5")), 4)
+            self.assertEqual(redis_client.get_current_turn("c5"), 4)
+
+            self.assertTrue(redis_client.save_decision_if_newer("c5", "目的地: 京都", 4))
+            self.assertFalse(redis_client.save_decision_if_newer("c5", "目的地: 大阪", 2))
+            self.assertEqual(redis_client.get_decision("c5"), "目的地: 京都")
+
+    def test_existing_sessions_start_after_their_history_and_decision_turn(self):
+        """
+        EN: A session saved before the turn counter continues after its stored history and decision turn.
+        JP: ターン番号の導入前に保存されたセッションは、既存の履歴と decision_turn の続きから数えること。
+        """
+        redis_client.append_chat_history("c6", [("human", "a"), ("assistant", "b"), ("human", "c"), ("assistant", "d")])
+        self.assertEqual(redis_client.commit_turn("c6", [("human", "e"), ("assistant", "f")]).turn, 3)
+
+        redis_client.save_decision_if_newer("c7", "目的地: 京都", 5)
+        self.assertEqual(redis_client.commit_turn("c7", [("human", "a"), ("assistant", "b")]).turn, 6)
+
+    def test_reset_restarts_the_turn_counter_and_rejects_older_decisions(self):
+        """
+        EN: A reset sets the turn counter back to 0, so the decision is ready again and a pre-reset job's result is not saved.
+        JP: リセットでターン番号が 0 に戻り、決定事項の状態が ready になり、リセット前のジョブの結果は保存されないこと。
+        """
+        commit = redis_client.commit_turn("c8", [("human", "京都"), ("assistant", "了解")], decision="目的地: 京都")
+        self.assertEqual(commit.turn, 1)
+
+        redis_client.reset_session("c8")
+
+        # ターン 0 は /api/decision で ready / Turn 0 reports ready on /api/decision
+        self.assertEqual(redis_client.get_current_turn("c8"), 0)
+        self.assertFalse(redis_client.save_decision_if_newer("c8", "目的地: 大阪", 1))
+        self.assertEqual(redis_client.get_decision("c8"), "")
+        self.assertEqual(redis_client.commit_turn("c8", [("human", "札幌")]).turn, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+"""
+`backend.redis_pool` のテスト。
+Tests for `backend.redis_pool`.
+"""
+import os
+import unittest
+from unittest.mock import patch
+
+import redis
+
+from backend import redis_client
+from backend.redis_pool import InstrumentedConnectionPool, default_max_connections
+
+
+class _FakeConnection:
+    """
+    ネットワークに接続しない接続のスタブ
+    Connection stub that never touches the network.
+    """
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.connected = False
+        self.pid = os.getpid()
+
+    def connect(self):
+        self.connected = True
+
+    def disconnect(self, *args, **kwargs):
+        self.connected = False
+
+    def can_read(self, timeout=0):
+        return False
+
+    def should_reconnect(self):
+        return False
+
+    def __getattr__(self, name):
+        # プールが参照するその他の属性（メンテナンス通知など）は無効値で返す
+        # Any other attribute the pool probes (maintenance hooks, ...) is inert
+        return lambda *args, **kwargs: None
+
+
+def _pool(max_connections=2, timeout=0.0):
+    return InstrumentedConnectionPool(
+        max_connections=max_connections, timeout=timeout, connection_class=_FakeConnection
+    )
+
+
+class RedisPoolTests(unittest.TestCase):
+    """
+    上限付き接続プールのテストケース群
+    Test cases for the bounded connection pool.
+    """
+
+    def test_default_size_follows_worker_threads(self):
+        """
+        EN: The default size is gunicorn threads plus decision worker threads plus background headroom.
+        JP: 既定の上限が gunicorn のスレッド数＋決定事項ワーカーのスレッド数＋余裕になること。
+        """
+        with patch.dict(os.environ, {"GUNICORN_THREADS": "8", "DECISION_WORKER_THREADS": "3"}):
+            self.assertEqual(default_max_connections(), 13)
+        with patch.dict(os.environ, {"GUNICORN_THREADS": "oops", "DECISION_WORKER_THREADS": "0"}):
+            self.assertEqual(default_max_connections(), 4)
+
+    def test_stats_track_in_use_and_idle_connections(self):
+        """
+        EN: Acquired connections count as in use and return to idle after release.
+        JP: 取得中の接続は使用中として数えられ、返却後は待機中に戻ること。
+        """
+        pool = _pool()
+        first = pool.get_connection()
+        second = pool.get_connection()
+        stats = pool.stats()
+        self.assertEqual((stats["created"], stats["in_use"], stats["idle"]), (2, 2, 0))
+        self.assertEqual(stats["acquired_total"], 2)
+
+        pool.release(first)
+        stats = pool.stats()
+        self.assertEqual((stats["in_use"], stats["idle"]), (1, 1))
+
+        pool.release(second)
+        self.assertIs(pool.get_connection(), second)
+        self.assertEqual(pool.stats()["created"], 2)
+
+    def test_exhausted_pool_fails_after_timeout_and_is_counted(self):
+        """
+        EN: With every connection in use, acquiring fails after the timeout and is counted as exhausted.
+        JP: 全接続が使用中の場合、タイムアウト後に取得が失敗し、枯渇として数えられること。
+        """
+        pool = _pool(max_connections=1, timeout=0.01)
+        held = pool.get_connection()
+
+        with self.assertRaises(redis.ConnectionError):
+            pool.get_connection()
+        self.assertEqual(pool.stats()["exhausted_total"], 1)
+
+        pool.release(held)
+        self.assertIs(pool.get_connection(), held)
+
+    def test_pool_stats_without_client(self):
+        """
+        EN: pool_stats reports disconnected when there is no Redis client.
+        JP: Redis クライアントが無い場合、pool_stats が未接続を返すこと。
+        """
+        with patch.object(redis_client, "redis_client", None):
+            self.assertEqual(redis_client.pool_stats(), {"connected": False})
+
+    def test_pool_stats_reports_current_client_pool(self):
+        """
+        EN: pool_stats returns the statistics of the current client's pool.
+        JP: pool_stats が現在のクライアントのプールの統計を返すこと。
+        """
+        pool = _pool(max_connections=3)
+        with patch.object(redis_client, "redis_client", redis.Redis(connection_pool=pool)):
+            stats = redis_client.pool_stats()
+        self.assertTrue(stats["connected"])
+        self.assertEqual(stats["max_connections"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+"""
+`backend.redis_replicas` のテスト。
+Tests for `backend.redis_replicas`.
+"""
+import unittest
+
+from backend.redis_replicas import RecentWrites, ReplicaSet
+
+
+class ReplicaSetTests(unittest.TestCase):
+    """
+    読み込みレプリカ群のテストケース群
+    Test cases for the read replica set.
+    """
+
+    def test_failed_replica_rests_until_retry(self):
+        """
+        EN: A replica marked down is not picked until retry_after seconds have passed.
+        JP: 失敗扱いのレプリカは retry_after 秒経つまで選ばれないこと。
+        """
+        first, second = object(), object()
+        replicas = ReplicaSet({"a": first, "b": second}, retry_after=10.0)
+        replicas.mark_down(first, now=100.0)
+
+        self.assertEqual({id(replicas.pick(now=105.0)) for _ in range(20)}, {id(second)})
+        self.assertEqual(replicas.down(now=105.0), ["a"])
+        self.assertEqual(replicas.down(now=110.0), [])
+
+    def test_pick_returns_none_when_every_replica_rests(self):
+        """
+        EN: pick returns None while every replica is resting.
+        JP: 全レプリカが休止中なら pick が None を返すこと。
+        """
+        only = object()
+        replicas = ReplicaSet({"a": only}, retry_after=10.0)
+        replicas.mark_down(only, now=0.0)
+
+        self.assertIsNone(replicas.pick(now=5.0))
+        self.assertIs(replicas.pick(now=10.0), only)
+
+
+class RecentWritesTests(unittest.TestCase):
+    """
+    直近の書き込み記録のテストケース群
+    Test cases for the recent write tracker.
+    """
+
+    def test_writes_are_recent_within_the_window(self):
+        """
+        EN: A session counts as recently written only within the window.
+        JP: 書き込みから window 秒以内だけ直近の書き込みと扱われること。
+        """
+        writes = RecentWrites(window=5.0)
+        writes.note("s1", now=100.0)
+
+        self.assertTrue(writes.is_recent("s1", now=104.9))
+        self.assertFalse(writes.is_recent("s1", now=105.0))
+        self.assertFalse(writes.is_recent("s2", now=100.0))
+
+    def test_expired_entries_are_pruned_on_write(self):
+        """
+        EN: Recording a write removes entries older than the window, keeping the tracker small.
+        JP: 書き込みの記録時に window より古い記録が削除され、件数が増え続けないこと。
+        """
+        writes = RecentWrites(window=5.0)
+        writes.note("old", now=0.0)
+        writes.note("mid", now=3.0)
+        writes.note("old", now=4.0)
+        writes.note("new", now=8.5)
+
+        self.assertEqual(len(writes), 2)
+        self.assertTrue(writes.is_recent("old", now=8.5))
+        self.assertFalse(writes.is_recent("mid", now=8.5))
+
+    def test_zero_window_records_nothing(self):
+        """
+        EN: With a zero window (replica reads disabled) nothing is recorded.
+        JP: window が 0（レプリカ読み込み無効）の場合は何も記録しないこと。
+        """
+        writes = RecentWrites(window=0.0)
+        writes.note("s1", now=1.0)
+
+        self.assertEqual(len(writes), 0)
+        self.assertFalse(writes.is_recent("s1", now=1.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
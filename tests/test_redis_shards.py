@@ -0,0 +1,83 @@
+"""
+`backend.redis_shards` のテスト。
+Tests for `backend.redis_shards`.
+"""
+import unittest
+from collections import Counter
+
+from backend.redis_shards import HashRing, ShardedRedis, node_name
+
+
+class HashRingTests(unittest.TestCase):
+    """
+    コンシステント・ハッシュリングのテストケース群
+    Test cases for the consistent hash ring.
+    """
+
+    def test_keys_spread_evenly_and_routing_is_stable(self):
+        """
+        EN: Keys spread roughly evenly over the nodes, and the same key always maps to the same node.
+        JP: キーが各ノードにほぼ均等に分散し、同じキーは常に同じノードに割り当てられること。
+        """
+        ring = HashRing(["a", "b", "c"])
+        keys = [f"session-{index}" for index in range(3000)]
+        counts = Counter(ring.node_for(key) for key in keys)
+
+        self.assertEqual(set(counts), {"a", "b", "c"})
+        for node in counts:
+            self.assertGreater(counts[node], 700)
+        reordered = HashRing(["c", "a", "b"])
+        self.assertEqual([ring.node_for(key) for key in keys], [reordered.node_for(key) for key in keys])
+
+    def test_adding_a_node_moves_only_its_share(self):
+        """
+        EN: Adding a fourth node moves about a quarter of the keys, all of them to the new node.
+        JP: 4台目を追加しても移動するキーは約1/4で、移動先はすべて新しいノードであること。
+        """
+        before = HashRing(["a", "b", "c"])
+        after = HashRing(["a", "b", "c", "d"])
+        keys = [f"session-{index}" for index in range(3000)]
+        moved = [key for key in keys if before.node_for(key) != after.node_for(key)]
+
+        self.assertLess(len(moved), len(keys) * 0.35)
+        self.assertEqual({after.node_for(key) for key in moved}, {"d"})
+
+    def test_node_name_ignores_credentials(self):
+        """
+        EN: Node names omit credentials so rotating a password does not move sessions.
+        JP: ノード名に認証情報が含まれず、パスワードを変えてもセッションが移動しないこと。
+        """
+        self.assertEqual(node_name("redis://:secret@cache-1:6380/2"), "cache-1:6380/2")
+        self.assertEqual(node_name("redis://cache-1"), "cache-1:6379/0")
+
+    def test_sharded_client_routes_and_pings_every_node(self):
+        """
+        EN: ShardedRedis returns the owning node's client and pings every node.
+        JP: ShardedRedis が担当ノードのクライアントを返し、全ノードに ping すること。
+        """
+        pinged = []
+
+        class _Node:
+            def __init__(self, name):
+                self.name = name
+
+            def ping(self):
+                pinged.append(self.name)
+                return True
+
+        sharded = ShardedRedis({"a": _Node("a"), "b": _Node("b")})
+        self.assertEqual(sharded.for_key("s1").name, sharded.ring.node_for("s1"))
+        self.assertTrue(sharded.ping())
+        self.assertEqual(sorted(pinged), ["a", "b"])
+
+    def test_empty_ring_is_rejected(self):
+        """
+        EN: A ring without nodes raises ValueError.
+        JP: ノードの無いリングは ValueError になること。
+        """
+        with self.assertRaises(ValueError):
+            HashRing([])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,11 +3,16 @@
 Tests for shared route factories in `backend.routes.common`.
 """
 
+import json
+import threading
+import time
 import unittest
+from concurrent.futures import Future
 from unittest.mock import patch
 
 from flask import Blueprint, Flask
 
+from backend import decision_worker, redis_client, serialization, stage_timing
 from backend.routes.common import make_chat_send_message_route, make_complete_route
 
 
@@ -42,7 +47,6 @@ class RoutesCommonTests(unittest.TestCase):
             ),
             resolve_user_language=lambda *_args, **_kwargs: "ja",
             get_user_language=lambda *_args, **_kwargs: "ja",
-            save_user_language=lambda *_args, **_kwargs: None,
             chat_with_llama=lambda *_args, **_kwargs: (
                 "ok",
                 "",
@@ -110,6 +114,275 @@ class RoutesCommonTests(unittest.TestCase):
         payload = response.get_json()
         self.assertEqual(payload, {"reservation_data": ["目的地：東京"]})
 
+    def _register_timed_chat_route(self, name: str) -> None:
+        """段階計測を行うチャットルートを登録する / Register a chat route whose runners record stages."""
+
+        def chat_with_llama(*_args, **_kwargs):
+            with stage_timing.stage("llm"):
+                pass
+            return "ok", "", None, None, False, "ok", False
+
+        def stream_chat_with_llama(*_args, **_kwargs):
+            with stage_timing.stage("llm"):
+                pass
+            payload = {"type": "final", "response": "ok"}
+            timings = stage_timing.current()
+            if timings is not None:
+                payload["timing"] = timings.as_dict()
+            yield f"data: {json.dumps(payload)}\n\n"
+
+        blueprint = Blueprint(f"{name}_bp", __name__)
+        make_chat_send_message_route(
+            blueprint=blueprint,
+            route_path=f"/{name}",
+            mode=name,
+            endpoint_name=name,
+            check_and_increment_limit=lambda *_args, **_kwargs: (True, 1, 10, "normal", False, None),
+            resolve_user_language=lambda *_args, **_kwargs: "ja",
+            get_user_language=lambda *_args, **_kwargs: "ja",
+            chat_with_llama=chat_with_llama,
+            stream_chat_with_llama=stream_chat_with_llama,
+            logger=self.app.logger,
+        )
+        self.app.register_blueprint(blueprint)
+
+    def test_stage_timing_is_returned_only_for_trusted_callers(self):
+        """
+        EN: Server-Timing and SSE `timing` appear only when the caller sends the timing token.
+        JP: タイミング用トークンを送った呼び出し元にだけ Server-Timing と SSE の `timing` を返すこと。
+        """
+        self._register_timed_chat_route("timed_chat")
+        client = self.app.test_client()
+        client.set_cookie("session_id", "session-timed")
+        body = {"message": "hello", "user_type": "normal"}
+
+        with patch("backend.routes.common.security.is_csrf_valid", return_value=True), patch.object(
+            stage_timing, "STAGE_TIMING_TOKEN", "secret"
+        ):
+            plain = client.post("/timed_chat", json=body)
+            timed = client.post("/timed_chat", json=body, headers={"X-Stage-Timing": "secret"})
+            non_ascii = client.post("/timed_chat", json=body, headers={"X-Stage-Timing": "sécret"})
+            streamed = client.post(
+                "/timed_chat",
+                json=dict(body, stream=True),
+                headers={"X-Stage-Timing": "secret"},
+            )
+            frame = json.loads(streamed.get_data(as_text=True).split("data: ", 1)[1])
+
+        self.assertNotIn("Server-Timing", plain.headers)
+        self.assertEqual(non_ascii.status_code, 200)
+        self.assertNotIn("Server-Timing", non_ascii.headers)
+        self.assertIn("llm;dur=", timed.headers["Server-Timing"])
+        self.assertIn("total;dur=", timed.headers["Server-Timing"])
+        self.assertIn("llm", frame["timing"])
+        self.assertIsNone(stage_timing.current())
+
+    def test_session_snapshot_is_loaded_once_and_shared_with_runner(self):
+        """
+        EN: The snapshot loader runs once per turn and the runner reads session state from it.
+        JP: スナップショットはターンごとに1回だけ読み込まれ、処理側はそこから状態を読むこと。
+        """
+        loads = []
+        seen = {}
+
+        def load_session_snapshot(session_id):
+            loads.append(session_id)
+            return redis_client.SessionSnapshot(
+                session_id=session_id,
+                chat_history=[("human", "前回"), ("assistant", "了解")],
+                user_language="en",
+            )
+
+        def chat_with_llama(session_id, *_args, **_kwargs):
+            seen["history"] = redis_client.get_chat_history(session_id)
+            seen["language"] = redis_client.get_user_language(session_id)
+            return "ok", "", None, None, False, "ok", False
+
+        blueprint = Blueprint("snapshot_bp", __name__)
+        make_chat_send_message_route(
+            blueprint=blueprint,
+            route_path="/snapshot_chat",
+            mode="snapshot_chat",
+            endpoint_name="snapshot_chat",
+            check_and_increment_limit=lambda *_args, **_kwargs: (True, 1, 10, "normal", False, None),
+            resolve_user_language=lambda _prompt, fallback=None, accept_language=None: fallback,
+            get_user_language=redis_client.get_user_language,
+            chat_with_llama=chat_with_llama,
+            stream_chat_with_llama=lambda *_args, **_kwargs: iter(()),
+            logger=self.app.logger,
+            load_session_snapshot=load_session_snapshot,
+        )
+        self.app.register_blueprint(blueprint)
+        client = self.app.test_client()
+        client.set_cookie("session_id", "session-snapshot")
+
+        with patch("backend.routes.common.security.is_csrf_valid", return_value=True), patch.object(
+            redis_client, "get_redis_client", side_effect=AssertionError("Redis should not be read")
+        ):
+            response = client.post("/snapshot_chat", json={"message": "hello", "user_type": "normal"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(loads, ["session-snapshot"])
+        self.assertEqual(seen["history"], [("human", "前回"), ("assistant", "了解")])
+        self.assertEqual(seen["language"], "en")
+
+    def _register_snapshot_chat_route(self, name, load_session_snapshot, chat_with_llama, check_and_increment_limit=None):
+        """スナップショットを読み込むチャットルートを登録する / Register a chat route that loads a session snapshot."""
+        blueprint = Blueprint(f"{name}_bp", __name__)
+        make_chat_send_message_route(
+            blueprint=blueprint,
+            route_path=f"/{name}",
+            mode=name,
+            endpoint_name=name,
+            check_and_increment_limit=check_and_increment_limit
+            or (lambda *_args, **_kwargs: (True, 1, 10, "normal", False, None)),
+            resolve_user_language=lambda _prompt, fallback=None, accept_language=None: fallback or "ja",
+            get_user_language=redis_client.get_user_language,
+            chat_with_llama=chat_with_llama,
+            stream_chat_with_llama=lambda *_args, **_kwargs: iter(()),
+            logger=self.app.logger,
+            load_session_snapshot=load_session_snapshot,
+        )
+        self.app.register_blueprint(blueprint)
+
+    def test_overlapping_turns_read_the_snapshot_only_under_the_session_lock(self):
+        """
+        EN: A turn that overlaps one in progress gets 409 without reading the session or using quota, and the next turn sees the committed history.
+        JP: 処理中のターンと重なったターンはセッションを読まず利用回数も消費せずに 409 となり、次のターンは保存済みの履歴を読むこと。
+        """
+        committed = []
+        loads = []
+        limit_checks = []
+        seen = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def load_session_snapshot(session_id):
+            loads.append(session_id)
+            return redis_client.SessionSnapshot(session_id=session_id, chat_history=list(committed), user_language="ja")
+
+        def check_and_increment_limit(session_id, user_type=None):
+            limit_checks.append(session_id)
+            return True, len(limit_checks), 10, "normal", False, None
+
+        def chat_with_llama(session_id, prompt, **_kwargs):
+            seen.append(redis_client.get_chat_history(session_id))
+            if prompt == "first":
+                started.set()
+                release.wait(timeout=5)
+            committed.extend([("human", prompt), ("assistant", "ok")])
+            return "ok", "", None, None, False, "ok", False
+
+        self._register_snapshot_chat_route(
+            "overlap_chat", load_session_snapshot, chat_with_llama, check_and_increment_limit
+        )
+        body = {"user_type": "normal"}
+        results = {}
+
+        def post(message):
+            client = self.app.test_client()
+            client.set_cookie("session_id", "session-overlap")
+            results[message] = client.post("/overlap_chat", json=dict(body, message=message))
+
+        with patch("backend.routes.common.security.is_csrf_valid", return_value=True):
+            first = threading.Thread(target=post, args=("first",))
+            first.start()
+            self.assertTrue(started.wait(timeout=5))
+            post("overlap")
+            release.set()
+            first.join(timeout=5)
+            post("third")
+
+        self.assertEqual(results["overlap"].status_code, 409)
+        self.assertEqual(results["first"].status_code, 200)
+        self.assertEqual(results["third"].status_code, 200)
+        self.assertEqual(loads, ["session-overlap", "session-overlap"])
+        self.assertEqual(len(limit_checks), 2)
+        self.assertEqual(seen, [[], [("human", "first"), ("assistant", "ok")]])
+
+    def test_snapshot_read_is_timed_as_redis_read(self):
+        """
+        EN: The snapshot read is inside the timed turn, so `redis_read` and `total` include it.
+        JP: スナップショットの読み込みは計測の内側で行われ、`redis_read` と `total` に含まれること。
+        """
+        def load_session_snapshot(session_id):
+            time.sleep(0.05)
+            return redis_client.SessionSnapshot(session_id=session_id, user_language="ja")
+
+        self._register_snapshot_chat_route(
+            "timed_snapshot_chat",
+            load_session_snapshot,
+            lambda *_args, **_kwargs: ("ok", "", None, None, False, "ok", False),
+        )
+        client = self.app.test_client()
+        client.set_cookie("session_id", "session-timed-snapshot")
+
+        with patch("backend.routes.common.security.is_csrf_valid", return_value=True), patch.object(
+            stage_timing, "STAGE_TIMING_TOKEN", "secret"
+        ):
+            response = client.post(
+                "/timed_snapshot_chat",
+                json={"message": "hello", "user_type": "normal"},
+                headers={"X-Stage-Timing": "secret"},
+            )
+
+        stages = {
+            part.split(";")[0].strip(): float(part.split("dur=")[1].split(";")[0])
+            for part in response.headers["Server-Timing"].split(",")
+        }
+        self.assertGreaterEqual(stages["redis_read"], 50)
+        self.assertGreaterEqual(stages["total"], stages["redis_read"])
+
+    def test_decision_event_is_sent_after_the_session_lock_is_released(self):
+        """
+        EN: A decision the turn deferred is awaited only after the session lock is released, then sent as a `decision` event.
+        JP: ターンが預けた決定事項はセッションロックの解放後に待ち、`decision` イベントで送ること。
+        """
+        future = Future()
+        order = []
+
+        def stream_chat_with_llama(*_args, **_kwargs):
+            decision_worker.defer_to_stream(2, future)
+            yield serialization.sse_event({"type": "final", "response": "ok"})
+
+        def release_session_lock(session_id):
+            order.append("release")
+            # ロック解放後に決定事項が届く / The decision arrives only after the lock is released
+            future.set_result("目的地: 京都")
+
+        blueprint = Blueprint("decision_event_bp", __name__)
+        make_chat_send_message_route(
+            blueprint=blueprint,
+            route_path="/decision_event_chat",
+            mode="decision_event_chat",
+            endpoint_name="decision_event_chat",
+            check_and_increment_limit=lambda *_args, **_kwargs: (True, 1, 10, "normal", False, None),
+            resolve_user_language=lambda *_args, **_kwargs: "ja",
+            get_user_language=lambda *_args, **_kwargs: "ja",
+            chat_with_llama=lambda *_args, **_kwargs: ("ok", "", None, None, False, "ok", False),
+            stream_chat_with_llama=stream_chat_with_llama,
+            logger=self.app.logger,
+        )
+        self.app.register_blueprint(blueprint)
+        client = self.app.test_client()
+        client.set_cookie("session_id", "session-decision")
+
+        with patch("backend.routes.common.security.is_csrf_valid", return_value=True), patch(
+            "backend.routes.common.acquire_session_lock", return_value=True
+        ), patch("backend.routes.common.release_session_lock", side_effect=release_session_lock), patch.object(
+            decision_worker, "DECISION_STREAM_WAIT_SECONDS", 1.0
+        ):
+            response = client.post(
+                "/decision_event_chat",
+                json={"message": "hello", "user_type": "normal", "stream": True},
+            )
+            frames = [json.loads(part) for part in response.get_data(as_text=True).split("data: ")[1:]]
+
+        self.assertEqual(order, ["release"])
+        self.assertEqual([frame["type"] for frame in frames], ["final", "decision"])
+        self.assertEqual(frames[1], {"type": "decision", "current_plan": "目的地: 京都", "turn": 2})
+        self.assertIsNone(decision_worker.stream_pending())
+
 
 if __name__ == "__main__":
     unittest.main()
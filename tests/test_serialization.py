@@ -0,0 +1,52 @@
+"""
+`backend.serialization` のテスト。
+Tests for `backend.serialization`.
+"""
+import json
+import unittest
+from unittest.mock import patch
+
+from backend import serialization
+
+
+class SerializationTests(unittest.TestCase):
+    """
+    バックエンド選択と出力形式のテストケース群
+    Test cases for backend selection and output format.
+    """
+
+    def test_backends_produce_identical_json(self):
+        """
+        EN: orjson (when installed) and stdlib json emit the same compact, non-escaped JSON.
+        JP: orjson（インストール時）と標準の json が同じ JSON（空白なし・非ASCIIはそのまま）を出力すること。
+        """
+        payload = {"type": "delta", "content": "京都\n\"quoted\"", "items": [0, 1.5, None, True]}
+        outputs = set()
+        for backend in (serialization.BACKEND_JSON, serialization._select_backend("auto")):
+            with patch.object(serialization, "BACKEND", backend):
+                outputs.add(serialization.dumps(payload))
+                self.assertEqual(serialization.loads(serialization.dumps(payload)), payload)
+        self.assertEqual(outputs, {json.dumps(payload, ensure_ascii=False, separators=(",", ":"))})
+
+    def test_falls_back_to_stdlib_without_orjson(self):
+        """
+        EN: Without orjson every setting resolves to the stdlib backend.
+        JP: orjson が無い場合はどの設定でも標準ライブラリを使うこと。
+        """
+        with patch.object(serialization, "orjson", None):
+            for requested in ("auto", "orjson", "json", "bogus"):
+                self.assertEqual(serialization._select_backend(requested), serialization.BACKEND_JSON)
+        self.assertEqual(serialization._select_backend("json"), serialization.BACKEND_JSON)
+
+    def test_sse_event_frames_payload(self):
+        """
+        EN: sse_event builds one data frame terminated by a blank line; invalid JSON raises ValueError.
+        JP: sse_event は空行で終わる data フレームを作り、不正な JSON は ValueError になること。
+        """
+        self.assertEqual(serialization.sse_event({"type": "meta"}), 'data: {"type":"meta"}\n\n')
+        with self.assertRaises(ValueError):
+            serialization.loads("{broken")
+
+
+if __name__ == "__main__":
+    unittest.main()
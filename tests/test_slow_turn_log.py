@@ -0,0 +1,137 @@
+"""
+`backend.slow_turn_log` の遅いターン記録を検証するテスト。
+Tests for slow-turn logging in `backend.slow_turn_log`.
+"""
+
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from flask import Blueprint, Flask
+
+from backend import serialization, slow_turn_log, stage_timing
+from backend.routes.common import make_chat_send_message_route
+
+SECRET_PROMPT = "私のパスポート番号は TK1234567 です"
+
+
+class SlowTurnLogTests(unittest.TestCase):
+    """
+    遅いターンのログのテストケース群
+    Test cases for the slow-turn log.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "slow.jsonl")
+        self.app = Flask(__name__)
+
+        def chat_with_llama(*_args, **_kwargs):
+            with stage_timing.stage("llm"):
+                stage_timing.event("groq_retry", call_type="chat", attempt=1, error="APITimeoutError")
+            stage_timing.annotate(language="ja", history_turns=3, history_bytes=120, used_web_search=False)
+            return "ok", "", None, None, False, "ok", False
+
+        blueprint = Blueprint("slow_bp", __name__)
+        make_chat_send_message_route(
+            blueprint=blueprint,
+            route_path="/slow",
+            mode="slow",
+            endpoint_name="slow",
+            check_and_increment_limit=lambda *_args, **_kwargs: (True, 1, 10, "normal", False, None),
+            resolve_user_language=lambda *_args, **_kwargs: "ja",
+            get_user_language=lambda *_args, **_kwargs: "ja",
+            chat_with_llama=chat_with_llama,
+            stream_chat_with_llama=self._stream_final,
+            logger=self.app.logger,
+        )
+        self.app.register_blueprint(blueprint)
+
+    @staticmethod
+    def _stream_final(*_args, **_kwargs):
+        with stage_timing.stage("llm"):
+            time.sleep(0.01)
+        stage_timing.finish()
+        yield serialization.sse_event({"type": "final", "response": "ok"})
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _post(self, threshold_ms: float):
+        client = self.app.test_client()
+        client.set_cookie("session_id", "session-slow")
+        with patch("backend.routes.common.security.is_csrf_valid", return_value=True), patch.object(
+            slow_turn_log, "SLOW_TURN_LOG_THRESHOLD_MS", threshold_ms
+        ), patch.object(slow_turn_log, "SLOW_TURN_LOG_PATH", self.path):
+            return client.post("/slow", json={"message": SECRET_PROMPT, "user_type": "normal"})
+
+    def test_slow_turn_is_logged_without_user_content(self):
+        """
+        EN: A turn over the threshold is logged with stages, events and shape, but no user text or header.
+        JP: 閾値超えのターンは段階・イベント・会話の形を記録し、本文やヘッダーは出さないこと。
+        """
+        response = self._post(threshold_ms=0.0001)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Server-Timing", response.headers)
+        with open(self.path, encoding="utf-8") as f:
+            raw = f.read()
+        entry = json.loads(raw)
+        self.assertEqual(entry["mode"], "slow")
+        self.assertEqual(entry["transport"], "json")
+        self.assertEqual(entry["status"], 200)
+        self.assertEqual(entry["history_turns"], 3)
+        self.assertIn("llm", entry["stages_ms"])
+        self.assertEqual(entry["events"][0]["name"], "groq_retry")
+        self.assertNotIn("TK1234567", raw)
+
+    def test_streamed_turn_total_stops_at_the_final_frame(self):
+        """
+        EN: A streamed turn's logged total excludes time the client spends after the final frame.
+        JP: ストリームのターンの total に final フレーム後の送信待ち時間が含まれないこと。
+        """
+        client = self.app.test_client()
+        client.set_cookie("session_id", "session-slow")
+        with patch("backend.routes.common.security.is_csrf_valid", return_value=True), patch.object(
+            slow_turn_log, "SLOW_TURN_LOG_THRESHOLD_MS", 0.0001
+        ), patch.object(slow_turn_log, "SLOW_TURN_LOG_PATH", self.path):
+            response = client.post(
+                "/slow",
+                json={"message": SECRET_PROMPT, "user_type": "normal", "stream": True},
+                buffered=False,
+            )
+            chunks = iter(response.response)
+            self.assertIn(b'"final"', next(chunks))
+            time.sleep(0.3)
+            self.assertEqual(list(chunks), [])
+            response.close()
+
+        with open(self.path, encoding="utf-8") as f:
+            entry = json.loads(f.read())
+        self.assertEqual(entry["transport"], "sse")
+        self.assertLess(entry["total_ms"], 300)
+
+    def test_fast_turn_and_disabled_log_write_nothing(self):
+        """
+        EN: Turns under the threshold, or with the log disabled, produce no entries.
+        JP: 閾値未満のターンや無効時は何も記録しないこと。
+        """
+        self._post(threshold_ms=60_000)
+        self._post(threshold_ms=0)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_estimate_tokens_counts_non_ascii_per_char(self):
+        """
+        EN: Token estimate counts ~4 ASCII chars per token and one per non-ASCII char.
+        JP: トークン概算は ASCII 約4文字で1、非ASCIIは1文字で1と数えること。
+        """
+        self.assertEqual(slow_turn_log.estimate_tokens("abcdefgh"), 2)
+        self.assertEqual(slow_turn_log.estimate_tokens("東京"), 2)
+        self.assertEqual(slow_turn_log.estimate_tokens(""), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,207 @@
+"""
+`backend.tracing` のスパン出力を検証するテスト。
+Tests for span export in `backend.tracing`.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from flask import Blueprint, Flask
+from sqlalchemy import create_engine, text
+
+from backend import decision_worker, tracing
+from backend.routes.common import make_chat_send_message_route, make_complete_route
+
+
+@tracing.traced("unit.lookup")
+def _lookup() -> str:
+    return "value"
+
+
+class TracingTests(unittest.TestCase):
+    """
+    トレースの親子関係・サンプリング・出力のテストケース群
+    Test cases for span parenting, sampling and export.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "traces.jsonl")
+        tracing.configure(tracing.EXPORTER_FILE, self.path, 1.0)
+
+    def tearDown(self):
+        tracing.configure(tracing.EXPORTER_OFF)
+        self.tmpdir.cleanup()
+
+    def _spans(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _register_route(self, app: Flask) -> None:
+        def chat_with_llama(*_args, **_kwargs):
+            _lookup()
+            return "ok", "", None, None, False, "ok", False
+
+        def stream_chat_with_llama(*_args, **_kwargs):
+            _lookup()
+            yield "data: {}\n\n"
+
+        blueprint = Blueprint("traced_bp", __name__)
+        make_chat_send_message_route(
+            blueprint=blueprint,
+            route_path="/traced",
+            mode="traced",
+            endpoint_name="traced",
+            check_and_increment_limit=lambda *_args, **_kwargs: (True, 1, 10, "normal", False, None),
+            resolve_user_language=lambda *_args, **_kwargs: "ja",
+            get_user_language=lambda *_args, **_kwargs: "ja",
+            chat_with_llama=chat_with_llama,
+            stream_chat_with_llama=stream_chat_with_llama,
+            logger=app.logger,
+        )
+        app.register_blueprint(blueprint)
+
+    def test_route_exports_root_and_child_spans_for_json_and_stream(self):
+        """
+        EN: A chat turn exports one trace whose children point at the root, including streamed turns.
+        JP: チャット1ターンでルート配下の子スパンを持つトレースが出力されること（ストリーム時も含む）。
+        """
+        app = Flask(__name__)
+        self._register_route(app)
+        client = app.test_client()
+        client.set_cookie("session_id", "session-traced")
+        body = {"message": "hello", "user_type": "normal"}
+
+        with patch("backend.routes.common.security.is_csrf_valid", return_value=True):
+            client.post("/traced", json=body)
+            streamed = client.post("/traced", json=dict(body, stream=True))
+            streamed.get_data()
+
+        spans = self._spans()
+        roots = [span for span in spans if span["parent_span_id"] is None]
+        self.assertEqual([root["name"] for root in roots], ["chat.send_message"] * 2)
+        self.assertEqual(roots[0]["attributes"]["http.status_code"], 200)
+
+        by_id = {span["span_id"]: span for span in spans}
+        lookups = [span for span in spans if span["name"] == "unit.lookup"]
+        self.assertEqual(len(lookups), 2)
+        self.assertEqual(by_id[lookups[0]["parent_span_id"]]["name"], "chat.send_message")
+        self.assertEqual(by_id[lookups[1]["parent_span_id"]]["name"], "chat.stream")
+        for span in spans:
+            self.assertIn(span["trace_id"], {root["trace_id"] for root in roots})
+
+    def test_streamed_turn_exports_root_with_its_stream_spans(self):
+        """
+        EN: A streamed turn's root is exported in the same batch as the chat.stream span, after the stream closes.
+        JP: ストリーム応答のルートスパンが chat.stream スパンの終了後に同じバッチで出力されること。
+        """
+        app = Flask(__name__)
+        self._register_route(app)
+        client = app.test_client()
+        client.set_cookie("session_id", "session-traced")
+        batches = []
+        original_export = tracing._export
+
+        def record_export(spans):
+            batches.append([span.name for span in spans])
+            original_export(spans)
+
+        with patch("backend.routes.common.security.is_csrf_valid", return_value=True), patch.object(
+            tracing, "_export", side_effect=record_export
+        ):
+            streamed = client.post("/traced", json={"message": "hello", "user_type": "normal", "stream": True})
+            self.assertEqual(batches, [])
+            streamed.get_data()
+            streamed.close()
+
+        self.assertEqual(len(batches), 1)
+        self.assertIn("chat.send_message", batches[0])
+        self.assertIn("chat.stream", batches[0])
+
+    def test_sampling_rate_zero_exports_nothing(self):
+        """
+        EN: With a zero sample rate, no spans are recorded or exported.
+        JP: サンプリング率0ではスパンを記録・出力しないこと。
+        """
+        tracing.configure(tracing.EXPORTER_FILE, self.path, 0.0)
+        with tracing.start_trace("root") as root:
+            self.assertIsNone(root)
+            _lookup()
+        self.assertEqual(self._spans(), [])
+
+    def test_sqlalchemy_queries_become_child_spans(self):
+        """
+        EN: Queries on an instrumented engine are recorded under the current span.
+        JP: 計装したエンジンのクエリが現在のスパンの子として記録されること。
+        """
+        engine = create_engine("sqlite+pysqlite:///:memory:")
+        tracing.instrument_sqlalchemy(engine)
+        with tracing.start_trace("root"):
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+
+        spans = self._spans()
+        db_spans = [span for span in spans if span["name"] == "db.select"]
+        self.assertEqual(len(db_spans), 1)
+        self.assertEqual(db_spans[0]["attributes"]["db.system"], "sqlite")
+        self.assertIsNotNone(db_spans[0]["parent_span_id"])
+
+    def test_complete_route_exports_its_child_spans(self):
+        """
+        EN: The completion route opens a root span, so spans of the data it loads (SQL) are exported under it.
+        JP: 完了画面ルートがルートスパンを開き、読み込み処理（SQL）のスパンがその下に出力されること。
+        """
+        def load_reservation_data(_session_id):
+            _lookup()
+            return []
+
+        app = Flask(__name__)
+        blueprint = Blueprint("traced_complete_bp", __name__)
+        make_complete_route(
+            blueprint=blueprint,
+            route_path="/traced_complete",
+            mode="traced",
+            endpoint_name="traced_complete",
+            load_reservation_data=load_reservation_data,
+            formatter=lambda items: items,
+            logger=app.logger,
+        )
+        app.register_blueprint(blueprint)
+        client = app.test_client()
+        client.set_cookie("session_id", "session-traced")
+
+        response = client.get("/traced_complete", headers={"Accept": "application/json"})
+
+        self.assertEqual(response.status_code, 200)
+        by_name = {span["name"]: span for span in self._spans()}
+        self.assertEqual(by_name["reservation.complete"]["attributes"]["http.status_code"], 200)
+        self.assertEqual(by_name["unit.lookup"]["parent_span_id"], by_name["reservation.complete"]["span_id"])
+
+    def test_decision_job_runs_under_the_submitting_span(self):
+        """
+        EN: A decision job's spans are children of the span that submitted it, and the trace waits for the job.
+        JP: 決定事項ジョブのスパンは投入したスパンの子になり、トレースの出力はジョブの完了を待つこと。
+        """
+        with tracing.start_trace("root") as root:
+            future = decision_worker.submit_decision_job("traced-session", 1, lambda: _lookup())
+        self.assertEqual(future.result(timeout=5), "value")
+        # ルートより後に終わるジョブも同じバッチで出力される / A job finishing after the root is exported in the same batch
+        for _ in range(50):
+            if self._spans():
+                break
+            threading.Event().wait(0.02)
+
+        by_name = {span["name"]: span for span in self._spans()}
+        self.assertEqual(by_name["decision.job"]["parent_span_id"], root.span_id)
+        self.assertEqual(by_name["unit.lookup"]["parent_span_id"], by_name["decision.job"]["span_id"])
+        self.assertEqual(len({span["trace_id"] for span in by_name.values()}), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+"""
+`backend.write_journal` のテスト。
+Tests for `backend.write_journal`.
+"""
+import unittest
+
+from backend.write_journal import OP_APPEND, OP_FIELDS, WriteJournal, split_by_stamp
+
+
+class WriteJournalTests(unittest.TestCase):
+    """
+    フォールバック書き込みジャーナルのテストケース群
+    Test cases for the fallback write journal.
+    """
+
+    def test_drain_returns_sessions_oldest_first_in_batches(self):
+        """
+        EN: drain returns each session's operations in order, oldest session first, up to the batch size.
+        JP: drain が各セッションの操作を記録順に、古いセッションから最大バッチ件数まで返すこと。
+        """
+        journal = WriteJournal()
+        journal.record("a", OP_APPEND, [("human", "1")], now=1.0)
+        journal.record("b", OP_FIELDS, {"user_type": "normal"}, now=2.0)
+        journal.record("a", OP_APPEND, [("human", "2")], now=3.0)
+
+        batch = journal.drain(1)
+        self.assertEqual([session_id for session_id, _ops in batch], ["a"])
+        self.assertEqual([op.written_at for op in batch[0][1]], [1.0, 3.0])
+        self.assertEqual(len(journal), 1)
+        self.assertEqual([session_id for session_id, _ops in journal.drain(10)], ["b"])
+        self.assertEqual(journal.drain(10), [])
+
+    def test_restore_puts_failed_batch_before_newer_operations(self):
+        """
+        EN: A restored batch goes back ahead of operations recorded after it was drained.
+        JP: 戻したバッチが、取り出し後に記録された操作より前に並ぶこと。
+        """
+        journal = WriteJournal()
+        journal.record("a", OP_APPEND, [("human", "1")], now=1.0)
+        batch = journal.drain(10)
+        journal.record("a", OP_APPEND, [("human", "2")], now=2.0)
+
+        journal.restore(batch)
+
+        (session_id, ops), = journal.drain(10)
+        self.assertEqual(session_id, "a")
+        self.assertEqual([op.written_at for op in ops], [1.0, 2.0])
+
+    def test_oldest_sessions_are_dropped_over_the_limit(self):
+        """
+        EN: Over max_ops, the oldest session's operations are dropped and counted, never the current one.
+        JP: 操作数の上限を超えると、最も古いセッションの記録が捨てられて数えられ、記録中のセッションは残ること。
+        """
+        journal = WriteJournal(max_ops=2)
+        journal.record("old", OP_FIELDS, {"user_type": "a"}, now=1.0)
+        journal.record("new", OP_FIELDS, {"user_type": "b"}, now=2.0)
+        journal.record("new", OP_FIELDS, {"user_type": "c"}, now=3.0)
+
+        stats = journal.stats()
+        self.assertEqual((stats["pending_sessions"], stats["pending_ops"]), (1, 2))
+        self.assertEqual(stats["totals"], {"recorded": 3, "dropped": 1})
+
+    def test_split_by_stamp(self):
+        """
+        EN: Operations newer than the Redis stamp are replayed; the rest are conflicts.
+        JP: Redis の最終更新時刻より新しい操作は再生対象、それ以外は競合になること。
+        """
+        journal = WriteJournal()
+        for now in (1.0, 2.0, 3.0):
+            journal.record("a", OP_FIELDS, {"user_type": str(now)}, now=now)
+        (_session_id, ops), = journal.drain(1)
+
+        newer, older = split_by_stamp(ops, 2.0)
+        self.assertEqual([op.written_at for op in newer], [3.0])
+        self.assertEqual([op.written_at for op in older], [1.0, 2.0])
+
+
+if __name__ == "__main__":
+    unittest.main()